@@ -7,6 +7,7 @@ from flask import Blueprint, jsonify, request
 from models import db, CompanyAnalysis
 from services.web_scraper import WebScraper
 from services.gemini_analyzer import GeminiAnalyzer
+from services.normalization import registrable_domain
 from datetime import datetime, timedelta
 from functools import wraps
 import os
@@ -50,6 +51,27 @@ def require_api_key(f):
     return decorated_function
 
 
+def find_company_analysis(company_domain, legacy_domain=None):
+    """
+    保存済みの分析を取得
+
+    登録可能ドメインで見つからなければ、従来のキー（www.を除いたホスト名）でも探す。
+    従来のキーで見つかった行は登録可能ドメインのキーに付け替える（以降は同じドメインのBizで共有される）。
+
+    Args:
+        company_domain: 登録可能ドメイン
+        legacy_domain: 従来のキー（www.を除いたホスト名）
+    """
+    analysis = CompanyAnalysis.query.filter_by(company_domain=company_domain).first()
+    if analysis or not legacy_domain or legacy_domain == company_domain:
+        return analysis
+    analysis = CompanyAnalysis.query.filter_by(company_domain=legacy_domain).first()
+    if analysis:
+        analysis.company_domain = company_domain
+        db.session.commit()
+    return analysis
+
+
 @api_bp.route('/companies/<company_domain>/analysis', methods=['GET'])
 @require_api_key
 def get_company_analysis(company_domain):
@@ -81,11 +103,12 @@ def get_company_analysis(company_domain):
         }
     """
     try:
-        # ドメインからwww.を除去
-        company_domain = company_domain.replace('www.', '')
+        # 登録可能ドメインに統一（www.や支店サブドメインを除去し、チェーンの分析を共有）
+        legacy_domain = company_domain.replace('www.', '')
+        company_domain = registrable_domain(f"https://{company_domain}") or legacy_domain
         
-        # キャッシュチェック
-        cached_analysis = CompanyAnalysis.query.filter_by(company_domain=company_domain).first()
+        # キャッシュチェック（従来のキーで保存された分析も対象）
+        cached_analysis = find_company_analysis(company_domain, legacy_domain)
         
         # キャッシュが有効か確認
         if cached_analysis:
@@ -226,12 +249,13 @@ def analyze_company_url(company_url: str, force_update: bool = False) -> dict:
             }
         
         # 3. データベース保存
-        company_domain = scrape_result['domain']
+        # 登録可能ドメインで保存（同じドメインのBizはBiz.website_domainで分析結果を共有）
+        company_domain = registrable_domain(company_url) or scrape_result['domain']
         now = datetime.utcnow()
         expires_at = now + timedelta(days=90)  # 90日間有効
         
-        # 既存レコードをチェック
-        existing = CompanyAnalysis.query.filter_by(company_domain=company_domain).first()
+        # 既存レコードをチェック（従来のキーで保存された分析も対象）
+        existing = find_company_analysis(company_domain, scrape_result['domain'])
         
         if existing and not force_update:
             # 既存レコードを返す（通常はここには来ない）
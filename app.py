@@ -27,10 +27,22 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.keys import Keys
-# Google Maps関連
-from googlemaps import Client as GoogleMaps
 from models import biz_categories 
 from sqlalchemy.orm import joinedload
+from services.area_subdivision import SPLIT_STATUS, subdivide_task
+from services.change_detection import ChangeTracker, place_state
+from services.contact_extraction import extract_contacts
+from services.normalization import registrable_domain
+from services.hpb_extractors import (
+    ENRICHMENT_PARTIAL, card_details, details_to_json, extract_details, missing_fields, save_details
+)
+from services.host_controller import get_host_controller
+from services.hpb_parsers import parse_rejob_search, parse_salon_list
+from services.page_pipeline import iter_pages
+from services.places_client import REVIEW_FIELDS, BudgetDeferred, PlacesError, get_places_client
+from services.places_governor import BATCH, INTERACTIVE
+from services.recrawl_scheduler import gmap_search_key
+from services.page_fetcher import create_fetcher
 
 # --- アプリケーションの初期設定 ---
 app = Flask(__name__)
@@ -70,6 +82,10 @@ def get_stealth_driver(driver=None):
     options.add_argument('--disable-blink-features=AutomationControlled')
     options.add_argument('--window-size=1920,1080')
     options.add_argument('--lang=ja')
+    # 裏のタブでもJavaScriptを止めない（services.tabbed_worker で複数タブを並行して読み込むため）
+    options.add_argument('--disable-background-timer-throttling')
+    options.add_argument('--disable-backgrounding-occluded-windows')
+    options.add_argument('--disable-renderer-backgrounding')
     options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.7339.127 Safari/537.36')
     
     # WebDriver検出を回避するための設定
@@ -94,50 +110,78 @@ def get_stealth_driver(driver=None):
     return driver
 
 # ... (Google Map ヘルパー関数群は変更なし) ...
-def get_gmap_place_details(place_name, api_key, return_list=False):
-    gmaps = GoogleMaps(api_key)
+# Google Map関連の取得は全て services.host_controller を通す（タイムアウト・ブロックが続いたら一時停止）
+# Places APIは services.places_client（共有セッション・タイムアウト・再試行・フィールド指定）を通す
+# priority は予算に近づいたときの優先度（services.places_governor: ページ表示 < 一括取得 < 管理者の手動実行）
+def get_gmap_place_details(place_name, api_key, return_list=False, priority=BATCH):
+    """予算の上限に近く見送った場合は BudgetDeferred を送出（結果なしと区別するため）"""
+    client = get_places_client(api_key)
     try:
-        results = gmaps.places(place_name, language='ja', region='jp').get('results', [])
-        if results: return results if return_list else results[0]
-    except Exception as e:
+        if return_list: return client.text_search_all(place_name, priority=priority)[0]
+        # 1件だけ必要な場合は、必要なフィールドのみ返す Find Place を使う
+        return client.find_place(place_name, priority=priority)
+    except BudgetDeferred:
+        raise
+    except PlacesError as e:
         print(f"[Google検索失敗] {e}", flush=True)
     return [] if return_list else None
-def get_cid_from_place_id(place_id, driver):
-    if not place_id: return None
+def cid_from_gmap_url(final_url):
+    cid_match = re.search(r'cid=([0-9]+)', final_url)
+    if cid_match: return cid_match.group(1)
+    for part in final_url.split('!'):
+        if '0x' in part:
+            hex_part = part.split(':')[-1]
+            try: return str(int(hex_part, 16))
+            except ValueError: continue
+    return None
+def load_gmap_place(place_id, fetcher):
+    """Place IDからGoogle Mapのページを開き、(CID, HTML) を返す（fetcher は create_fetcher の戻り値）"""
+    if not place_id: return None, None
     gmap_url = f"https://www.google.com/maps/place/?q=place_id:{place_id}"
     try:
-        driver.get(gmap_url)
-        time.sleep(5)
-        final_url = driver.current_url
-        cid_match = re.search(r'cid=([0-9]+)', final_url)
-        if cid_match: return cid_match.group(1)
-        for part in final_url.split('!'):
-            if '0x' in part:
-                hex_part = part.split(':')[-1]
-                try: return str(int(hex_part, 16))
-                except ValueError: continue
+        final_url, html = fetcher.fetch(gmap_url, wait=5)
+        return cid_from_gmap_url(final_url), html
     except Exception as e:
         print(f"CID取得中にエラー: {e}", flush=True)
-    return None
+    return None, None
+def get_cid_from_place_id(place_id, fetcher):
+    return load_gmap_place(place_id, fetcher)[0]
 def get_website_from_gmap(driver):
     try: return driver.find_element(By.CSS_SELECTOR, "a[data-item-id='authority']").get_attribute("href")
     except Exception:
         try: return driver.find_element(By.CSS_SELECTOR, "a[aria-label^='ウェブサイト']").get_attribute("href")
         except Exception: return None
+def website_from_gmap_html(html):
+    """Google MapのページのHTMLから公式サイトのURL（get_website_from_gmap のHTML版）"""
+    if not html: return None
+    soup = BeautifulSoup(html, 'lxml')
+    link = soup.select_one("a[data-item-id='authority']") or soup.select_one("a[aria-label^='ウェブサイト']")
+    return link.get('href') if link else None
+# 公式サイトのメール取得結果（ドメイン -> (取得時刻, メール)）。チェーン・分院で同じサイトを再取得しない
+_website_contact_cache = {}
+WEBSITE_CONTACT_CACHE_SECONDS = 24 * 60 * 60
+
 def get_contact_info_from_website(website_url):
     if not website_url: return None, None
+    domain = registrable_domain(website_url) or website_url
+    cached = _website_contact_cache.get(domain)
+    if cached and time.time() - cached[0] < WEBSITE_CONTACT_CACHE_SECONDS:
+        print(f"公式サイト({domain})は取得済みのため結果を再利用します。", flush=True)
+        return None, cached[1]
     email = None
     try:
         headers = {'User-Agent': 'Mozilla/5.0'}
-        response = requests.get(website_url, headers=headers, timeout=10)
+        with get_host_controller().request(website_url, wait=False) as slot:
+            response = requests.get(website_url, headers=headers, timeout=10)
+            slot.check_status(response.status_code)
         if response.status_code == 200:
-            html = response.text
-            emails = list(set(re.findall(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}', html)))
+            emails, _ = extract_contacts(response.text)
             if emails: email = ', '.join(emails)
+        _website_contact_cache[domain] = (time.time(), email)
     except Exception as e:
         print(f"公式サイト({website_url})の解析エラー: {e}", flush=True)
     return None, email
-def enrich_salon_with_gmap_data(salon_obj, driver):
+def enrich_salon_with_gmap_data(salon_obj, fetcher, priority=BATCH):
     search_name = salon_obj.name_hpb or salon_obj.name
     print(f"--- Google Map情報拡充開始: {search_name} ---", flush=True)
     api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
@@ -146,7 +190,7 @@ def enrich_salon_with_gmap_data(salon_obj, driver):
         return salon_obj
     try:
         if not salon_obj.place_id:
-            place_details = get_gmap_place_details(search_name, api_key)
+            place_details = get_gmap_place_details(search_name, api_key, priority=priority)
             if not place_details:
                 print("-> Place情報が見つかりませんでした。", flush=True)
                 return salon_obj
@@ -157,10 +201,10 @@ def enrich_salon_with_gmap_data(salon_obj, driver):
             salon_obj.review_count = place_details.get('user_ratings_total')
             print(f"-> Place ID: {salon_obj.place_id} を取得しました。", flush=True)
         if salon_obj.place_id:
-            salon_obj.cid = get_cid_from_place_id(salon_obj.place_id, driver)
+            salon_obj.cid, gmap_html = load_gmap_place(salon_obj.place_id, fetcher)
             if salon_obj.cid:
                 print(f"-> CID: {salon_obj.cid} を取得しました。", flush=True)
-                salon_obj.website_url = get_website_from_gmap(driver)
+                salon_obj.website_url = website_from_gmap_html(gmap_html)
                 if salon_obj.website_url:
                     print(f"-> 公式サイト: {salon_obj.website_url} を取得しました。", flush=True)
                     _, salon_obj.email = get_contact_info_from_website(salon_obj.website_url)
@@ -169,53 +213,49 @@ def enrich_salon_with_gmap_data(salon_obj, driver):
         print(f"Google Map情報取得中にエラーが発生: {e}", flush=True)
     return salon_obj
 
-def get_gmap_details(place_id, api_key):
+def get_gmap_details(place_id, api_key, priority=INTERACTIVE):
     """
     Google Places APIから総合評価、レビュー総数、最新のレビュー1件をまとめて取得する。
+    予算の上限に近い場合は呼び出さずにNoneを返す（ページ表示はDBに保存済みの評価を使う）。
     """
     if not place_id or not api_key:
         return None
     
-    # 取得するフィールドを明示的に指定
-    fields = "name,rating,user_ratings_total,reviews"
-    url = f"https://maps.googleapis.com/maps/api/place/details/json?place_id={place_id}&fields={fields}&language=ja&key={api_key}"
-    
     try:
-        response = requests.get(url)
-        response.raise_for_status() # HTTPエラーがあれば例外を発生させる
-        data = response.json()
-
-        if data.get("status") == "OK" and "result" in data:
-            result = data["result"]
-            
-            # 総合評価とレビュー総数を格納
-            summary_data = {
-                'rating': result.get('rating'),
-                'count': result.get('user_ratings_total')
-            }
-            
-            # 最新のレビュー1件を格納
-            latest_review = None
-            if "reviews" in result and result["reviews"]:
-                # APIは通常「最も関連性の高い」順で返すため、最初のレビューを取得
-                review = result["reviews"][0]
-                latest_review = {
-                    'author_name': review.get('author_name'),
-                    'rating': review.get('rating'),
-                    'text': review.get('text'),
-                }
-
-            # 辞書形式で両方のデータを返す
-            return {
-                'summary': summary_data,
-                'latest_review': latest_review
-            }
-        else:
-            print(f"Google Places API Error for place_id {place_id}: {data.get('status')}")
-            return None
-    except requests.exceptions.RequestException as e:
+        # 取得するフィールドを明示的に指定
+        result = get_places_client(api_key).details(place_id, REVIEW_FIELDS, priority=priority)
+    except BudgetDeferred as e:
+        print(f"Google Places API deferred for place_id {place_id}: {e}")
+        return None
+    except PlacesError as e:
         print(f"Error fetching Google Places data for place_id {place_id}: {e}")
         return None
+    if not result:
+        print(f"Google Places API Error for place_id {place_id}: NOT_FOUND")
+        return None
+
+    # 総合評価とレビュー総数を格納
+    summary_data = {
+        'rating': result.get('rating'),
+        'count': result.get('user_ratings_total')
+    }
+    
+    # 最新のレビュー1件を格納
+    latest_review = None
+    if result.get("reviews"):
+        # APIは通常「最も関連性の高い」順で返すため、最初のレビューを取得
+        review = result["reviews"][0]
+        latest_review = {
+            'author_name': review.get('author_name'),
+            'rating': review.get('rating'),
+            'text': review.get('text'),
+        }
+
+    # 辞書形式で両方のデータを返す
+    return {
+        'summary': summary_data,
+        'latest_review': latest_review
+    }
 
 
 # --- 認証用のデコレータ ---
@@ -487,8 +527,77 @@ def edit_salon(biz_id):
 @app.route('/admin/upload', methods=['GET', 'POST'])
 @auth_required
 def upload_salon_csv():
-    # ... (この機能は後で再実装)
-    return render_template('admin/upload_salon.html')
+    """CSVアップロード（バックグラウンドでストリーミングインポート）"""
+    from services.csv_importer import CSV_FORMATS, ImportProgress, run_import_job
+
+    progress_dir = os.path.join(app.instance_path, 'import_jobs')
+    if request.method == 'POST':
+        csv_file = request.files.get('csv_file')
+        if not csv_file or not csv_file.filename:
+            flash('CSVファイルを選択してください。', 'danger')
+            return redirect(url_for('upload_salon_csv'))
+
+        csv_format = request.form.get('csv_format') or None
+        if csv_format and csv_format not in CSV_FORMATS:
+            flash('無効なCSV形式です。', 'danger')
+            return redirect(url_for('upload_salon_csv'))
+
+        progress = ImportProgress(progress_dir)
+        upload_dir = os.path.join(app.instance_path, app.config['UPLOAD_FOLDER'])
+        os.makedirs(upload_dir, exist_ok=True)
+        csv_path = os.path.join(upload_dir, f"{progress.job_id}.csv")
+        csv_file.save(csv_path)
+        progress.update(force=True)
+
+        thread = threading.Thread(
+            target=run_import_job,
+            args=(app, csv_path, progress_dir, progress.job_id),
+            kwargs={
+                'csv_format': csv_format,
+                'prefecture_filter': request.form.get('prefecture_filter') or None,
+            }
+        )
+        thread.start()
+        flash(f'CSVインポート (ジョブID: {progress.job_id}) をバックグラウンドで開始しました。', 'info')
+        return redirect(url_for('upload_salon_csv', job_id=progress.job_id))
+
+    return render_template('admin/upload_salon.html', job_id=request.args.get('job_id'), csv_formats=CSV_FORMATS)
+
+
+@app.route('/admin/upload/progress/<job_id>')
+@auth_required
+def upload_progress(job_id):
+    """CSVインポートの進捗をJSONで返す"""
+    from services.csv_importer import ImportProgress
+
+    progress = ImportProgress.load(os.path.join(app.instance_path, 'import_jobs'), job_id)
+    if not progress:
+        return jsonify({'error': 'ジョブが見つかりません。'}), 404
+    return jsonify(progress)
+
+@app.route('/admin/coverage')
+@auth_required
+def coverage_dashboard():
+    """データ充足率ダッシュボード"""
+    from services.coverage_report import coverage_history, coverage_rate, get_coverage_report
+
+    report = get_coverage_report(refresh=bool(request.args.get('refresh')))
+    return render_template(
+        'admin/coverage.html',
+        report=report,
+        history=coverage_history(),
+        coverage_rate=coverage_rate
+    )
+
+
+@app.route('/admin/coverage.json')
+@auth_required
+def coverage_json():
+    """データ充足率をJSONで返す（?refresh=1 で再計算）"""
+    from services.coverage_report import coverage_history, get_coverage_report
+
+    report = get_coverage_report(refresh=bool(request.args.get('refresh')))
+    return jsonify(dict(report, history=coverage_history()))
 
 @app.route('/admin/ads', methods=['GET', 'POST'])
 @auth_required
@@ -654,7 +763,7 @@ def scraping_tasks():
 
     categories = Category.query.order_by(Category.name).all()
     prefectures = [p[0] for p in db.session.query(Area.prefecture).distinct().order_by(Area.prefecture).all()]
-    task_statuses = ['未実行', '実行中', '完了', '失敗']
+    task_statuses = ['未実行', '実行中', '完了', '失敗', SPLIT_STATUS]
 
     for task in tasks:
         task.category_name = next((c.name for c in categories if c.id == task.category_id), '不明')
@@ -693,7 +802,7 @@ def run_task(task_id, update_mode):
         flash(f'HPBタスク(ID:{task.id})の実行をバックグラウンドで開始しました。', 'info')
     
     elif task.task_type == 'GMAP':
-        command = f"nohup /var/www/salon_app/venv/bin/python /var/www/salon_app/run_gmap_scraper.py {task.id} >> {log_file} 2>&1 &"
+        command = f"nohup /var/www/salon_app/venv/bin/python /var/www/salon_app/run_gmap_scraper.py {task.id} --admin >> {log_file} 2>&1 &"
         os.system(command)
         flash(f'Google Mapタスク(ID:{task.id})の実行をバックグラウンドで開始しました。', 'info')
         
@@ -704,35 +813,51 @@ def run_task(task_id, update_mode):
     return redirect(url_for('scraping_tasks'))
 
 
-def scrape_gmap_and_save(task_id, keyword, category_name, update_mode):
+def scrape_gmap_and_save(task_id, keyword, category_name, update_mode, priority=BATCH):
     with app.app_context():
         task = db.session.get(ScrapingTask, task_id)
         if not task: return
         
+        previous_status, previous_run_at = task.status, task.last_run_at
         task.status = '実行中'
         task.last_run_at = datetime.now()
         db.session.commit()
         
-        driver = None # driverを再度使うので復活
+        fetcher = None # Google Mapのページ取得（CID・公式サイト）
         try:
             category_obj = Category.query.filter_by(name=category_name).first()
             if not category_obj:
                 task.status = '失敗'; db.session.commit(); return
 
             api_key = os.environ.get('GOOGLE_MAPS_API_KEY')
-            place_details_list = get_gmap_place_details(keyword, api_key, return_list=True)
+            try:
+                # next_page_token を辿って上限（60件）まで取得。上限まで返った場合は地域を細分化する
+                place_details_list, saturated = get_places_client(api_key).text_search_all(keyword, priority=priority)
+            except BudgetDeferred as e:
+                # 予算の上限に近いため見送り（失敗扱いにせず、次回の選択対象に残す）
+                print(f"タスクを見送ります（Places APIの予算）: {e}", flush=True)
+                task.status, task.last_run_at = previous_status, previous_run_at
+                db.session.commit(); return
 
             if not place_details_list:
                 task.status = '完了'; db.session.commit(); return
+            print(f"検索結果: {len(place_details_list)}件{'（上限）' if saturated else ''}", flush=True)
 
-            driver = get_stealth_driver() # driverを初期化
+            fetcher = create_fetcher(get_stealth_driver, 'gmap', wait=5)
             new_salon_count = 0
+            # 前回から検索結果が変わっていない既存サロンはDB書き込みを省略（上書きモードでは常に更新）
+            tracker = ChangeTracker('gmap')
             
             for place_details in place_details_list:
                 place_id = place_details.get('place_id')
                 if not place_id: continue
 
                 existing_salon = Biz.query.filter_by(place_id=place_id).first()
+                state_key, state_data = place_state(place_details)
+                unchanged, fingerprint = tracker.check(state_key, data=state_data, extra=category_name)
+                if existing_salon and unchanged and update_mode != 'overwrite':
+                    tracker.commit(state_key, fingerprint, changed=False)
+                    continue
                 
                 target_salon = None
 
@@ -748,7 +873,7 @@ def scrape_gmap_and_save(task_id, keyword, category_name, update_mode):
                     new_salon.categories.append(category_obj)
                     
                     # ▼▼▼▼▼ データ拡充機能を復活 ▼▼▼▼▼
-                    enrich_salon_with_gmap_data(new_salon, driver)
+                    enrich_salon_with_gmap_data(new_salon, fetcher, priority)
                     
                     db.session.commit() # IDを確定
                     target_salon = new_salon
@@ -762,7 +887,7 @@ def scrape_gmap_and_save(task_id, keyword, category_name, update_mode):
                         target_salon.name = place_details.get('name')
                         target_salon.address = place_details.get('formatted_address')
                         # ▼▼▼▼▼ データ拡充機能を復活 ▼▼▼▼▼
-                        enrich_salon_with_gmap_data(target_salon, driver)
+                        enrich_salon_with_gmap_data(target_salon, fetcher, priority)
 
                     if not any(cat.id == category_obj.id for cat in target_salon.categories):
                         target_salon.categories.append(category_obj)
@@ -781,8 +906,25 @@ def scrape_gmap_and_save(task_id, keyword, category_name, update_mode):
                     summary.count = count
                 
                 db.session.commit()
-
+                tracker.commit(state_key, fingerprint)
+
+            tracker.report()
+            # 検索結果全体の変更も記録（services.recrawl_scheduler がタスクの再実行間隔の推定に使う）
+            search_tracker = ChangeTracker('gmap_search')
+            search_key = gmap_search_key(keyword)
+            unchanged, fingerprint = search_tracker.check(
+                search_key, data=dict(place_state(p) for p in place_details_list), extra=category_name
+            )
+            search_tracker.commit(search_key, fingerprint, changed=not unchanged)
             task.status = '完了'
+            if saturated:
+                children, created = subdivide_task(task)
+                if children:
+                    # 子タスクが同じ範囲を網羅するため、このタスクは再クロールの対象から外す
+                    task.status = SPLIT_STATUS
+                    print(f"検索結果が上限に達したため{children}地域に分割しました（新規タスク {created}件）", flush=True)
+                else:
+                    print("検索結果が上限に達しましたが、これ以上細かい地域に分割できません", flush=True)
             db.session.commit()
 
         except Exception as e:
@@ -791,8 +933,8 @@ def scrape_gmap_and_save(task_id, keyword, category_name, update_mode):
             db.session.commit()
             db.session.rollback()
         finally:
-            if driver: # driverを使うので、終了処理も復活
-                driver.quit()
+            if fetcher:
+                fetcher.close()
 
 
 def _scrape_rejob_for_salon(app_context, biz_id, salon_name):
@@ -802,41 +944,20 @@ def _scrape_rejob_for_salon(app_context, biz_id, salon_name):
     """
     app_context.push()
     print(f"--- [求人取得開始] サロン: {salon_name} (ID: {biz_id}) ---", flush=True)
-    driver = None
+    fetcher = create_fetcher(get_stealth_driver, 'rejob', wait=5) # ページ読み込みとJS実行を待機
     try:
-        # 1. 検索URLを構築してアクセス
+        # 1. 検索URLを構築してアクセス（取得したHTMLはスナップショットとして保存）
         encoded_salon_name = urllib.parse.quote(salon_name)
         search_url = f"https://relax-job.com/search?keywords={encoded_salon_name}"
 
-        driver = get_stealth_driver()
-        driver.get(search_url)
-        time.sleep(5) # ページ読み込みとJS実行を待機
-
-        soup = BeautifulSoup(driver.page_source, 'lxml')
-
-        # 2. ページネーション要素を取得
-        pagination_element = soup.find('div', class_='c-pagenation')
-
-        job_link_tags = []
-        if pagination_element:
-            # ページネーションより前にある求人リンク（aタグ）を全て取得
-            # これにより、関連性の低い求人を除外する
-            job_link_tags = pagination_element.find_all_previous('a', href=re.compile(r'^/job/B\d+'))
-            job_link_tags.reverse() # 順番を元に戻す
-            print(f"-> ページネーションを発見。対象求人を{len(job_link_tags)}件に絞り込みました。")
+        # 2. 検索結果を解析（ページネーションより前の求人、なければ会社名が一致する求人カード）
+        result = parse_rejob_search(fetcher.get(search_url), salon_name)
+        if result.paginated:
+            print(f"-> ページネーションを発見。対象求人を{len(result.jobs)}件に絞り込みました。")
         else:
-            # ページネーションがない場合は、ページ全体の求人カードから探す
             print("-> ページネーションが見つからないため、ページ全体の求人カードから検索します。")
-            job_cards = soup.select('div.jobCassette')
-            for card in job_cards:
-                # 会社名でフィルタリング
-                company_tag = card.select_one('p.jobCassette__company')
-                if company_tag and salon_name in company_tag.get_text(strip=True):
-                    title_tag = card.select_one('h3.jobCassette__title a')
-                    if title_tag:
-                        job_link_tags.append(title_tag)
-
-        if not job_link_tags:
+
+        if not result.jobs:
             print("-> 処理対象の求人リンクが見つかりませんでした。")
             return
 
@@ -844,16 +965,13 @@ def _scrape_rejob_for_salon(app_context, biz_id, salon_name):
         Job.query.filter_by(biz_id=biz_id, source='リジョブ').delete()
 
         new_jobs = []
-        for link_tag in job_link_tags:
-            title = link_tag.get_text(strip=True)
-            source_url = "https://relax-job.com" + link_tag.get('href')
-
+        for job in result.jobs:
             # 詳細ページから給与などを取得するロジックは、一旦省略しリンク取得を優先
             new_job = Job(
                 biz_id=biz_id,
-                title=title,
+                title=job.title,
                 source='リジョブ',
-                source_url=source_url
+                source_url=job.url
             )
             new_jobs.append(new_job)
 
@@ -868,82 +986,10 @@ def _scrape_rejob_for_salon(app_context, biz_id, salon_name):
         print(f"エラーが発生しました: {e}", flush=True)
         db.session.rollback()
     finally:
-        if driver:
-            driver.quit()
+        fetcher.close()
         db.session.close()
 
 
-# app.py
-
-# ===============================================================
-# ▼▼▼ 以下の3つの関数を、app.pyに貼り付けてください ▼▼▼
-# (既存の同名関数は削除してください)
-# ===============================================================
-
-def _enrich_salon_with_hpb_details(salon_obj, driver):
-    """
-    【v2】HPB詳細ページから住所を取得するヘルパー関数
-    """
-    if not salon_obj.hotpepper_url:
-        return salon_obj
-    try:
-        # print(f"-> 詳細情報取得のためアクセス: {salon_obj.hotpepper_url}")
-        driver.get(salon_obj.hotpepper_url)
-        time.sleep(3)
-        soup = BeautifulSoup(driver.page_source, 'lxml')
-        info_table = soup.select_one('table.slnDataTbl')
-        if info_table:
-            rows = info_table.select('tr')
-            for row in rows:
-                th = row.select_one('th')
-                if th and '住所' in th.get_text():
-                    td = row.select_one('td')
-                    if td:
-                        address_text = ' '.join(td.get_text(strip=True).split())
-                        salon_obj.address = address_text
-                        print(f"-> 住所取得成功: {address_text}")
-                        break
-    except Exception as e:
-        print(f"[HPB詳細解析エラー] {e}", flush=True)
-    return salon_obj
-
-def _enrich_salon_with_hpb_reviews(salon_obj, driver):
-    """
-    【v2】HPB口コミページから評価を取得し、ReviewSummaryテーブルに保存するヘルパー関数
-    """
-    if not salon_obj or not salon_obj.hotpepper_url:
-        return salon_obj
-    review_url = salon_obj.hotpepper_url.split('?')[0] + "reviews/"
-    try:
-        # print(f"-> 口コミ評価取得のためアクセス: {review_url}")
-        driver.get(review_url)
-        time.sleep(3)
-        soup = BeautifulSoup(driver.page_source, 'lxml')
-        summary = ReviewSummary.query.filter_by(biz_id=salon_obj.id, source_name='Hot Pepper').first()
-        if not summary:
-            summary = ReviewSummary(biz_id=salon_obj.id, source_name='Hot Pepper')
-            db.session.add(summary)
-        rating_summary_p = soup.find('p', class_='reviewPoint', string=re.compile(r'総合'))
-        if rating_summary_p:
-            rating_span = rating_summary_p.find_next_sibling('p', class_='reviewPointNum')
-            if rating_span:
-                try:
-                    summary.rating = float(rating_span.get_text(strip=True))
-                    print(f"-> HPB総合評価取得成功: {summary.rating}")
-                except (ValueError, TypeError): pass
-        count_tag = soup.select_one('p.reviewRead a')
-        if count_tag:
-            match = re.search(r'（(\d+)件）', count_tag.get_text(strip=True))
-            if match:
-                try:
-                    summary.count = int(match.group(1))
-                    print(f"-> HPB口コミ件数取得成功: {summary.count}")
-                except (ValueError, TypeError): pass
-    except Exception as e:
-        print(f"[HPB口コミ解析エラー] {e}", flush=True)
-    return salon_obj
-
-
 # app.py の scrape_salon_list 関数を以下に置き換えてください
 
 def scrape_salon_list(start_url, category_name, update_mode):
@@ -951,6 +997,9 @@ def scrape_salon_list(start_url, category_name, update_mode):
     【v16-final】
     一件ずつDBにコミットすることで、セッションの不整合に起因する
     全てのIntegrityErrorとAttributeErrorを根本的に解決する最終安定版。
+    一覧ページは services.page_pipeline で次ページを先読みしながら取得する
+    （同じホストへのリクエスト間隔は HPB_MIN_REQUEST_INTERVAL 秒以上）。
+    前回の処理から内容が変わっていないページ（services.change_detection）はDB書き込みを省略する。
     """
     with app.app_context():
         # ▼▼▼【修正点1】import文を関数の先頭に移動 ▼▼▼
@@ -961,70 +1010,55 @@ def scrape_salon_list(start_url, category_name, update_mode):
             print(f"エラー: DBにカテゴリ「{category_name}」が見つかりません。", flush=True)
             return
             
-        driver = None
+        fetcher = create_fetcher(get_stealth_driver, 'hpb_list', wait=5)
+        tracker = ChangeTracker('hpb_list')
         try:
-            driver = get_stealth_driver()
-            current_url = start_url
             total_new, total_updated = 0, 0
-            page_count = 1
+            started = time.monotonic()
 
-            while current_url:
-                processed_urls_this_page = set()
+            # 次ページの取得は、このページのDB書き込みと並行して先読みする
+            pages = iter_pages(start_url, fetcher, parse_salon_list)
+            for page_count, (current_url, html, page) in enumerate(pages, 1):
                 print(f"\n--- {page_count}ページ目を処理中: {current_url} ---", flush=True)
-                driver.get(current_url)
-                time.sleep(5)
 
-                soup = BeautifulSoup(driver.page_source, 'lxml')
-                
-                salon_cards = soup.select('li.searchListCassette')
-                if not salon_cards:
-                    salon_cards = [body.find_parent('li') for body in soup.select('div.slnCassetteBody')]
-                if not salon_cards:
-                    salon_cards = soup.select('div.clinic')
-                
-                if not salon_cards:
+                if not page.cards:
                     print("-> 処理対象のサロン・クリニック情報が見つかりませんでした。")
+                    if page_count == 1:
+                        # 1ページ目から結果が空なのはブロック・エラーページの兆候
+                        get_host_controller().report_blocked(current_url)
                     break
 
-                # ▼▼▼【修正点2】ページ単位のリストを削除 ▼▼▼
-                # page_new_salons = []
-                # page_updated_salons = []
+                # カテゴリが変われば保存内容も変わるため、カテゴリ名も含めて比較
+                unchanged, fingerprint = tracker.check(current_url, html=html, extra=category_name)
+                if unchanged:
+                    print("-> 前回の処理から変更なし。DB書き込みを省略します。", flush=True)
+                    tracker.commit(current_url, fingerprint, changed=False)
+                    continue
+
+                for card in page.cards:
+                    full_url = card.url
+                    hpb_name = card.name
 
-                for card in salon_cards:
-                    name_tag = card.select_one('h3.slnName a, h3.slcHead a, p.clinic__name a')
-                    if not name_tag:
-                        continue
-                    
-                    raw_href = name_tag.get('href')
-                    if not raw_href: continue
-
-                    full_url = ""
-                    if raw_href.startswith('http'):
-                        full_url = raw_href.split('?')[0]
-                    elif raw_href.startswith('/'):
-                        full_url = "https://clinic.beauty.hotpepper.jp" + raw_href.split('?')[0]
-                    else:
-                        continue
-                    
-                    if full_url in processed_urls_this_page:
-                        continue
-                    processed_urls_this_page.add(full_url)
-                    
-                    hpb_name = name_tag.get_text(strip=True)
-                    
                     # DBから常に最新の状態を取得
                     existing_salon = Biz.query.filter_by(hotpepper_url=full_url).first()
                     
+                    # カードに表示されている住所・評価・口コミ件数（詳細ページの取得を省くため保存）
+                    harvested = card_details(card)
+
                     if not existing_salon:
                         # HPBのみのデータとして新規登録
                         new_salon = Biz(name_hpb=hpb_name, hotpepper_url=full_url)
                         db.session.add(new_salon)
                         new_salon.categories.append(category_obj)
                         print(f"-> 新規発見: {hpb_name}", flush=True)
-                        # ▼▼▼【修正点3】ここで即時コミット▼▼▼
-                        db.session.commit() 
+                        # ▼▼▼【修正点3】ここで即時コミット（カードの項目も同じトランザクションで保存）▼▼▼
+                        db.session.flush()
+                        save_details(new_salon, harvested, enrichment=ENRICHMENT_PARTIAL if harvested else None)
                         total_new += 1
                     else:
+                        if harvested and missing_fields(existing_salon, harvested):
+                            save_details(existing_salon, harvested,
+                                         enrichment=existing_salon.hpb_enrichment or ENRICHMENT_PARTIAL)
                         association_exists = db.session.query(biz_categories).filter(
                             biz_categories.c.biz_id == existing_salon.id,
                             biz_categories.c.category_id == category_obj.id
@@ -1036,116 +1070,46 @@ def scrape_salon_list(start_url, category_name, update_mode):
                             # ▼▼▼【修正点3】ここで即時コミット▼▼▼
                             db.session.commit()
                             total_updated += 1
-                
-                # ▼▼▼【修正点4】ページ単位のコミット処理を削除 ▼▼▼
-                # if page_new_salons or page_updated_salons:
-                #    db.session.commit()
-                #    total_new += len(page_new_salons)
-                #    total_updated += len(page_updated_salons)
-
-                next_page_tag = soup.select_one('a.iS.arrowR')
-                if next_page_tag and '次へ' in next_page_tag.text:
-                    current_url = next_page_tag['href']
-                else:
-                    current_url = None
-            
-            print(f"\n--- 完了 --- 新規登録:{total_new}件, カテゴリ追加:{total_updated}件", flush=True)
+
+                tracker.commit(current_url, fingerprint)
+
+            print(f"\n--- 完了 --- 新規登録:{total_new}件, カテゴリ追加:{total_updated}件"
+                  f"（所要時間 {time.monotonic() - started:.1f}秒）", flush=True)
+            tracker.report()
+            get_host_controller().print_report()
 
         except Exception as e:
             print(f"エラーが発生しました: {e}", flush=True)
             traceback.print_exc()
             db.session.rollback()
         finally:
-            if driver:
-                driver.quit()
+            fetcher.close()
 
 # ▼▼▼ 【ステップ1】HPB詳細情報取得ヘルパー関数を新規作成 ▼▼▼
 # ▼▼▼ この get_hpb_details 関数を、以下の新しい内容に丸ごと置き換えてください ▼▼▼
-def get_hpb_details(salon_url):
+def get_hpb_details(salon_url, fetcher=None, fields=None):
     """
     単一のHot Pepper BeautyのURLから、追加情報を取得する。
-    【真・最終解決版】全カテゴリで口コミ専用ページを参照するようにし、
-    クリニック系とその他（美容院・エステ等）でセレクタを正確に使い分ける。
+    トップページ・口コミページを1回ずつ開き、services.hpb_extractors に登録された抽出処理
+    （住所・評価・口コミ件数・クーポン・メニュー・スタッフ）を全て実行する。
+
+    Args:
+        salon_url: HPBのサロン・クリニックURL
+        fetcher: 使い回すページ取得（create_fetcher の戻り値、省略時はこの呼び出し用に作成して終了時に閉じる）
+        fields: 取得する項目名（省略時は全項目）
+
+    Returns:
+        dict: 項目名 → 値 / 失敗時はNone
     """
-    driver = None
+    own_fetcher = fetcher is None
+    if own_fetcher:
+        fetcher = create_fetcher(get_stealth_driver, 'hpb_details', wait=3)
     try:
-        driver = get_stealth_driver()
-        
-        # --- 1. 最初にトップページを開き、住所を取得 ---
-        driver.get(salon_url)
-        time.sleep(3) 
-        soup_main = BeautifulSoup(driver.page_source, 'lxml')
-        
-        address = None
-        address_th = soup_main.find('th', string=lambda t: t and '住所' in t)
-        if address_th and address_th.find_next_sibling('td'):
-            address = address_th.find_next_sibling('td').get_text(strip=True)
-
-        # --- 2. 評価と口コミ件数を取得 ---
-        rating = None
-        review_count = None
-
-        # URLによって処理を分岐
-        if "clinic.beauty.hotpepper.jp" in salon_url:
-            # --- 【クリニック】口コミ専用ページに移動して情報を取得 ---
-            reviews_url = salon_url.rstrip('/') + '/reviews/'
-            print(f"[診断] クリニック用URLを検出。口コミページへ移動します: {reviews_url}")
-            driver.get(reviews_url)
-            time.sleep(3)
-            soup_reviews = BeautifulSoup(driver.page_source, 'lxml')
-
-            # 総合評価を取得 (span.clinic-review-rating__total-score)
-            rating_tag = soup_reviews.select_one('span.clinic-review-rating__total-score')
-            if rating_tag:
-                try:
-                    rating = float(rating_tag.get_text(strip=True))
-                except (ValueError, TypeError):
-                    print(f"[診断] クリニック評価の数値変換に失敗")
-            
-            # 口コミ件数を取得 (span.c-search-result-heading__count)
-            review_count_tag = soup_reviews.select_one('span.c-search-result-heading__count')
-            if review_count_tag:
-                review_count_text = review_count_tag.get_text(strip=True)
-                count_match = re.search(r'(\d+)', review_count_text)
-                if count_match:
-                    try:
-                        review_count = int(count_match.group(1))
-                    except (ValueError, TypeError):
-                         print(f"[診断] クリニック口コミ件数の数値変換に失敗")
-
-        else:
-            # --- 【美容院・エステ等】口コミ専用ページに移動して情報を取得 ---
-            reviews_url = salon_url.rstrip('/') + '/review/'
-            print(f"[診断] 美容院・エステ用URLを検出。口コミページへ移動します: {reviews_url}")
-            driver.get(reviews_url)
-            time.sleep(3)
-            soup_reviews = BeautifulSoup(driver.page_source, 'lxml')
-
-            # 総合評価を取得 (dd.reviewRatingMeanScore)
-            rating_tag = soup_reviews.select_one('dd.reviewRatingMeanScore')
-            if rating_tag:
-                try:
-                    rating = float(rating_tag.get_text(strip=True))
-                except (ValueError, TypeError):
-                     print(f"[診断] 美容院・エステ評価の数値変換に失敗")
-
-            # 口コミ件数を取得 (span.numberOfResult)
-            review_count_tag = soup_reviews.select_one('span.numberOfResult')
-            if review_count_tag:
-                review_count_text = review_count_tag.get_text(strip=True)
-                count_match = re.search(r'(\d+)', review_count_text)
-                if count_match:
-                    try:
-                        review_count = int(count_match.group(1))
-                    except (ValueError, TypeError):
-                        print(f"[診断] 美容院・エステ口コミ件数の数値変換に失敗")
-
-        details = {
-            'address': address,
-            'rating': rating,
-            'review_count': review_count
-        }
-        print(f"HPB詳細取得試行: {salon_url} -> {details}")
+        details = extract_details(salon_url, fetcher, fields=fields)
+        summary = ', '.join(
+            f"{name}={len(value)}件" if isinstance(value, list) else f"{name}={value}" for name, value in details.items()
+        )
+        print(f"HPB詳細取得試行: {salon_url} -> {summary}")
         return details
 
     except Exception as e:
@@ -1153,8 +1117,8 @@ def get_hpb_details(salon_url):
         traceback.print_exc()
         return None
     finally:
-        if driver:
-            driver.quit()
+        if own_fetcher:
+            fetcher.close()
 
 # app.py の末尾あたりに追加
 
@@ -1187,7 +1151,7 @@ def test_hpb_details():
             details = get_hpb_details(salon.hotpepper_url)
             if details:
                 result_item['status'] = 'Success'
-                result_item['details'] = details
+                result_item['details'] = details_to_json(details)
             else:
                 result_item['status'] = 'Failed'
         else:
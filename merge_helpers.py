@@ -3,28 +3,29 @@ HPBとGmapのデータマージ用ヘルパー関数
 app.pyから読み込んで使用します
 """
 import re
+import time
+import unicodedata
+from collections import defaultdict
 from difflib import SequenceMatcher
 
+from sqlalchemy import update
+
+from models import Coupon, Menu, ReviewSummary, Staff
+from services.address_parser import parse_address
+from services.normalization import normalize_address, normalize_name, phone_digits, registrable_domain
+
+# 設定
+GMAP_INDEX_SYNC_INTERVAL = 600  # 共有の候補インデックスをDBと全件同期する間隔（秒）
+REFRESH_CHUNK_SIZE = 500  # refresh() で1回のクエリに渡すIDの数（SQLiteの変数の上限対策）
+
+
 def normalize_address_for_matching(address):
-    """住所を正規化してマッチング精度を向上"""
-    if not address:
-        return ""
-    address = address.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-    address = address.replace('－', '-').replace('ー', '-').replace(' ', '').replace('　', '')
-    address = re.sub(r'[−‐－―ー]', '-', address)
-    return address
+    """住所を正規化してマッチング精度を向上（services.normalization.normalize_address）"""
+    return normalize_address(address)
 
 def normalize_name_for_matching(name):
-    """クリニック名を正規化してマッチング精度を向上"""
-    if not name:
-        return ""
-    name = name.replace(' ', '').replace('　', '')
-    name = name.replace('ヴ', 'ブ').replace('ヰ', 'イ').replace('ヱ', 'エ')
-    name = name.translate(str.maketrans(
-        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ',
-        'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-    ))
-    return name.lower()
+    """クリニック名を正規化してマッチング精度を向上（services.normalization.normalize_name）"""
+    return normalize_name(name)
 
 def calculate_text_similarity(str1, str2):
     """2つの文字列の類似度を計算（0.0〜1.0）"""
@@ -32,6 +33,365 @@ def calculate_text_similarity(str1, str2):
         return 0.0
     return SequenceMatcher(None, str1, str2).ratio()
 
+# --- 候補ブロッキング用インデックス ---
+# 郵便番号・丁目（区+町名+丁目番号）・電話番号をキーに候補を絞り込み、
+# 類似度計算は同じブロックに入った少数の候補に対してのみ行う
+
+_ZIPCODE_PATTERN = re.compile(r'〒?\s*(\d{3})-?(\d{4})')
+
+
+def normalize_phone_digits(phone):
+    """電話番号を数字のみに正規化（services.normalization.phone_digits）"""
+    return phone_digits(phone)
+
+
+def extract_ward(address, address_key=None):
+    """
+    住所から市区町村（例: '渋谷区'）を取り出す（services.address_parser で構造化）
+
+    Args:
+        address: 住所
+        address_key: 正規化済み住所（Biz.address_key）。あれば再計算しない
+
+    Returns:
+        str: 市区町村名 / 判定できない場合は空文字
+    """
+    normalized = address_key or normalize_address(address)
+    return parse_address(normalized).city if normalized else ""
+
+
+def blocking_keys(address, phone=None, address_key=None, digits=None):
+    """
+    マッチング候補の絞り込みに使うブロッキングキーを生成
+
+    Args:
+        address: 住所（郵便番号付きでも可）
+        phone: 電話番号
+        address_key: 正規化済み住所（Biz.address_key）。あれば再計算しない
+        digits: 正規化済み電話番号（Biz.phone_digits）。あれば再計算しない
+
+    Returns:
+        set: 'zip:1500043', 'chome:渋谷区道玄坂2', 'town:渋谷区道玄坂', 'tel:0312345678' などのキー
+    """
+    keys = set()
+    if address:
+        zip_match = _ZIPCODE_PATTERN.search(unicodedata.normalize('NFKC', address))
+        if zip_match:
+            keys.add(f"zip:{zip_match.group(1)}{zip_match.group(2)}")
+
+    normalized = address_key or normalize_address(address)
+    parsed = parse_address(normalized) if normalized else None
+    if parsed and parsed.city and parsed.town:
+        # 丁目が判定できない場合は番地の先頭の数字を丁目相当として扱う
+        number = parsed.chome or parsed.block.split('-', 1)[0]
+        if number:
+            keys.add(f"chome:{parsed.city}{parsed.town}{number}")
+        else:
+            keys.add(f"town:{parsed.city}{parsed.town}")
+
+    digits = digits or phone_digits(phone)
+    if digits:
+        keys.add(f"tel:{digits}")
+    return keys
+
+
+class CandidateIndex:
+    """
+    マッチング候補のブロッキングインデックス（メモリ上）
+
+    ブロッキングキー -> Biz ID の転置インデックスを持ち、
+    lookup() は該当ブロックのIDを返すだけなので行数に依存せず高速。
+    """
+
+    def __init__(self):
+        self._blocks = defaultdict(set)
+        self._records = {}  # biz_id -> (正規化名, 正規化住所, キー集合)
+        self._sources = {}  # biz_id -> 登録時の (名前, 住所, 電話番号)（sync() で変更の有無を判定）
+        self.max_id = 0
+
+    def __len__(self):
+        return len(self._records)
+
+    def add(self, biz_id, name, address, phone=None, name_key=None, address_key=None, digits=None):
+        """
+        候補を追加（既に存在する場合は置き換え）
+
+        name_key / address_key / digits にBizの保存済みキーを渡すと正規化を省略する。
+        """
+        if biz_id in self._records:
+            self.remove(biz_id)
+        address_key = address_key or normalize_address(address)
+        keys = blocking_keys(address, phone, address_key=address_key, digits=digits)
+        self._records[biz_id] = (name_key or normalize_name(name), address_key, keys)
+        self._sources[biz_id] = (name, address, phone)
+        for key in keys:
+            self._blocks[key].add(biz_id)
+        self.max_id = max(self.max_id, biz_id)
+
+    def remove(self, biz_id):
+        """候補を削除（マージ済みなど）"""
+        record = self._records.pop(biz_id, None)
+        self._sources.pop(biz_id, None)
+        if not record:
+            return
+        for key in record[2]:
+            block = self._blocks.get(key)
+            if block:
+                block.discard(biz_id)
+                if not block:
+                    del self._blocks[key]
+
+    def lookup(self, address, phone=None):
+        """
+        同じブロックに属する候補IDを返す
+
+        Returns:
+            set: Biz IDの集合
+        """
+        candidate_ids = set()
+        for key in blocking_keys(address, phone):
+            candidate_ids |= self._blocks.get(key, set())
+        return candidate_ids
+
+    def score_candidates(self, name, address, phone=None, exclude_id=None):
+        """
+        ブロック内の候補ごとの類似度を計算
+
+        Yields:
+            tuple: (biz_id, 住所類似度, 名前類似度, 電話番号一致)
+        """
+        target_address = normalize_address_for_matching(address or '')
+        target_name = normalize_name_for_matching(name or '')
+        digits = normalize_phone_digits(phone)
+        phone_key = f"tel:{digits}" if digits else None
+
+        # 比較対象側(seq2)の前処理結果を使い回すため、SequenceMatcherは1つずつ生成
+        address_matcher = SequenceMatcher(None)
+        address_matcher.set_seq2(target_address)
+        name_matcher = SequenceMatcher(None)
+        name_matcher.set_seq2(target_name)
+
+        for biz_id in sorted(self.lookup(address, phone)):
+            if biz_id == exclude_id:
+                continue
+            candidate_name, candidate_address, keys = self._records[biz_id]
+            address_sim = 0.0
+            if target_address and candidate_address:
+                address_matcher.set_seq1(candidate_address)
+                address_sim = address_matcher.ratio()
+            name_sim = 0.0
+            if target_name and candidate_name:
+                name_matcher.set_seq1(candidate_name)
+                name_sim = name_matcher.ratio()
+            yield biz_id, address_sim, name_sim, phone_key is not None and phone_key in keys
+
+    def best_match(self, name, address, phone=None, threshold=0.75, exclude_id=None):
+        """
+        ブロック内の候補をスコアリングし、最も類似度の高い候補を返す
+
+        電話番号が一致した候補は名前・住所の表記揺れに関わらず優先する。
+
+        Returns:
+            tuple: (biz_id, score) / 見つからない場合は (None, 0.0)
+        """
+        best_id, best_score = None, 0.0
+        for biz_id, address_sim, name_sim, phone_match in self.score_candidates(name, address, phone, exclude_id):
+            score = 1.0 if phone_match else address_sim * 0.7 + name_sim * 0.3
+            if score >= threshold and score > best_score:
+                best_id, best_score = biz_id, score
+        return best_id, best_score
+
+    def load(self, query, Biz, name_attr='name'):
+        """
+        SQLAlchemyクエリの結果を追加（max_idより大きいIDのみ = 差分読み込み）
+
+        Args:
+            query: Bizを対象としたクエリ
+            Biz: Bizモデル
+            name_attr: 名前として使う属性（'name' or 'name_hpb'）
+
+        Returns:
+            int: 追加件数
+        """
+        name_column = getattr(Biz, name_attr)
+        rows = query.with_entities(
+            Biz.id, name_column, Biz.address, Biz.phone, Biz.name_key, Biz.address_key, Biz.phone_digits
+        ).filter(Biz.id > self.max_id).order_by(Biz.id).yield_per(5000)
+        added = 0
+        for biz_id, name, address, phone, name_key, address_key, digits in rows:
+            # name_keyは name → name_hpb の順で計算されているため、nameを使う場合のみ流用
+            self.add(biz_id, name, address, phone,
+                     name_key=name_key if name_attr == 'name' and name else None,
+                     address_key=address_key, digits=digits)
+            added += 1
+        return added
+
+
+    def _apply_rows(self, rows, name_attr):
+        """行を登録し直す（前回の登録から名前・住所・電話番号が変わった行のみ）。(見つかったID, 更新件数) を返す"""
+        seen = set()
+        updated = 0
+        for biz_id, name, address, phone, name_key, address_key, digits in rows:
+            seen.add(biz_id)
+            if self._sources.get(biz_id) == (name, address, phone):
+                continue
+            self.add(biz_id, name, address, phone,
+                     name_key=name_key if name_attr == 'name' and name else None,
+                     address_key=address_key, digits=digits)
+            updated += 1
+        return seen, updated
+
+    def sync(self, query, Biz, name_attr='name'):
+        """
+        SQLAlchemyクエリの結果と全件同期（load() の差分読み込みでは拾えない既存行の変更も反映）
+
+        - 新しい行を追加
+        - 名前・住所・電話番号が変わった行（住所がNULLから入った、上書きモードで書き換わった等）を登録し直す
+        - 条件から外れた行（HPBと紐付いた等）を削除
+
+        全行を読むため、呼び出しごとではなく一定間隔で使う（間は load() と refresh() で差分を反映）。
+
+        Args:
+            query: Bizを対象としたクエリ
+            Biz: Bizモデル
+            name_attr: 名前として使う属性（'name' or 'name_hpb'）
+
+        Returns:
+            tuple: (追加・更新件数, 削除件数)
+        """
+        name_column = getattr(Biz, name_attr)
+        rows = query.with_entities(
+            Biz.id, name_column, Biz.address, Biz.phone, Biz.name_key, Biz.address_key, Biz.phone_digits
+        ).yield_per(5000)
+        seen, updated = self._apply_rows(rows, name_attr)
+        stale = [biz_id for biz_id in self._records if biz_id not in seen]
+        for biz_id in stale:
+            self.remove(biz_id)
+        return updated, len(stale)
+
+    def refresh(self, query, Biz, biz_ids=(), digits=None, name_attr='name'):
+        """
+        指定した候補と、電話番号が一致する行だけをDBと同期（主キー・phone_digitsのインデックスで検索）
+
+        lookup() で得た候補を照合の直前に確認し、条件から外れた候補（HPBと紐付いた・住所が変わった等）を
+        登録し直す・削除する。別の行の住所が後から同じブロックに入った場合は次回の sync() で反映される。
+
+        Args:
+            query: Bizを対象としたクエリ（sync() と同じ条件）
+            Biz: Bizモデル
+            biz_ids: 確認する候補のID
+            digits: 正規化済み電話番号（一致する行を追加する）
+            name_attr: 名前として使う属性（'name' or 'name_hpb'）
+
+        Returns:
+            tuple: (追加・更新件数, 削除件数)
+        """
+        biz_ids = list(biz_ids)
+        target_ids = set(biz_ids)
+        if digits:
+            # 先にインデックスだけで対象のIDを求める（query の条件と OR で組み合わせると
+            # hotpepper_url 等のインデックスが選ばれて全件走査になることがあるため）
+            target_ids.update(biz_id for (biz_id,) in Biz.query.filter(Biz.phone_digits == digits).with_entities(Biz.id))
+        if not target_ids:
+            return 0, 0
+        name_column = getattr(Biz, name_attr)
+        target_ids = sorted(target_ids)
+        seen, updated = set(), 0
+        for start in range(0, len(target_ids), REFRESH_CHUNK_SIZE):
+            rows = query.filter(Biz.id.in_(target_ids[start:start + REFRESH_CHUNK_SIZE])).with_entities(
+                Biz.id, name_column, Biz.address, Biz.phone, Biz.name_key, Biz.address_key, Biz.phone_digits
+            )
+            chunk_seen, chunk_updated = self._apply_rows(rows, name_attr)
+            seen |= chunk_seen
+            updated += chunk_updated
+        stale = [biz_id for biz_id in biz_ids if biz_id not in seen]
+        for biz_id in stale:
+            self.remove(biz_id)
+        return updated, len(stale)
+
+
+def find_by_phone(Biz, phone):
+    """電話番号が一致するサロンを検索（Biz.phone_digitsのインデックスで等価検索）"""
+    digits = phone_digits(phone)
+    if not digits:
+        return []
+    return Biz.query.filter(Biz.phone_digits == digits).all()
+
+
+def find_by_website(Biz, url):
+    """同じドメインのWebサイトを持つサロンを検索（Biz.website_domainのインデックスで等価検索）"""
+    domain = registrable_domain(url)
+    if not domain:
+        return []
+    return Biz.query.filter(Biz.website_domain == domain).all()
+
+
+_gmap_candidate_index = None
+_gmap_candidate_synced_at = 0.0
+
+
+def _gmap_candidate_query(Biz):
+    return Biz.query.filter(
+        Biz.hotpepper_url.is_(None),
+        Biz.place_id.isnot(None),  # Gmapデータがある
+        Biz.address.isnot(None)
+    )
+
+
+def get_gmap_candidate_index(Biz, address=None, phone=None):
+    """
+    HPB未紐付けのGmapサロンの候補インデックスを返す（プロセス内で共有）
+
+    - GMAP_INDEX_SYNC_INTERVAL 秒ごとにDBと全件同期（別プロセスで住所が入った・書き換わったサロンを反映）
+    - その間は新しい行の差分読み込みと、address / phone のブロックの候補・電話番号が一致する行の確認のみ
+      （主キー・インデックスでの検索のため、行数が増えても1回の照合は軽い）
+
+    Args:
+        Biz: Bizモデル
+        address: 照合するサロンの住所（指定時はそのブロックの候補をDBと同期）
+        phone: 照合するサロンの電話番号
+    """
+    global _gmap_candidate_index, _gmap_candidate_synced_at
+    if _gmap_candidate_index is None:
+        _gmap_candidate_index = CandidateIndex()
+    index = _gmap_candidate_index
+    query = _gmap_candidate_query(Biz)
+    now = time.monotonic()
+    if not _gmap_candidate_synced_at or now - _gmap_candidate_synced_at >= GMAP_INDEX_SYNC_INTERVAL:
+        index.sync(query, Biz)
+        _gmap_candidate_synced_at = now
+    else:
+        index.load(query, Biz)
+        if address or phone:
+            index.refresh(query, Biz, index.lookup(address, phone), phone_digits(phone))
+    return index
+
+
+def move_hpb_enrichment(db, hpb_salon, gmap_salon):
+    """
+    HPBのみのサロンの詳細情報（クーポン・メニュー・スタッフ・口コミの集計）をマージ先のGmapサロンに移す
+
+    HPBのみのレコードを削除する前に呼ぶ（削除すると口コミの集計はカスケード削除され、
+    クーポン・メニュー・スタッフは紐付け先のない行として残るため）。コミットは呼び出し側。
+    口コミの集計はマージ先に同じ取得元の行がない場合のみ移す（biz_id と source_name の一意制約）。
+    """
+    for model in (Coupon, Menu, Staff):
+        db.session.execute(
+            update(model).where(model.biz_id == hpb_salon.id).values(biz_id=gmap_salon.id)
+            .execution_options(synchronize_session=False)
+        )
+    existing_sources = db.session.query(ReviewSummary.source_name).filter(ReviewSummary.biz_id == gmap_salon.id)
+    db.session.execute(
+        update(ReviewSummary).where(
+            ReviewSummary.biz_id == hpb_salon.id, ReviewSummary.source_name.notin_(existing_sources)
+        ).values(biz_id=gmap_salon.id).execution_options(synchronize_session=False)
+    )
+    # 読み込み済みの review_summaries を削除時のカスケードの対象にしない
+    db.session.expire(hpb_salon, ['review_summaries'])
+    if hpb_salon.hpb_enrichment and not gmap_salon.hpb_enrichment:
+        gmap_salon.hpb_enrichment = hpb_salon.hpb_enrichment
+
+
 def try_merge_hpb_with_gmap(hpb_salon, db, Biz):
     """
     HPBで新規登録したサロンに対して、
@@ -48,42 +408,30 @@ def try_merge_hpb_with_gmap(hpb_salon, db, Biz):
     if not hpb_salon.address:
         return False  # 住所がないとマッチングできない
     
-    # 正規化
-    hpb_address = normalize_address_for_matching(hpb_salon.address)
-    hpb_name = normalize_name_for_matching(hpb_salon.name_hpb or '')
-    
-    # Gmapから取得済みでHPBがまだ紐付いていないサロンを検索
-    candidates = Biz.query.filter(
-        Biz.hotpepper_url.is_(None),
-        Biz.place_id.isnot(None),  # Gmapデータがある
-        Biz.address.isnot(None)
-    ).limit(100).all()  # パフォーマンス考慮で上限設定
-    
-    best_match = None
-    best_score = 0.0
-    threshold = 0.75  # 類似度閾値
-    
-    for candidate in candidates:
-        candidate_address = normalize_address_for_matching(candidate.address or '')
-        candidate_name = normalize_name_for_matching(candidate.name or '')
-        
-        # 住所と名前の類似度を計算
-        address_sim = calculate_text_similarity(hpb_address, candidate_address)
-        name_sim = calculate_text_similarity(hpb_name, candidate_name)
-        
-        # 総合スコア（住所70%、名前30%）
-        total_score = address_sim * 0.7 + name_sim * 0.3
-        
-        if total_score > best_score and total_score >= threshold:
-            best_score = total_score
-            best_match = candidate
+    # ブロッキングインデックスで候補を絞り込み、ブロック内の候補だけをスコアリング
+    index = get_gmap_candidate_index(Biz, hpb_salon.address, hpb_salon.phone)
+    best_id, best_score = index.best_match(
+        hpb_salon.name_hpb, hpb_salon.address, hpb_salon.phone,
+        threshold=0.75,  # 類似度閾値
+        exclude_id=hpb_salon.id
+    )
+    best_match = db.session.get(Biz, best_id) if best_id else None
+    if best_match and best_match.hotpepper_url:
+        # 他プロセスで既にマージ済み
+        index.remove(best_id)
+        best_match = None
     
     # マッチしたらマージ
     if best_match:
-        best_match.hotpepper_url = hpb_salon.hotpepper_url
-        best_match.name_hpb = hpb_salon.name_hpb
-        db.session.delete(hpb_salon)  # HPBのみのレコードを削除
+        hotpepper_url, name_hpb = hpb_salon.hotpepper_url, hpb_salon.name_hpb
+        # 詳細情報を移してからHPBのみのレコードを削除（hotpepper_urlの一意制約に抵触しないよう、先に削除を反映）
+        move_hpb_enrichment(db, hpb_salon, best_match)
+        db.session.delete(hpb_salon)
+        db.session.flush()
+        best_match.hotpepper_url = hotpepper_url
+        best_match.name_hpb = name_hpb
         db.session.commit()
+        index.remove(best_id)
         print(f"  ✓ Gmapデータとマージ: {best_match.name} (類似度: {best_score:.2f})", flush=True)
         return True
     
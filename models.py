@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from sqlalchemy import event
+from services.normalization import matching_keys
 
 db = SQLAlchemy()
 
@@ -20,9 +22,28 @@ class Biz(db.Model):
     email = db.Column(db.String(255), nullable=True)
     phone = db.Column(db.String(255), nullable=True)
     hotpepper_url = db.Column(db.String(255), nullable=True, unique=True)
+    # HPB詳細情報の取得状況（None: 未取得 / partial: 一覧のカードの項目のみ / full: 詳細ページ取得済み）
+    hpb_enrichment = db.Column(db.String(20), nullable=True, index=True)
+    # マッチング用の正規化キー（services.normalizationで計算し、書き込み時に自動更新）
+    name_key = db.Column(db.String(255), nullable=True, index=True)
+    address_key = db.Column(db.String(255), nullable=True, index=True)
+    phone_digits = db.Column(db.String(20), nullable=True, index=True)
+    website_domain = db.Column(db.String(255), nullable=True, index=True)
     categories = db.relationship('Category', secondary=biz_categories, lazy='subquery', backref=db.backref('bizs', lazy=True))
     review_summaries = db.relationship('ReviewSummary', backref='biz', lazy=True, cascade="all, delete-orphan")
 
+    def refresh_matching_keys(self):
+        """正規化キーを現在の値から再計算"""
+        for column, value in matching_keys(
+            self.name, self.name_hpb, self.address, self.phone, self.website_url
+        ).items():
+            setattr(self, column, value)
+
+@event.listens_for(Biz, 'before_insert')
+@event.listens_for(Biz, 'before_update')
+def _biz_refresh_matching_keys(mapper, connection, target):
+    target.refresh_matching_keys()
+
 class ReviewSummary(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     biz_id = db.Column(db.Integer, db.ForeignKey('biz.id'), nullable=False)
@@ -47,6 +68,40 @@ class Coupon(db.Model):
     title = db.Column(db.String(255), nullable=False)
     biz_id = db.Column(db.Integer, db.ForeignKey('biz.id'), nullable=False)
 
+class Menu(db.Model):
+    """HPBのメニュー・料金（services/hpb_extractors.pyで取得）"""
+    id = db.Column(db.Integer, primary_key=True)
+    biz_id = db.Column(db.Integer, db.ForeignKey('biz.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)  # メニュー名
+    price = db.Column(db.Integer, nullable=True)  # 料金（円）
+    category = db.Column(db.String(100), nullable=True)  # カテゴリ（施術種類）
+
+class Staff(db.Model):
+    """HPBのスタッフ情報（services/hpb_extractors.pyで取得）"""
+    id = db.Column(db.Integer, primary_key=True)
+    biz_id = db.Column(db.Integer, db.ForeignKey('biz.id'), nullable=False, index=True)
+    name = db.Column(db.String(255), nullable=False)
+    position = db.Column(db.String(100), nullable=True)  # 役職
+
+class MatchCandidate(db.Model):
+    """一括名寄せで検出した候補ペア（scripts/merge_gmap_hpb.pyで取り込み）"""
+    id = db.Column(db.Integer, primary_key=True)
+    mode = db.Column(db.String(20), nullable=False, index=True)  # hpb_gmap / dedupe_gmap / dedupe_hpb
+    left_id = db.Column(db.Integer, nullable=False, index=True)  # hpb_gmapではHPB側のBiz ID
+    right_id = db.Column(db.Integer, nullable=False, index=True)  # hpb_gmapではGmap側のBiz ID
+    score = db.Column(db.Float, nullable=False)  # 総合スコア（住所70%、名前30%）
+    address_score = db.Column(db.Float, nullable=True)
+    name_score = db.Column(db.Float, nullable=True)
+    status = db.Column(db.String(20), nullable=False, default='pending', index=True)  # pending / merged / rejected
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class CoverageSnapshot(db.Model):
+    """データ充足率レポートのスナップショット（services/coverage_report.pyで作成）"""
+    id = db.Column(db.Integer, primary_key=True)
+    total = db.Column(db.Integer, nullable=False)  # 集計時点の総件数
+    report = db.Column(db.JSON, nullable=False)  # 項目別・区別・カテゴリ別の集計結果
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
 class Category(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False, unique=True)
@@ -1,24 +1,28 @@
 import sys
 import os
-from datetime import datetime, timedelta
 
 sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 from app import app, db, scrape_gmap_and_save
 from models import ScrapingTask, Category
+from services.places_governor import ADMIN, BATCH
+from services.recrawl_scheduler import next_task
 
-def process_gmap_task(task_id=None):
+def process_gmap_task(task_id=None, priority=BATCH):
+    """
+    Google Map検索タスクを1件実行
+
+    Args:
+        task_id: タスクID（省略時は recrawl_scheduler.next_task で選択）
+        priority: Places APIの優先度（管理画面から手動で実行したタスクのみ ADMIN）
+    """
     with app.app_context():
         task = None
         if task_id:
             task = db.session.get(ScrapingTask, task_id)
         else:
-            five_days_ago = datetime.utcnow() - timedelta(days=5)
-            task = ScrapingTask.query.filter(
-                ScrapingTask.task_type == 'GMAP',
-                ScrapingTask.status.in_(['未実行', '失敗']),
-                (ScrapingTask.last_run_at == None) | (ScrapingTask.last_run_at < five_days_ago)
-            ).order_by(ScrapingTask.id.asc()).first()
+            # 鮮度・変更頻度・失敗履歴・価値で優先度付けしたタスク（services.recrawl_scheduler）
+            task = next_task('GMAP')
 
         if not task:
             return
@@ -29,12 +33,16 @@ def process_gmap_task(task_id=None):
             db.session.commit()
             return
 
-        scrape_gmap_and_save(task.id, task.search_keyword, category.name, 'skip')
+        scrape_gmap_and_save(task.id, task.search_keyword, category.name, 'skip', priority=priority)
 
 if __name__ == '__main__':
-    if len(sys.argv) > 1:
-        task_id_to_run = int(sys.argv[1])
-        process_gmap_task(task_id_to_run)
-    else:
-        process_gmap_task()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Google Map検索タスクの実行')
+    parser.add_argument('task_id', type=int, nargs='?', help='タスクID（省略時は優先度の最も高いタスク）')
+    parser.add_argument('--admin', action='store_true',
+                        help='管理画面からの手動実行（Places APIの予算のソフト上限を超えても実行する）')
+    args = parser.parse_args()
+
+    process_gmap_task(args.task_id, priority=ADMIN if args.admin else BATCH)
 
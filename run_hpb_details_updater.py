@@ -1,36 +1,47 @@
 import time
-from sqlalchemy import or_, and_
+from concurrent.futures import ThreadPoolExecutor
 
-# app.pyから必要なものをインポート
-from app import app, db, get_hpb_details
-from models import Biz, ReviewSummary
+from sqlalchemy import or_
 
-def update_hpb_details_batch():
+# app.pyから必要なものをインポート
+from app import app, db, get_hpb_details, get_stealth_driver
+from models import Biz
+from services.change_detection import ChangeTracker
+from services.host_controller import get_host_controller
+from services.hpb_extractors import (
+    ENRICHMENT_FULL, details_to_json, missing_fields, pages_for, registered_fields, save_details
+)
+from services.page_fetcher import create_fetcher
+from services.snapshot_store import is_replay, set_replay
+
+def update_hpb_details_batch(fields=None, biz_ids=None):
     """
-    HPBのURLが登録済みで、まだ詳細情報（評価・口コミ数）が
-    未取得のサロンを対象に、情報を取得してDBを更新するバッチ処理。
+    HPBのURLが登録済みで、まだ詳細ページを取得していない（hpb_enrichment が full でない）
+    サロンを対象に、情報を取得してDBを更新するバッチ処理。
+    1サロンにつきトップページ・口コミページを最大1回ずつ開き、住所・評価・口コミ数・クーポン・メニュー・スタッフを
+    まとめて取得・保存する（ブラウザは全サロンで使い回す）。
+    Playwright（BROWSER_BACKEND_HPB_DETAILS=playwright）では複数のサロンのページを同時に取得し、
+    DBへの保存は取得順に1件ずつ行う。
+    一覧ページのカードから取得済みの項目は取得せず、残りの項目が口コミページだけならトップページは開かない。
+    取得結果の変更は services.change_detection に記録する（services.recrawl_scheduler が再取得の間隔の推定に使う）。
+
+    Args:
+        fields: 取得する項目名（Noneなら登録済みの全項目。全項目を取得したサロンは full になる）
+        biz_ids: 指定時はこのBizのみを対象に、取得済みの項目も含めて再取得する（再クロール計画の実行用）
     """
     with app.app_context():
         print("--- HPB詳細情報の更新バッチを開始します ---")
 
         # --- 更新対象のサロンを取得 ---
         # 1. hotpepper_urlが存在する
-        # 2. Hot PepperのReviewSummaryが存在しない、OR 存在するがratingがNULL (前回失敗した)
-        
-        # SQLAlchemyのouterjoinを使って、ReviewSummaryが存在しないサロンも対象に含める
-        target_salons = db.session.query(Biz).outerjoin(
-            ReviewSummary, 
-            and_(
-                Biz.id == ReviewSummary.biz_id,
-                ReviewSummary.source_name == 'Hot Pepper'
-            )
-        ).filter(
-            Biz.hotpepper_url.isnot(None),
-            or_(
-                ReviewSummary.id.is_(None),
-                ReviewSummary.rating.is_(None)
-            )
-        ).all()
+        # 2. 詳細ページを未取得（一覧のカードの項目のみ、または未取得）
+        if biz_ids is not None:
+            target_salons = Biz.query.filter(Biz.id.in_(biz_ids), Biz.hotpepper_url.isnot(None)).all()
+        else:
+            target_salons = Biz.query.filter(
+                Biz.hotpepper_url.isnot(None),
+                or_(Biz.hpb_enrichment.is_(None), Biz.hpb_enrichment != ENRICHMENT_FULL)
+            ).all()
 
         total_targets = len(target_salons)
         print(f"-> 更新対象のサロンが {total_targets} 件見つかりました。")
@@ -39,56 +50,83 @@ def update_hpb_details_batch():
             print("--- 全てのサロンの情報が取得済みです。バッチを終了します ---")
             return
 
-        # --- 1件ずつ処理を実行 ---
-        for i, salon in enumerate(target_salons):
-            print(f"\n({i+1}/{total_targets}) {salon.name_hpb or salon.name} の情報を処理中...")
-            print(f"  URL: {salon.hotpepper_url}")
-
-            if not salon.hotpepper_url:
-                print("  -> URLがありません。スキップします。")
-                continue
-
-            # app.pyで完成させたヘルパー関数を実行
-            details = get_hpb_details(salon.hotpepper_url)
-
-            if details:
-                # --- 取得成功：データベースを更新 ---
-                try:
-                    # 住所が空の場合のみ、取得した住所で更新
-                    if not salon.address and details.get('address'):
-                        salon.address = details.get('address')
-                        print(f"  -> 住所を更新しました: {salon.address}")
-
-                    # 評価と口コミ件数をReviewSummaryテーブルに保存/更新
-                    if details.get('rating') is not None or details.get('review_count') is not None:
-                        hpb_summary = ReviewSummary.query.filter_by(
-                            biz_id=salon.id, 
-                            source_name='Hot Pepper'
-                        ).first()
-
-                        if not hpb_summary:
-                            hpb_summary = ReviewSummary(biz_id=salon.id, source_name='Hot Pepper')
-                            db.session.add(hpb_summary)
-                            print("  -> 新しいReviewSummaryレコードを作成しました。")
-                        
-                        hpb_summary.rating = details.get('rating')
-                        hpb_summary.count = details.get('review_count')
-                        print(f"  -> 評価: {hpb_summary.rating}, 口コミ数: {hpb_summary.count} で更新します。")
-
-                    db.session.commit()
-                    print("  -> [成功] データベースの更新が完了しました。")
-
-                except Exception as e:
-                    db.session.rollback()
-                    print(f"  -> [エラー] DB更新中にエラーが発生: {e}")
-            else:
-                # --- 取得失敗 ---
-                print("  -> [失敗] 詳細情報の取得に失敗しました。")
-
-            # サーバーに負荷をかけすぎないよう、1秒待機
-            time.sleep(1)
-
-        print("\n--- 全ての処理が完了しました。バッチを終了します ---")
+        # 全項目を取得した場合のみ full にする（--fields で一部の項目だけ取得した場合は状態を変えない）
+        enrichment = ENRICHMENT_FULL if fields is None else None
+        page_loads, skipped_pages = 0, 0
+        tracker = ChangeTracker('hpb_details')
+
+        # --- 取得する項目を決める（取得済みの項目（一覧のカード由来など）を除き、残りの項目のページだけを開く） ---
+        work = []
+        for salon in target_salons:
+            missing = missing_fields(salon, fields) if biz_ids is None else (fields or registered_fields())
+            pages = pages_for(missing) if missing else []
+            page_loads += len(pages)
+            skipped_pages += len(pages_for(fields)) - len(pages)
+            if missing:
+                work.append((salon, missing, pages))
+        if len(work) < total_targets:
+            print(f"-> 対象の項目を取得済みのサロン {total_targets - len(work)} 件はスキップします。")
+
+        fetcher = create_fetcher(get_stealth_driver, 'hpb_details', wait=3)
+
+        def fetch_details(item):
+            salon_url, missing = item
+            details = get_hpb_details(salon_url, fetcher=fetcher, fields=missing)
+            # 1ページずつ取得する場合は、サーバーに負荷をかけすぎないよう1秒待機（リプレイ時は不要）
+            if fetcher.concurrency == 1 and not is_replay():
+                time.sleep(1)
+            return details
+
+        # --- 取得は並行して行い、保存は1件ずつ実行 ---
+        executor = ThreadPoolExecutor(max_workers=fetcher.concurrency, thread_name_prefix='hpb-details')
+        try:
+            results = executor.map(fetch_details, [(salon.hotpepper_url, missing) for salon, missing, _ in work])
+            for i, ((salon, missing, pages), details) in enumerate(zip(work, results)):
+                print(f"\n({i+1}/{len(work)}) {salon.name_hpb or salon.name} の情報を処理中...")
+                print(f"  URL: {salon.hotpepper_url}")
+                print(f"  -> 取得する項目: {', '.join(missing)}（ページ: {', '.join(pages)}）")
+
+                if details:
+                    # 全項目を取得した場合は前回の取得結果と比較し、変更がなければ保存を省略
+                    unchanged, fingerprint = False, None
+                    if fields is None:
+                        unchanged, fingerprint = tracker.check(salon.hotpepper_url, data=details_to_json(details))
+                    # --- 取得成功：全項目を1トランザクションで保存 ---
+                    try:
+                        if unchanged:
+                            print("  -> 前回の取得から変更なし。DB書き込みを省略します。")
+                        else:
+                            updated = save_details(salon, details, enrichment=enrichment)
+                            print(f"  -> [成功] データベースの更新が完了しました: {', '.join(updated) or '更新なし'}")
+                        if fingerprint:
+                            tracker.commit(salon.hotpepper_url, fingerprint, changed=not unchanged)
+                    except Exception as e:
+                        print(f"  -> [エラー] DB更新中にエラーが発生: {e}")
+                else:
+                    # --- 取得失敗 ---
+                    print("  -> [失敗] 詳細情報の取得に失敗しました。")
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+            fetcher.close()
+
+        print(f"\n-> 詳細ページの取得: {page_loads}回（取得済みの項目により省略: {skipped_pages}回）")
+        tracker.report()
+        get_host_controller().print_report()
+        print("--- 全ての処理が完了しました。バッチを終了します ---")
 
 if __name__ == '__main__':
-    update_hpb_details_batch()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HPB詳細情報（住所・評価・口コミ数・クーポン・メニュー・スタッフ）の更新バッチ')
+    parser.add_argument('--from-cache', action='store_true', help='保存済みのスナップショットのみを使う（ネットワークに接続しない）')
+    parser.add_argument('--fields', help=f"取得する項目（カンマ区切り、省略時は全項目: {','.join(registered_fields())}）")
+    args = parser.parse_args()
+
+    fields = [name.strip() for name in args.fields.split(',')] if args.fields else None
+    unknown = set(fields or []) - set(registered_fields())
+    if unknown:
+        parser.error(f"不明な項目: {', '.join(sorted(unknown))}")
+
+    if args.from_cache:
+        set_replay(True)
+    update_hpb_details_batch(fields=fields)
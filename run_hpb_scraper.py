@@ -6,6 +6,8 @@ sys.path.append(os.path.abspath(os.path.dirname(__file__)))
 
 from app import app, db, scrape_salon_list
 from models import ScrapingTask, Category
+from services.recrawl_scheduler import next_task
+from services.snapshot_store import set_replay
 
 def process_hpb_task(task_id=None):
     with app.app_context():
@@ -14,11 +16,9 @@ def process_hpb_task(task_id=None):
             # タスクIDが指定された場合、そのタスクを直接取得
             task = db.session.get(ScrapingTask, task_id)
         else:
-            # ID指定なし（cron用）の場合、未実行の最も古いタスクを取得
-            task = ScrapingTask.query.filter(
-                ScrapingTask.task_type == 'HPB',
-                ScrapingTask.status.in_(['未実行', '失敗'])
-            ).order_by(ScrapingTask.id.asc()).first()
+            # ID指定なし（cron用）の場合、鮮度・変更頻度・失敗履歴で優先度付けしたタスクを取得
+            # （未実行のタスクに加え、一覧の変更が多いタスクほど早く再実行される。services.recrawl_scheduler）
+            task = next_task('HPB')
 
         if not task:
             # print("実行対象のHPBタスクが見つかりませんでした。") # cronで動かす際は不要なログ
@@ -46,9 +46,13 @@ def process_hpb_task(task_id=None):
         print(f"[{datetime.now()}] HPBタスクID: {task.id} の処理が完了。ステータス: {task.status}")
 
 if __name__ == '__main__':
-    # コマンドラインからIDが渡されたかチェック
-    if len(sys.argv) > 1:
-        task_id_to_run = int(sys.argv[1])
-        process_hpb_task(task_id_to_run)
-    else:
-        process_hpb_task()
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HPBの一覧ページからサロンを登録')
+    parser.add_argument('task_id', nargs='?', type=int, help='実行するタスクID（省略時はスケジューラーが選んだタスク）')
+    parser.add_argument('--from-cache', action='store_true', help='保存済みのスナップショットのみを使う（ネットワークに接続しない）')
+    args = parser.parse_args()
+
+    if args.from_cache:
+        set_replay(True)
+    process_hpb_task(args.task_id)
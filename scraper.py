@@ -2,13 +2,16 @@ import sys
 import time
 import re
 import urllib.parse
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service as ChromeService
 from webdriver_manager.chrome import ChromeDriverManager
 
 from app import app, db
 from models import Biz, Job
+from services.address_parser import parse_address
+from services.host_controller import get_host_controller
+from services.normalization import remove_zipcode
 
 
 def scrape_and_save_jobs(biz_id, url):
@@ -26,10 +29,14 @@ def scrape_and_save_jobs(biz_id, url):
         options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/128.0.0.0 Safari/537.36')
         driver = webdriver.Chrome(service=ChromeService(ChromeDriverManager().install()), options=options)
 
-        driver.get(url)
-        time.sleep(3)
-        html = driver.page_source
-        soup = BeautifulSoup(html, 'lxml')
+        # ホストごとの同時実行数・サーキットブレーカー（services.host_controller）
+        with get_host_controller().request(url) as slot:
+            driver.get(url)
+            time.sleep(3)
+            html = slot.check(driver.page_source)
+        # 検索結果の箱（div.p-search-cassettes-outer）の中だけをパース
+        # （パース時のclass判定は属性値全体との比較になるため、複数クラスに対応できるよう正規表現で指定）
+        soup = BeautifulSoup(html, 'lxml', parse_only=SoupStrainer('div', class_=re.compile(r'(^|\s)p-search-cassettes-outer(\s|$)')))
 
         # --- ▼▼▼ 新しいHTML解析ロジック ▼▼▼ ---
         # 1. まず、本来の検索結果を囲んでいる大きな箱を見つける
@@ -101,17 +108,8 @@ def run_scraper(start_id=None, end_id=None):
         print(f"合計 {len(salons)}件のサロンを処理します。")
 
         for salon in salons:
-            address = salon.address
-            if ' ' in address:
-                address_without_postal = address.split(' ', 1)[1]
-            else:
-                address_without_postal = address
-
-            match = re.search(r'.*?[都道府県].*?[市区町村]', address_without_postal)
-            if match:
-                area = match.group(0)
-            else:
-                area = address_without_postal
+            parsed = parse_address(salon.address)
+            area = parsed.ward_key or remove_zipcode(salon.address) or ''
 
             search_query = f"{salon.name} {area}"
             encoded_query = urllib.parse.quote(search_query)
@@ -10,6 +10,7 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_cid_from_place_id, get_stealth_driver, get_website_from_gmap
+from services.host_controller import get_host_controller
 
 def add_website_urls(limit=None):
     """
@@ -44,8 +45,11 @@ def add_website_urls(limit=None):
                     
                     # Place IDからGoogleマップを開く（CID取得と同じ処理）
                     gmap_url = f"https://www.google.com/maps/place/?q=place_id:{salon.place_id}"
-                    driver.get(gmap_url)
-                    time.sleep(3)
+                    # ホストごとの同時実行数・サーキットブレーカー（遮断中はクールダウンが終わるまで待つ）
+                    with get_host_controller().request(gmap_url) as slot:
+                        driver.get(gmap_url)
+                        time.sleep(3)
+                        slot.check(driver.page_source)
                     
                     # 公式サイトURLを取得
                     website = get_website_from_gmap(driver)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Bizの公式サイトを企業分析（Gemini）にかける
+- Biz.website_domain（登録可能ドメイン）でグループ化し、ドメインごとに代表URLを1回だけ分析
+- 分析結果は CompanyAnalysis.company_domain に保存され、同じドメインの全Biz（チェーン・分院）で共有される
+- 有効期限内の分析があるドメインはスキップ
+"""
+import sys
+import os
+import time
+from datetime import datetime
+
+sys.path.append('/var/www/salon_app')
+os.chdir('/var/www/salon_app')
+
+from app import app, db, Biz
+from models import CompanyAnalysis
+from api.company_analysis import analyze_company_url
+from services.domain_groups import group_by_domain, print_dedup_stats
+from services.normalization import registrable_domain
+from services.coverage_report import print_coverage
+
+
+# 設定
+REQUEST_INTERVAL = 1.0  # 分析ごとの待機秒数（Gemini APIのレート制限対策）
+
+
+def analyzed_domains():
+    """有効期限内の分析があるドメイン（登録可能ドメイン）の集合"""
+    now = datetime.utcnow()
+    rows = db.session.query(CompanyAnalysis.company_domain).filter(
+        db.or_(CompanyAnalysis.expires_at.is_(None), CompanyAnalysis.expires_at >= now)
+    )
+    # 従来のキー（www.を除いたホスト名）で保存された分析も登録可能ドメインとして数える
+    return {registrable_domain(f"https://{domain}") or domain for domain, in rows}
+
+
+def analyze_websites(limit=None, dry_run=False, force=False):
+    """
+    ドメイン単位で公式サイトを分析
+
+    Args:
+        limit: 分析するドメイン数の上限（テスト用）
+        dry_run: Trueならグループ化の統計のみ表示して分析しない
+        force: Trueなら分析済みのドメインも再分析
+    """
+    with app.app_context():
+        rows = db.session.query(Biz.id, Biz.website_url, Biz.website_domain).filter(
+            Biz.website_url.isnot(None)
+        ).order_by(Biz.id).all()
+
+        groups = group_by_domain(rows)
+        print(f"=== 企業分析: 対象Biz {len(rows)}件 ===")
+        print_dedup_stats(groups)
+
+        done = set() if force else analyzed_domains()
+        pending = [group for group in groups if group.domain not in done]
+        skipped = len(groups) - len(pending)
+        # 共有しているBizが多いドメインから分析（1回の分析で反映される件数が多い）
+        pending.sort(key=lambda group: -len(group))
+        if limit:
+            pending = pending[:limit]
+
+        print(f"\n分析済みでスキップ: {skipped}ドメイン")
+        print(f"分析対象: {len(pending)}ドメイン（{sum(len(group) for group in pending)}件のBizに反映）")
+
+        if dry_run:
+            print("\nドライランのため分析は行いません。")
+            return
+
+        stats = {'success': 0, 'failed': 0, 'covered': 0, 'cost': 0.0}
+        started = time.monotonic()
+        for i, group in enumerate(pending, 1):
+            biz_id, url = group.representative
+            print(f"[{i}/{len(pending)}] {group.domain} ({len(group)}件) {url}", flush=True)
+            result = analyze_company_url(url, force_update=force)
+            if result['success']:
+                stats['success'] += 1
+                stats['covered'] += len(group)
+                stats['cost'] += result.get('cost') or 0.0
+                if result['company_domain'] != group.domain:
+                    print(f"  警告: 保存ドメイン {result['company_domain']} がグループ {group.domain} と異なります")
+            else:
+                stats['failed'] += 1
+                print(f"  失敗: {result['error'].splitlines()[0]}")
+            time.sleep(REQUEST_INTERVAL)
+
+        print(f"\n=== 企業分析: 完了 ({time.monotonic() - started:.0f}秒) ===")
+        print(f"成功: {stats['success']}ドメイン（{stats['covered']}件のBizに反映）")
+        print(f"失敗: {stats['failed']}ドメイン")
+        print(f"推定コスト: ${stats['cost']:.4f}")
+
+        print_coverage(['website', 'analysis'], title='現在の状況')
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bizの公式サイトをドメイン単位で企業分析')
+    parser.add_argument('--limit', type=int, help='分析するドメイン数の上限（テスト用）')
+    parser.add_argument('--dry-run', action='store_true', help='グループ化の統計のみ表示')
+    parser.add_argument('--force', action='store_true', help='分析済みのドメインも再分析')
+    args = parser.parse_args()
+
+    analyze_websites(limit=args.limit, dry_run=args.dry_run, force=args.force)
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+住所パーサーのスループット計測スクリプト
+
+services.address_parser の parse / parse_many と、従来の正規表現による
+市区町村抽出（r'.*?[都道府県].*?[市区町村]'）の処理速度・判定率を比較します。
+
+使い方:
+    python scripts/benchmark_address_parser.py                     # DBのBiz.addressを使用
+    python scripts/benchmark_address_parser.py --csv csv/list.csv --column 2
+    python scripts/benchmark_address_parser.py --with-areas        # Areaテーブルの町名辞書も読み込む
+"""
+import sys
+import os
+import csv
+import re
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.address_parser import AddressParser
+
+# 設定
+DEFAULT_REPEAT = 3  # 計測の繰り返し回数（最速値を採用）
+
+_LEGACY_WARD_PATTERN = re.compile(r'.*?[都道府県].*?[市区町村]')
+
+
+def load_addresses_from_csv(csv_path, column):
+    """CSVの指定列から住所を読み込む"""
+    with open(csv_path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        return [row[column] for row in reader if len(row) > column and row[column]]
+
+
+def load_addresses_from_db(with_areas):
+    """DBのBiz.addressを読み込む（with_areas=TrueならAreaテーブルも返す）"""
+    from app import app
+    from models import Area, Biz
+
+    with app.app_context():
+        addresses = [a for (a,) in Biz.query.with_entities(Biz.address).filter(Biz.address.isnot(None))]
+        areas = list(Area.query.with_entities(Area.prefecture, Area.city)) if with_areas else []
+    return addresses, areas
+
+
+def measure(func, repeat):
+    """funcを repeat 回実行し、最速の実行時間（秒）と最後の結果を返す"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(label, count, elapsed):
+    rate = count / elapsed if elapsed else float('inf')
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms  {rate:12,.0f} 件/秒")
+
+
+def run_benchmark(addresses, areas=None, repeat=DEFAULT_REPEAT):
+    """
+    各方式で住所を処理して速度と判定率を表示
+
+    Args:
+        addresses: 住所のリスト
+        areas: Areaの (prefecture, city) のリスト（町名辞書用）
+        repeat: 繰り返し回数
+    """
+    parser = AddressParser()
+    if areas:
+        started = time.perf_counter()
+        loaded = parser.load_areas(areas)
+        print(f"町名辞書: {loaded}件 ({time.perf_counter() - started:.2f}秒)")
+
+    count = len(addresses)
+    print(f"対象住所: {count}件（ユニーク {len(set(addresses))}件）\n")
+
+    print("=== 処理時間 ===")
+    legacy_time, legacy = measure(
+        lambda: [m.group(0) if m else None for m in map(_LEGACY_WARD_PATTERN.search, addresses)], repeat
+    )
+    report("正規表現（市区町村のみ）", count, legacy_time)
+
+    parse_time, parsed = measure(lambda: [parser.parse(a) for a in addresses], repeat)
+    report("parse（1件ずつ）", count, parse_time)
+
+    def parse_many_cold():
+        parser._cache.clear()
+        return parser.parse_many(addresses)
+
+    cold_time, _ = measure(parse_many_cold, repeat)
+    report("parse_many（キャッシュなし）", count, cold_time)
+    warm_time, _ = measure(lambda: parser.parse_many(addresses), repeat)
+    report("parse_many（キャッシュあり）", count, warm_time)
+
+    print("\n=== 判定率 ===")
+    for label, hits in [
+        ("正規表現: 市区町村", sum(1 for m in legacy if m)),
+        ("都道府県", sum(1 for p in parsed if p.prefecture)),
+        ("市区町村", sum(1 for p in parsed if p.city)),
+        ("町名", sum(1 for p in parsed if p.town)),
+        ("丁目", sum(1 for p in parsed if p.chome)),
+        ("番地", sum(1 for p in parsed if p.block)),
+        ("建物名", sum(1 for p in parsed if p.building)),
+    ]:
+        print(f"  {label:<20} {hits:8d}件 ({hits / count * 100 if count else 0:5.1f}%)")
+
+    print("\n=== サンプル ===")
+    for p in parsed[:5]:
+        print(f"  {p.raw}\n    → {p}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='住所パーサーのスループット計測')
+    arg_parser.add_argument('--csv', help='住所を読み込むCSV（省略時はDBのBiz.address）')
+    arg_parser.add_argument('--column', type=int, default=2, help='CSVの住所列（0始まり）')
+    arg_parser.add_argument('--with-areas', action='store_true', help='Areaテーブルから町名辞書を読み込む')
+    arg_parser.add_argument('--multiply', type=int, default=1, help='住所リストを複製して件数を増やす')
+    arg_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='計測の繰り返し回数')
+    args = arg_parser.parse_args()
+
+    areas = []
+    if args.csv:
+        addresses = load_addresses_from_csv(args.csv, args.column)
+        if args.with_areas:
+            _, areas = load_addresses_from_db(with_areas=True)
+    else:
+        addresses, areas = load_addresses_from_db(args.with_areas)
+
+    if not addresses:
+        print("住所データがありません")
+        sys.exit(1)
+
+    run_benchmark(addresses * max(args.multiply, 1), areas, repeat=args.repeat)
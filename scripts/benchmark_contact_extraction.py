@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+メール・電話番号抽出のスループット計測スクリプト
+
+保存済みのHTMLページ（ディレクトリ内の *.html / *.htm）に対して、
+services.contact_extraction の extract_contacts / extract_many と、従来のHTML全体への
+正規表現による抽出の処理速度・抽出件数を比較し、従来方式のみで抽出された値（誤検出の候補）を表示します。
+--check で電話番号の表記ゆれの確認（PHONE_CHECKS）のみを実行します。
+
+使い方:
+    python scripts/benchmark_contact_extraction.py pages/
+    python scripts/benchmark_contact_extraction.py pages/ --workers 4 --multiply 5
+    python scripts/benchmark_contact_extraction.py --check
+"""
+import sys
+import os
+import glob
+import re
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.contact_extraction import extract_contacts, extract_from_text, extract_many
+
+# 設定
+DEFAULT_REPEAT = 3  # 計測の繰り返し回数（最速値を採用）
+SAMPLES_TO_SHOW = 15  # 従来方式のみで抽出された値の表示件数
+
+# 従来の抽出（HTML全体に正規表現を適用し、Pythonで画像拡張子を除外）
+_LEGACY_EMAIL_PATTERN = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+_LEGACY_EMAIL_NOISE_PATTERN = re.compile(r'\.(?:jpe?g|png|gif|svg|webp|css|js)$', re.IGNORECASE)
+_LEGACY_PHONE_PATTERN = re.compile(r'0120[-‐ー]\d{3}[-‐ー]\d{3,4}|0\d{1,4}[-‐ー]\d{1,4}[-‐ー]\d{4}|(?<!\d)0\d{9,10}(?!\d)')
+
+# 電話番号の表記と期待する抽出結果（--check で確認）
+PHONE_CHECKS = [
+    ('TEL.03-1234-5678', ['03-1234-5678']),
+    ('TEL03-1234-5678', ['03-1234-5678']),
+    ('TEL/03-1234-5678', ['03-1234-5678']),
+    ('TEL:03-1234-5678', ['03-1234-5678']),
+    ('03 1234 5678', ['03-1234-5678']),
+    ('03.1234.5678', ['03-1234-5678']),
+    ('+81 3 1234 5678', ['03-1234-5678']),
+    ('+81(0)3-1234-5678', ['03-1234-5678']),
+    ('03(1234)5678', ['03-1234-5678']),
+    ('０３－１２３４－５６７８', ['03-1234-5678']),
+    ('0312345678', ['03-1234-5678']),
+    ('03 1234 5678 090 1234 5678', ['03-1234-5678', '090-1234-5678']),
+    # 番号の途中・日付・バージョン番号
+    ('12-03-1234-5678', []),
+    ('v1.03-1234-5678', []),
+    ('A1B0312345678', []),
+    ('2024/03/15', []),
+    ('2024.03.15', []),
+]
+
+
+def legacy_extract(html):
+    emails = []
+    for email in _LEGACY_EMAIL_PATTERN.findall(html):
+        if not _LEGACY_EMAIL_NOISE_PATTERN.search(email) and email not in emails:
+            emails.append(email)
+    phones = []
+    for phone in _LEGACY_PHONE_PATTERN.findall(html):
+        phone = re.sub(r'[‐ー]', '-', phone)
+        if phone not in phones:
+            phones.append(phone)
+    return emails, phones
+
+
+def load_pages(directory):
+    """ディレクトリ内のHTMLファイルを読み込む（文字コードはUTF-8 → CP932の順で判定）"""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*.htm*'), recursive=True)):
+        with open(path, 'rb') as f:
+            body = f.read()
+        try:
+            pages.append(body.decode('utf-8'))
+        except UnicodeDecodeError:
+            pages.append(body.decode('cp932', errors='replace'))
+    return pages
+
+
+def measure(func, repeat):
+    """funcを repeat 回実行し、最速の実行時間（秒）と最後の結果を返す"""
+    best, result = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def report(label, count, size, elapsed):
+    rate = count / elapsed if elapsed else float('inf')
+    throughput = size / elapsed / 1024 / 1024 if elapsed else float('inf')
+    print(f"  {label:<28} {elapsed * 1000:9.1f} ms  {rate:10,.0f} ページ/秒  {throughput:8.1f} MB/秒")
+
+
+def check_phones():
+    """
+    PHONE_CHECKS の各表記から期待どおりの電話番号が抽出されるか確認
+
+    Returns:
+        bool: 全て期待どおりならTrue
+    """
+    failed = 0
+    for text, expected in PHONE_CHECKS:
+        _, phones = extract_from_text(text)
+        if phones != expected:
+            failed += 1
+            print(f"  NG {text!r}: {phones}（期待値 {expected}）")
+    print(f"電話番号の確認: {len(PHONE_CHECKS) - failed}/{len(PHONE_CHECKS)}件 OK")
+    return failed == 0
+
+
+def run_benchmark(pages, workers=0, repeat=DEFAULT_REPEAT):
+    """
+    各方式でページを処理して速度と抽出件数を表示
+
+    Args:
+        pages: HTMLのリスト
+        workers: extract_many のプロセス数（0なら計測しない）
+        repeat: 繰り返し回数
+    """
+    count = len(pages)
+    size = sum(len(page.encode('utf-8')) for page in pages)
+    print(f"対象ページ: {count}件（{size / 1024 / 1024:.1f} MB）\n")
+
+    print("=== 処理時間 ===")
+    legacy_time, legacy = measure(lambda: [legacy_extract(page) for page in pages], repeat)
+    report("正規表現（HTML全体）", count, size, legacy_time)
+    new_time, extracted = measure(lambda: [extract_contacts(page) for page in pages], repeat)
+    report("extract_contacts", count, size, new_time)
+    if workers:
+        batch_time, _ = measure(lambda: extract_many(pages, workers=workers), repeat)
+        report(f"extract_many（{workers}プロセス）", count, size, batch_time)
+
+    print("\n=== 抽出件数 ===")
+    for label, results in [("正規表現（HTML全体）", legacy), ("extract_contacts", extracted)]:
+        emails = sum(len(e) for e, _ in results)
+        phones = sum(len(p) for _, p in results)
+        pages_found = sum(1 for e, p in results if e or p)
+        print(f"  {label:<28} メール {emails:6d}件  電話 {phones:6d}件  取得ページ {pages_found:6d}件")
+
+    print("\n=== 従来方式のみで抽出された値（誤検出の候補） ===")
+    shown = 0
+    for (old_emails, old_phones), (new_emails, new_phones) in zip(legacy, extracted):
+        new_phone_digits = {re.sub(r'\D', '', p) for p in new_phones}
+        for value in [e for e in old_emails if e.lower() not in new_emails] + \
+                     [p for p in old_phones if re.sub(r'\D', '', p) not in new_phone_digits]:
+            print(f"  {value}")
+            shown += 1
+            if shown >= SAMPLES_TO_SHOW:
+                return
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='メール・電話番号抽出のスループット計測')
+    arg_parser.add_argument('directory', nargs='?', help='保存済みHTMLページのディレクトリ')
+    arg_parser.add_argument('--workers', type=int, default=0, help='extract_many のプロセス数（0なら計測しない）')
+    arg_parser.add_argument('--multiply', type=int, default=1, help='ページリストを複製して件数を増やす')
+    arg_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='計測の繰り返し回数')
+    arg_parser.add_argument('--check', action='store_true', help='電話番号の表記ゆれの確認のみを実行')
+    args = arg_parser.parse_args()
+
+    if args.check:
+        sys.exit(0 if check_phones() else 1)
+    if not args.directory:
+        arg_parser.error('directory を指定してください')
+
+    pages = load_pages(args.directory)
+    if not pages:
+        print(f"HTMLファイルがありません: {args.directory}")
+        sys.exit(1)
+
+    run_benchmark(pages * max(args.multiply, 1), workers=args.workers, repeat=args.repeat)
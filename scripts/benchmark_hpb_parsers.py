@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+HPB / リジョブのページ解析のバックエンド比較
+
+scripts/fixtures/hpb の保存済みページ（期待値は expected.json）で各バックエンドを検証し、
+処理時間を比較します。services.hpb_parsers は全フィクスチャに合格した中で最速のものを採用しています。
+
+バックエンド:
+- BeautifulSoup(lxml)        … 従来の app.py の実装
+- BeautifulSoup+SoupStrainer … 必要な要素だけを部分的にパース
+- lxml.html+XPath            … コンパイル済みXPath
+- selectolax（lexbor）       … services.hpb_parsers（採用）
+
+使い方:
+    python scripts/benchmark_hpb_parsers.py
+    python scripts/benchmark_hpb_parsers.py --repeat 20
+    python scripts/benchmark_hpb_parsers.py --fixtures path/to/pages   # expected.json を置いたディレクトリ
+"""
+import sys
+import os
+import json
+import re
+import time
+from dataclasses import asdict, is_dataclass
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html as lxml_html
+
+from services import hpb_parsers
+from services.hpb_parsers import (
+    CARD_DATA_SELECTOR, CARD_LABELS, CARD_RATING_SELECTOR, CARD_REVIEW_COUNT_SELECTOR, HPB_CLINIC_BASE_URL,
+    REJOB_BASE_URL, JobLink, RejobSearchPage, ReviewStats, SalonCard, SalonListPage
+)
+
+# 設定
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'hpb')
+DEFAULT_REPEAT = 10  # 計測の繰り返し回数（最速値を採用）
+
+_NUMBER_PATTERN = re.compile(r'(\d+)')
+_REJOB_JOB_HREF_PATTERN = re.compile(r'^/job/B\d+')
+
+
+def _to_float(text):
+    try:
+        return float(text)
+    except (ValueError, TypeError):
+        return None
+
+
+def _to_count(text):
+    match = _NUMBER_PATTERN.search(text or '')
+    return int(match.group(1)) if match else None
+
+
+def _card_fields(pairs, rating_text, count_text):
+    """カードの「ラベル, 値」の組と評価・口コミ件数のテキストから SalonCard の項目を作る"""
+    fields = {}
+    for label, value in pairs:
+        key = CARD_LABELS.get(label.strip())
+        if key and value.strip() and key not in fields:
+            fields[key] = value.strip()
+    fields['rating'] = _to_float(rating_text)
+    fields['review_count'] = _to_count(count_text)
+    return fields
+
+
+def _card_url(href, base_url):
+    if not href:
+        return None
+    if href.startswith('http'):
+        return href.split('?')[0]
+    if href.startswith('/'):
+        return base_url + href.split('?')[0]
+    return None
+
+
+# ---------------------------------------------------------------
+# BeautifulSoup(lxml)（従来の実装）/ SoupStrainer による部分パース
+# ---------------------------------------------------------------
+
+class SoupBackend:
+    """BeautifulSoup実装。strain=True なら SoupStrainer で必要な要素だけをパースする"""
+
+    def __init__(self, strain=False):
+        self.strain = strain
+
+    def _soup(self, html, strainer):
+        if self.strain:
+            return BeautifulSoup(html, 'lxml', parse_only=strainer)
+        return BeautifulSoup(html, 'lxml')
+
+    def parse_salon_list(self, html, base_url=HPB_CLINIC_BASE_URL):
+        soup = self._soup(html, SoupStrainer(['li', 'div', 'a']))
+        salon_cards = soup.select('li.searchListCassette')
+        if not salon_cards:
+            salon_cards = [body.find_parent('li') for body in soup.select('div.slnCassetteBody')]
+        if not salon_cards:
+            salon_cards = soup.select('div.clinic')
+        page = SalonListPage()
+        seen = set()
+        for card in salon_cards:
+            if card is None:
+                continue
+            name_tag = card.select_one('h3.slnName a, h3.slcHead a, p.clinic__name a')
+            if not name_tag:
+                continue
+            url = _card_url(name_tag.get('href'), base_url)
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            page.cards.append(SalonCard(name=name_tag.get_text(strip=True), url=url, **self._card_fields(card)))
+        next_page_tag = soup.select_one('a.iS.arrowR')
+        if next_page_tag and '次へ' in next_page_tag.text:
+            page.next_url = next_page_tag['href']
+        return page
+
+    @staticmethod
+    def _card_fields(card):
+        pairs = []
+        for item in card.select(CARD_DATA_SELECTOR):
+            label, sep, value = item.get_text(strip=True).partition('：')
+            if sep:
+                pairs.append((label, value))
+        for dt in card.find_all('dt'):
+            dd = dt.find_next_sibling('dd')
+            if dd:
+                pairs.append((dt.get_text(strip=True), dd.get_text(strip=True)))
+        rating = card.select_one(CARD_RATING_SELECTOR)
+        count = card.select_one(CARD_REVIEW_COUNT_SELECTOR)
+        return _card_fields(pairs, rating.get_text(strip=True) if rating else None,
+                            count.get_text(strip=True) if count else None)
+
+    def parse_salon_address(self, html):
+        soup = self._soup(html, SoupStrainer('tr'))
+        address_th = soup.find('th', string=lambda t: t and '住所' in t)
+        if address_th and address_th.find_next_sibling('td'):
+            return address_th.find_next_sibling('td').get_text(strip=True)
+        return None
+
+    def parse_clinic_reviews(self, html):
+        soup = self._soup(html, SoupStrainer('span'))
+        rating_tag = soup.select_one('span.clinic-review-rating__total-score')
+        count_tag = soup.select_one('span.c-search-result-heading__count')
+        return ReviewStats(
+            rating=_to_float(rating_tag.get_text(strip=True)) if rating_tag else None,
+            count=_to_count(count_tag.get_text(strip=True)) if count_tag else None,
+        )
+
+    def parse_salon_reviews(self, html):
+        soup = self._soup(html, SoupStrainer(['dd', 'span']))
+        rating_tag = soup.select_one('dd.reviewRatingMeanScore')
+        count_tag = soup.select_one('span.numberOfResult')
+        return ReviewStats(
+            rating=_to_float(rating_tag.get_text(strip=True)) if rating_tag else None,
+            count=_to_count(count_tag.get_text(strip=True)) if count_tag else None,
+        )
+
+    def parse_rejob_search(self, html, salon_name):
+        soup = self._soup(html, SoupStrainer(['div', 'a']))
+        page = RejobSearchPage()
+        pagination_element = soup.find('div', class_='c-pagenation')
+        if pagination_element:
+            page.paginated = True
+            tags = pagination_element.find_all_previous('a', href=_REJOB_JOB_HREF_PATTERN)
+            tags.reverse()
+            page.jobs = [JobLink(title=tag.get_text(strip=True), url=REJOB_BASE_URL + tag.get('href')) for tag in tags]
+            return page
+        for card in soup.select('div.jobCassette'):
+            company_tag = card.select_one('p.jobCassette__company')
+            if company_tag and salon_name in company_tag.get_text(strip=True):
+                title_tag = card.select_one('h3.jobCassette__title a')
+                if title_tag:
+                    page.jobs.append(JobLink(title=title_tag.get_text(strip=True),
+                                             url=REJOB_BASE_URL + title_tag.get('href')))
+        return page
+
+
+# ---------------------------------------------------------------
+# lxml.html + コンパイル済みXPath
+# ---------------------------------------------------------------
+
+def _has_class(name):
+    """XPathのクラス判定（CSSの .name と同じ）"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+class LxmlBackend:
+    """lxml.html + etree.XPath 実装（XPathはインスタンス生成時に1回だけコンパイル）"""
+
+    def __init__(self):
+        self.salon_cards = etree.XPath(f'//li[{_has_class("searchListCassette")}]')
+        self.salon_card_body_parents = etree.XPath(f'//div[{_has_class("slnCassetteBody")}]/ancestor::li[1]')
+        self.clinic_cards = etree.XPath(f'//div[{_has_class("clinic")}]')
+        self.card_name_link = etree.XPath(
+            f'(.//h3[{_has_class("slnName")}]//a | .//h3[{_has_class("slcHead")}]//a'
+            f' | .//p[{_has_class("clinic__name")}]//a)[1]'
+        )
+        self.card_data_items = etree.XPath(f'.//ul[{_has_class("slnDataList")}]/li')
+        self.card_terms = etree.XPath('.//dt')
+        self.term_description = etree.XPath('following-sibling::dd[1]')
+        self.card_rating = etree.XPath(f'(.//*[{_has_class("reviewRating")} or {_has_class("clinic__rating")}])[1]')
+        self.card_review_count = etree.XPath(
+            f'(.//*[{_has_class("reviewCount")} or {_has_class("clinic__review-count")}])[1]'
+        )
+        self.next_page_link = etree.XPath(f'(//a[{_has_class("iS")} and {_has_class("arrowR")}])[1]')
+        self.address_cell = etree.XPath("(//th[contains(., '住所')])[1]/following-sibling::td[1]")
+        self.clinic_rating = etree.XPath(f'(//span[{_has_class("clinic-review-rating__total-score")}])[1]')
+        self.clinic_review_count = etree.XPath(f'(//span[{_has_class("c-search-result-heading__count")}])[1]')
+        self.salon_rating = etree.XPath(f'(//dd[{_has_class("reviewRatingMeanScore")}])[1]')
+        self.salon_review_count = etree.XPath(f'(//span[{_has_class("numberOfResult")}])[1]')
+        self.rejob_pagination = etree.XPath(f'(//div[{_has_class("c-pagenation")}])[1]')
+        self.rejob_cards = etree.XPath(f'//div[{_has_class("jobCassette")}]')
+        self.rejob_card_company = etree.XPath(f'(.//p[{_has_class("jobCassette__company")}])[1]')
+        self.rejob_card_title_link = etree.XPath(f'(.//h3[{_has_class("jobCassette__title")}]//a)[1]')
+
+    @staticmethod
+    def _document(html):
+        try:
+            return lxml_html.document_fromstring(html)
+        except ValueError:
+            return lxml_html.document_fromstring(html.encode('utf-8'))
+
+    @staticmethod
+    def _text(element):
+        return ''.join(part.strip() for part in element.itertext())
+
+    @staticmethod
+    def _first(xpath, node):
+        found = xpath(node)
+        return found[0] if found else None
+
+    def parse_salon_list(self, html, base_url=HPB_CLINIC_BASE_URL):
+        document = self._document(html)
+        cards = self.salon_cards(document) or self.salon_card_body_parents(document) or self.clinic_cards(document)
+        page = SalonListPage()
+        seen = set()
+        for card in cards:
+            link = self._first(self.card_name_link, card)
+            if link is None:
+                continue
+            url = _card_url(link.get('href'), base_url)
+            if not url or url in seen:
+                continue
+            seen.add(url)
+            page.cards.append(SalonCard(name=self._text(link), url=url, **self._card_fields(card)))
+        next_link = self._first(self.next_page_link, document)
+        if next_link is not None and '次へ' in next_link.text_content():
+            page.next_url = next_link.get('href')
+        return page
+
+    def _card_fields(self, card):
+        pairs = []
+        for item in self.card_data_items(card):
+            label, sep, value = self._text(item).partition('：')
+            if sep:
+                pairs.append((label, value))
+        for dt in self.card_terms(card):
+            dd = self._first(self.term_description, dt)
+            if dd is not None:
+                pairs.append((self._text(dt), self._text(dd)))
+        rating = self._first(self.card_rating, card)
+        count = self._first(self.card_review_count, card)
+        return _card_fields(pairs, self._text(rating) if rating is not None else None,
+                            self._text(count) if count is not None else None)
+
+    def parse_salon_address(self, html):
+        cell = self._first(self.address_cell, self._document(html))
+        return self._text(cell) if cell is not None else None
+
+    def _reviews(self, html, rating_xpath, count_xpath):
+        document = self._document(html)
+        rating = self._first(rating_xpath, document)
+        count = self._first(count_xpath, document)
+        return ReviewStats(
+            rating=_to_float(self._text(rating)) if rating is not None else None,
+            count=_to_count(self._text(count)) if count is not None else None,
+        )
+
+    def parse_clinic_reviews(self, html):
+        return self._reviews(html, self.clinic_rating, self.clinic_review_count)
+
+    def parse_salon_reviews(self, html):
+        return self._reviews(html, self.salon_rating, self.salon_review_count)
+
+    def parse_rejob_search(self, html, salon_name):
+        document = self._document(html)
+        page = RejobSearchPage()
+        pagination = self._first(self.rejob_pagination, document)
+        if pagination is not None:
+            page.paginated = True
+            for element in document.iter():
+                if element is pagination:
+                    break
+                if element.tag == 'a' and _REJOB_JOB_HREF_PATTERN.match(element.get('href') or ''):
+                    page.jobs.append(JobLink(title=self._text(element), url=REJOB_BASE_URL + element.get('href')))
+            return page
+        for card in self.rejob_cards(document):
+            company = self._first(self.rejob_card_company, card)
+            if company is None or salon_name not in self._text(company):
+                continue
+            link = self._first(self.rejob_card_title_link, card)
+            if link is not None:
+                page.jobs.append(JobLink(title=self._text(link), url=REJOB_BASE_URL + (link.get('href') or '')))
+        return page
+
+
+def get_backends():
+    return {
+        'BeautifulSoup(lxml)': SoupBackend(),
+        'BeautifulSoup+SoupStrainer': SoupBackend(strain=True),
+        'lxml.html+XPath': LxmlBackend(),
+        'selectolax（採用）': hpb_parsers,
+    }
+
+
+def load_fixtures(directory):
+    """expected.json とHTMLを読み込む → [(ファイル名, パーサー名, 引数, 期待値, HTML)]"""
+    with open(os.path.join(directory, 'expected.json'), encoding='utf-8') as f:
+        expected = json.load(f)
+    fixtures = []
+    for name, case in expected.items():
+        with open(os.path.join(directory, name), encoding='utf-8') as f:
+            fixtures.append((name, case['parser'], case.get('args', {}), case['expected'], f.read()))
+    return fixtures
+
+
+def _plain(value):
+    return asdict(value) if is_dataclass(value) else value
+
+
+def verify(backend, fixtures):
+    """各フィクスチャの結果が期待値と一致するか → 不一致のファイル名のリスト"""
+    failures = []
+    for name, parser, args, expected, html in fixtures:
+        try:
+            result = _plain(getattr(backend, parser)(html, **args))
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+        if result != expected:
+            failures.append((name, result))
+    return failures
+
+
+def measure(backend, fixtures, repeat):
+    """全フィクスチャを1周する時間の最速値（秒）"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _, parser, args, _, html in fixtures:
+            getattr(backend, parser)(html, **args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run_benchmark(directory=FIXTURES_DIR, repeat=DEFAULT_REPEAT):
+    fixtures = load_fixtures(directory)
+    size = sum(len(html.encode('utf-8')) for *_, html in fixtures)
+    print(f"フィクスチャ: {len(fixtures)}件（{size / 1024:.0f} KB）")
+
+    results = []
+    print("\n=== 検証・処理時間 ===")
+    for label, backend in get_backends().items():
+        failures = verify(backend, fixtures)
+        elapsed = measure(backend, fixtures, repeat)
+        per_page = elapsed / len(fixtures) * 1000
+        status = '合格' if not failures else f'不合格 {len(failures)}件'
+        print(f"  {label:<28} {per_page:7.2f} ms/ページ  {status}")
+        for name, result in failures:
+            print(f"      {name}: {str(result)[:120]}")
+        results.append((label, per_page, not failures))
+
+    passed = [r for r in results if r[2]]
+    if passed:
+        fastest = min(passed, key=lambda r: r[1])
+        baseline = results[0][1]
+        print(f"\n合格した中で最速: {fastest[0]}（従来比 {baseline / fastest[1]:.1f}倍）")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='HPB / リジョブのページ解析のバックエンド比較')
+    arg_parser.add_argument('--fixtures', default=FIXTURES_DIR, help='フィクスチャのディレクトリ（expected.json を含む）')
+    arg_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='計測の繰り返し回数')
+    args = arg_parser.parse_args()
+
+    run_benchmark(args.fixtures, repeat=args.repeat)
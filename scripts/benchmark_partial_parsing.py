@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+部分パース（SoupStrainer）・lxmlテキスト抽出の効果測定
+
+各抽出処理について、従来の実装（ページ全体のBeautifulSoupツリーを構築）と現在の実装の
+1ページあたりの処理時間とメモリ使用量（tracemalloc によるPythonヒープのピーク）を比較し、結果が一致するか確認します。
+lxml / selectolax がC側で確保するメモリは tracemalloc に含まれないため、参考値として扱ってください。
+
+対象:
+- 問い合わせリンク探索      services.contact_crawler.find_contact_links（aタグのみパース）
+- JS描画判定                services.contact_crawler.needs_browser（lxml）
+- 企業サイトの本文抽出      services.web_scraper.WebScraper._extract_text（html.parser → lxml）
+- HPBサロンデータ表         旧 app._enrich_salon_with_hpb_details（table.slnDataTbl のみパース）
+- HPB口コミ評価             旧 app._enrich_salon_with_hpb_reviews（pタグのみパース）
+  （現在は services.hpb_extractors に統合済み。BeautifulSoupで処理する場合の参考値）
+
+使い方:
+    python scripts/benchmark_partial_parsing.py                       # scripts/fixtures/hpb を使用
+    python scripts/benchmark_partial_parsing.py --pages pages/        # manage_snapshots.py --export の書き出し先など
+"""
+import sys
+import os
+import glob
+import re
+import time
+import tracemalloc
+from urllib.parse import urljoin, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+from services.contact_crawler import (
+    CONTACT_KEYWORDS, CONTACT_URL_KEYWORDS, MAX_CONTACT_PAGES, MIN_TEXT_LENGTH, _JS_ONLY_MARKERS,
+    find_contact_links, needs_browser
+)
+from services.normalization import registrable_domain
+from services.web_scraper import WebScraper
+
+# 設定
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'hpb')
+BASE_URL = 'https://beauty.hotpepper.jp/slnH000000000/'  # 相対リンク解決用のURL
+DEFAULT_REPEAT = 5  # 計測の繰り返し回数（最速値を採用）
+
+
+# ---------------------------------------------------------------
+# 従来の実装（ページ全体のツリーを構築）
+# ---------------------------------------------------------------
+
+def legacy_find_contact_links(html, base_url, limit=MAX_CONTACT_PAGES):
+    site_domain = registrable_domain(base_url)
+    soup = BeautifulSoup(html, 'lxml')
+    by_text, by_url = [], []
+    for anchor in soup.find_all('a', href=True):
+        href = anchor['href'].strip()
+        if not href or href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
+            continue
+        url = urljoin(base_url, href).split('#', 1)[0]
+        if registrable_domain(url) != site_domain or url.rstrip('/') == base_url.rstrip('/'):
+            continue
+        text = anchor.get_text(' ', strip=True) or anchor.get('title', '') or ''
+        if any(keyword in text for keyword in CONTACT_KEYWORDS):
+            if url not in by_text:
+                by_text.append(url)
+        elif any(keyword in urlparse(url).path.lower() for keyword in CONTACT_URL_KEYWORDS):
+            if url not in by_url:
+                by_url.append(url)
+    return (by_text + [url for url in by_url if url not in by_text])[:limit]
+
+
+def legacy_needs_browser(html):
+    soup = BeautifulSoup(html, 'lxml')
+    for tag in soup(['script', 'style', 'noscript', 'template']):
+        tag.decompose()
+    if len(soup.get_text(' ', strip=True)) >= MIN_TEXT_LENGTH:
+        return False
+    lowered = html.lower()
+    return any(marker in lowered for marker in _JS_ONLY_MARKERS) or '<script' in lowered
+
+
+def legacy_extract_text(html):
+    soup = BeautifulSoup(html, 'html.parser')
+    for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
+        tag.decompose()
+    text = soup.get_text(separator='\n', strip=True)
+    lines = []
+    for line in text.split('\n'):
+        line = line.strip()
+        if len(line) < 10:
+            continue
+        lines.append(re.sub(r'\s+', ' ', line))
+    return '\n'.join(lines)
+
+
+def _hpb_address(soup):
+    info_table = soup.select_one('table.slnDataTbl')
+    if not info_table:
+        return None
+    for row in info_table.select('tr'):
+        th = row.select_one('th')
+        if th and '住所' in th.get_text():
+            td = row.select_one('td')
+            return ' '.join(td.get_text(strip=True).split()) if td else None
+    return None
+
+
+def _hpb_review_point(soup):
+    rating_p = soup.find('p', class_='reviewPoint', string=lambda t: t and '総合' in t)
+    rating = rating_p.find_next_sibling('p', class_='reviewPointNum') if rating_p else None
+    count = soup.select_one('p.reviewRead a')
+    return (rating.get_text(strip=True) if rating else None, count.get_text(strip=True) if count else None)
+
+
+# (表示名, 従来, 現在)
+EXTRACTORS = [
+    ('問い合わせリンク探索', lambda html: legacy_find_contact_links(html, BASE_URL),
+     lambda html: find_contact_links(html, BASE_URL)),
+    ('JS描画判定', legacy_needs_browser, needs_browser),
+    ('企業サイトの本文抽出', legacy_extract_text, WebScraper()._extract_text),
+    ('HPBサロンデータ表', lambda html: _hpb_address(BeautifulSoup(html, 'lxml')),
+     lambda html: _hpb_address(BeautifulSoup(html, 'lxml', parse_only=SoupStrainer('table', class_=re.compile(r'(^|\s)slnDataTbl(\s|$)'))))),
+    ('HPB口コミ評価', lambda html: _hpb_review_point(BeautifulSoup(html, 'lxml')),
+     lambda html: _hpb_review_point(BeautifulSoup(html, 'lxml', parse_only=SoupStrainer('p')))),
+]
+
+
+def load_pages(directories):
+    pages = []
+    for directory in directories:
+        for path in sorted(glob.glob(os.path.join(directory, '**', '*.htm*'), recursive=True)):
+            with open(path, encoding='utf-8', errors='replace') as f:
+                pages.append(f.read())
+    return pages
+
+
+def measure_time(func, pages, repeat):
+    """全ページを処理する時間の最速値（秒）と結果"""
+    best, results = None, None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = [func(page) for page in pages]
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, results
+
+
+def measure_memory(func, pages):
+    """1ページあたりのPythonヒープのピーク（バイト、ページごとのピークの平均）"""
+    peaks = []
+    for page in pages:
+        tracemalloc.start()
+        func(page)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return sum(peaks) / len(peaks)
+
+
+def run_benchmark(pages, repeat=DEFAULT_REPEAT):
+    size = sum(len(page.encode('utf-8')) for page in pages)
+    print(f"対象ページ: {len(pages)}件（{size / 1024:.0f} KB）\n")
+    print(f"  {'抽出処理':<16} {'従来 ms/頁':>10} {'現在 ms/頁':>10} {'速度':>6}  {'従来 KB':>9} {'現在 KB':>9}  結果")
+    for label, legacy, current in EXTRACTORS:
+        legacy_time, legacy_results = measure_time(legacy, pages, repeat)
+        current_time, current_results = measure_time(current, pages, repeat)
+        legacy_memory = measure_memory(legacy, pages)
+        current_memory = measure_memory(current, pages)
+        same = '一致' if legacy_results == current_results else '不一致'
+        print(f"  {label:<16} {legacy_time / len(pages) * 1000:10.2f} {current_time / len(pages) * 1000:10.2f}"
+              f" {legacy_time / current_time:5.1f}x  {legacy_memory / 1024:9.0f} {current_memory / 1024:9.0f}  {same}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    arg_parser = argparse.ArgumentParser(description='部分パース・lxmlテキスト抽出の効果測定')
+    arg_parser.add_argument('--pages', action='append', help='HTMLページのディレクトリ（複数指定可、省略時はフィクスチャ）')
+    arg_parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='計測の繰り返し回数')
+    args = arg_parser.parse_args()
+
+    pages = load_pages(args.pages or [FIXTURES_DIR])
+    if not pages:
+        print("HTMLファイルがありません")
+        sys.exit(1)
+    run_benchmark(pages, repeat=args.repeat)
@@ -2,19 +2,39 @@
 """
 データクレンジング: ビジネスデータの正規化・標準化
 Phase 1C, 1B完了後に実行
+
+IDの範囲ごとのチャンク単位で読み込み・バルクUPDATEするため、件数が増えても
+メモリ使用量とトランザクションの大きさは一定。差分はTSVレポートに書き出す。
 """
 import sys
 import os
 import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
 sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
+from sqlalchemy import func, update
+
 from app import app, db, Biz
+from services.normalization import format_phone, matching_keys, remove_zipcode
+
+# 設定
+CHUNK_SIZE = 2000  # 1チャンクあたりのID範囲（読み込み・バルクUPDATEの単位）
+DEFAULT_WORKERS = 0  # 変更計算のプロセス数（0で単一プロセス）
+
+STAT_KEYS = ('phone_normalized', 'phone_invalid', 'address_cleaned', 'former_name_extracted', 'closed_flagged')
+
+_ZIPCODE_PREFIX_PATTERN = re.compile(r'^〒?\d{3}-?\d{4}')
+_FORMER_NAME_PATTERN = re.compile(r'[（(]旧[：:]\s*(.+?)[）)]')
+_FORMER_NAME_REMOVE_PATTERN = re.compile(r'[（(]旧[：:].+?[）)]')
 
 def normalize_phone_number(phone_str):
     """
-    電話番号を標準形式に正規化
+    電話番号を標準形式に正規化（services.normalization.format_phone）
     
     Args:
         phone_str: 元の電話番号文字列（複数番号、ハイフンあり/なし混在）
@@ -22,37 +42,11 @@ def normalize_phone_number(phone_str):
     Returns:
         str: 正規化された電話番号（03-1234-5678形式）または None
     """
-    if not phone_str:
-        return None
-    
-    # 複数番号がある場合は最初の1つを使用
-    phones = phone_str.split(',')
-    phone = phones[0].strip()
-    
-    # 数字のみ抽出
-    digits = re.sub(r'\D', '', phone)
-    
-    # 桁数チェック（10桁または11桁）
-    if len(digits) not in [10, 11]:
-        return None
-    
-    # フォーマット変換
-    if len(digits) == 10:
-        # 03-1234-5678 or 06-1234-5678
-        if digits[:2] in ['03', '04', '06']:
-            return f"{digits[:2]}-{digits[2:6]}-{digits[6:]}"
-        # 0120-123-456
-        elif digits[:4] == '0120':
-            return f"{digits[:4]}-{digits[4:7]}-{digits[7:]}"
-        else:
-            return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
-    else:  # 11桁
-        # 090-1234-5678
-        return f"{digits[:3]}-{digits[3:7]}-{digits[7:]}"
+    return format_phone(phone_str)
 
 def remove_zipcode_from_address(address):
     """
-    住所から郵便番号を削除
+    住所から郵便番号を削除（services.normalization.remove_zipcode）
     
     Args:
         address: 元の住所文字列
@@ -60,12 +54,7 @@ def remove_zipcode_from_address(address):
     Returns:
         str: 郵便番号なしの住所
     """
-    if not address:
-        return None
-    
-    # 〒123-4567 または 1234567 を削除
-    address = re.sub(r'^〒?\d{3}-?\d{4}\s*', '', address)
-    return address.strip()
+    return remove_zipcode(address)
 
 def extract_former_name(name):
     """
@@ -81,109 +70,237 @@ def extract_former_name(name):
         return name, None
     
     # 「（旧：XXX）」または「(旧:XXX)」パターン
-    match = re.search(r'[（(]旧[：:]\s*(.+?)[）)]', name)
+    match = _FORMER_NAME_PATTERN.search(name)
     if match:
         former = match.group(1).strip()
-        current = re.sub(r'[（(]旧[：:].+?[）)]', '', name).strip()
+        current = _FORMER_NAME_REMOVE_PATTERN.sub('', name).strip()
         return current, former
     
     return name, None
 
-def cleanse_all_data(dry_run=True):
+def compute_changes(row):
     """
-    全データをクレンジング
-    
+    1件分のクレンジング内容を計算（DBやORMオブジェクトに触れないため、プロセスプールで実行可能）
+
+    Args:
+        row: (id, name, name_hpb, address, phone, website_url) のタプル
+
+    Returns:
+        tuple: (バルクUPDATE用dict or None, 差分のリスト[(項目, 変更前, 変更後)], 集計キーのタプル)
+    """
+    biz_id, name, name_hpb, address, phone, website_url = row
+    values = {}
+    diffs = []
+    flags = []
+
+    # 1. 電話番号の正規化
+    if phone:
+        normalized = normalize_phone_number(phone)
+        if normalized and normalized != phone:
+            values['phone'] = normalized
+            diffs.append(('電話', phone, normalized))
+            flags.append('phone_normalized')
+        elif not normalized:
+            flags.append('phone_invalid')
+
+    # 2. 住所から郵便番号削除
+    if address and _ZIPCODE_PREFIX_PATTERN.match(address):
+        cleaned = remove_zipcode_from_address(address)
+        if cleaned != address:
+            values['address'] = cleaned
+            diffs.append(('住所', address, cleaned))
+            flags.append('address_cleaned')
+
+    # 3. 旧名称の抽出（former_name フィールドは後で追加）
+    if name:
+        current, former = extract_former_name(name)
+        if former:
+            values['name'] = current
+            diffs.append(('名前', name, current))
+            diffs.append(('旧名', '', former))
+            flags.append('former_name_extracted')
+
+    # 4. 閉院フラグ（is_closed フィールドは後で追加）
+    if name and ('閉院' in name or '閉鎖' in name):
+        diffs.append(('閉院フラグ', '', 'ON'))
+        flags.append('closed_flagged')
+
+    if not values:
+        return None, diffs, tuple(flags)
+
+    # バルクUPDATEではモデルのイベントが発火しないため、正規化キーもここで再計算
+    values.update(matching_keys(
+        values.get('name', name), name_hpb, values.get('address', address),
+        values.get('phone', phone), website_url
+    ))
+    values['id'] = biz_id
+    return values, diffs, tuple(flags)
+
+def compute_chunk(rows):
+    """
+    チャンク内の全行の変更を計算
+
+    Returns:
+        tuple: (バルクUPDATE用dictのリスト, 差分のリスト[(id, 名前, 項目, 変更前, 変更後)], 集計dict)
+    """
+    updates = []
+    diffs = []
+    stats = dict.fromkeys(STAT_KEYS, 0)
+    for row in rows:
+        values, row_diffs, flags = compute_changes(row)
+        if values:
+            updates.append(values)
+        for field, before, after in row_diffs:
+            diffs.append((row[0], row[1], field, before, after))
+        for flag in flags:
+            stats[flag] += 1
+    return updates, diffs, stats
+
+def iter_id_chunks(chunk_size=CHUNK_SIZE):
+    """
+    IDの範囲ごとにBizの対象カラムをタプルで読み込む（ORMオブジェクトは生成しない）
+
+    Yields:
+        list[tuple]: (id, name, name_hpb, address, phone, website_url) のリスト
+    """
+    min_id, max_id = db.session.query(func.min(Biz.id), func.max(Biz.id)).one()
+    if min_id is None:
+        return
+    for start in range(min_id, max_id + 1, chunk_size):
+        rows = db.session.query(
+            Biz.id, Biz.name, Biz.name_hpb, Biz.address, Biz.phone, Biz.website_url
+        ).filter(Biz.id >= start, Biz.id < start + chunk_size).order_by(Biz.id).all()
+        if rows:
+            yield [tuple(row) for row in rows]
+
+def iter_computed_chunks(chunks, workers=DEFAULT_WORKERS):
+    """
+    チャンクごとの変更計算結果を読み込み順に返す（workers > 0 ならプロセスプールで並列計算）
+
+    読み込み済みで未処理のチャンクは workers × 2 件までに抑える。
+    """
+    if not workers or workers <= 0:
+        for rows in chunks:
+            yield len(rows), compute_chunk(rows)
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for rows in chunks:
+            pending.append((len(rows), executor.submit(compute_chunk, rows)))
+            if len(pending) >= workers * 2:
+                count, future = pending.popleft()
+                yield count, future.result()
+        while pending:
+            count, future = pending.popleft()
+            yield count, future.result()
+
+class DiffReport:
+    """差分レポート（TSV）をチャンクごとにファイルへ書き出す"""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._file.write("biz_id\tname\tfield\tbefore\tafter\n")
+
+    def write(self, diffs):
+        for biz_id, name, field, before, after in diffs:
+            self._file.write('\t'.join(
+                _tsv_value(v) for v in (biz_id, name, field, before, after)
+            ) + '\n')
+        self.rows += len(diffs)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+def _tsv_value(value):
+    if value is None:
+        return ''
+    return str(value).replace('\t', ' ').replace('\n', ' ')
+
+def cleanse_all_data(dry_run=True, report_path=None, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE):
+    """
+    全データをクレンジング（IDの範囲ごとのチャンク単位でストリーミング処理）
+
+    - 行はタプルで読み込み、変更内容を計算してチャンクごとにバルクUPDATE・コミット
+    - 変更内容はレポートファイル（TSV）に逐次書き出す
+
     Args:
         dry_run: Trueの場合は変更せずレポートのみ
+        report_path: 差分レポートの出力先（dry_runで省略時は cleansing_diff_<日時>.tsv）
+        workers: 変更計算のプロセス数（0で単一プロセス）
+        chunk_size: 1チャンクあたりのID範囲
+
+    Returns:
+        dict: 集計結果
     """
-    
+    if dry_run and not report_path:
+        report_path = f"cleansing_diff_{datetime.now().strftime('%Y%m%d_%H%M%S')}.tsv"
+
     with app.app_context():
-        salons = Biz.query.all()
-        total = len(salons)
-        
-        stats = {
-            'phone_normalized': 0,
-            'phone_invalid': 0,
-            'address_cleaned': 0,
-            'former_name_extracted': 0,
-            'closed_flagged': 0,
-        }
-        
+        total = Biz.query.count()
+
+        stats = dict.fromkeys(STAT_KEYS, 0)
+        stats['updated'] = 0
+
         print(f"=== データクレンジング{'（DRY RUN）' if dry_run else ''} ===")
-        print(f"対象: {total}件")
+        print(f"対象: {total}件（チャンク: ID {chunk_size}件ごと / ワーカー: {workers}）")
+        if report_path:
+            print(f"差分レポート: {report_path}")
         print()
-        
-        for i, salon in enumerate(salons, 1):
-            changed = False
-            
-            # 1. 電話番号の正規化
-            if salon.phone:
-                normalized = normalize_phone_number(salon.phone)
-                if normalized and normalized != salon.phone:
-                    print(f"[{i}] {salon.name}")
-                    print(f"  電話: {salon.phone} → {normalized}")
-                    if not dry_run:
-                        salon.phone = normalized
-                    stats['phone_normalized'] += 1
-                    changed = True
-                elif not normalized:
-                    stats['phone_invalid'] += 1
-            
-            # 2. 住所から郵便番号削除
-            if salon.address and re.match(r'^〒?\d{3}-?\d{4}', salon.address):
-                cleaned = remove_zipcode_from_address(salon.address)
-                if cleaned != salon.address:
-                    if changed:
-                        print(f"  住所: {salon.address[:40]}... → {cleaned[:40]}...")
-                    if not dry_run:
-                        salon.address = cleaned
-                    stats['address_cleaned'] += 1
-                    changed = True
-            
-            # 3. 旧名称の抽出
-            if salon.name:
-                current, former = extract_former_name(salon.name)
-                if former:
-                    if not changed:
-                        print(f"[{i}] {salon.name}")
-                    print(f"  名前: {salon.name} → {current}")
-                    print(f"  旧名: {former}")
-                    if not dry_run:
-                        salon.name = current
-                        # former_name フィールドは後で追加
-                    stats['former_name_extracted'] += 1
-                    changed = True
-            
-            # 4. 閉院フラグ
-            if salon.name and ('閉院' in salon.name or '閉鎖' in salon.name):
-                if not changed:
-                    print(f"[{i}] {salon.name}")
-                print(f"  閉院フラグ: ON")
-                # is_closed フィールドは後で追加
-                stats['closed_flagged'] += 1
-                changed = True
-            
-            if changed and i % 100 == 0:
-                print(f"\n--- 進捗: {i}/{total} ---\n")
-        
+
+        report = DiffReport(report_path) if report_path else None
+        started = time.monotonic()
+        processed = 0
+        try:
+            for count, (updates, diffs, chunk_stats) in iter_computed_chunks(iter_id_chunks(chunk_size), workers):
+                if updates and not dry_run:
+                    db.session.execute(update(Biz), updates)
+                    db.session.commit()
+                if report:
+                    report.write(diffs)
+                for key, value in chunk_stats.items():
+                    stats[key] += value
+                stats['updated'] += len(updates)
+                processed += count
+                print(f"  進捗: {processed}/{total}件 / 変更 {stats['updated']}件 "
+                      f"({time.monotonic() - started:.1f}秒)", flush=True)
+        finally:
+            if report:
+                report.close()
+
         if not dry_run:
-            db.session.commit()
             print("\n✓ データベース更新完了")
-        
+
         print(f"\n=== クレンジング結果 ===")
+        print(f"{'変更対象' if dry_run else '更新'}: {stats['updated']}件")
         print(f"電話番号正規化: {stats['phone_normalized']}件")
         print(f"電話番号不正: {stats['phone_invalid']}件")
         print(f"住所クリーニング: {stats['address_cleaned']}件")
         print(f"旧名称抽出: {stats['former_name_extracted']}件")
         print(f"閉院フラグ: {stats['closed_flagged']}件")
+        if report:
+            print(f"差分レポート: {report.path}（{report.rows}行）")
+        return stats
 
 if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='ビジネスデータのクレンジング（デフォルトはDRY RUN）')
+    parser.add_argument('--execute', action='store_true', help='データベースを実際に更新')
+    parser.add_argument('--report', help='差分レポート（TSV）の出力先')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='変更計算のプロセス数（0で単一プロセス）')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='1チャンクあたりのID範囲')
+    args = parser.parse_args()
+
     # デフォルトはDRY RUN（変更なし）
-    dry_run = '--execute' not in sys.argv
-    
+    dry_run = not args.execute
+
     if dry_run:
         print("DRY RUNモード: データは変更されません")
         print("実行するには --execute オプションを付けてください")
         print()
-    
-    cleanse_all_data(dry_run=dry_run)
+
+    cleanse_all_data(dry_run=dry_run, report_path=args.report, workers=args.workers, chunk_size=args.chunk_size)
@@ -12,6 +12,7 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_stealth_driver
+from services.host_controller import get_host_controller
 
 def get_cid_from_place_id(place_id, api_key, driver):
     """
@@ -34,8 +35,11 @@ def get_cid_from_place_id(place_id, api_key, driver):
         
         # タイムアウトを30秒に設定
         driver.set_page_load_timeout(30)
-        driver.get(maps_url)
-        time.sleep(5)  # ページロード待機
+        # ホストごとの同時実行数・サーキットブレーカー（遮断中はクールダウンが終わるまで待つ）
+        with get_host_controller().request(maps_url) as slot:
+            driver.get(maps_url)
+            time.sleep(5)  # ページロード待機
+            slot.check(driver.page_source)
         
         # 現在のURLからCIDを抽出
         current_url = driver.current_url
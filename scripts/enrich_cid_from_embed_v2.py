@@ -20,6 +20,9 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_stealth_driver
+from services.browser_watchdog import BROWSER_RSS_LIMIT_MB, get_browser_watchdog
+from services.host_controller import TIMEOUT, get_host_controller
+from services.coverage_report import print_coverage
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -29,7 +32,6 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 MAX_RETRIES = 3  # リトライ回数
 PAGE_TIMEOUT = 15  # ページロードタイムアウト（秒）
 WAIT_TIMEOUT = 10  # 要素待機タイムアウト（秒）
-BROWSER_RESTART_INTERVAL = 15  # ブラウザ再起動間隔（件数）
 
 
 def is_driver_alive(driver):
@@ -57,12 +59,13 @@ def restart_driver(driver):
     """
     try:
         if driver:
+            get_browser_watchdog().forget(driver)
             driver.quit()
     except Exception as e:
         print(f"    警告: driver.quit()失敗 - {type(e).__name__}")
     
     time.sleep(2)
-    new_driver = get_stealth_driver()
+    new_driver = get_browser_watchdog().track(get_stealth_driver())
     print(f"    ✓ ブラウザ再起動完了")
     return new_driver
 
@@ -87,22 +90,28 @@ def get_cid_from_place_id(place_id, api_key, driver):
             # 通常のGoogleマップURL（APIキー不要）
             maps_url = f"https://www.google.com/maps/search/?api=1&query=Google&query_place_id={place_id}"
             
-            # タイムアウト設定
-            driver.set_page_load_timeout(PAGE_TIMEOUT)
+            # ページロード（ホストごとのサーキットブレーカーを通す。遮断中はクールダウンが終わるまで待ち、再試行で連打しない）
+            with get_host_controller().request(maps_url) as slot:
+                # タイムアウト設定
+                driver.set_page_load_timeout(PAGE_TIMEOUT)
             
-            # ページロード
-            driver.get(maps_url)
+                # ページロード
+                started = time.monotonic()
+                driver.get(maps_url)
             
-            # ページが完全にロードされるまで待機（明示的待機）
-            try:
-                WebDriverWait(driver, WAIT_TIMEOUT).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
-            except TimeoutException:
-                print(f"    警告: ページロード待機タイムアウト（試行 {attempt}/{MAX_RETRIES}）")
+                # ページが完全にロードされるまで待機（明示的待機）
+                try:
+                    WebDriverWait(driver, WAIT_TIMEOUT).until(
+                        lambda d: d.execute_script('return document.readyState') == 'complete'
+                    )
+                except TimeoutException:
+                    print(f"    警告: ページロード待機タイムアウト（試行 {attempt}/{MAX_RETRIES}）")
+                    slot.failed(TIMEOUT)
+                get_browser_watchdog().record_latency(driver, time.monotonic() - started)
             
-            # 追加：地図が完全にロードされるまで待機
-            time.sleep(5)  # JavaScriptの実行を待つ
+                # 追加：地図が完全にロードされるまで待機
+                time.sleep(5)  # JavaScriptの実行を待つ
+                slot.check(driver.page_source)
             
             # 現在のURLからCIDを抽出（複数回試行）
             for url_check_attempt in range(3):
@@ -222,7 +231,7 @@ def enrich_cid(limit=None, skip=0):
         print(f"改善点:")
         print(f"  - リトライ: 最大{MAX_RETRIES}回")
         print(f"  - ページタイムアウト: {PAGE_TIMEOUT}秒")
-        print(f"  - ブラウザ再起動: {BROWSER_RESTART_INTERVAL}件ごと")
+        print(f"  - ブラウザ再起動: メモリ・描画時間の監視で必要なときのみ（RSS上限 {BROWSER_RSS_LIMIT_MB}MB）")
         print(f"  - ヘルスチェック: 有効")
         print()
         
@@ -232,7 +241,7 @@ def enrich_cid(limit=None, skip=0):
         driver_restarts = 0
         
         try:
-            driver = get_stealth_driver()
+            driver = get_browser_watchdog().track(get_stealth_driver())
             
             for i, salon in enumerate(salons, 1):
                 actual_index = skip + i  # 実際の処理番号
@@ -246,9 +255,10 @@ def enrich_cid(limit=None, skip=0):
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
-                    # 定期的なブラウザ再起動（メモリリーク対策）
-                    if i > 1 and i % BROWSER_RESTART_INTERVAL == 0:
-                        print(f"  🔄 定期ブラウザ再起動中（{BROWSER_RESTART_INTERVAL}件ごと）...")
+                    # メモリ・描画時間の監視による再起動（前の1件の処理後の状態で判定）
+                    reason = get_browser_watchdog().check(driver) if i > 1 else None
+                    if reason:
+                        print(f"  🔄 ブラウザ再起動中（{reason}）...")
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
@@ -312,7 +322,7 @@ def enrich_cid(limit=None, skip=0):
                     except Exception as restart_error:
                         print(f"  ❌ ブラウザ再起動失敗: {type(restart_error).__name__}")
                         # 新しいドライバーを取得
-                        driver = get_stealth_driver()
+                        driver = get_browser_watchdog().track(get_stealth_driver())
                     
                     time.sleep(2)
                     continue
@@ -323,6 +333,7 @@ def enrich_cid(limit=None, skip=0):
         finally:
             if driver:
                 try:
+                    get_browser_watchdog().forget(driver)
                     driver.quit()
                     print("\n✓ ブラウザを正常終了しました")
                 except:
@@ -338,17 +349,12 @@ def enrich_cid(limit=None, skip=0):
         if (success + failed) > 0:
             print(f"成功率: {success/(success+failed)*100:.1f}%")
         print(f"ブラウザ再起動回数: {driver_restarts}回")
+        get_browser_watchdog().print_report()
         
-        # 統計情報
-        with_cid = Biz.query.filter(Biz.cid.isnot(None)).count()
-        with_place_id = Biz.query.filter(Biz.place_id.isnot(None)).count()
-        total_salons = Biz.query.count()
-        
-        print(f"\n現在の全体状況:")
-        print(f"  総クリニック数: {total_salons}件")
-        print(f"  Place ID有り: {with_place_id}件")
-        print(f"  CID有り: {with_cid}件")
-        print(f"  CID取得率: {with_cid/with_place_id*100:.1f}% ({with_cid}/{with_place_id})")
+        # 統計情報（集計クエリ1本）
+        overall = print_coverage(['place_id', 'cid'])['overall']
+        with_cid, with_place_id = overall['cid'], overall['place_id']
+        print(f"  CID取得率: {(with_cid/with_place_id*100) if with_place_id > 0 else 0:.1f}% ({with_cid}/{with_place_id})")
         print(f"  残りCID未取得: {with_place_id - with_cid}件")
         print(f"{'='*60}\n")
 
@@ -11,6 +11,7 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, ReviewSummary, get_gmap_place_details, get_cid_from_place_id, get_stealth_driver, get_website_from_gmap
+from services.places_client import BudgetDeferred
 
 def enrich_with_gmap(limit=None):
     """
@@ -112,6 +113,11 @@ def enrich_with_gmap(limit=None):
                     
                     time.sleep(1)  # API制限対策
                     
+                except BudgetDeferred as e:
+                    # 予算の上限に近いため、残りは次回に回す
+                    print(f"  Places APIの予算のため中断します: {e}")
+                    db.session.rollback()
+                    break
                 except Exception as e:
                     print(f"  エラー: {e}")
                     failed += 1
@@ -3,6 +3,7 @@
 Phase 1C-2: CIDからWebsite URLを取得
 CIDがあるがwebsite_urlがないクリニックを対象に、
 GoogleマップページからWebsite URLを取得
+1つのブラウザの複数のタブで並行して読み込む（--tabs、services.tabbed_worker）
 """
 import sys
 import os
@@ -14,6 +15,9 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_stealth_driver
+from services.browser_watchdog import BROWSER_RSS_LIMIT_MB, get_browser_watchdog
+from services.host_controller import get_host_controller
+from services.tabbed_worker import NOT_FOUND, TAB_COUNT, TabbedWorker
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -23,7 +27,6 @@ from selenium.common.exceptions import TimeoutException, NoSuchElementException,
 MAX_RETRIES = 3
 PAGE_TIMEOUT = 30
 WAIT_TIMEOUT = 15
-BROWSER_RESTART_INTERVAL = 20
 
 
 def is_driver_alive(driver):
@@ -40,16 +43,84 @@ def restart_driver(driver):
     """ブラウザを安全に再起動"""
     try:
         if driver:
+            get_browser_watchdog().forget(driver)
             driver.quit()
     except Exception as e:
         print(f"    警告: driver.quit()失敗 - {type(e).__name__}")
     
     time.sleep(2)
-    new_driver = get_stealth_driver()
+    new_driver = get_browser_watchdog().track(get_stealth_driver())
     print(f"    ✓ ブラウザ再起動完了")
     return new_driver
 
 
+def maps_url_for_cid(cid):
+    return f"https://maps.google.com/?cid={cid}"
+
+
+def find_website_link(driver):
+    """表示中のGoogleマップページの「ウェブサイト」リンク（見つからなければNone）"""
+    # パターン1: data-item-id="authority" のリンク
+    try:
+        element = driver.find_element(By.CSS_SELECTOR, 'a[data-item-id="authority"]')
+        website_url = element.get_attribute('href')
+        if website_url:
+            return website_url
+    except NoSuchElementException:
+        pass
+    
+    # パターン2: aria-label="ウェブサイト" のリンク
+    try:
+        element = driver.find_element(By.CSS_SELECTOR, 'a[aria-label*="ウェブサイト"]')
+        website_url = element.get_attribute('href')
+        if website_url:
+            return website_url
+    except NoSuchElementException:
+        pass
+    
+    # パターン3: テキストに「ウェブサイト」を含むリンク
+    elements = driver.find_elements(By.PARTIAL_LINK_TEXT, 'ウェブサイト')
+    if elements:
+        return elements[0].get_attribute('href') or None
+    return None
+
+
+def find_website_in_source(page_source):
+    """ページソースから公式サイトらしいURLを抽出（パターン4、見つからなければNone）"""
+    # "http" または "https" で始まるURLを探す（Googleマップ関連URLを除外）
+    url_pattern = r'https?://(?!maps\.google|maps\.gstatic|www\.google)[a-zA-Z0-9\-\.]+\.[a-zA-Z]{2,}(?:/[^\s"<>]*)?'
+    urls = re.findall(url_pattern, page_source)
+    
+    # クリニックの公式サイトらしいURLを選択
+    for url in urls:
+        # 除外パターン
+        if any(exclude in url.lower() for exclude in [
+            'facebook.com', 'twitter.com', 'instagram.com',
+            'youtube.com', 'google.com', 'gstatic.com',
+            'schema.org', 'w3.org'
+        ]):
+            continue
+        
+        # 最初に見つかった適切なURLを返す
+        return url
+    return None
+
+
+def check_website(driver):
+    """
+    タブごとの完了判定（services.tabbed_worker）
+
+    「ウェブサイト」リンクがあればそのURL、店舗情報（住所）の表示後にリンクがなければページソースから抽出し、
+    それでもなければ NOT_FOUND。表示前ならNone（読み込み中）。
+    """
+    website_url = find_website_link(driver)
+    if website_url:
+        return website_url
+    if not driver.find_elements(By.CSS_SELECTOR, '[data-item-id="address"]'):
+        return None
+    return find_website_in_source(driver.page_source) or NOT_FOUND
+
+
 def get_website_url_from_cid(cid, driver):
     """
     CIDからGoogleマップページを開いてWebsite URLを取得
@@ -67,65 +138,21 @@ def get_website_url_from_cid(cid, driver):
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             # GoogleマップURL（CID使用）
-            maps_url = f"https://maps.google.com/?cid={cid}"
-            
-            driver.set_page_load_timeout(PAGE_TIMEOUT)
-            driver.get(maps_url)
-            
-            # ページロード待機
-            time.sleep(5)
+            maps_url = maps_url_for_cid(cid)
             
-            # 「ウェブサイト」ボタンを探す（複数パターン）
-            website_url = None
+            # ページロード（ホストごとのサーキットブレーカーを通す。遮断中はクールダウンが終わるまで待ち、再試行で連打しない）
+            with get_host_controller().request(maps_url) as slot:
+                driver.set_page_load_timeout(PAGE_TIMEOUT)
+                started = time.monotonic()
+                driver.get(maps_url)
+                get_browser_watchdog().record_latency(driver, time.monotonic() - started)
             
-            # パターン1: data-item-id="authority" のリンク
-            try:
-                element = driver.find_element(By.CSS_SELECTOR, 'a[data-item-id="authority"]')
-                website_url = element.get_attribute('href')
-                if website_url:
-                    return website_url
-            except NoSuchElementException:
-                pass
+                # ページロード待機
+                time.sleep(5)
+                slot.check(driver.page_source)
             
-            # パターン2: aria-label="ウェブサイト" のリンク
-            try:
-                element = driver.find_element(By.CSS_SELECTOR, 'a[aria-label*="ウェブサイト"]')
-                website_url = element.get_attribute('href')
-                if website_url:
-                    return website_url
-            except NoSuchElementException:
-                pass
-            
-            # パターン3: テキストに「ウェブサイト」を含むリンク
-            try:
-                elements = driver.find_elements(By.PARTIAL_LINK_TEXT, 'ウェブサイト')
-                if elements:
-                    website_url = elements[0].get_attribute('href')
-                    if website_url:
-                        return website_url
-            except NoSuchElementException:
-                pass
-            
-            # パターン4: ページソースから直接抽出
-            page_source = driver.page_source
-            
-            # "http" または "https" で始まるURLを探す（Googleマップ関連URLを除外）
-            url_pattern = r'https?://(?!maps\.google|maps\.gstatic|www\.google)[a-zA-Z0-9\-\.]+\.[a-zA-Z]{2,}(?:/[^\s"<>]*)?'
-            urls = re.findall(url_pattern, page_source)
-            
-            # クリニックの公式サイトらしいURLを選択
-            for url in urls:
-                # 除外パターン
-                if any(exclude in url.lower() for exclude in [
-                    'facebook.com', 'twitter.com', 'instagram.com',
-                    'youtube.com', 'google.com', 'gstatic.com',
-                    'schema.org', 'w3.org'
-                ]):
-                    continue
-                
-                # 最初に見つかった適切なURLを返す
-                website_url = url
-                break
+            # 「ウェブサイト」ボタンを探す（複数パターン）、なければページソースから直接抽出
+            website_url = find_website_link(driver) or find_website_in_source(driver.page_source)
             
             if website_url:
                 return website_url
@@ -162,12 +189,55 @@ def get_website_url_from_cid(cid, driver):
     return None
 
 
-def enrich_website_url(limit=None):
+def enrich_website_url_tabbed(salons, tabs):
+    """
+    1つのブラウザの複数のタブでWebsite URLを並行して取得（services.tabbed_worker）
+
+    店舗情報が表示されたタブから順に結果を取り出し、期限切れのタブはページソースから探す。
+
+    Returns:
+        tuple: (成功件数, 失敗件数, ブラウザ再起動回数)
+    """
+    by_id = {salon.id: salon for salon in salons}
+    worker = TabbedWorker(get_stealth_driver, tabs=tabs, timeout=PAGE_TIMEOUT)
+    success, failed = 0, 0
+    try:
+        results = worker.run(
+            [(salon.id, maps_url_for_cid(salon.cid)) for salon in salons],
+            check=check_website,
+            fallback=lambda driver: find_website_link(driver) or find_website_in_source(driver.page_source),
+        )
+        for i, (biz_id, website_url) in enumerate(results, 1):
+            salon = by_id[biz_id]
+            print(f"\n[{i}/{len(salons)}] {salon.name}")
+            print(f"  CID: {salon.cid}")
+            if website_url:
+                try:
+                    salon.website_url = website_url
+                    db.session.commit()
+                    print(f"  ✅ Website URL: {website_url}")
+                    success += 1
+                except Exception as e:
+                    print(f"  ❌ DB更新エラー: {type(e).__name__}")
+                    db.session.rollback()
+                    failed += 1
+            else:
+                print(f"  ❌ Website URL取得失敗")
+                failed += 1
+    except KeyboardInterrupt:
+        print("\n\n⚠️  処理を中断しました")
+    finally:
+        worker.close()
+    return success, failed, worker.restarts
+
+
+def enrich_website_url(limit=None, tabs=TAB_COUNT):
     """
     CIDを持つがwebsite_urlがないクリニックにWebsite URLを追加
     
     Args:
         limit: 処理件数上限（Noneなら全件）
+        tabs: 1つのブラウザで並行して読み込むタブ数（1なら1件ずつ処理）
     """
     
     with app.app_context():
@@ -189,8 +259,9 @@ def enrich_website_url(limit=None):
         print(f"改善点:")
         print(f"  - リトライ: 最大{MAX_RETRIES}回")
         print(f"  - ページタイムアウト: {PAGE_TIMEOUT}秒")
-        print(f"  - ブラウザ再起動: {BROWSER_RESTART_INTERVAL}件ごと")
+        print(f"  - ブラウザ再起動: メモリ・描画時間の監視で必要なときのみ（RSS上限 {BROWSER_RSS_LIMIT_MB}MB）")
         print(f"  - 複数の抽出パターン実装")
+        print(f"  - 並行タブ数: {tabs}")
         print()
         
         driver = None
@@ -199,7 +270,11 @@ def enrich_website_url(limit=None):
         driver_restarts = 0
         
         try:
-            driver = get_stealth_driver()
+            if tabs > 1:
+                success, failed, driver_restarts = enrich_website_url_tabbed(salons, tabs)
+                return  # 最終統計は finally で表示
+            
+            driver = get_browser_watchdog().track(get_stealth_driver())
             
             for i, salon in enumerate(salons, 1):
                 print(f"\n[{i}/{total}] {salon.name}")
@@ -212,9 +287,10 @@ def enrich_website_url(limit=None):
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
-                    # 定期的なブラウザ再起動
-                    if i > 1 and i % BROWSER_RESTART_INTERVAL == 0:
-                        print(f"  🔄 定期ブラウザ再起動中（{BROWSER_RESTART_INTERVAL}件ごと）...")
+                    # メモリ・描画時間の監視による再起動（前の1件の処理後の状態で判定）
+                    reason = get_browser_watchdog().check(driver) if i > 1 else None
+                    if reason:
+                        print(f"  🔄 ブラウザ再起動中（{reason}）...")
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
@@ -273,7 +349,7 @@ def enrich_website_url(limit=None):
                         driver_restarts += 1
                     except Exception as restart_error:
                         print(f"  ❌ ブラウザ再起動失敗: {type(restart_error).__name__}")
-                        driver = get_stealth_driver()
+                        driver = get_browser_watchdog().track(get_stealth_driver())
                     
                     time.sleep(2)
                     continue
@@ -284,6 +360,7 @@ def enrich_website_url(limit=None):
         finally:
             if driver:
                 try:
+                    get_browser_watchdog().forget(driver)
                     driver.quit()
                     print("\n✓ ブラウザを正常終了しました")
                 except Exception as e:
@@ -300,6 +377,7 @@ def enrich_website_url(limit=None):
             print(f"失敗: {failed}件")
             print(f"成功率: {success_rate:.1f}%")
             print(f"ブラウザ再起動回数: {driver_restarts}回")
+            get_browser_watchdog().print_report()
             
             # 現在の全体状況
             total_salons = Biz.query.count()
@@ -316,10 +394,11 @@ def enrich_website_url(limit=None):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='CIDからWebsite URLを取得')
     parser.add_argument('--test', action='store_true', help='テストモード（10件のみ）')
+    parser.add_argument('--tabs', type=int, default=TAB_COUNT, help='1つのブラウザで並行して読み込むタブ数（1なら1件ずつ処理）')
     args = parser.parse_args()
     
     if args.test:
         print("🧪 テストモード: 10件のみ処理")
-        enrich_website_url(limit=10)
+        enrich_website_url(limit=10, tabs=args.tabs)
     else:
-        enrich_website_url()
+        enrich_website_url(tabs=args.tabs)
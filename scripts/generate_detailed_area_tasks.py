@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app, db
 from models import ScrapingTask, Area, Category
+from services.address_parser import get_address_parser
 
 def generate_detailed_area_tasks():
     """詳細エリアごとのGoogle Mapタスクを生成"""
@@ -57,22 +58,20 @@ def generate_detailed_area_tasks():
             print("\n⚠ エリアデータが見つかりません")
             return
         
-        # 23区のエリアのみをフィルタリング
+        # 23区のエリアのみをフィルタリング（エリア名を市区町村・町名に分解して判定）
+        parser = get_address_parser()
         filtered_areas = []
+        ward_counts = {}
         for area in all_areas:
-            if any(area.city.startswith(ward) for ward in tokyo_wards):
+            ward, _, _ = parser.split_area(area.prefecture, area.city)
+            if ward in tokyo_wards:
                 filtered_areas.append(area)
+                ward_counts[ward] = ward_counts.get(ward, 0) + 1
         
         print(f"\n対象エリア数: {len(filtered_areas)}件")
         
         # 区ごとの内訳を表示
         print("\n【区ごとのタスク数】")
-        ward_counts = {}
-        for area in filtered_areas:
-            for ward in tokyo_wards:
-                if area.city.startswith(ward):
-                    ward_counts[ward] = ward_counts.get(ward, 0) + 1
-                    break
         
         for ward in sorted(ward_counts.keys(), key=lambda x: ward_counts[x], reverse=True):
             print(f"  {ward}: {ward_counts[ward]}件")
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+HTMLスナップショットの管理
+- 保存状況（件数・URL数・圧縮前後の容量・取得元ごとの件数）の表示
+- 保持ポリシー（URLごとの世代数・容量上限）の適用
+- HTMLファイルとして書き出し（scripts/benchmark_contact_extraction.py 等のオフライン検証用）
+
+使い方:
+    python scripts/manage_snapshots.py                       # 保存状況を表示
+    python scripts/manage_snapshots.py --prune --max-mb 1024
+    python scripts/manage_snapshots.py --export pages/ --source contact --limit 500
+    python scripts/manage_snapshots.py --list --source hpb_details --limit 20
+"""
+import sys
+import os
+import hashlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.snapshot_store import get_snapshot_store
+
+
+def print_stats(store):
+    stats = store.stats()
+    ratio = stats['stored_bytes'] / stats['raw_bytes'] * 100 if stats['raw_bytes'] else 0
+    print(f"保存先: {store.root}")
+    print(f"  スナップショット: {stats['snapshots']}件（URL {stats['urls']}件）")
+    print(f"  本体ファイル: {stats['blobs']}件（内容の重複を除外）")
+    print(f"  容量: {stats['raw_bytes'] / 1024 / 1024:.1f} MB → {stats['stored_bytes'] / 1024 / 1024:.1f} MB"
+          f"（{ratio:.1f}%、上限 {store.max_bytes / 1024 / 1024:.0f} MB）")
+    for source, count in stats['by_source'].items():
+        print(f"    {source or '(不明)'}: {count}件")
+
+
+def export_snapshots(store, directory, source=None, limit=None):
+    """URLごとの最新のスナップショットをHTMLファイルとして書き出す"""
+    os.makedirs(directory, exist_ok=True)
+    count = 0
+    for snapshot in store.iter_snapshots(source=source, limit=limit):
+        html = snapshot.html
+        if html is None:
+            continue
+        name = hashlib.sha1(snapshot.url.encode('utf-8')).hexdigest()[:16]
+        with open(os.path.join(directory, f"{snapshot.source or 'unknown'}_{name}.html"), 'w', encoding='utf-8') as f:
+            f.write(html)
+        count += 1
+    print(f"{count}件を書き出しました: {directory}")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HTMLスナップショットの管理')
+    parser.add_argument('--prune', action='store_true', help='保持ポリシーを適用して古いスナップショットを削除')
+    parser.add_argument('--max-mb', type=int, help='--prune 時の容量上限（MB、省略時は設定値）')
+    parser.add_argument('--keep', type=int, help='--prune 時にURLごとに残す世代数（省略時は設定値）')
+    parser.add_argument('--export', metavar='DIR', help='URLごとの最新のHTMLを書き出すディレクトリ')
+    parser.add_argument('--list', action='store_true', help='URLごとの最新のスナップショットを一覧表示')
+    parser.add_argument('--source', help='取得元で絞り込む（hpb_list / hpb_details / rejob / contact など）')
+    parser.add_argument('--limit', type=int, help='--export / --list の最大件数')
+    args = parser.parse_args()
+
+    store = get_snapshot_store()
+
+    if args.prune:
+        max_bytes = args.max_mb * 1024 * 1024 if args.max_mb else None
+        removed = store.prune(max_bytes=max_bytes, keep_per_url=args.keep)
+        print(f"削除: スナップショット {removed['snapshots']}件、本体ファイル {removed['blobs']}件")
+
+    if args.list:
+        for snapshot in store.iter_snapshots(source=args.source, limit=args.limit):
+            print(f"  {snapshot.fetched_at:%Y-%m-%d %H:%M:%S}  {snapshot.source or '-':<12} {snapshot.url}")
+
+    if args.export:
+        export_snapshots(store, args.export, source=args.source, limit=args.limit)
+
+    print_stats(store)
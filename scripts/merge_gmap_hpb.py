@@ -24,52 +24,25 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from app import app, db
-from models import Biz
-from difflib import SequenceMatcher
-import re
+from models import Biz, MatchCandidate
+# 正規化・類似度計算は services.normalization / merge_helpers に集約
+from merge_helpers import CandidateIndex, move_hpb_enrichment
 
-def normalize_address(address):
-    """住所を正規化（全角→半角、空白削除など）"""
-    if not address:
-        return ""
-    
-    # 全角数字を半角に
-    address = address.translate(str.maketrans('０１２３４５６７８９', '0123456789'))
-    # 全角ハイフンを半角に
-    address = address.replace('－', '-').replace('ー', '-')
-    # 空白削除
-    address = address.replace(' ', '').replace('　', '')
-    # 「丁目」「番地」などの表記揺れを統一
-    address = re.sub(r'[−‐－―ー]', '-', address)
-    
-    return address
-
-def normalize_name(name):
-    """クリニック名を正規化"""
-    if not name:
-        return ""
-    
-    # 空白削除
-    name = name.replace(' ', '').replace('　', '')
-    # カタカナの表記揺れを統一
-    name = name.replace('ヴ', 'ブ').replace('ヰ', 'イ').replace('ヱ', 'エ')
-    # 全角英数字を半角に
-    name = name.translate(str.maketrans(
-        'ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ',
-        'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz'
-    ))
-    # 小文字に統一
-    name = name.lower()
-    
-    return name
+def build_gmap_index():
+    """
+    マージ候補（hotpepper_urlがNullのサロン）のブロッキングインデックスを構築
 
-def calculate_similarity(str1, str2):
-    """2つの文字列の類似度を計算（0.0〜1.0）"""
-    if not str1 or not str2:
-        return 0.0
-    return SequenceMatcher(None, str1, str2).ratio()
+    Returns:
+        CandidateIndex
+    """
+    index = CandidateIndex()
+    index.load(Biz.query.filter(
+        Biz.hotpepper_url.is_(None),
+        Biz.address.isnot(None)
+    ), Biz)
+    return index
 
-def find_matching_salon(hpb_salon, threshold_address=0.85, threshold_name=0.70):
+def find_matching_salon(hpb_salon, threshold_address=0.85, threshold_name=0.70, index=None):
     """
     HPBのサロンデータに対して、既存のGmapサロンから
     マッチする可能性が高いものを探す
@@ -78,46 +51,43 @@ def find_matching_salon(hpb_salon, threshold_address=0.85, threshold_name=0.70):
         hpb_salon: HPBから取得したサロン情報（dict or Biz object）
         threshold_address: 住所の類似度閾値
         threshold_name: 名前の類似度閾値
+        index: build_gmap_index()で構築したインデックス（省略時は毎回構築）
     
     Returns:
         マッチしたSalonオブジェクト、またはNone
     """
-    # HPBサロンの情報を正規化
-    hpb_address = normalize_address(hpb_salon.get('address', '') if isinstance(hpb_salon, dict) else hpb_salon.address or '')
-    hpb_name = normalize_name(hpb_salon.get('name_hpb', '') if isinstance(hpb_salon, dict) else hpb_salon.name_hpb or '')
+    if isinstance(hpb_salon, dict):
+        address = hpb_salon.get('address', '')
+        name = hpb_salon.get('name_hpb', '')
+        phone = hpb_salon.get('phone')
+        exclude_id = None
+    else:
+        address = hpb_salon.address or ''
+        name = hpb_salon.name_hpb or ''
+        phone = hpb_salon.phone
+        exclude_id = hpb_salon.id
     
-    if not hpb_address and not hpb_name:
+    if not address and not name:
         return None
     
-    # Google Mapsから取得済みのサロンを検索
-    # hotpepper_urlがNullのものを対象（まだマージされていないもの）
-    candidates = Biz.query.filter(
-        Biz.hotpepper_url.is_(None),
-        Biz.address.isnot(None)
-    ).all()
+    if index is None:
+        index = build_gmap_index()
     
-    best_match = None
+    # 郵便番号・丁目・電話番号が同じブロックの候補だけをスコアリング
+    best_id = None
     best_score = 0.0
     
-    for candidate in candidates:
-        # 住所の類似度
-        candidate_address = normalize_address(candidate.address or '')
-        address_similarity = calculate_similarity(hpb_address, candidate_address)
-        
-        # 名前の類似度
-        candidate_name = normalize_name(candidate.name or '')
-        name_similarity = calculate_similarity(hpb_name, candidate_name)
-        
-        # 総合スコア（住所を重視: 70%、名前: 30%）
-        total_score = address_similarity * 0.7 + name_similarity * 0.3
+    for biz_id, address_similarity, name_similarity, phone_match in index.score_candidates(name, address, phone, exclude_id):
+        # 総合スコア（住所を重視: 70%、名前: 30%）。電話番号一致は確定扱い
+        total_score = 1.0 if phone_match else address_similarity * 0.7 + name_similarity * 0.3
         
         # 閾値チェック
-        if address_similarity >= threshold_address or name_similarity >= threshold_name:
+        if phone_match or address_similarity >= threshold_address or name_similarity >= threshold_name:
             if total_score > best_score:
                 best_score = total_score
-                best_match = candidate
+                best_id = biz_id
     
-    return best_match
+    return db.session.get(Biz, best_id) if best_id else None
 
 def merge_salon_data(gmap_salon, hpb_data):
     """
@@ -164,28 +134,34 @@ def auto_merge_hpb_with_gmap():
         
         print(f"\nHPBのみのサロン: {len(hpb_only_salons)}件")
         
+        index = build_gmap_index()
+        print(f"マージ候補インデックス: {len(index)}件")
+        
         matched_count = 0
         
         for i, hpb_salon in enumerate(hpb_only_salons, 1):
             print(f"\n({i}/{len(hpb_only_salons)}) {hpb_salon.name_hpb} をマッチング中...")
             
             # マッチング
-            gmap_match = find_matching_salon(hpb_salon)
+            gmap_match = find_matching_salon(hpb_salon, index=index)
             
             if gmap_match:
                 print(f"  ✓ マッチ: {gmap_match.name} (住所: {gmap_match.address})")
                 
-                # マージ
-                success = merge_salon_data(gmap_match, {
+                hpb_data = {
                     'name_hpb': hpb_salon.name_hpb,
                     'hotpepper_url': hpb_salon.hotpepper_url
-                })
+                }
+                # HPBのみのレコードは詳細情報を移してから削除し、hotpepper_urlの一意制約に抵触しないよう
+                # 削除を反映してからマージ（マージ失敗時はmerge_salon_data内のrollbackで移動・削除も取り消される）
+                move_hpb_enrichment(db, hpb_salon, gmap_match)
+                db.session.delete(hpb_salon)
+                db.session.flush()
+                success = merge_salon_data(gmap_match, hpb_data)
                 
                 if success:
                     matched_count += 1
-                    # HPBのみのレコードは削除（マージ済み）
-                    db.session.delete(hpb_salon)
-                    db.session.commit()
+                    index.remove(gmap_match.id)
             else:
                 print(f"  - マッチなし")
         
@@ -193,5 +169,103 @@ def auto_merge_hpb_with_gmap():
         print(f"自動マージ完了: {matched_count}件をマージ")
         print("=" * 70)
 
+def apply_match_candidates(min_score=0.85, dry_run=False):
+    """
+    一括名寄せ（services.entity_resolution）で保存した候補ペアをスコア順に取り込む
+
+    Args:
+        min_score: 自動マージする最低スコア（これ未満は手動確認用に残す）
+        dry_run: Trueなら候補を表示するだけでマージしない
+    """
+    candidates = MatchCandidate.query.filter(
+        MatchCandidate.mode == 'hpb_gmap',
+        MatchCandidate.status == 'pending',
+        MatchCandidate.score >= min_score
+    ).order_by(MatchCandidate.score.desc(), MatchCandidate.id).all()
+    
+    print(f"\n取り込み対象の候補ペア: {len(candidates)}件（スコア{min_score}以上）")
+    
+    used_ids = set()
+    matched_count = 0
+    
+    for candidate in candidates:
+        # 1件のサロンは1回だけマージ（スコアの高いペアを優先）
+        if candidate.left_id in used_ids or candidate.right_id in used_ids:
+            continue
+        
+        hpb_salon = db.session.get(Biz, candidate.left_id)
+        gmap_salon = db.session.get(Biz, candidate.right_id)
+        if not hpb_salon or not gmap_salon or gmap_salon.hotpepper_url:
+            candidate.status = 'rejected'
+            continue
+        
+        print(f"  ✓ {hpb_salon.name_hpb} ⇔ {gmap_salon.name} (スコア: {candidate.score:.2f})")
+        if dry_run:
+            continue
+        
+        hpb_data = {
+            'name_hpb': hpb_salon.name_hpb,
+            'hotpepper_url': hpb_salon.hotpepper_url
+        }
+        # hotpepper_urlの一意制約に抵触しないよう、HPBのみのレコードを先に削除してからマージ
+        # （詳細情報はGmapサロンに移す。マージ失敗時はmerge_salon_data内のrollbackで移動・削除も取り消される）
+        move_hpb_enrichment(db, hpb_salon, gmap_salon)
+        db.session.delete(hpb_salon)
+        candidate.status = 'merged'
+        db.session.flush()
+        if merge_salon_data(gmap_salon, hpb_data):
+            used_ids.update((candidate.left_id, candidate.right_id))
+            matched_count += 1
+    
+    if not dry_run:
+        db.session.commit()
+    print(f"候補ペアから{matched_count}件をマージ")
+    return matched_count
+
+def batch_merge_hpb_with_gmap(min_score=0.85, dry_run=False, csv_path=None):
+    """
+    TF-IDF + 疎行列演算による一括名寄せを実行し、候補ペアを取り込む
+    """
+    from services.entity_resolution import run_batch_matching
+    
+    with app.app_context():
+        MatchCandidate.__table__.create(bind=db.engine, checkfirst=True)
+        print("=" * 70)
+        print("HPB ⇔ Gmap 一括名寄せを開始")
+        print("=" * 70)
+        run_batch_matching(db, Biz, MatchCandidate, mode='hpb_gmap', csv_path=csv_path)
+        apply_match_candidates(min_score=min_score, dry_run=dry_run)
+
+def detect_duplicates(source, csv_path=None):
+    """
+    同一ソース内の重複候補を検出して保存（マージは行わない）
+    
+    Args:
+        source: 'gmap' or 'hpb'
+    """
+    from services.entity_resolution import run_batch_matching
+    
+    with app.app_context():
+        MatchCandidate.__table__.create(bind=db.engine, checkfirst=True)
+        pairs = run_batch_matching(db, Biz, MatchCandidate, mode=f"dedupe_{source}", csv_path=csv_path)
+        for pair in pairs[:20]:
+            print(f"  {pair['left_id']} ⇔ {pair['right_id']} (スコア: {pair['score']:.2f})")
+
 if __name__ == '__main__':
-    auto_merge_hpb_with_gmap()
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='GmapとHPBのデータをマージ')
+    parser.add_argument('--batch', action='store_true', help='TF-IDFによる一括名寄せで候補ペアを作成して取り込む')
+    parser.add_argument('--dedupe', choices=['gmap', 'hpb'], help='同一ソース内の重複候補を検出')
+    parser.add_argument('--min-score', type=float, default=0.85, help='自動マージする最低スコア（--batch時）')
+    parser.add_argument('--dry-run', action='store_true', help='マージせず候補を表示するだけ')
+    parser.add_argument('--csv', help='候補ペアをCSVにも書き出す')
+    
+    args = parser.parse_args()
+    
+    if args.dedupe:
+        detect_duplicates(args.dedupe, csv_path=args.csv)
+    elif args.batch:
+        batch_merge_hpb_with_gmap(min_score=args.min_score, dry_run=args.dry_run, csv_path=args.csv)
+    else:
+        auto_merge_hpb_with_gmap()
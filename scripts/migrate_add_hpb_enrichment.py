@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+BizテーブルにHPB詳細情報の取得状況カラム（hpb_enrichment）を追加するマイグレーションスクリプト
+
+- hpb_enrichment カラムとインデックスを追加（既存レコードは NULL = 未取得）
+- 以降は scrape_salon_list が一覧のカードの項目を保存した時に partial、
+  run_hpb_details_updater.py が詳細ページの全項目を取得した時に full を設定する
+
+実行前に必ずバックアップを取ってください！
+"""
+import sys
+import os
+import sqlite3
+from datetime import datetime
+
+DB_PATH = '/var/www/salon_app/instance/biz_data.db'  # VPS用
+# DB_PATH = os.path.join(os.path.dirname(__file__), '../instance/biz_data.db')  # ローカル用
+
+def backup_database():
+    """データベースをバックアップ"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = DB_PATH.replace('.db', f'_backup_{timestamp}.db')
+
+    print(f"=== データベースバックアップ ===")
+    print(f"元: {DB_PATH}")
+    print(f"先: {backup_path}")
+
+    import shutil
+    shutil.copy2(DB_PATH, backup_path)
+    print(f"✓ バックアップ完了\n")
+
+    return backup_path
+
+def add_column(conn):
+    """カラムとインデックスを追加（既にある場合はスキップ）"""
+    cursor = conn.cursor()
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(biz);")}
+
+    print("=== カラム追加 ===")
+    if 'hpb_enrichment' in existing:
+        print("  - hpb_enrichment: 既に存在")
+    else:
+        cursor.execute("ALTER TABLE biz ADD COLUMN hpb_enrichment VARCHAR(20);")
+        print("  ✓ hpb_enrichment")
+    cursor.execute("CREATE INDEX IF NOT EXISTS ix_biz_hpb_enrichment ON biz (hpb_enrichment);")
+
+    conn.commit()
+    print()
+
+def main():
+    global DB_PATH
+    import argparse
+
+    parser = argparse.ArgumentParser(description='BizにHPB詳細情報の取得状況カラムを追加')
+    parser.add_argument('--db', default=DB_PATH, help='データベースのパス')
+    parser.add_argument('--yes', action='store_true', help='確認をスキップ')
+    args = parser.parse_args()
+
+    DB_PATH = args.db
+
+    print("=" * 60)
+    print("HPB詳細情報の取得状況 マイグレーション")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(DB_PATH):
+        print(f"エラー: データベースが見つかりません: {DB_PATH}")
+        sys.exit(1)
+
+    if not args.yes:
+        response = input("⚠️ このマイグレーションはデータベースを直接変更します。\n実行前にバックアップを取ります。続行しますか？ (yes/no): ")
+        if response.lower() != 'yes':
+            print("キャンセルしました")
+            sys.exit(0)
+
+    backup_path = backup_database()
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        add_column(conn)
+        conn.close()
+        print("=" * 60)
+        print("マイグレーション完了！")
+        print(f"バックアップ: {backup_path}")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ エラー発生: {e}")
+        print(f"バックアップから復元してください: {backup_path}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
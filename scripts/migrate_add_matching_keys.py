@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Bizテーブルにマッチング用の正規化キーカラムを追加するマイグレーションスクリプト
+
+- name_key / address_key / phone_digits / website_domain カラムとインデックスを追加
+- 既存レコードのキーを services.normalization で計算して埋める（チャンク単位）
+
+以降の書き込みでは models.py のイベントでキーが自動更新される。
+実行前に必ずバックアップを取ってください！
+"""
+import sys
+import os
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.normalization import matching_keys
+
+DB_PATH = '/var/www/salon_app/instance/biz_data.db'  # VPS用
+# DB_PATH = os.path.join(os.path.dirname(__file__), '../instance/biz_data.db')  # ローカル用
+
+# 設定
+CHUNK_SIZE = 5000  # 1回のUPDATEで処理する件数
+
+KEY_COLUMNS = [
+    ('name_key', 'VARCHAR(255)'),
+    ('address_key', 'VARCHAR(255)'),
+    ('phone_digits', 'VARCHAR(20)'),
+    ('website_domain', 'VARCHAR(255)'),
+]
+
+def backup_database():
+    """データベースをバックアップ"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = DB_PATH.replace('.db', f'_backup_{timestamp}.db')
+
+    print(f"=== データベースバックアップ ===")
+    print(f"元: {DB_PATH}")
+    print(f"先: {backup_path}")
+
+    import shutil
+    shutil.copy2(DB_PATH, backup_path)
+    print(f"✓ バックアップ完了\n")
+
+    return backup_path
+
+def add_columns(conn):
+    """カラムとインデックスを追加（既にある場合はスキップ）"""
+    cursor = conn.cursor()
+    existing = {row[1] for row in cursor.execute("PRAGMA table_info(biz);")}
+
+    print("=== カラム追加 ===")
+    for column, column_type in KEY_COLUMNS:
+        if column in existing:
+            print(f"  - {column}: 既に存在")
+        else:
+            cursor.execute(f"ALTER TABLE biz ADD COLUMN {column} {column_type};")
+            print(f"  ✓ {column}")
+        cursor.execute(f"CREATE INDEX IF NOT EXISTS ix_biz_{column} ON biz ({column});")
+
+    conn.commit()
+    print()
+
+def backfill_keys(conn, only_missing=True):
+    """
+    既存レコードの正規化キーを計算して保存
+
+    Args:
+        conn: SQLite接続
+        only_missing: Trueならキー未設定のレコードのみ（Falseで全件再計算）
+
+    Returns:
+        int: 更新件数
+    """
+    print("=== 正規化キーの埋め込み ===")
+    condition = "WHERE name_key IS NULL AND address_key IS NULL" if only_missing else ""
+    total = conn.execute(f"SELECT COUNT(*) FROM biz {condition};").fetchone()[0]
+    print(f"対象: {total}件")
+
+    updated = 0
+    last_id = 0
+    while True:
+        # IDの範囲で読み進める（OFFSETは後半ほど遅くなるため使わない）
+        where = f"{condition} AND id > ?" if condition else "WHERE id > ?"
+        rows = conn.execute(
+            f"SELECT id, name, name_hpb, address, phone, website_url FROM biz {where} ORDER BY id LIMIT ?;",
+            (last_id, CHUNK_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+
+        params = []
+        for biz_id, name, name_hpb, address, phone, website_url in rows:
+            keys = matching_keys(name, name_hpb, address, phone, website_url)
+            params.append((keys['name_key'], keys['address_key'], keys['phone_digits'],
+                           keys['website_domain'], biz_id))
+        conn.executemany(
+            "UPDATE biz SET name_key = ?, address_key = ?, phone_digits = ?, website_domain = ? WHERE id = ?;",
+            params
+        )
+        conn.commit()
+
+        updated += len(rows)
+        last_id = rows[-1][0]
+        print(f"  {updated}/{total}件", flush=True)
+
+    print(f"✓ {updated}件更新\n")
+    return updated
+
+def main():
+    global DB_PATH
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Bizにマッチング用正規化キーを追加')
+    parser.add_argument('--db', default=DB_PATH, help='データベースのパス')
+    parser.add_argument('--recompute', action='store_true', help='全件のキーを再計算（正規化ロジック変更時）')
+    parser.add_argument('--yes', action='store_true', help='確認をスキップ')
+    args = parser.parse_args()
+
+    DB_PATH = args.db
+
+    print("=" * 60)
+    print("マッチング用正規化キー マイグレーション")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(DB_PATH):
+        print(f"エラー: データベースが見つかりません: {DB_PATH}")
+        sys.exit(1)
+
+    if not args.yes:
+        response = input("⚠️ このマイグレーションはデータベースを直接変更します。\n実行前にバックアップを取ります。続行しますか？ (yes/no): ")
+        if response.lower() != 'yes':
+            print("キャンセルしました")
+            sys.exit(0)
+
+    backup_path = backup_database()
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        add_columns(conn)
+        backfill_keys(conn, only_missing=not args.recompute)
+        conn.close()
+        print("=" * 60)
+        print("マイグレーション完了！")
+        print(f"バックアップ: {backup_path}")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ エラー発生: {e}")
+        print(f"バックアップから復元してください: {backup_path}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
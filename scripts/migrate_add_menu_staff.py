@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+HPBのメニュー・スタッフのテーブル（menu / staff）を作成するマイグレーションスクリプト
+
+- menu / staff テーブルと biz_id のインデックスを作成（既にある場合はスキップ）
+- 以降は run_hpb_details_updater.py / app.get_hpb_details が詳細ページから取得した
+  メニュー・スタッフをサロンごとに置き換えて保存する（services/hpb_extractors.save_details）
+
+実行前に必ずバックアップを取ってください！
+"""
+import sys
+import os
+import sqlite3
+from datetime import datetime
+
+DB_PATH = '/var/www/salon_app/instance/biz_data.db'  # VPS用
+# DB_PATH = os.path.join(os.path.dirname(__file__), '../instance/biz_data.db')  # ローカル用
+
+def backup_database():
+    """データベースをバックアップ"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = DB_PATH.replace('.db', f'_backup_{timestamp}.db')
+
+    print(f"=== データベースバックアップ ===")
+    print(f"元: {DB_PATH}")
+    print(f"先: {backup_path}")
+
+    import shutil
+    shutil.copy2(DB_PATH, backup_path)
+    print(f"✓ バックアップ完了\n")
+
+    return backup_path
+
+TABLES = {
+    'menu': (
+        """CREATE TABLE menu (
+            id INTEGER NOT NULL PRIMARY KEY,
+            biz_id INTEGER NOT NULL REFERENCES biz (id),
+            name VARCHAR(255) NOT NULL,
+            price INTEGER,
+            category VARCHAR(100)
+        );""",
+        "CREATE INDEX IF NOT EXISTS ix_menu_biz_id ON menu (biz_id);",
+    ),
+    'staff': (
+        """CREATE TABLE staff (
+            id INTEGER NOT NULL PRIMARY KEY,
+            biz_id INTEGER NOT NULL REFERENCES biz (id),
+            name VARCHAR(255) NOT NULL,
+            position VARCHAR(100)
+        );""",
+        "CREATE INDEX IF NOT EXISTS ix_staff_biz_id ON staff (biz_id);",
+    ),
+}
+
+def create_tables(conn):
+    """テーブルとインデックスを作成（既にある場合はスキップ）"""
+    cursor = conn.cursor()
+    existing = {row[0] for row in cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table';")}
+
+    print("=== テーブル作成 ===")
+    for table, (create_table, create_index) in TABLES.items():
+        if table in existing:
+            print(f"  - {table}: 既に存在")
+        else:
+            cursor.execute(create_table)
+            print(f"  ✓ {table}")
+        cursor.execute(create_index)
+
+    conn.commit()
+    print()
+
+def main():
+    global DB_PATH
+    import argparse
+
+    parser = argparse.ArgumentParser(description='HPBのメニュー・スタッフのテーブルを作成')
+    parser.add_argument('--db', default=DB_PATH, help='データベースのパス')
+    parser.add_argument('--yes', action='store_true', help='確認をスキップ')
+    args = parser.parse_args()
+
+    DB_PATH = args.db
+
+    print("=" * 60)
+    print("HPBメニュー・スタッフ マイグレーション")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(DB_PATH):
+        print(f"エラー: データベースが見つかりません: {DB_PATH}")
+        sys.exit(1)
+
+    if not args.yes:
+        response = input("⚠️ このマイグレーションはデータベースを直接変更します。\n実行前にバックアップを取ります。続行しますか？ (yes/no): ")
+        if response.lower() != 'yes':
+            print("キャンセルしました")
+            sys.exit(0)
+
+    backup_path = backup_database()
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        create_tables(conn)
+        conn.close()
+        print("=" * 60)
+        print("マイグレーション完了！")
+        print(f"バックアップ: {backup_path}")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ エラー発生: {e}")
+        print(f"バックアップから復元してください: {backup_path}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+CompanyAnalysis.company_domain を登録可能ドメインに付け替えるマイグレーションスクリプト
+
+以前は www. を除いたホスト名（例: tokyo.example.co.jp）で保存していたため、登録可能ドメイン
+（例: example.co.jp）で検索する現在のAPI・カバレッジ集計から見つからない。
+- 従来のキーの行を登録可能ドメインに付け替える
+- 同じ登録可能ドメインに複数の行がある場合は、分析日時が最も新しい行を残して他を削除
+
+実行前に必ずバックアップを取ってください！
+"""
+import sys
+import os
+import sqlite3
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.normalization import registrable_domain
+
+DB_PATH = '/var/www/salon_app/instance/biz_data.db'  # VPS用
+# DB_PATH = os.path.join(os.path.dirname(__file__), '../instance/biz_data.db')  # ローカル用
+
+def backup_database():
+    """データベースをバックアップ"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    backup_path = DB_PATH.replace('.db', f'_backup_{timestamp}.db')
+
+    print(f"=== データベースバックアップ ===")
+    print(f"元: {DB_PATH}")
+    print(f"先: {backup_path}")
+
+    import shutil
+    shutil.copy2(DB_PATH, backup_path)
+    print(f"✓ バックアップ完了\n")
+
+    return backup_path
+
+def rekey_domains(conn):
+    """従来のキーの行を登録可能ドメインに付け替え（重複は最新の分析を残す）"""
+    cursor = conn.cursor()
+    rows = cursor.execute(
+        "SELECT id, company_domain FROM company_analysis ORDER BY analyzed_at DESC, id DESC;"
+    ).fetchall()
+
+    keep = {}  # 登録可能ドメイン -> 残す行のID
+    renamed = []
+    deleted = []
+    for row_id, domain in rows:
+        key = registrable_domain(f"https://{domain}") or domain
+        if key in keep:
+            deleted.append(row_id)
+            continue
+        keep[key] = row_id
+        if key != domain:
+            renamed.append((key, row_id))
+
+    print("=== キーの付け替え ===")
+    # 付け替え先のキーを持つ古い行を先に削除（company_domain は一意）
+    cursor.executemany("DELETE FROM company_analysis WHERE id = ?;", [(row_id,) for row_id in deleted])
+    cursor.executemany("UPDATE company_analysis SET company_domain = ? WHERE id = ?;", renamed)
+    conn.commit()
+    print(f"  ✓ 付け替え: {len(renamed)}件")
+    print(f"  ✓ 重複の削除: {len(deleted)}件")
+    print()
+
+def main():
+    global DB_PATH
+    import argparse
+
+    parser = argparse.ArgumentParser(description='CompanyAnalysisのキーを登録可能ドメインに付け替え')
+    parser.add_argument('--db', default=DB_PATH, help='データベースのパス')
+    parser.add_argument('--yes', action='store_true', help='確認をスキップ')
+    args = parser.parse_args()
+
+    DB_PATH = args.db
+
+    print("=" * 60)
+    print("企業分析のドメインキー マイグレーション")
+    print("=" * 60)
+    print()
+
+    if not os.path.exists(DB_PATH):
+        print(f"エラー: データベースが見つかりません: {DB_PATH}")
+        sys.exit(1)
+
+    if not args.yes:
+        response = input("⚠️ このマイグレーションはデータベースを直接変更します。\n実行前にバックアップを取ります。続行しますか？ (yes/no): ")
+        if response.lower() != 'yes':
+            print("キャンセルしました")
+            sys.exit(0)
+
+    backup_path = backup_database()
+
+    try:
+        conn = sqlite3.connect(DB_PATH)
+        rekey_domains(conn)
+        conn.close()
+        print("=" * 60)
+        print("マイグレーション完了！")
+        print(f"バックアップ: {backup_path}")
+        print("=" * 60)
+    except Exception as e:
+        print(f"\n❌ エラー発生: {e}")
+        print(f"バックアップから復元してください: {backup_path}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+再クロール計画の作成・実行（services.recrawl_scheduler）
+
+ScrapingTask（HPB一覧 / Google Map検索）とBizの情報拡充（HPB詳細 / 公式サイトの問い合わせ情報）を
+鮮度・変更頻度・失敗履歴・価値でスコア付けし、1時間あたりのリクエスト数の予算に収まる計画を表示する。
+--run で計画を実行する（cronで1時間ごとに実行する想定）。
+
+使い方:
+    python scripts/plan_recrawl.py                          # 今後1時間の計画を表示
+    python scripts/plan_recrawl.py --hours 3 --budget 400
+    python scripts/plan_recrawl.py --kinds hpb_details,contact --run
+"""
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import app, db, get_stealth_driver
+from models import Biz
+from services.contact_crawler import run_contact_crawl
+from services.places_governor import BATCH
+from services.recrawl_scheduler import (
+    HOURLY_REQUEST_BUDGET, KIND_CONTACT, KIND_GMAP_TASK, KIND_HPB_DETAILS, KIND_HPB_TASK, KINDS,
+    build_plan, print_plan
+)
+
+
+def run_plan(plan, use_browser=True):
+    """計画を種別ごとにまとめて実行"""
+    from run_gmap_scraper import process_gmap_task
+    from run_hpb_details_updater import update_hpb_details_batch
+    from run_hpb_scraper import process_hpb_task
+
+    by_kind = {kind: [item.target_id for item in plan if item.kind == kind] for kind in KINDS}
+
+    for task_id in by_kind[KIND_HPB_TASK]:
+        process_hpb_task(task_id)
+    for task_id in by_kind[KIND_GMAP_TASK]:
+        process_gmap_task(task_id, priority=BATCH)
+    if by_kind[KIND_HPB_DETAILS]:
+        update_hpb_details_batch(biz_ids=by_kind[KIND_HPB_DETAILS])
+    if by_kind[KIND_CONTACT]:
+        with app.app_context():
+            sites = [tuple(row) for row in Biz.query.with_entities(Biz.id, Biz.website_url, Biz.website_domain).filter(
+                Biz.id.in_(by_kind[KIND_CONTACT])
+            )]
+            stats = run_contact_crawl(db, Biz, sites, driver_factory=get_stealth_driver if use_browser else None)
+            print(f"問い合わせ情報: 取得成功 {stats['found']}件 / 変更なし {stats['unchanged']}件 / "
+                  f"失敗 {stats['errors']}件 / DB更新 {stats['written']}件")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='再クロール計画の作成・実行')
+    parser.add_argument('--hours', type=float, default=1.0, help='計画する時間（時間）')
+    parser.add_argument('--budget', type=int, default=HOURLY_REQUEST_BUDGET, help='1時間あたりのリクエスト数の予算')
+    parser.add_argument('--kinds', help=f"対象の種別（カンマ区切り、省略時は全て: {','.join(KINDS)}）")
+    parser.add_argument('--limit', type=int, help='表示する件数の上限')
+    parser.add_argument('--run', action='store_true', help='計画を実行する')
+    parser.add_argument('--no-browser', action='store_true', help='問い合わせ情報の取得でブラウザを使わない')
+    args = parser.parse_args()
+
+    kinds = [kind.strip() for kind in args.kinds.split(',')] if args.kinds else list(KINDS)
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        parser.error(f"不明な種別: {', '.join(sorted(unknown))}")
+
+    with app.app_context():
+        plan, budget, candidates = build_plan(hours=args.hours, budget_per_hour=args.budget, kinds=kinds)
+        print_plan(plan, budget, candidates, limit=args.limit)
+
+    if args.run:
+        run_plan(plan, use_browser=not args.no_browser)
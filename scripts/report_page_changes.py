@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+再クロール時の変更検出の集計（services.change_detection）
+- 実行ごとの未変更の割合（304応答・内容のハッシュ一致）
+- 取得元ごとのURLの安定度（連続して未変更だった回数の分布、最終変更からの平均日数）
+
+未変更の割合が高い取得元は、再クロールの間隔を延ばす候補。
+
+使い方:
+    python scripts/report_page_changes.py
+    python scripts/report_page_changes.py --source contact --runs 50
+"""
+import sys
+import os
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.change_detection import get_page_state_store
+
+
+def print_runs(store, source=None, limit=20):
+    runs = store.recent_runs(source=source, limit=limit)
+    print(f"=== 直近の実行（{len(runs)}件） ===")
+    for run_source, started_at, checked, unchanged, not_modified, new in runs:
+        ratio = unchanged / checked * 100 if checked else 0
+        print(f"  {datetime.fromtimestamp(started_at):%Y-%m-%d %H:%M}  {run_source:<10} 確認 {checked:>6}件  "
+              f"未変更 {unchanged:>6}件（{ratio:5.1f}%、304応答 {not_modified}件）  初回 {new}件")
+    print()
+
+
+def print_stability(store, source=None):
+    print("=== URLの安定度 ===")
+    for name, stats in store.stability(source=source).items():
+        urls = stats['urls']
+        print(f"  {name or '(不明)'}: {urls}件（最終変更から平均 {stats['avg_days_since_change'] or 0:.1f}日）")
+        for runs in (1, 3, 5):
+            count = stats[f'stable_{runs}'] or 0
+            print(f"    {runs}回以上連続で未変更: {count}件（{count / urls * 100:.1f}%）")
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='再クロール時の変更検出の集計')
+    parser.add_argument('--source', help='取得元で絞り込む（hpb_list / contact / gmap など）')
+    parser.add_argument('--runs', type=int, default=20, help='表示する実行の件数')
+    args = parser.parse_args()
+
+    store = get_page_state_store()
+    print(f"保存先: {store.path}\n")
+    print_runs(store, source=args.source, limit=args.runs)
+    print_stability(store, source=args.source)
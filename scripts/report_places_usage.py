@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Places APIの利用状況（services.places_governor）
+- 1日・1か月の料金（概算）と予算に対する割合
+- SKU・優先度ごとの呼び出し回数と料金
+- 予算のため見送った呼び出しの回数
+- エンドポイントごとの応答時間のヒストグラム
+
+使い方:
+    python scripts/report_places_usage.py                  # 今日と今月
+    python scripts/report_places_usage.py --day 2026-10-01
+    python scripts/report_places_usage.py --month 2026-09
+"""
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.places_governor import (
+    LATENCY_BUCKETS_MS, PRIORITY_LIMITS, SOFT_LIMIT_RATIO, get_places_governor
+)
+
+
+def print_budget(governor, label, period, budget):
+    spent = governor.store.spend(period)
+    if budget > 0:
+        print(f"{label}（{period}）: ${spent:.2f} / 予算 ${budget:.2f}（{spent / budget * 100:.1f}%、"
+              f"ソフト上限 ${budget * SOFT_LIMIT_RATIO:.2f}）")
+    else:
+        print(f"{label}（{period}）: ${spent:.2f}（予算なし）")
+
+
+def print_usage(governor, period):
+    print(f"\n=== SKU別（{period}） ===")
+    rows = governor.store.usage(period)
+    if not rows:
+        print("  記録なし")
+    for sku, priority, calls, cost in rows:
+        print(f"  {sku:<16} {priority:<12} {calls:>7}回  ${cost:8.2f}")
+    deferred = governor.store.deferred(period)
+    if deferred:
+        print(f"\n=== 予算のため見送った呼び出し（{period}） ===")
+        for endpoint, priority, calls in deferred:
+            print(f"  {endpoint:<18} {priority:<12} {calls:>7}回")
+
+
+def print_latency(governor, period):
+    print(f"\n=== 応答時間（{period}） ===")
+    histograms = governor.store.latency(period)
+    if not histograms:
+        print("  記録なし")
+    for endpoint, histogram in sorted(histograms.items()):
+        total = sum(histogram.values())
+        print(f"  {endpoint}: {total}回")
+        lower = 0
+        for bucket_ms in LATENCY_BUCKETS_MS + (0,):
+            count = histogram.get(bucket_ms, 0)
+            label = f"{lower}-{bucket_ms}ms" if bucket_ms else f"{lower}ms以上"
+            print(f"    {label:<14} {count:>7}回（{count / total * 100:5.1f}%） {'#' * round(count / total * 40)}")
+            lower = bucket_ms
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Places APIの利用状況')
+    parser.add_argument('--day', help='日別の集計（YYYY-MM-DD、省略時は今日）')
+    parser.add_argument('--month', help='月別の集計（YYYY-MM、省略時は今月）')
+    args = parser.parse_args()
+
+    governor = get_places_governor()
+    day = args.day or time.strftime('%Y-%m-%d')
+    month = args.month or day[:7]
+    print(f"保存先: {governor.store.path}")
+    print("優先度ごとの上限: " + ' / '.join(f"{name} {ratio:.0%}" for name, ratio in PRIORITY_LIMITS.items()) + "\n")
+    print_budget(governor, '1日', day, governor.daily_budget)
+    print_budget(governor, '1か月', month, governor.monthly_budget)
+    print_usage(governor, day)
+    print_usage(governor, month)
+    print_latency(governor, day)
@@ -7,6 +7,7 @@ Place IDからCIDを取得（タイムアウト延長版）
 - タイムアウト延長（15秒→30秒）
 - リトライ回数増加（3回→5回）
 - 待機時間延長（5秒→8秒）
+- 1つのブラウザの複数のタブで並行して読み込み（--tabs、services.tabbed_worker）
 """
 import sys
 import os
@@ -18,6 +19,10 @@ sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_stealth_driver
+from services.browser_watchdog import BROWSER_RSS_LIMIT_MB, get_browser_watchdog
+from services.host_controller import TIMEOUT, get_host_controller
+from services.tabbed_worker import NOT_FOUND, TAB_COUNT, TabbedWorker
+from services.coverage_report import print_coverage
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
@@ -27,7 +32,6 @@ from selenium.common.exceptions import TimeoutException, WebDriverException
 MAX_RETRIES = 5  # リトライ回数増加
 PAGE_TIMEOUT = 30  # ページロードタイムアウト延長
 WAIT_TIMEOUT = 15  # 要素待機タイムアウト延長
-BROWSER_RESTART_INTERVAL = 10  # ブラウザ再起動間隔短縮（安定性向上）
 
 
 def is_driver_alive(driver):
@@ -44,16 +48,76 @@ def restart_driver(driver):
     """ブラウザを安全に再起動"""
     try:
         if driver:
+            get_browser_watchdog().forget(driver)
             driver.quit()
     except Exception as e:
         print(f"    警告: driver.quit()失敗 - {type(e).__name__}")
     
     time.sleep(3)  # 再起動前の待機時間延長
-    new_driver = get_stealth_driver()
+    new_driver = get_browser_watchdog().track(get_stealth_driver())
     print(f"    ✓ ブラウザ再起動完了")
     return new_driver
 
 
+def maps_url_for_place_id(place_id):
+    return f"https://www.google.com/maps/search/?api=1&query=Google&query_place_id={place_id}"
+
+
+def extract_cid_from_url(current_url):
+    """GoogleマップのURLからCIDを抽出（見つからなければNone）"""
+    # パターン1: URL内の16進数
+    match = re.search(r'!1s0x[0-9a-f]+:0x([0-9a-f]+)', current_url)
+    if match:
+        return str(int(match.group(1), 16))
+    
+    # パターン2: cid= パラメータ
+    match = re.search(r'cid=(\d+)', current_url)
+    if match:
+        return match.group(1)
+    return None
+
+
+def extract_cid_from_source(page_source):
+    """GoogleマップのページソースからCIDを抽出（見つからなければNone）"""
+    # パターン3: ludocid
+    match = re.search(r'\"ludocid\":\"(\d+)\"', page_source)
+    if match:
+        return match.group(1)
+    
+    # パターン4: data-cid
+    match = re.search(r'data-cid=\"(\d+)\"', page_source)
+    if match:
+        return match.group(1)
+    
+    # パターン5: cid パラメータ（ページソース内）
+    match = re.search(r'[?&]cid=(\d+)', page_source)
+    if match:
+        return match.group(1)
+    
+    # パターン6: 0x形式（ページソース内）
+    match = re.search(r'0x[0-9a-f]+:0x([0-9a-f]+)', page_source)
+    if match:
+        return str(int(match.group(1), 16))
+    return None
+
+
+def fallback_cid(driver):
+    """
+    期限切れのタブでの判定（services.tabbed_worker）
+
+    ページソースにCIDがあればそれを返す。読み込みが完了している（readyState が complete、または
+    店舗情報のパネルが表示されている）のにCIDがなければ NOT_FOUND（ホストの失敗として記録せず、再試行もしない）。
+    読み込みが終わっていなければNone（タイムアウト）。
+    """
+    cid = extract_cid_from_source(driver.page_source)
+    if cid:
+        return cid
+    if driver.execute_script('return document.readyState') == 'complete' or \
+            driver.find_elements(By.CSS_SELECTOR, '[role="main"], [data-item-id="address"]'):
+        return NOT_FOUND
+    return None
+
+
 def get_cid_from_place_id(place_id, driver):
     """Place IDからCIDを取得（改善版・タイムアウト延長）"""
     if not place_id:
@@ -62,68 +126,44 @@ def get_cid_from_place_id(place_id, driver):
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             # 通常のGoogleマップURL
-            maps_url = f"https://www.google.com/maps/search/?api=1&query=Google&query_place_id={place_id}"
+            maps_url = maps_url_for_place_id(place_id)
             
-            # タイムアウト設定
-            driver.set_page_load_timeout(PAGE_TIMEOUT)
+            # ページロード（ホストごとのサーキットブレーカーを通す。遮断中はクールダウンが終わるまで待ち、再試行で連打しない）
+            with get_host_controller().request(maps_url) as slot:
+                # タイムアウト設定
+                driver.set_page_load_timeout(PAGE_TIMEOUT)
             
-            # ページロード
-            driver.get(maps_url)
+                # ページロード
+                started = time.monotonic()
+                driver.get(maps_url)
             
-            # ページロード待機
-            try:
-                WebDriverWait(driver, WAIT_TIMEOUT).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
-            except TimeoutException:
-                print(f"    警告: ページロード待機タイムアウト（試行 {attempt}/{MAX_RETRIES}）")
+                # ページロード待機
+                try:
+                    WebDriverWait(driver, WAIT_TIMEOUT).until(
+                        lambda d: d.execute_script('return document.readyState') == 'complete'
+                    )
+                except TimeoutException:
+                    print(f"    警告: ページロード待機タイムアウト（試行 {attempt}/{MAX_RETRIES}）")
+                    slot.failed(TIMEOUT)
+                get_browser_watchdog().record_latency(driver, time.monotonic() - started)
             
-            # JavaScriptロード待機（延長）
-            time.sleep(8)
+                # JavaScriptロード待機（延長）
+                time.sleep(8)
+                slot.check(driver.page_source)
             
             # URL確認（複数回試行）
             for url_check_attempt in range(5):
-                current_url = driver.current_url
-                
-                # パターン1: URL内の16進数
-                match = re.search(r'!1s0x[0-9a-f]+:0x([0-9a-f]+)', current_url)
-                if match:
-                    hex_cid = match.group(1)
-                    cid = str(int(hex_cid, 16))
+                cid = extract_cid_from_url(driver.current_url)
+                if cid:
                     return cid
                 
-                # パターン2: cid= パラメータ
-                match = re.search(r'cid=(\d+)', current_url)
-                if match:
-                    return match.group(1)
-                
                 # URLにまだCIDが含まれていない場合、待機
                 if url_check_attempt < 4:
                     time.sleep(3)
             
             # ページソースから検索
-            page_source = driver.page_source
-            
-            # パターン3: ludocid
-            match = re.search(r'\"ludocid\":\"(\d+)\"', page_source)
-            if match:
-                return match.group(1)
-            
-            # パターン4: data-cid
-            match = re.search(r'data-cid=\"(\d+)\"', page_source)
-            if match:
-                return match.group(1)
-            
-            # パターン5: cid パラメータ（ページソース内）
-            match = re.search(r'[?&]cid=(\d+)', page_source)
-            if match:
-                return match.group(1)
-            
-            # パターン6: 0x形式（ページソース内）
-            match = re.search(r'0x[0-9a-f]+:0x([0-9a-f]+)', page_source)
-            if match:
-                hex_cid = match.group(1)
-                cid = str(int(hex_cid, 16))
+            cid = extract_cid_from_source(driver.page_source)
+            if cid:
                 return cid
             
             print(f"    ℹ️  CIDが見つかりませんでした (試行 {attempt}/{MAX_RETRIES})")
@@ -157,8 +197,58 @@ def get_cid_from_place_id(place_id, driver):
     return None
 
 
-def retry_failed_cid(limit=None):
-    """CID取得失敗分を再試行"""
+def retry_failed_cid_tabbed(salons, tabs):
+    """
+    1つのブラウザの複数のタブでCIDを並行して取得（services.tabbed_worker）
+
+    URLがCIDを含む形に書き換わったタブから順に結果を取り出し、期限切れのタブはページソースから探す
+    （読み込みが完了していてCIDがないものはタイムアウトにせず、CIDなしとして扱う: fallback_cid）。
+
+    Returns:
+        tuple: (成功件数, 失敗件数, ブラウザ再起動回数)
+    """
+    by_id = {salon.id: salon for salon in salons}
+    worker = TabbedWorker(get_stealth_driver, tabs=tabs, timeout=PAGE_TIMEOUT)
+    success, failed = 0, 0
+    try:
+        jobs = [(salon.id, maps_url_for_place_id(salon.place_id)) for salon in salons]
+        results = worker.run(
+            jobs,
+            check=lambda driver: extract_cid_from_url(driver.current_url),
+            fallback=fallback_cid,
+        )
+        for i, (biz_id, cid) in enumerate(results, 1):
+            salon = by_id[biz_id]
+            print(f"\n[{i}/{len(salons)}] {salon.name}")
+            print(f"  Place ID: {salon.place_id}")
+            if cid:
+                try:
+                    salon.cid = cid
+                    db.session.commit()
+                    print(f"  ✅ CID: {cid}")
+                    success += 1
+                except Exception as e:
+                    print(f"  ❌ DB更新エラー: {type(e).__name__}")
+                    db.session.rollback()
+                    failed += 1
+            else:
+                print(f"  ❌ CID取得失敗")
+                failed += 1
+    except KeyboardInterrupt:
+        print("\n\n⚠️  処理を中断しました")
+    finally:
+        worker.close()
+    return success, failed, worker.restarts
+
+
+def retry_failed_cid(limit=None, tabs=TAB_COUNT):
+    """
+    CID取得失敗分を再試行
+
+    Args:
+        limit: 処理件数上限（Noneなら全件）
+        tabs: 1つのブラウザで並行して読み込むタブ数（1なら1件ずつ処理）
+    """
     
     with app.app_context():
         # Place IDがあるがCIDがないクリニックを取得
@@ -179,7 +269,8 @@ def retry_failed_cid(limit=None):
         print(f"  - タイムアウト延長: {PAGE_TIMEOUT}秒")
         print(f"  - リトライ: 最大{MAX_RETRIES}回")
         print(f"  - 待機時間: 8秒 + URL確認15秒")
-        print(f"  - ブラウザ再起動: {BROWSER_RESTART_INTERVAL}件ごと")
+        print(f"  - ブラウザ再起動: メモリ・描画時間の監視で必要なときのみ（RSS上限 {BROWSER_RSS_LIMIT_MB}MB）")
+        print(f"  - 並行タブ数: {tabs}")
         print()
         
         driver = None
@@ -188,7 +279,11 @@ def retry_failed_cid(limit=None):
         driver_restarts = 0
         
         try:
-            driver = get_stealth_driver()
+            if tabs > 1:
+                success, failed, driver_restarts = retry_failed_cid_tabbed(salons, tabs)
+                return  # 最終結果は finally で表示
+            
+            driver = get_browser_watchdog().track(get_stealth_driver())
             
             for i, salon in enumerate(salons, 1):
                 print(f"\n[{i}/{total}] {salon.name}")
@@ -201,9 +296,10 @@ def retry_failed_cid(limit=None):
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
-                    # 定期的なブラウザ再起動
-                    if i > 1 and i % BROWSER_RESTART_INTERVAL == 0:
-                        print(f"  🔄 定期ブラウザ再起動中（{BROWSER_RESTART_INTERVAL}件ごと）...")
+                    # メモリ・描画時間の監視による再起動（前の1件の処理後の状態で判定）
+                    reason = get_browser_watchdog().check(driver) if i > 1 else None
+                    if reason:
+                        print(f"  🔄 ブラウザ再起動中（{reason}）...")
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     
@@ -261,7 +357,7 @@ def retry_failed_cid(limit=None):
                         driver = restart_driver(driver)
                         driver_restarts += 1
                     except Exception:
-                        driver = get_stealth_driver()
+                        driver = get_browser_watchdog().track(get_stealth_driver())
                     
                     time.sleep(3)
                     continue
@@ -272,6 +368,7 @@ def retry_failed_cid(limit=None):
         finally:
             if driver:
                 try:
+                    get_browser_watchdog().forget(driver)
                     driver.quit()
                     print("\n✓ ブラウザを正常終了しました")
                 except Exception:
@@ -286,18 +383,14 @@ def retry_failed_cid(limit=None):
             print(f"失敗: {failed}件")
             print(f"成功率: {(success/total*100) if total > 0 else 0:.1f}%")
             print(f"ブラウザ再起動回数: {driver_restarts}回")
+            get_browser_watchdog().print_report()
             
             # 全体状況
             with app.app_context():
-                total_salons = Biz.query.count()
-                with_place_id = Biz.query.filter(Biz.place_id.isnot(None)).count()
-                with_cid = Biz.query.filter(Biz.cid.isnot(None)).count()
+                overall = print_coverage(['place_id', 'cid'])['overall']
+                with_place_id, with_cid = overall['place_id'], overall['cid']
                 remaining = with_place_id - with_cid
                 
-                print(f"\n現在の全体状況:")
-                print(f"  総クリニック数: {total_salons}件")
-                print(f"  Place ID有り: {with_place_id}件")
-                print(f"  CID有り: {with_cid}件")
                 print(f"  CID取得率: {(with_cid/with_place_id*100) if with_place_id > 0 else 0:.1f}% ({with_cid}/{with_place_id})")
                 print(f"  残りCID未取得: {remaining}件")
             print(f"{'='*60}")
@@ -306,10 +399,11 @@ def retry_failed_cid(limit=None):
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='CID再取得スクリプト（失敗分のみ）')
     parser.add_argument('--test', action='store_true', help='テストモード（10件のみ処理）')
+    parser.add_argument('--tabs', type=int, default=TAB_COUNT, help='1つのブラウザで並行して読み込むタブ数（1なら1件ずつ処理）')
     args = parser.parse_args()
     
     if args.test:
         print("🧪 テストモード: 10件のみ処理")
-        retry_failed_cid(limit=10)
+        retry_failed_cid(limit=10, tabs=args.tabs)
     else:
-        retry_failed_cid()
+        retry_failed_cid(tabs=args.tabs)
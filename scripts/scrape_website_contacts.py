@@ -4,214 +4,134 @@ Phase 1C: 公式サイトから問い合わせ情報を取得
 - 問い合わせページURL
 - メールアドレス
 - 電話番号
+
+services.contact_crawler の非同期クローラーを使用:
+- トップページ・問い合わせページはHTTPで同時取得（ドメインごとに同時接続数を制限）
+- JavaScript必須のサイトのみブラウザで再取得
+- 同じドメイン（チェーン・分院）のサイトは1回だけ取得し、問い合わせURL・メールを全Bizに展開（電話番号は展開しない）
+- 取得したHTMLはスナップショットとして保存し、--from-cache でネットワークを使わずに再処理できる
+- 結果はバッチ単位でDBに書き込み
+- トップページが前回から変更されていないサイトは処理を省略（--no-skip-unchanged で全件処理）
 """
 import sys
 import os
 import time
-import re
 
 sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, get_stealth_driver
-from selenium.webdriver.common.by import By
-from datetime import datetime
+from services.contact_crawler import (
+    BROWSER_WORKERS, CONCURRENCY, PER_DOMAIN_LIMIT, run_contact_crawl
+)
+from services.coverage_report import print_coverage
+from services.host_controller import get_host_controller
+from services.snapshot_store import set_replay
+
 
-def scrape_contact_info(website_url, driver):
+def enrich_contacts(limit=None, concurrency=CONCURRENCY, per_domain=PER_DOMAIN_LIMIT,
+                    browser_workers=BROWSER_WORKERS, use_browser=True, dedupe_domains=True, skip_unchanged=True):
     """
-    公式サイトから問い合わせ情報を取得
-    
+    全クリニックの問い合わせ情報を収集
+
     Args:
-        website_url: クリニックの公式サイトURL
-        driver: Seleniumドライバー
-    
-    Returns:
-        dict: {
-            'contact_page_url': str or None,
-            'emails': list[str],
-            'phones': list[str]
-        }
+        limit: 処理件数上限（テスト用）
+        concurrency: 全体の同時リクエスト数
+        per_domain: 同一ドメインへの同時リクエスト数
+        browser_workers: JS必須サイトをブラウザで再取得する並列数
+        use_browser: Falseならブラウザでの再取得を行わない
+        dedupe_domains: Trueなら同じドメインのサイトは1回だけ取得して結果を展開
+        skip_unchanged: Trueならトップページが前回から変更されていないサイトの処理を省略
     """
-    result = {'contact_page_url': None, 'emails': [], 'phones': []}
-    
-    try:
-        # Step 1: トップページをロード（タイムアウト30秒）
-        driver.set_page_load_timeout(30)
-        driver.get(website_url)
-        time.sleep(3)
-        
-        # Step 2: 問い合わせページリンクを探す
-        contact_keywords = [
-            'お問い合わせ', '問い合わせ', '問合せ', 'お問合せ',
-            'contact', 'Contact', 'CONTACT',
-            'ご予約', '予約', '相談', 'カウンセリング'
-        ]
-        
-        contact_link = None
-        
-        # リンクテキストで検索
-        for keyword in contact_keywords:
-            try:
-                elements = driver.find_elements(By.PARTIAL_LINK_TEXT, keyword)
-                if elements:
-                    href = elements[0].get_attribute('href')
-                    # 外部サイト（予約システム等）を除外
-                    if href and (website_url.split('/')[2] in href):
-                        contact_link = href
-                        break
-            except Exception:
-                continue
-        
-        # Step 3: 問い合わせページが見つかったらロード
-        if contact_link:
-            result['contact_page_url'] = contact_link
-            print(f"    問い合わせページ: {contact_link}")
-            driver.get(contact_link)
-            time.sleep(3)
-        
-        # Step 4: ページ全体からメール・電話を抽出
-        page_source = driver.page_source
-        
-        # メールアドレス抽出
-        email_pattern = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
-        emails = re.findall(email_pattern, page_source)
-        
-        # 画像ファイル等のノイズを除外
-        emails = [
-            email for email in emails 
-            if not any(ext in email.lower() for ext in ['.jpg', '.png', '.gif', '.svg', '.css', '.js'])
-        ]
-        result['emails'] = list(set(emails))[:3]  # 重複除去、最大3件
-        
-        # 電話番号抽出（日本の固定電話・フリーダイヤル）
-        phone_patterns = [
-            r'0\d{1,4}[-‐ー]\d{1,4}[-‐ー]\d{4}',  # ハイフン付き
-            r'0\d{9,10}',  # ハイフンなし
-            r'0120[-‐ー]\d{3}[-‐ー]\d{3,4}',  # フリーダイヤル
-        ]
-        
-        phones = []
-        for pattern in phone_patterns:
-            found = re.findall(pattern, page_source)
-            phones.extend(found)
-        
-        # 正規化（ハイフンを統一）
-        phones = [re.sub(r'[‐ー]', '-', phone) for phone in phones]
-        result['phones'] = list(set(phones))[:2]  # 重複除去、最大2件
-        
-        return result
-        
-    except Exception as e:
-        print(f"    エラー: {e}")
-        return result
-
-
-def enrich_contacts(limit=None):
-    """全クリニックの問い合わせ情報を収集"""
-    
     with app.app_context():
         # Website URLがあるクリニックを取得
-        query = Biz.query.filter(
+        query = Biz.query.with_entities(Biz.id, Biz.website_url, Biz.website_domain).filter(
             Biz.website_url.isnot(None),
             Biz.inquiry_url.is_(None)  # まだ問い合わせページを取得していない
-        )
-        
+        ).order_by(Biz.id)
+
         if limit:
             query = query.limit(limit)
-        
-        salons = query.all()
-        total = len(salons)
-        
+
+        sites = [tuple(row) for row in query]
+        total = len(sites)
+
         print(f"=== Phase 1C: 問い合わせ情報取得開始 ===")
         print(f"対象クリニック: {total}件")
         print(f"取得内容: 問い合わせページURL、メールアドレス、電話番号")
-        
-        driver = None
-        success = 0
-        failed = 0
-        
-        try:
-            driver = get_stealth_driver()
-            driver_restarts = 0
-            
-            for i, salon in enumerate(salons, 1):
-                print(f"\n[{i}/{total}] {salon.name}")
-                print(f"  公式サイト: {salon.website_url}")
-                
-                try:
-                    # 30件ごとにブラウザを再起動（メモリリーク対策）
-                    if i > 1 and i % 30 == 0:
-                        print(f"  → ブラウザ再起動中...（{driver_restarts + 1}回目）")
-                        driver.quit()
-                        time.sleep(3)
-                        driver = get_stealth_driver()
-                        driver_restarts += 1
-                    
-                    contact_info = scrape_contact_info(salon.website_url, driver)
-                    
-                    # DBに保存
-                    if contact_info['contact_page_url']:
-                        salon.inquiry_url = contact_info['contact_page_url']
-                    
-                    if contact_info['emails']:
-                        salon.email = ', '.join(contact_info['emails'])
-                        print(f"    メール: {contact_info['emails']}")
-                    
-                    if contact_info['phones']:
-                        salon.phone = ', '.join(contact_info['phones'])
-                        print(f"    電話: {contact_info['phones']}")
-                    
-                    db.session.commit()
-                    success += 1
-                    
-                    # 進捗表示
-                    if i % 10 == 0:
-                        print(f"\n--- 進捗: {i}/{total} 完了（成功: {success}, 失敗: {failed}）---")
-                    
-                    time.sleep(3)  # サーバー負荷対策（重要）
-                    
-                except Exception as e:
-                    print(f"    エラー: {type(e).__name__}: {str(e)[:100]}")
-                    failed += 1
-                    db.session.rollback()
-                    
-                    # エラー時にブラウザ再起動を試みる
-                    try:
-                        driver.quit()
-                        time.sleep(3)
-                        driver = get_stealth_driver()
-                        print("    → エラー後ブラウザ再起動完了")
-                    except:
-                        pass
-                    
-                    time.sleep(2)
-                    continue
-        
-        finally:
-            if driver:
-                driver.quit()
-        
-        print(f"\n=== Phase 1C: 完了 ===")
-        print(f"成功: {success}件")
-        print(f"失敗: {failed}件")
-        
-        # 統計情報
-        with_inquiry = Biz.query.filter(Biz.inquiry_url.isnot(None)).count()
-        with_email = Biz.query.filter(Biz.email.isnot(None)).count()
-        with_phone = Biz.query.filter(Biz.phone.isnot(None)).count()
-        
-        print(f"\n現在の状況:")
-        print(f"  問い合わせページ有り: {with_inquiry}件")
-        print(f"  メール有り: {with_email}件")
-        print(f"  電話有り: {with_phone}件")
-        print(f"  総クリニック数: {Biz.query.count()}件")
+        print(f"同時接続数: {concurrency}（ドメインごと {per_domain}）")
+
+        started = time.monotonic()
+        done = 0
+
+        def on_result(result):
+            nonlocal done
+            done += 1
+            if result.status == 'error':
+                print(f"  [{result.biz_id}] エラー: {result.website_url} ({result.error})")
+            elif result.found:
+                print(f"  [{result.biz_id}] {result.website_url}")
+                if result.contact_page_url:
+                    print(f"    問い合わせページ: {result.contact_page_url}")
+                if result.emails:
+                    print(f"    メール: {result.emails}")
+                if result.phones:
+                    print(f"    電話: {result.phones}")
+            if done % 50 == 0:
+                print(f"\n--- 進捗: {done}/{total} 完了 ({time.monotonic() - started:.0f}秒) ---\n", flush=True)
+
+        stats = run_contact_crawl(
+            db, Biz, sites,
+            driver_factory=get_stealth_driver if use_browser else None,
+            concurrency=concurrency,
+            per_domain=per_domain,
+            browser_workers=browser_workers,
+            on_result=on_result,
+            dedupe_domains=dedupe_domains,
+            skip_unchanged=skip_unchanged
+        )
+
+        print(f"\n=== Phase 1C: 完了 ({time.monotonic() - started:.0f}秒) ===")
+        print(f"取得サイト数: {stats['sites']}件（対象 {stats['total']}件）")
+        print(f"取得成功: {stats['found']}件（同じドメインのBizへ展開: {stats['fanned_out']}件）")
+        print(f"情報なし: {stats['not_found']}件")
+        print(f"前回から変更なし（省略）: {stats['unchanged']}件")
+        print(f"失敗: {stats['errors']}件")
+        print(f"ブラウザで再取得: {stats['browser']}件")
+        print(f"取得ページ数: {stats['fetches']}件")
+        print(f"DB更新: {stats['written']}件")
+        get_host_controller().print_report(min_requests=10)
+
+        # 統計情報（集計クエリ1本）
+        print_coverage(['inquiry', 'email', 'phone'], title='現在の状況')
 
 
 if __name__ == '__main__':
-    # 引数で処理件数を指定可能（テスト用）
-    limit = int(sys.argv[1]) if len(sys.argv) > 1 else None
-    
-    if limit:
-        print(f"テストモード: {limit}件のみ処理")
-    
-    enrich_contacts(limit=limit)
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Phase 1C: 公式サイトから問い合わせ情報を取得')
+    parser.add_argument('limit', nargs='?', type=int, help='処理件数上限（テスト用）')
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY, help='全体の同時リクエスト数')
+    parser.add_argument('--per-domain', type=int, default=PER_DOMAIN_LIMIT, help='同一ドメインへの同時リクエスト数')
+    parser.add_argument('--browser-workers', type=int, default=BROWSER_WORKERS, help='JS必須サイトのブラウザ並列数')
+    parser.add_argument('--no-browser', action='store_true', help='ブラウザでの再取得を行わない')
+    parser.add_argument('--no-dedupe', action='store_true', help='同じドメインのサイトもBizごとに取得する')
+    parser.add_argument('--no-skip-unchanged', action='store_true', help='前回から変更のないサイトも処理する')
+    parser.add_argument('--from-cache', action='store_true', help='保存済みのスナップショットのみを使う（ネットワークに接続しない）')
+    args = parser.parse_args()
+
+    if args.limit:
+        print(f"テストモード: {args.limit}件のみ処理")
+    if args.from_cache:
+        print("リプレイモード: 保存済みのスナップショットから処理します")
+        set_replay(True)
+
+    enrich_contacts(
+        limit=args.limit,
+        concurrency=args.concurrency,
+        per_domain=args.per_domain,
+        browser_workers=args.browser_workers,
+        use_browser=not (args.no_browser or args.from_cache),
+        dedupe_domains=not args.no_dedupe,
+        skip_unchanged=not args.no_skip_unchanged
+    )
@@ -4,13 +4,12 @@ Place IDは取得済みだが評価データがないクリニックの評価を
 """
 import sys
 import os
-import time
-import requests
 
 sys.path.append('/var/www/salon_app')
 os.chdir('/var/www/salon_app')
 
 from app import app, db, Biz, ReviewSummary
+from services.places_client import RATING_FIELDS, BudgetDeferred, get_places_client
 
 def update_missing_ratings():
     """
@@ -20,6 +19,7 @@ def update_missing_ratings():
     if not api_key:
         print("エラー: GOOGLE_MAPS_API_KEYが設定されていません")
         return
+    client = get_places_client(api_key)
     
     with app.app_context():
         # Place IDはあるが評価データがないクリニックを取得
@@ -46,45 +46,33 @@ def update_missing_ratings():
             try:
                 print(f"\n[{i}/{total}] {salon.name}")
                 
-                # Place Details APIで評価を取得
-                url = "https://maps.googleapis.com/maps/api/place/details/json"
-                params = {
-                    'place_id': salon.place_id,
-                    'fields': 'rating,user_ratings_total',
-                    'key': api_key,
-                    'language': 'ja'
-                }
+                # Place Details APIで評価を取得（評価のフィールドのみ。再試行・タイムアウトはクライアント側）
+                result = client.details(salon.place_id, RATING_FIELDS) or {}
+                rating = result.get('rating')
+                review_count = result.get('user_ratings_total')
                 
-                response = requests.get(url, params=params)
-                
-                if response.status_code == 200:
-                    result = response.json().get('result', {})
-                    rating = result.get('rating')
-                    review_count = result.get('user_ratings_total')
+                if rating is not None:
+                    # ReviewSummaryを作成
+                    google_review = ReviewSummary(
+                        biz_id=salon.id,
+                        source_name='Google',
+                        rating=rating,
+                        count=review_count
+                    )
+                    db.session.add(google_review)
+                    db.session.commit()
                     
-                    if rating is not None:
-                        # ReviewSummaryを作成
-                        google_review = ReviewSummary(
-                            biz_id=salon.id,
-                            source_name='Google',
-                            rating=rating,
-                            count=review_count
-                        )
-                        db.session.add(google_review)
-                        db.session.commit()
-                        
-                        print(f"  → 評価: {rating}★ ({review_count}件) 保存完了")
-                        success += 1
-                    else:
-                        print(f"  → 評価データなし")
-                        failed += 1
+                    print(f"  → 評価: {rating}★ ({review_count}件) 保存完了")
+                    success += 1
                 else:
-                    print(f"  → API Error: {response.status_code}")
+                    print(f"  → 評価データなし")
                     failed += 1
                 
-                # API制限対策
-                time.sleep(0.5)
-                
+            except BudgetDeferred as e:
+                # 予算の上限に近いため、残りは次回に回す
+                print(f"  Places APIの予算のため中断します: {e}")
+                db.session.rollback()
+                break
             except Exception as e:
                 print(f"  エラー: {e}")
                 failed += 1
@@ -0,0 +1,413 @@
+"""
+日本の住所パーサー（都道府県 → 市区町村 → 町名 のトライ木による構造化）
+- 住所を 郵便番号 / 都道府県 / 市区町村 / 町名 / 丁目 / 番地 / 建物名 に1パスで分解
+- 辞書は同梱の都道府県・市区町村リスト + Areaテーブル（町名レベル）から構築
+- 辞書にない市区町村・町名は正規表現でフォールバック
+- parse_many() で一括処理（同一住所はキャッシュ）
+
+ward_key（都道府県+市区町村）/ town_key（+町名+丁目）を区の絞り込み、
+エリア単位のタスク生成、名寄せのブロッキングに使用する。
+"""
+import re
+import unicodedata
+
+from services.normalization import kanji_to_number
+
+
+# 設定
+PREFECTURES = [
+    '北海道', '青森県', '岩手県', '宮城県', '秋田県', '山形県', '福島県',
+    '茨城県', '栃木県', '群馬県', '埼玉県', '千葉県', '東京都', '神奈川県',
+    '新潟県', '富山県', '石川県', '福井県', '山梨県', '長野県', '岐阜県',
+    '静岡県', '愛知県', '三重県', '滋賀県', '京都府', '大阪府', '兵庫県',
+    '奈良県', '和歌山県', '鳥取県', '島根県', '岡山県', '広島県', '山口県',
+    '徳島県', '香川県', '愛媛県', '高知県', '福岡県', '佐賀県', '長崎県',
+    '熊本県', '大分県', '宮崎県', '鹿児島県', '沖縄県',
+]
+
+# 同梱の市区町村辞書（東京都は全市区町村、その他は政令指定都市）
+# それ以外の市区町村は Area テーブルの読み込み、または正規表現で補う
+BUNDLED_CITIES = {
+    '東京都': [
+        '千代田区', '中央区', '港区', '新宿区', '文京区', '台東区',
+        '墨田区', '江東区', '品川区', '目黒区', '大田区', '世田谷区',
+        '渋谷区', '中野区', '杉並区', '豊島区', '北区', '荒川区',
+        '板橋区', '練馬区', '足立区', '葛飾区', '江戸川区',
+        '八王子市', '立川市', '武蔵野市', '三鷹市', '青梅市', '府中市', '昭島市',
+        '調布市', '町田市', '小金井市', '小平市', '日野市', '東村山市', '国分寺市',
+        '国立市', '福生市', '狛江市', '東大和市', '清瀬市', '東久留米市', '武蔵村山市',
+        '多摩市', '稲城市', '羽村市', 'あきる野市', '西東京市',
+        '西多摩郡瑞穂町', '西多摩郡日の出町', '西多摩郡檜原村', '西多摩郡奥多摩町',
+        '大島町', '利島村', '新島村', '神津島村', '三宅島三宅村', '三宅村', '御蔵島村',
+        '八丈島八丈町', '八丈町', '青ヶ島村', '小笠原村',
+    ],
+    '北海道': ['札幌市'],
+    '宮城県': ['仙台市'],
+    '埼玉県': ['さいたま市'],
+    '千葉県': ['千葉市'],
+    '神奈川県': ['横浜市', '川崎市', '相模原市'],
+    '新潟県': ['新潟市'],
+    '静岡県': ['静岡市', '浜松市'],
+    '愛知県': ['名古屋市'],
+    '京都府': ['京都市'],
+    '大阪府': ['大阪市', '堺市'],
+    '兵庫県': ['神戸市'],
+    '岡山県': ['岡山市'],
+    '広島県': ['広島市'],
+    '福岡県': ['北九州市', '福岡市'],
+    '熊本県': ['熊本市'],
+}
+
+TOKYO_23_WARDS = BUNDLED_CITIES['東京都'][:23]
+
+# 区を持つ政令指定都市（「大阪市北区」までを市区町村として扱う）
+DESIGNATED_CITIES = {
+    city for pref, cities in BUNDLED_CITIES.items() if pref != '東京都' for city in cities
+}
+
+PARSE_CACHE_SIZE = 100000  # parse_many() のキャッシュ上限
+
+_ZIPCODE_PATTERN = re.compile(r'^〒?\s*(\d{3})-?(\d{4})(?!\d)|〒\s*(\d{3})-?(\d{4})')
+_COUNTRY_PREFIX_PATTERN = re.compile(r'^(?:日本|Japan)[、,]?\s*')
+_HYPHEN_PATTERN = re.compile(r'[‐‑‒–—―−─－]')
+_DIGIT_LONG_VOWEL_PATTERN = re.compile(r'(?<=\d)[ーｰ](?=\d)')
+_SEPARATORS = ' 　,、'
+_CITY_FALLBACK_PATTERN = re.compile(r'[^\d\s,、-]{1,8}?郡[^\d\s,、-]{1,6}?[町村]|[^\d\s,、-]{1,6}?[市区町村]')
+_DESIGNATED_WARD_PATTERN = re.compile(r'[^\d\s,、-]{1,4}?区')
+# 「北17条西」「新琴似1条」のような条・線を含む町名（北海道など）は数字ごと町名に含める
+_TOWN_FALLBACK_PATTERN = re.compile(
+    r'(?:[^\d\s,、-]|\d+(?:条|線|地割))+?(?=[一二三四五六七八九十]+丁目|\d(?!\d*(?:条|線|地割))|[\s,、-]|$)'
+)
+_CHOME_PATTERN = re.compile(r'([一二三四五六七八九十]+|\d+)丁目')
+_BLOCK_PATTERN = re.compile(r'(\d+)((?:(?:-|番地の?|番の?|の|号)\d+)*)(?:号|番地?)?')
+_BLOCK_SEPARATOR_PATTERN = re.compile(r'番地の?|番の?|の|号')
+_AREA_CHOME_PATTERN = re.compile(r'(\d+)丁目$')
+_PARENTHESES_PATTERN = re.compile(r'\(.*?\)')
+
+_END = ''  # トライ木の終端キー（1文字のキーと衝突しない）
+
+
+class AddressTrie:
+    """
+    文字単位のトライ木（最長一致検索用）
+
+    ノードは dict（文字 -> 子ノード）で、終端には _END キーで値を持つ。
+    """
+    __slots__ = ('_root', '_size')
+
+    def __init__(self):
+        self._root = {}
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, word):
+        return self.get(word) is not None
+
+    def insert(self, word, value=True):
+        """単語を登録（既存の場合は値を置き換え）"""
+        node = self._root
+        for char in word:
+            node = node.setdefault(char, {})
+        if _END not in node:
+            self._size += 1
+        node[_END] = value
+
+    def get(self, word, default=None):
+        """完全一致で値を取得"""
+        node = self._root
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return default
+        return node.get(_END, default)
+
+    def longest_match(self, text, start=0):
+        """
+        text[start:] の先頭に一致する最長の単語を探す
+
+        Returns:
+            tuple: (値, 一致の終了位置) / 一致しない場合は (None, start)
+        """
+        node = self._root
+        value, end = None, start
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            if _END in node:
+                value, end = node[_END], i + 1
+        return value, end
+
+
+class ParsedAddress:
+    """構造化された住所"""
+    __slots__ = ('raw', 'zipcode', 'prefecture', 'city', 'town', 'chome', 'block', 'building')
+
+    def __init__(self, raw, zipcode='', prefecture='', city='', town='', chome='', block='', building=''):
+        self.raw = raw
+        self.zipcode = zipcode
+        self.prefecture = prefecture
+        self.city = city
+        self.town = town
+        self.chome = chome
+        self.block = block
+        self.building = building
+
+    @property
+    def ward_key(self):
+        """都道府県+市区町村（例: '東京都渋谷区'）"""
+        return f"{self.prefecture}{self.city}" if self.city else ""
+
+    @property
+    def town_key(self):
+        """都道府県+市区町村+町名+丁目（例: '東京都渋谷区道玄坂2'）"""
+        return f"{self.prefecture}{self.city}{self.town}{self.chome}" if self.town else ""
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __repr__(self):
+        return (f"<ParsedAddress {self.prefecture}|{self.city}|{self.town}|{self.chome}|"
+                f"{self.block}|{self.building}>")
+
+
+class AddressParser:
+    """
+    トライ木による住所パーサー
+
+    - 都道府県のトライ木
+    - 都道府県ごとの市区町村トライ木（都道府県が省略された住所用に全国の市区町村トライ木も保持）
+    - (都道府県, 市区町村) ごとの町名トライ木（値は丁目の有無）
+    """
+
+    def __init__(self, bundled=True):
+        self._prefectures = AddressTrie()
+        self._cities = {}  # 都道府県 -> AddressTrie
+        self._all_cities = AddressTrie()  # 市区町村 -> 該当する都道府県の集合
+        self._towns = {}  # (都道府県, 市区町村) -> AddressTrie
+        self._cache = {}
+        for prefecture in PREFECTURES:
+            self._prefectures.insert(prefecture, prefecture)
+        if bundled:
+            for prefecture, cities in BUNDLED_CITIES.items():
+                for city in cities:
+                    self.add_city(prefecture, city)
+
+    @property
+    def town_count(self):
+        return sum(len(trie) for trie in self._towns.values())
+
+    def add_city(self, prefecture, city):
+        """市区町村を辞書に追加"""
+        trie = self._cities.get(prefecture)
+        if trie is None:
+            trie = self._cities[prefecture] = AddressTrie()
+        trie.insert(city, city)
+        prefectures = self._all_cities.get(city)
+        if prefectures is None:
+            self._all_cities.insert(city, {prefecture})
+        else:
+            prefectures.add(prefecture)
+
+    def add_town(self, prefecture, city, town, has_chome=False):
+        """町名を辞書に追加（has_chome: 「○丁目」のある町か）"""
+        if city not in self._cities.get(prefecture, ()):
+            self.add_city(prefecture, city)
+        trie = self._towns.get((prefecture, city))
+        if trie is None:
+            trie = self._towns[(prefecture, city)] = AddressTrie()
+        trie.insert(town, has_chome or bool(trie.get(town)))
+        self._cache.clear()
+
+    def split_area(self, prefecture, area_name):
+        """
+        Area.city（市区町村+町名、例: '渋谷区道玄坂１丁目'）を分解
+
+        Returns:
+            tuple: (市区町村, 町名, 丁目) / 分解できない部分は空文字
+        """
+        text = unicodedata.normalize('NFKC', area_name or '')
+        text = _PARENTHESES_PATTERN.sub('', text).strip()
+        city, pos = self._match_city(text, 0, prefecture)
+        if not city:
+            return "", "", ""
+        town = text[pos:]
+        chome = ""
+        chome_match = _AREA_CHOME_PATTERN.search(town)
+        if chome_match:
+            chome = chome_match.group(1)
+            town = town[:chome_match.start()]
+        return city, town, chome
+
+    def load_areas(self, rows):
+        """
+        Areaテーブルの (prefecture, city) から市区町村・町名の辞書を構築
+
+        Args:
+            rows: (都道府県, Area.city) のイテラブル
+
+        Returns:
+            int: 追加した町名の件数
+        """
+        before = self.town_count
+        for prefecture, area_name in rows:
+            if prefecture not in self._prefectures:
+                continue
+            city, town, chome = self.split_area(prefecture, area_name)
+            if city and town:
+                self.add_town(prefecture, city, town, has_chome=bool(chome))
+        return self.town_count - before
+
+    def _match_city(self, text, pos, prefecture):
+        """市区町村を辞書の最長一致 → 正規表現の順で判定"""
+        if prefecture:
+            trie = self._cities.get(prefecture)
+            city, end = trie.longest_match(text, pos) if trie else (None, pos)
+        else:
+            prefectures, end = self._all_cities.longest_match(text, pos)
+            city = text[pos:end] if prefectures else None
+        if not city:
+            fallback = _CITY_FALLBACK_PATTERN.match(text, pos)
+            if not fallback:
+                return "", pos
+            city, end = fallback.group(0), fallback.end()
+            if city.endswith('市') and text.startswith('市', end):
+                # 「四日市市」「廿日市市」など市名に「市」を含む場合
+                city, end = city + '市', end + 1
+        if city in DESIGNATED_CITIES:
+            ward = _DESIGNATED_WARD_PATTERN.match(text, end)
+            if ward:
+                city, end = city + ward.group(0), ward.end()
+        return city, end
+
+    def parse(self, address):
+        """
+        住所を構造化
+
+        Args:
+            address: 住所文字列（郵便番号・建物名付きでも可）
+
+        Returns:
+            ParsedAddress: 判定できない要素は空文字
+        """
+        result = ParsedAddress(address)
+        if not address:
+            return result
+
+        text = unicodedata.normalize('NFKC', address).strip()
+        text = _COUNTRY_PREFIX_PATTERN.sub('', text)
+        zip_match = _ZIPCODE_PATTERN.search(text)
+        if zip_match:
+            groups = zip_match.groups()
+            result.zipcode = f"{groups[0] or groups[2]}-{groups[1] or groups[3]}"
+            text = text[:zip_match.start()] + text[zip_match.end():]
+        text = _DIGIT_LONG_VOWEL_PATTERN.sub('-', _HYPHEN_PATTERN.sub('-', text))
+
+        length = len(text)
+        pos = _skip(text, 0)
+
+        # 都道府県
+        prefecture, pos = self._prefectures.longest_match(text, pos)
+        pos = _skip(text, pos)
+
+        # 市区町村
+        city, pos = self._match_city(text, pos, prefecture)
+        if not prefecture and city:
+            prefectures = self._all_cities.get(city)
+            if prefectures and len(prefectures) == 1:
+                prefecture = next(iter(prefectures))
+        result.prefecture = prefecture or ""
+        result.city = city
+        pos = _skip(text, pos)
+
+        # 町名
+        has_chome = None
+        town_trie = self._towns.get((prefecture, city)) if city else None
+        if town_trie:
+            has_chome, end = town_trie.longest_match(text, pos)
+            if has_chome is not None:
+                result.town, pos = text[pos:end], end
+        if not result.town and city and pos < length:
+            town_match = _TOWN_FALLBACK_PATTERN.match(text, pos)
+            if town_match and not _CHOME_PATTERN.match(text, pos):
+                result.town, pos = town_match.group(0), town_match.end()
+        pos = _skip(text, pos)
+
+        # 丁目・番地
+        chome_match = _CHOME_PATTERN.match(text, pos)
+        if chome_match:
+            number = chome_match.group(1)
+            result.chome = number if number.isdigit() else str(kanji_to_number(number))
+            pos = chome_match.end()
+            if pos < length and text[pos] == '-':
+                pos += 1
+        block_match = _BLOCK_PATTERN.match(text, pos)
+        if block_match:
+            numbers = [block_match.group(1)] + [
+                n for n in re.split(r'-', _BLOCK_SEPARATOR_PATTERN.sub('-', block_match.group(2))) if n
+            ]
+            # 「2-29-5」形式: 丁目のある町（辞書にない町は3要素の場合）は先頭を丁目とみなす
+            if not result.chome and len(numbers) >= 2 and (has_chome or (has_chome is None and len(numbers) >= 3)):
+                result.chome = numbers.pop(0)
+            result.block = '-'.join(numbers)
+            pos = block_match.end()
+
+        # 残りは建物名・階数
+        result.building = text[pos:].strip(_SEPARATORS + '-')
+        return result
+
+    def parse_many(self, addresses):
+        """
+        住所をまとめて構造化（同一住所の結果はキャッシュして再利用）
+
+        Args:
+            addresses: 住所のイテラブル
+
+        Returns:
+            list[ParsedAddress]
+        """
+        cache = self._cache
+        parse = self.parse
+        results = []
+        append = results.append
+        for address in addresses:
+            parsed = cache.get(address)
+            if parsed is None:
+                parsed = parse(address)
+                if len(cache) < PARSE_CACHE_SIZE:
+                    cache[address] = parsed
+            append(parsed)
+        return results
+
+
+def _skip(text, pos):
+    """区切り文字（空白・読点）を読み飛ばす"""
+    length = len(text)
+    while pos < length and text[pos] in _SEPARATORS:
+        pos += 1
+    return pos
+
+
+_default_parser = None
+
+
+def get_address_parser(Area=None):
+    """
+    プロセス内で共有するパーサーを返す
+
+    Args:
+        Area: Areaモデル（初回のみ、渡すと町名辞書をAreaテーブルから読み込む。app_context内で呼び出すこと）
+    """
+    global _default_parser
+    if _default_parser is None:
+        _default_parser = AddressParser()
+    if Area is not None and not _default_parser.town_count:
+        _default_parser.load_areas(Area.query.with_entities(Area.prefecture, Area.city).yield_per(5000))
+    return _default_parser
+
+
+def parse_address(address):
+    """住所を構造化（同梱辞書のみの共有パーサーを使用）"""
+    return get_address_parser().parse(address)
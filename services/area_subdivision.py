@@ -0,0 +1,105 @@
+"""
+Google Map検索タスクの地域の細分化
+
+テキスト検索は1クエリ最大60件（20件 × 3ページ）までしか返さないため、上限まで返った（飽和した）検索は
+範囲内の施設を取りこぼしている可能性がある。飽和したタスクだけを Area テーブルの一段細かい地域
+（区・市 → 町名 → 丁目）の子タスクに分割し、飽和しなかった地域はそれ以上分割しない。
+最初から全ての町名でタスクを作る（scripts/generate_detailed_area_tasks.py）より少ないAPI呼び出しで、
+施設の多い地域も漏れなく検索できる。
+
+- キーワードは既存のタスクと同じ形式（'<都道府県><地域> <検索語>'、例: '東京都港区六本木 美容クリニック'）
+- 分割したタスクは SPLIT_STATUS にして再クロールの対象から外す（子タスクが同じ範囲を検索するため）
+- 丁目まで分割しても飽和する場合、町名・丁目のない地域はそれ以上分割できない（ログに残す）
+
+scrape_gmap_and_save（app.py）から使用する。
+"""
+import unicodedata
+
+from models import db, Area, ScrapingTask
+from services.address_parser import PREFECTURES, get_address_parser
+
+
+# 設定
+SPLIT_STATUS = '分割済み'
+
+
+def _normalize(text):
+    return unicodedata.normalize('NFKC', text or '').replace(' ', '').replace('　', '')
+
+
+def split_keyword(keyword):
+    """
+    検索キーワードを (都道府県, 地域, 検索語) に分解
+
+    例: '東京都港区六本木 美容クリニック' → ('東京都', '港区六本木', '美容クリニック')
+    都道府県で始まらないキーワードは ('', '', キーワード)
+    """
+    location, _, term = (keyword or '').strip().partition(' ')
+    prefecture = next((name for name in PREFECTURES if location.startswith(name)), '')
+    if not prefecture:
+        return '', '', (keyword or '').strip()
+    return prefecture, location[len(prefecture):], term.strip()
+
+
+def child_locations(prefecture, location):
+    """
+    地域の一段細かい地域（区・市 → 町名、町名 → 丁目）の一覧（app_context内で呼び出すこと）
+
+    Returns:
+        list: 地域名（Area.city の表記。分割できない場合は空）
+    """
+    parser = get_address_parser(Area)
+    city, town, chome = parser.split_area(prefecture, location)
+    if not city or chome:
+        return []
+    rows = Area.query.filter(
+        Area.prefecture == prefecture, Area.city.like(f"{location}%")
+    ).with_entities(Area.city).all()
+    children = {}
+    for (name,) in rows:
+        child_city, child_town, child_chome = parser.split_area(prefecture, name)
+        if child_city != city or not child_town:
+            continue
+        if not town:
+            # 区・市 → 町名（Areaに町名だけの行があればその表記を使う）
+            key = child_city + child_town
+            if child_chome:
+                children.setdefault(key, key)
+            else:
+                children[key] = name
+        elif child_town == town and child_chome:
+            children[name] = name
+    return sorted(children.values())
+
+
+def subdivide_task(task):
+    """
+    飽和したタスクを一段細かい地域の子タスクに分割（app_context内、コミットは呼び出し側）
+
+    既に同じキーワードのタスクがある地域は作成しない。
+
+    Returns:
+        tuple: (子地域の数, 新規に作成したタスク数)。分割できない場合は (0, 0)
+    """
+    prefecture, location, term = split_keyword(task.search_keyword)
+    if not prefecture or not location:
+        return 0, 0
+    children = child_locations(prefecture, location)
+    if not children:
+        return 0, 0
+    existing = {
+        _normalize(keyword) for (keyword,) in ScrapingTask.query.filter(
+            ScrapingTask.task_type == 'GMAP', ScrapingTask.search_keyword.like(f"{prefecture}{location}%")
+        ).with_entities(ScrapingTask.search_keyword)
+    }
+    created = 0
+    for child in children:
+        keyword = f"{prefecture}{child} {term}" if term else f"{prefecture}{child}"
+        if _normalize(keyword) in existing:
+            continue
+        db.session.add(ScrapingTask(
+            task_type='GMAP', search_keyword=keyword, status='未実行', category_id=task.category_id
+        ))
+        existing.add(_normalize(keyword))
+        created += 1
+    return len(children), created
@@ -0,0 +1,221 @@
+"""
+ブラウザのメモリ監視と必要なときだけの再起動
+
+固定の件数ごとの再起動（メモリリーク対策）の代わりに、ページを1件処理するごとに
+ドライバーのプロセスツリー（chromedriver と子プロセスの Chrome 一式）の RSS を psutil で計測し、
+次のいずれかに当てはまるブラウザだけを再起動する。
+- 1ブラウザの RSS が BROWSER_RSS_LIMIT_MB を超えた
+- 描画にかかる時間が起動直後の基準（最初の BASELINE_PAGES 件の中央値）の LATENCY_FACTOR 倍を超えた
+- 全体（このマシンで動いている全ての Chrome）の RSS が GLOBAL_RSS_LIMIT_MB を超えた
+  （このプロセスが管理するブラウザのうち最も大きいものから再起動する）
+プロセスツリーを特定できないドライバーは、従来どおり FALLBACK_RESTART_PAGES 件ごとに再起動する。
+
+RSS はプロセス間の共有メモリを重複して数えるため、実際の使用量より大きめに出る（閾値はその前提の値）。
+
+使い方:
+    watchdog = get_browser_watchdog()
+    driver = watchdog.track(get_stealth_driver())
+    ...
+    watchdog.record_latency(driver, 読み込みにかかった秒数)
+    reason = watchdog.check(driver)  # 再起動すべきなら理由、不要ならNone
+    ...
+    watchdog.forget(driver)
+    driver.quit()
+"""
+import os
+import statistics
+import threading
+import time
+from collections import deque
+
+import psutil
+
+
+# 設定
+BROWSER_RSS_LIMIT_MB = int(os.environ.get('BROWSER_RSS_LIMIT_MB', '1200'))  # 1ブラウザのRSSの上限
+GLOBAL_RSS_LIMIT_MB = int(os.environ.get('GLOBAL_RSS_LIMIT_MB', '2500'))  # 全てのChromeのRSSの合計の上限（4GBのVPS想定）
+LATENCY_FACTOR = 2.5  # 描画時間が基準のこの倍を超えたら再起動
+MIN_LATENCY_DELTA = 3.0  # 基準との差がこの秒数未満なら遅延とみなさない（速いページの揺らぎ対策）
+BASELINE_PAGES = 5  # 起動直後の基準にする件数
+RECENT_PAGES = 5  # 遅延の判定に使う直近の件数
+MIN_PAGES = 3  # 起動からこの件数未満のブラウザは再起動しない（再起動の連鎖を防ぐ）
+FALLBACK_RESTART_PAGES = 30  # RSSを計測できないドライバーの再起動間隔（件数）
+GLOBAL_SAMPLE_INTERVAL = 5.0  # 全体のRSSを再計測する間隔（秒）
+BROWSER_PROCESS_NAMES = ('chrome', 'chromium', 'chromedriver')
+
+REASON_RSS = 'rss'
+REASON_LATENCY = 'latency'
+REASON_GLOBAL = 'global'
+REASON_FALLBACK = 'fallback'
+
+MB = 1024 * 1024
+
+
+def _root_pids(driver):
+    """ドライバーのプロセスツリーの起点（chromedriver / Chrome本体）のPID"""
+    pids = []
+    browser_pid = getattr(driver, 'browser_pid', None)  # undetected_chromedriver
+    if browser_pid:
+        pids.append(browser_pid)
+    process = getattr(getattr(driver, 'service', None), 'process', None)
+    if process is not None and getattr(process, 'pid', None):
+        pids.append(process.pid)
+    return pids
+
+
+def process_tree_rss(pids):
+    """
+    プロセスとその全ての子プロセスのRSSの合計（バイト）
+
+    Returns:
+        int: RSSの合計（どのプロセスも見つからなければNone）
+    """
+    seen = {}
+    for pid in pids:
+        try:
+            root = psutil.Process(pid)
+            processes = [root] + root.children(recursive=True)
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            continue
+        for process in processes:
+            if process.pid in seen:
+                continue
+            try:
+                seen[process.pid] = process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                pass
+    return sum(seen.values()) if seen else None
+
+
+def browser_processes_rss():
+    """このマシンで動いている全てのChrome（chromedriver含む）のRSSの合計（バイト）"""
+    total = 0
+    for process in psutil.process_iter(['name', 'memory_info']):
+        name = (process.info['name'] or '').lower()
+        memory = process.info['memory_info']
+        if memory is not None and any(browser in name for browser in BROWSER_PROCESS_NAMES):
+            total += memory.rss
+    return total
+
+
+class BrowserState:
+    """監視中の1ブラウザの状態"""
+
+    def __init__(self, pids):
+        self.pids = pids
+        self.started = time.monotonic()
+        self.pages = 0
+        self.baseline = []  # 起動直後の描画時間
+        self.recent = deque(maxlen=RECENT_PAGES)
+        self.rss = None
+        self.peak_rss = 0
+
+    def baseline_latency(self):
+        return statistics.median(self.baseline) if len(self.baseline) >= BASELINE_PAGES else None
+
+    def latency_degraded(self):
+        baseline = self.baseline_latency()
+        if baseline is None or len(self.recent) < RECENT_PAGES:
+            return False
+        recent = statistics.median(self.recent)
+        return recent > baseline * LATENCY_FACTOR and recent - baseline >= MIN_LATENCY_DELTA
+
+
+class BrowserWatchdog:
+    """ブラウザのメモリ・描画時間の監視（スレッドセーフ、プロセス内で共有）"""
+
+    def __init__(self):
+        self._browsers = {}  # id(driver) → BrowserState
+        self._lock = threading.Lock()
+        self._global_rss = None
+        self._global_sampled = 0.0
+        self.recycles = {REASON_RSS: 0, REASON_LATENCY: 0, REASON_GLOBAL: 0, REASON_FALLBACK: 0}
+        self.peak_rss = 0
+
+    def track(self, driver):
+        """ドライバーを監視対象に登録（ドライバーをそのまま返す）"""
+        with self._lock:
+            self._browsers[id(driver)] = BrowserState(_root_pids(driver))
+        return driver
+
+    def forget(self, driver):
+        """監視対象から外す（quit() の前に呼ぶ）"""
+        with self._lock:
+            self._browsers.pop(id(driver), None)
+
+    def record_latency(self, driver, seconds):
+        """ページの読み込み開始から描画完了までの秒数を記録"""
+        with self._lock:
+            state = self._browsers.get(id(driver))
+            if state is None:
+                return
+            if len(state.baseline) < BASELINE_PAGES:
+                state.baseline.append(seconds)
+            else:
+                state.recent.append(seconds)
+
+    def _sample_global(self):
+        now = time.monotonic()
+        if self._global_rss is None or now - self._global_sampled >= GLOBAL_SAMPLE_INTERVAL:
+            self._global_rss = browser_processes_rss()
+            self._global_sampled = now
+        return self._global_rss
+
+    def check(self, driver):
+        """
+        ページを1件処理した後に呼び出し、RSSを計測して再起動すべきか判定
+
+        Returns:
+            str: 再起動すべきなら理由（ログ用）、不要ならNone（監視対象外のドライバーもNone）
+        """
+        with self._lock:
+            state = self._browsers.get(id(driver))
+        if state is None:
+            return None
+        rss = process_tree_rss(state.pids) if state.pids else None
+        global_rss = self._sample_global()
+
+        with self._lock:
+            state.pages += 1
+            state.rss = rss
+            if rss is not None:
+                state.peak_rss = max(state.peak_rss, rss)
+                self.peak_rss = max(self.peak_rss, rss)
+            if state.pages < MIN_PAGES:
+                return None
+            if rss is None:
+                if state.pages >= FALLBACK_RESTART_PAGES:
+                    return self._recycle(REASON_FALLBACK, f"RSSを計測できないため{state.pages}件ごとに再起動")
+                return None
+            if rss > BROWSER_RSS_LIMIT_MB * MB:
+                return self._recycle(REASON_RSS, f"RSS {rss / MB:.0f}MB > 上限 {BROWSER_RSS_LIMIT_MB}MB")
+            if state.latency_degraded():
+                return self._recycle(REASON_LATENCY, f"描画時間 {statistics.median(state.recent):.1f}秒"
+                                                     f"（起動直後 {state.baseline_latency():.1f}秒）")
+            if global_rss > GLOBAL_RSS_LIMIT_MB * MB:
+                # このプロセスのブラウザのうち最も大きいものだけを再起動する
+                largest = max(self._browsers.values(), key=lambda other: other.rss or 0)
+                if largest is state:
+                    self._global_rss = None  # 再起動後に計測し直す
+                    return self._recycle(REASON_GLOBAL, f"全体のRSS {global_rss / MB:.0f}MB > 上限 {GLOBAL_RSS_LIMIT_MB}MB"
+                                                        f"（このブラウザ {rss / MB:.0f}MB）")
+            return None
+
+    def _recycle(self, kind, reason):
+        self.recycles[kind] += 1
+        return reason
+
+    def print_report(self):
+        """再起動の回数（理由別）と最大RSSを表示"""
+        total = sum(self.recycles.values())
+        print(f"ブラウザのメモリ監視: 再起動 {total}回（RSS {self.recycles[REASON_RSS]} / "
+              f"描画時間 {self.recycles[REASON_LATENCY]} / 全体の上限 {self.recycles[REASON_GLOBAL]} / "
+              f"計測不可 {self.recycles[REASON_FALLBACK]}）最大RSS {self.peak_rss / MB:.0f}MB", flush=True)
+
+
+_watchdog = BrowserWatchdog()
+
+
+def get_browser_watchdog():
+    """プロセス内で共有するBrowserWatchdog"""
+    return _watchdog
@@ -0,0 +1,320 @@
+"""
+再クロール時の変更検出（変更のないページの解析・DB書き込みを省略）
+
+URLごとに ETag / Last-Modified と正規化した内容のハッシュを記録する。
+- HTTPで取得するページ（公式サイト）: 条件付きリクエスト（If-None-Match / If-Modified-Since）を送り、
+  304 なら未変更とする
+- それ以外（Seleniumで取得するHPBの一覧、Places APIの結果）: 正規化した内容のハッシュを前回と比較する
+  正規化では script / style / コメント等と、リンクのクエリ文字列（計測用パラメータ）を除く
+
+実行ごとに未変更の割合を集計して記録する（scripts/report_page_changes.py で確認し、
+変更の少ないページの再クロール間隔を延ばす判断に使う）。リプレイモードでは変更検出を行わない。
+
+保存先: instance/page_state.sqlite3（環境変数 PAGE_STATE_DB で変更可）
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from lxml import etree, html as lxml_html
+
+from services.snapshot_store import is_replay
+
+
+# 設定
+PAGE_STATE_DB = os.environ.get(
+    'PAGE_STATE_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'page_state.sqlite3')
+)
+VOLATILE_TAGS = ('script', 'style', 'noscript', 'template', etree.Comment)  # 内容の比較から除く要素
+# Places APIの検索結果のうち比較する項目（photo_reference 等は毎回変わるため除く）
+PLACE_FIELDS = ('name', 'formatted_address', 'rating', 'user_ratings_total', 'business_status')
+
+_enabled = os.environ.get('CHANGE_DETECTION', '1') != '0'
+
+
+def set_enabled(enabled=True):
+    """変更検出の有効・無効を切り替える（無効なら常に「変更あり」として全件処理する）"""
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def is_enabled():
+    return _enabled and not is_replay()
+
+
+def content_fingerprint(html, extra=None):
+    """
+    正規化した内容のハッシュ
+
+    表示テキスト（空白を畳んだもの）とリンク先（クエリ文字列・フラグメントを除く）から計算する。
+    広告・計測用のスクリプトや属性だけが変わったページは同じハッシュになる。
+
+    Args:
+        html: HTML
+        extra: 内容と一緒にハッシュする値（処理条件が変わったら再処理させたい場合。カテゴリ名など）
+
+    Returns:
+        str: SHA-256（16進）
+    """
+    digest = hashlib.sha256()
+    if extra is not None:
+        digest.update(str(extra).encode('utf-8') + b'\0')
+    try:
+        document = lxml_html.document_fromstring(html)
+    except ValueError:
+        document = lxml_html.document_fromstring(html.encode('utf-8'))
+    except etree.ParserError:
+        digest.update((html or '').encode('utf-8'))
+        return digest.hexdigest()
+    etree.strip_elements(document, *VOLATILE_TAGS, with_tail=False)
+    for part in document.itertext():
+        text = ' '.join(part.split())
+        if text:
+            digest.update(text.encode('utf-8') + b'\n')
+    for href in document.xpath('//a/@href'):
+        digest.update(href.split('#', 1)[0].split('?', 1)[0].encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+def data_fingerprint(data, extra=None):
+    """APIの結果など（JSONに変換できる値）のハッシュ"""
+    payload = json.dumps([data, extra], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def place_state(place_details):
+    """Places APIの結果1件の (状態のキー, 比較する値)"""
+    return f"place:{place_details.get('place_id')}", {name: place_details.get(name) for name in PLACE_FIELDS}
+
+
+class PageState:
+    """URL1件の前回の状態"""
+    __slots__ = ('url', 'source', 'etag', 'last_modified', 'content_hash', 'checked_at', 'changed_at', 'unchanged_runs')
+
+    def __init__(self, url, source, etag, last_modified, content_hash, checked_at, changed_at, unchanged_runs):
+        self.url = url
+        self.source = source
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_hash = content_hash
+        self.checked_at = checked_at
+        self.changed_at = changed_at
+        self.unchanged_runs = unchanged_runs  # 連続して未変更だった回数
+
+
+class PageStateStore:
+    """URLごとの状態（ETag / Last-Modified / 内容のハッシュ）と実行ごとの集計の保存先"""
+
+    def __init__(self, path=PAGE_STATE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS page_state (
+                url TEXT PRIMARY KEY,
+                source TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                checked_at REAL NOT NULL,
+                changed_at REAL NOT NULL,
+                unchanged_runs INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS ix_page_state_source ON page_state (source);
+            CREATE TABLE IF NOT EXISTS change_runs (
+                id INTEGER PRIMARY KEY,
+                source TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                finished_at REAL NOT NULL,
+                checked INTEGER NOT NULL,
+                unchanged INTEGER NOT NULL,
+                not_modified INTEGER NOT NULL,
+                new INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_change_runs_source ON change_runs (source, started_at);
+        ''')
+
+    def get(self, url):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, source, etag, last_modified, content_hash, checked_at, changed_at, unchanged_runs '
+                'FROM page_state WHERE url = ?', (url,)
+            ).fetchone()
+        return PageState(*row) if row else None
+
+    def states(self, source):
+        """取得元のURLの状態をまとめて取得（URL → PageState）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT url, source, etag, last_modified, content_hash, checked_at, changed_at, unchanged_runs '
+                'FROM page_state WHERE source = ?', (source,)
+            ).fetchall()
+        return {row[0]: PageState(*row) for row in rows}
+
+    def record(self, url, source, content_hash, changed, etag=None, last_modified=None):
+        """処理を終えたURLの状態を保存（changed=False なら連続未変更回数を加算）"""
+        now = time.time()
+        with self._lock:
+            if changed:
+                self._conn.execute('''
+                    INSERT INTO page_state (url, source, etag, last_modified, content_hash, checked_at, changed_at, unchanged_runs)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, 0)
+                    ON CONFLICT(url) DO UPDATE SET source = excluded.source, etag = excluded.etag,
+                        last_modified = excluded.last_modified, content_hash = excluded.content_hash,
+                        checked_at = excluded.checked_at, changed_at = excluded.changed_at, unchanged_runs = 0
+                ''', (url, source, etag, last_modified, content_hash, now, now))
+            else:
+                self._conn.execute('''
+                    UPDATE page_state SET checked_at = ?, unchanged_runs = unchanged_runs + 1,
+                        etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified)
+                    WHERE url = ?
+                ''', (now, etag, last_modified, url))
+            self._conn.commit()
+
+    def record_run(self, source, started_at, counts):
+        with self._lock:
+            self._conn.execute(
+                'INSERT INTO change_runs (source, started_at, finished_at, checked, unchanged, not_modified, new) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (source, started_at, time.time(), counts['checked'], counts['unchanged'], counts['not_modified'],
+                 counts['new'])
+            )
+            self._conn.commit()
+
+    def recent_runs(self, source=None, limit=20):
+        """直近の実行ごとの集計 [(source, started_at, checked, unchanged, not_modified, new), ...]"""
+        query = 'SELECT source, started_at, checked, unchanged, not_modified, new FROM change_runs'
+        params = []
+        if source:
+            query += ' WHERE source = ?'
+            params.append(source)
+        with self._lock:
+            return self._conn.execute(query + ' ORDER BY started_at DESC LIMIT ?', params + [limit]).fetchall()
+
+    def stability(self, source=None):
+        """
+        取得元ごとのURLの安定度
+
+        Returns:
+            dict: 取得元 → {'urls', 'stable_1', 'stable_3', 'stable_5', 'avg_days_since_change'}
+        """
+        query = '''
+            SELECT COALESCE(source, ''), COUNT(*),
+                   SUM(unchanged_runs >= 1), SUM(unchanged_runs >= 3), SUM(unchanged_runs >= 5),
+                   AVG(? - changed_at) / 86400.0
+            FROM page_state
+        '''
+        params = [time.time()]
+        if source:
+            query += ' WHERE source = ?'
+            params.append(source)
+        with self._lock:
+            rows = self._conn.execute(query + ' GROUP BY source ORDER BY source', params).fetchall()
+        return {row[0]: {'urls': row[1], 'stable_1': row[2], 'stable_3': row[3], 'stable_5': row[4],
+                         'avg_days_since_change': row[5]} for row in rows}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_page_state_store():
+    """プロセス内で共有するPageStateStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = PageStateStore()
+        return _store
+
+
+class ChangeTracker:
+    """
+    1回の実行での変更検出と集計
+
+    使い方:
+        tracker = ChangeTracker('hpb_list')
+        unchanged, fingerprint = tracker.check(url, html=html)
+        if not unchanged:
+            ...（解析・DB書き込み）
+        tracker.commit(url, fingerprint, changed=not unchanged)  # 処理を終えてから記録
+        tracker.report()
+
+    Args:
+        source: 取得元の識別名（hpb_list / contact / gmap など）
+        store: PageStateStore（省略時はプロセス内で共有のもの）
+    """
+
+    def __init__(self, source, store=None):
+        self.source = source
+        self.enabled = is_enabled()
+        self.store = (store or get_page_state_store()) if self.enabled else None
+        self.started_at = time.time()
+        self.counts = {'checked': 0, 'unchanged': 0, 'not_modified': 0, 'new': 0}
+        self._lock = threading.Lock()
+
+    def _count(self, *keys):
+        with self._lock:
+            for key in keys:
+                self.counts[key] += 1
+
+    def conditional_headers(self, url):
+        """条件付きリクエストのヘッダー（前回の ETag / Last-Modified がなければ空）"""
+        if not self.enabled:
+            return {}
+        state = self.store.get(url)
+        headers = {}
+        if state and state.etag:
+            headers['If-None-Match'] = state.etag
+        if state and state.last_modified:
+            headers['If-Modified-Since'] = state.last_modified
+        return headers
+
+    def not_modified(self, url):
+        """304 Not Modified を受け取った（未変更として数える）"""
+        self._count('checked', 'unchanged', 'not_modified')
+
+    def check(self, url, html=None, data=None, extra=None):
+        """
+        前回から変更がないか
+
+        Args:
+            url: 状態のキー（URL、またはAPIの結果なら 'place:<place_id>' など）
+            html: ページのHTML（content_fingerprint で比較）
+            data: APIの結果など（data_fingerprint で比較）
+            extra: 内容と一緒にハッシュする処理条件
+
+        Returns:
+            tuple: (未変更ならTrue, 今回のハッシュ)
+        """
+        fingerprint = content_fingerprint(html, extra) if data is None else data_fingerprint(data, extra)
+        if not self.enabled:
+            return False, fingerprint
+        state = self.store.get(url)
+        if state is None:
+            self._count('checked', 'new')
+            return False, fingerprint
+        unchanged = state.content_hash == fingerprint
+        self._count('checked', 'unchanged') if unchanged else self._count('checked')
+        return unchanged, fingerprint
+
+    def commit(self, url, fingerprint, changed=True, etag=None, last_modified=None):
+        """処理を終えたURLの状態を保存（処理に失敗した場合は呼ばない → 次回も処理される）"""
+        if self.enabled:
+            self.store.record(url, self.source, fingerprint, changed, etag=etag, last_modified=last_modified)
+
+    def report(self):
+        """今回の集計を表示して記録"""
+        if not self.enabled:
+            return
+        counts = self.counts
+        if counts['checked']:
+            self.store.record_run(self.source, self.started_at, counts)
+        ratio = counts['unchanged'] / counts['checked'] * 100 if counts['checked'] else 0
+        print(f"変更検出（{self.source}）: 確認 {counts['checked']}件 / 未変更 {counts['unchanged']}件（{ratio:.1f}%、"
+              f"304応答 {counts['not_modified']}件）/ 初回 {counts['new']}件", flush=True)
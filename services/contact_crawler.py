@@ -0,0 +1,577 @@
+"""
+公式サイトの問い合わせ情報クローラー（非同期HTTP優先）
+- トップページをコネクションプール付きのHTTPクライアント（aiohttp）で取得
+- aタグのテキスト・URLから問い合わせページを探し、同時に取得
+- メール・電話番号の抽出は services.contact_extraction（テキストノードと mailto: / tel: リンクが対象）
+- 同時接続数は全体とドメインごとに制限（同じサイトへの負荷を抑える）
+- ホストごとのAIMD同時実行数・サーキットブレーカー（services.host_controller）を通して取得し、
+  遮断中のホストは待たずにエラーとする（次回の実行で再取得される）
+- JavaScriptでしか描画されないサイトのみブラウザ（Selenium）で再取得
+  （メモリ・描画時間を監視し、必要なときだけ再起動: services.browser_watchdog）
+- 同じドメイン（チェーン・分院）のサイトは1回だけ取得し、問い合わせURL・メールをグループ内の全Bizに展開
+  （電話番号は支店ごとに異なるため、取得したサイトのBizにのみ保存）
+- 取得したHTMLはスナップショットとして保存（リプレイモードでは保存済みのHTMLのみを使用）
+- トップページは条件付きリクエストで取得し、304応答または内容のハッシュが前回と同じサイトは
+  問い合わせページの取得・DB書き込みを省略（services.change_detection）
+- 結果（inquiry_url / email / phone）はバッチ単位でバルクUPDATE
+
+scripts/scrape_website_contacts.py から使用する。
+"""
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
+from lxml import etree, html as lxml_html
+from sqlalchemy import update
+
+from services.browser_watchdog import get_browser_watchdog
+from services.change_detection import ChangeTracker
+from services.contact_extraction import extract_contacts
+from services.domain_groups import group_by_domain, print_dedup_stats
+from services.host_controller import CircuitOpenError, get_host_controller
+from services.normalization import matching_keys, registrable_domain
+from services.snapshot_store import get_snapshot_store, is_replay, record_snapshot
+
+
+# 設定
+CONCURRENCY = 20  # 全体の同時リクエスト数
+PER_DOMAIN_LIMIT = 2  # 同一ドメインへの同時リクエスト数
+REQUEST_TIMEOUT = 15  # 1リクエストのタイムアウト（秒）
+MAX_CONTACT_PAGES = 2  # 1サイトあたりに取得する問い合わせページ数
+MAX_BODY_BYTES = 2 * 1024 * 1024  # これより大きいレスポンスは切り捨て
+BATCH_SIZE = 50  # DB書き込みのバッチサイズ
+BROWSER_WORKERS = 1  # ブラウザでの再取得の並列数
+SNAPSHOT_SOURCE = 'contact'  # スナップショットの取得元の識別名
+SHARED_COLUMNS = ('inquiry_url', 'email')  # 同じドメインの他のBizに展開する項目（電話番号は支店ごとに異なるため含めない）
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.7339.127 Safari/537.36'
+
+CONTACT_KEYWORDS = [
+    'お問い合わせ', '問い合わせ', '問合せ', 'お問合せ',
+    'contact', 'Contact', 'CONTACT',
+    'ご予約', '予約', '相談', 'カウンセリング'
+]
+CONTACT_URL_KEYWORDS = ['contact', 'inquiry', 'toiawase', 'otoiawase', 'form', 'reserve', 'counseling']
+
+MAX_EMAILS = 3
+MAX_PHONES = 2
+
+_LINK_STRAINER = SoupStrainer('a', href=True)
+_META_CHARSET_PATTERN = re.compile(rb'<meta[^>]+charset=["\']?([a-zA-Z0-9_-]+)', re.IGNORECASE)
+_JS_ONLY_MARKERS = ('enable javascript', 'javascriptを有効', 'id="root"', 'id="app"', 'id="__next"', 'id="__nuxt"')
+MIN_TEXT_LENGTH = 200  # 本文がこれより短く、JS前提のマーカーがあればブラウザで再取得
+
+
+def find_contact_links(html, base_url, limit=MAX_CONTACT_PAGES):
+    """
+    ページ内のaタグから問い合わせページの候補を探す（同一ドメインのみ）
+
+    Args:
+        html: ページのHTML
+        base_url: ページのURL（相対リンクの解決用）
+        limit: 最大件数
+
+    Returns:
+        list[str]: 問い合わせページのURL（テキスト一致 → URL一致の順）
+    """
+    if not html:
+        return []
+    site_domain = registrable_domain(base_url)
+    # aタグのみをパース（ページ全体のツリーは作らない）
+    soup = BeautifulSoup(html, 'lxml', parse_only=_LINK_STRAINER)
+    by_text, by_url = [], []
+    for anchor in soup.find_all('a', href=True):
+        href = anchor['href'].strip()
+        if not href or href.startswith(('#', 'mailto:', 'tel:', 'javascript:')):
+            continue
+        url = urljoin(base_url, href).split('#', 1)[0]
+        # 外部サイト（予約システム等）を除外
+        if registrable_domain(url) != site_domain or url.rstrip('/') == base_url.rstrip('/'):
+            continue
+        text = anchor.get_text(' ', strip=True) or anchor.get('title', '') or ''
+        if any(keyword in text for keyword in CONTACT_KEYWORDS):
+            if url not in by_text:
+                by_text.append(url)
+        elif any(keyword in urlparse(url).path.lower() for keyword in CONTACT_URL_KEYWORDS):
+            if url not in by_url:
+                by_url.append(url)
+    links = by_text + [url for url in by_url if url not in by_text]
+    return links[:limit]
+
+
+def needs_browser(html):
+    """JavaScriptで描画されるためHTTP取得では中身がないページか判定"""
+    if not html or not html.strip():
+        return False
+    try:
+        document = lxml_html.document_fromstring(html)
+    except ValueError:
+        document = lxml_html.document_fromstring(html.encode('utf-8'))
+    except etree.ParserError:
+        return False
+    etree.strip_elements(document, 'script', 'style', 'noscript', 'template', etree.Comment, with_tail=False)
+    if sum(len(part.strip()) for part in document.itertext()) >= MIN_TEXT_LENGTH:
+        return False
+    lowered = html.lower()
+    return any(marker in lowered for marker in _JS_ONLY_MARKERS) or '<script' in lowered
+
+
+def _decode(body, charset):
+    """レスポンスをデコード（ヘッダー → metaタグ → UTF-8 の順で文字コードを判定）"""
+    if not charset:
+        meta = _META_CHARSET_PATTERN.search(body[:4096])
+        charset = meta.group(1).decode('ascii') if meta else 'utf-8'
+    try:
+        return body.decode(charset, errors='replace')
+    except LookupError:
+        return body.decode('utf-8', errors='replace')
+
+
+class ContactResult:
+    """1サイト分の取得結果"""
+    __slots__ = ('biz_id', 'website_url', 'contact_page_url', 'emails', 'phones', 'status', 'error', 'fetches',
+                 'fingerprint', 'etag', 'last_modified')
+
+    def __init__(self, biz_id, website_url):
+        self.biz_id = biz_id
+        self.website_url = website_url
+        self.contact_page_url = None
+        self.emails = []
+        self.phones = []
+        self.status = 'ok'  # ok / unchanged（前回から変更なし）/ browser（ブラウザで再取得が必要）/ error
+        self.error = None
+        self.fetches = 0
+        # トップページの変更検出用（services.change_detection）
+        self.fingerprint = None
+        self.etag = None
+        self.last_modified = None
+
+    def merge(self, emails, phones):
+        for email in emails:
+            if email not in self.emails:
+                self.emails.append(email)
+        for phone in phones:
+            if phone not in self.phones:
+                self.phones.append(phone)
+
+    @property
+    def found(self):
+        return bool(self.contact_page_url or self.emails or self.phones)
+
+
+def process_pages(result, pages):
+    """
+    取得済みページ（[(URL, HTML), ...]、先頭がトップページ）から結果を組み立てる
+
+    問い合わせページの内容を優先し、トップページの内容で補う。
+    """
+    for url, html in pages[1:]:
+        if html and not result.contact_page_url:
+            result.contact_page_url = url
+        result.merge(*extract_contacts(html))
+    if pages:
+        result.merge(*extract_contacts(pages[0][1]))
+    result.emails = result.emails[:MAX_EMAILS]
+    result.phones = result.phones[:MAX_PHONES]
+    return result
+
+
+class AsyncContactCrawler:
+    """
+    aiohttpによる問い合わせ情報クローラー
+
+    同時リクエスト数は全体（CONCURRENCY）とドメインごと（PER_DOMAIN_LIMIT）の2段階で制限する。
+    tracker（services.change_detection.ChangeTracker）を渡すと、トップページが前回から
+    変更されていないサイトは status='unchanged' として問い合わせページを取得しない。
+    """
+
+    def __init__(self, concurrency=CONCURRENCY, per_domain=PER_DOMAIN_LIMIT, timeout=REQUEST_TIMEOUT,
+                 tracker=None):
+        self.concurrency = concurrency
+        self.per_domain = per_domain
+        self.timeout = timeout
+        self.tracker = tracker
+        self._domain_limits = {}
+        self._global_limit = None
+
+    def _domain_limit(self, url):
+        domain = registrable_domain(url) or url
+        limit = self._domain_limits.get(domain)
+        if limit is None:
+            limit = self._domain_limits[domain] = asyncio.Semaphore(self.per_domain)
+        return limit
+
+    async def fetch(self, session, url, headers=None, validators=None):
+        """
+        1ページ取得
+
+        取得したHTMLはスナップショットとして保存し、リプレイモードでは保存済みのHTMLを返す。
+
+        Args:
+            session: aiohttp.ClientSession
+            url: URL
+            headers: 追加のリクエストヘッダー（条件付きリクエストの If-None-Match など）
+            validators: 指定時はレスポンスの status / etag / last_modified を格納するdict
+
+        Returns:
+            tuple: (最終URL, HTML) / HTML以外・エラー時・304応答時は (URL, None)
+        """
+        if is_replay():
+            snapshot = get_snapshot_store().get(url)
+            return url, snapshot
+        # 同時実行数の枠を先に取る（Slot.started がHTTPリクエストの時間だけを計るように）
+        async with self._global_limit, self._domain_limit(url), \
+                get_host_controller().async_request(url, wait=False) as slot:
+            async with session.get(url, allow_redirects=True, headers=headers) as response:
+                slot.check_status(response.status)
+                if validators is not None:
+                    validators['status'] = response.status
+                    validators['etag'] = response.headers.get('ETag')
+                    validators['last_modified'] = response.headers.get('Last-Modified')
+                if response.status != 200:
+                    return url, None
+                content_type = response.headers.get('Content-Type', '')
+                if content_type and 'html' not in content_type:
+                    return str(response.url), None
+                body = await response.content.read(MAX_BODY_BYTES)
+                html = _decode(body, response.charset)
+        record_snapshot(url, html, SNAPSHOT_SOURCE)
+        return str(response.url), html
+
+    async def crawl_site(self, session, biz_id, website_url):
+        """トップページ → 問い合わせページ（同時取得）の順に取得して結果を返す"""
+        result = ContactResult(biz_id, website_url)
+        try:
+            headers = self.tracker.conditional_headers(website_url) if self.tracker else None
+            validators = {}
+            final_url, html = await self.fetch(session, website_url, headers=headers, validators=validators)
+            result.fetches += 1
+            result.etag, result.last_modified = validators.get('etag'), validators.get('last_modified')
+            if self.tracker and validators.get('status') == 304:
+                self.tracker.not_modified(website_url)
+                result.status = 'unchanged'
+                return result
+            if html is None:
+                result.status, result.error = 'error', 'トップページを取得できません'
+                return result
+            if needs_browser(html):
+                result.status = 'browser'
+                return result
+            if self.tracker:
+                unchanged, result.fingerprint = self.tracker.check(website_url, html=html)
+                if unchanged:
+                    result.status = 'unchanged'
+                    return result
+
+            links = find_contact_links(html, final_url)
+            pages = [(final_url, html)]
+            if links:
+                fetched = await asyncio.gather(*(self.fetch(session, link) for link in links), return_exceptions=True)
+                result.fetches += len(links)
+                pages.extend(page for page in fetched if not isinstance(page, BaseException))
+            return process_pages(result, pages)
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError, ValueError, CircuitOpenError) as e:
+            result.status, result.error = 'error', f"{type(e).__name__}: {str(e)[:100]}"
+            return result
+
+    async def crawl(self, sites):
+        """
+        複数サイトを同時に取得（完了した順に返す）
+
+        Args:
+            sites: (biz_id, website_url) のリスト
+
+        Yields:
+            ContactResult
+        """
+        self._global_limit = asyncio.Semaphore(self.concurrency)
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=self.per_domain, ttl_dns_cache=300)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        headers = {'User-Agent': USER_AGENT, 'Accept-Language': 'ja,en;q=0.8'}
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=headers) as session:
+            tasks = [asyncio.ensure_future(self.crawl_site(session, biz_id, url)) for biz_id, url in sites]
+            for task in asyncio.as_completed(tasks):
+                yield await task
+
+
+class BrowserContactCrawler:
+    """
+    JavaScript必須サイト用のブラウザクローラー（スレッドごとに1つのドライバー）
+
+    Args:
+        driver_factory: Seleniumドライバーを生成する関数（app.get_stealth_driver）
+        workers: 並列数
+    """
+
+    def __init__(self, driver_factory, workers=BROWSER_WORKERS):
+        self.driver_factory = driver_factory
+        self.workers = workers
+        self._local = threading.local()
+        self._drivers = []
+        self._lock = threading.Lock()
+
+    def _driver(self):
+        driver = getattr(self._local, 'driver', None)
+        if driver is None:
+            driver = get_browser_watchdog().track(self.driver_factory())
+            driver.set_page_load_timeout(30)
+            with self._lock:
+                self._drivers.append(driver)
+            self._local.driver = driver
+        return driver
+
+    def _quit(self, driver):
+        with self._lock:
+            if driver in self._drivers:
+                self._drivers.remove(driver)
+        get_browser_watchdog().forget(driver)
+        try:
+            driver.quit()
+        except Exception:
+            pass
+        self._local.driver = None
+
+    def _load(self, driver, url):
+        with get_host_controller().request(url, wait=False) as slot:
+            started = time.monotonic()
+            driver.get(url)
+            # 固定のsleepではなく、読み込み完了を待つ
+            deadline = started + 10
+            while time.monotonic() < deadline:
+                if driver.execute_script('return document.readyState') == 'complete':
+                    break
+                time.sleep(0.2)
+            get_browser_watchdog().record_latency(driver, time.monotonic() - started)
+            html = slot.check(driver.page_source)
+        record_snapshot(url, html, SNAPSHOT_SOURCE)
+        return driver.current_url, html
+
+    def crawl_site(self, biz_id, website_url):
+        result = ContactResult(biz_id, website_url)
+        driver = self._driver()
+        try:
+            final_url, html = self._load(driver, website_url)
+            pages = [(final_url, html)]
+            for link in find_contact_links(html, final_url):
+                pages.append(self._load(driver, link))
+            result.fetches = len(pages)
+            reason = get_browser_watchdog().check(driver)
+            if reason:
+                print(f"  🔄 ブラウザを再起動します: {reason}", flush=True)
+                self._quit(driver)
+            return process_pages(result, pages)
+        except CircuitOpenError as e:
+            result.status, result.error = 'error', str(e)
+            return result
+        except Exception as e:
+            result.status, result.error = 'error', f"{type(e).__name__}: {str(e)[:100]}"
+            self._quit(driver)
+            return result
+
+    def crawl(self, sites):
+        """複数サイトを取得（完了順ではなく入力順に返す）"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(lambda site: self.crawl_site(*site), sites)
+
+    def close(self):
+        for driver in list(self._drivers):
+            get_browser_watchdog().forget(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self._drivers.clear()
+
+
+class ContactWriter:
+    """
+    取得結果をバッチ単位でBizにバルクUPDATE
+
+    同じドメインの他のBizにもドメイン単位の項目（問い合わせURL・メール）を展開する。展開先では未登録（NULL）の
+    項目にのみ書き込む（支店ごとに個別に登録されていることがあるため）。電話番号は支店ごとに異なり、
+    名寄せのキー（phone_digits）にもなるため、取得したサイトのBizにのみ書き込む。
+    前回から変更のなかったサイトは、保存済みの値を前回の処理後にグループに加わったBizに展開する（add_unchanged）。
+    """
+
+    def __init__(self, db, Biz, batch_size=BATCH_SIZE):
+        self.db = db
+        self.Biz = Biz
+        self.batch_size = batch_size
+        self._pending = []
+        self._shared = []  # (展開先のbiz_idリスト, [(列名, 値), ...])
+        self._unchanged = []  # (代表のbiz_id, 展開先のbiz_idリスト)（保存済みの値を flush 時に読んで展開）
+        self.written = 0
+
+    def add(self, result, shared_ids=()):
+        """
+        Args:
+            result: ContactResult
+            shared_ids: 結果を展開する同じドメインの他のBiz ID
+        """
+        if not result.found:
+            return
+        values = {}
+        if result.contact_page_url:
+            values['inquiry_url'] = result.contact_page_url
+        if result.emails:
+            values['email'] = ', '.join(result.emails)
+        if result.phones:
+            values['phone'] = ', '.join(result.phones)
+            # バルクUPDATEではモデルのイベントが発火しないため、正規化キーもここで更新
+            values['phone_digits'] = matching_keys(phone=values['phone'])['phone_digits']
+        columns = [(column, values[column]) for column in SHARED_COLUMNS if column in values]
+        if shared_ids and columns:
+            self._shared.append((list(shared_ids), columns))
+        self._pending.append(dict(values, id=result.biz_id))
+        if len(self._pending) + len(self._shared) + len(self._unchanged) >= self.batch_size:
+            self.flush()
+
+    def add_unchanged(self, biz_id, shared_ids):
+        """
+        前回から変更のなかったサイトの保存済みの問い合わせURL・メールを、未登録の展開先に書き込む
+
+        Args:
+            biz_id: 代表のBiz ID（取得したサイト）
+            shared_ids: 同じドメインの他のBiz ID
+        """
+        if not shared_ids:
+            return
+        self._unchanged.append((biz_id, list(shared_ids)))
+        if len(self._pending) + len(self._shared) + len(self._unchanged) >= self.batch_size:
+            self.flush()
+
+    def _load_unchanged(self):
+        """変更のなかった代表の保存済みの値を読み、展開の対象に加える"""
+        shared_ids = dict(self._unchanged)
+        columns = [getattr(self.Biz, column) for column in SHARED_COLUMNS]
+        rows = self.db.session.query(self.Biz.id, *columns).filter(self.Biz.id.in_(list(shared_ids)))
+        for biz_id, *values in rows:
+            stored = [(column, value) for column, value in zip(SHARED_COLUMNS, values) if value]
+            if stored:
+                self._shared.append((shared_ids[biz_id], stored))
+        self._unchanged = []
+
+    def flush(self):
+        if not self._pending and not self._shared and not self._unchanged:
+            return
+        if self._unchanged:
+            self._load_unchanged()
+        if self._pending:
+            self.db.session.execute(update(self.Biz), self._pending)
+        shared_written = 0
+        for biz_ids, columns in self._shared:
+            # 項目ごとに、その項目が未登録の展開先にのみ書き込む
+            rowcounts = [self.db.session.execute(
+                update(self.Biz)
+                .where(self.Biz.id.in_(biz_ids), getattr(self.Biz, column).is_(None))
+                .values({column: value})
+                .execution_options(synchronize_session=False)
+            ).rowcount for column, value in columns]
+            shared_written += max(rowcounts, default=0)
+        self.db.session.commit()
+        self.written += len(self._pending) + shared_written
+        self._pending = []
+        self._shared = []
+
+
+def run_contact_crawl(db, Biz, sites, driver_factory=None, concurrency=CONCURRENCY,
+                      per_domain=PER_DOMAIN_LIMIT, browser_workers=BROWSER_WORKERS, on_result=None,
+                      dedupe_domains=True, skip_unchanged=True):
+    """
+    問い合わせ情報を取得してDBに保存（app_context内で呼び出すこと）
+
+    skip_unchanged の場合、トップページが前回の処理から変更されていないサイト（304応答・内容のハッシュが同じ）は
+    問い合わせページの取得とDB書き込みを省略する（同じドメインの未登録のBizへの保存済みの値の展開のみ行う）。
+    変更検出の状態はDBへの書き込み後に記録する（途中で失敗した場合、次回は再処理される）。
+    ブラウザで再取得するサイトは毎回処理する。
+
+    Args:
+        db: データベース
+        Biz: Bizモデル
+        sites: (biz_id, website_url[, website_domain]) のリスト
+        driver_factory: JS必須サイト用のドライバー生成関数（Noneならブラウザでの再取得なし）
+        concurrency: 全体の同時リクエスト数
+        per_domain: 同一ドメインへの同時リクエスト数
+        browser_workers: ブラウザでの再取得の並列数
+        on_result: 1サイト完了ごとに呼ばれる関数 (ContactResult) -> None
+        dedupe_domains: Trueなら同じドメインのサイトは代表URLで1回だけ取得し、問い合わせURL・メールを全Bizに展開
+        skip_unchanged: Trueなら前回から変更のないサイトの処理を省略
+
+    Returns:
+        dict: 集計結果
+    """
+    if dedupe_domains:
+        groups = group_by_domain(sites)
+        print_dedup_stats(groups)
+    else:
+        groups = group_by_domain((biz_id, url, f"{biz_id}:{url}") for biz_id, url, *_ in sites)
+    # 代表のbiz_id -> 展開先のbiz_id
+    shared = {}
+    targets = []
+    for group in groups:
+        representative = group.representative
+        targets.append(representative)
+        shared[representative[0]] = [biz_id for biz_id in group.biz_ids if biz_id != representative[0]]
+
+    stats = {'total': len(sites), 'sites': len(targets), 'found': 0, 'not_found': 0, 'unchanged': 0, 'browser': 0,
+             'errors': 0, 'fetches': 0, 'fanned_out': 0}
+    writer = ContactWriter(db, Biz)
+    tracker = ChangeTracker(SNAPSHOT_SOURCE) if skip_unchanged else None
+    browser_sites = []
+    processed = []  # 変更検出の状態を記録するHTTP取得分の結果（DBへの書き込み後に記録）
+
+    def handle(result):
+        stats['fetches'] += result.fetches
+        if result.status == 'browser':
+            browser_sites.append((result.biz_id, result.website_url))
+            return
+        if result.status == 'unchanged':
+            stats['unchanged'] += 1
+            # 前回の処理後に同じドメインに加わったBizにも保存済みの値を展開
+            writer.add_unchanged(result.biz_id, shared[result.biz_id])
+            processed.append(result)
+            if on_result:
+                on_result(result)
+            return
+        if result.status == 'error':
+            stats['errors'] += 1
+        elif result.found:
+            stats['found'] += 1
+            stats['fanned_out'] += len(shared[result.biz_id])
+        else:
+            stats['not_found'] += 1
+        writer.add(result, shared[result.biz_id])
+        if result.status == 'ok' and result.fingerprint:
+            processed.append(result)
+        if on_result:
+            on_result(result)
+
+    async def crawl_http():
+        async for result in AsyncContactCrawler(concurrency, per_domain, tracker=tracker).crawl(targets):
+            handle(result)
+
+    asyncio.run(crawl_http())
+    writer.flush()
+    if tracker:
+        for result in processed:
+            tracker.commit(result.website_url, result.fingerprint, changed=result.status != 'unchanged',
+                           etag=result.etag, last_modified=result.last_modified)
+        tracker.report()
+
+    stats['browser'] = len(browser_sites)
+    if browser_sites and driver_factory:
+        print(f"JavaScript必須サイトをブラウザで再取得: {len(browser_sites)}件", flush=True)
+        browser = BrowserContactCrawler(driver_factory, browser_workers)
+        try:
+            for result in browser.crawl(browser_sites):
+                handle(result)
+        finally:
+            browser.close()
+        writer.flush()
+
+    stats['written'] = writer.written
+    return stats
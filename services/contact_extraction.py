@@ -0,0 +1,239 @@
+"""
+公式サイトのHTMLからメールアドレス・電話番号を抽出
+- 生のHTML全体ではなく、テキストノード（script / style / コメント等を除く）と
+  mailto: / tel: リンクのみを走査する（image@2x.png やJS内の文字列の誤検出を防ぎ、走査量も減らす）
+- 正規表現はモジュール読み込み時にコンパイル済み
+- 電話番号は日本の番号体系で検証・整形（全角数字・各種ハイフン・括弧・+81 に対応）
+- 複数ページをまとめて処理するバッチAPI（extract_many）
+
+services/contact_crawler.py、app.get_contact_info_from_website で使用する。
+"""
+import re
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import unquote
+
+from lxml import etree, html as lxml_html
+
+from services.normalization import format_phone
+
+
+# 設定
+BATCH_CHUNK_SIZE = 20  # extract_many をプロセス並列で実行するときの1タスクあたりのページ数
+
+# テキストを持たない・表示されない要素（中身ごと除外）
+SKIP_TAGS = ('script', 'style', 'template', 'svg', 'iframe', etree.Comment, etree.ProcessingInstruction)
+
+# ファイル拡張子に見えるTLD（image@2x.png 等のノイズ）
+NOISE_TLDS = frozenset({
+    'png', 'jpg', 'jpeg', 'gif', 'svg', 'webp', 'avif', 'bmp', 'ico', 'tif', 'tiff',
+    'css', 'js', 'json', 'map', 'mp4', 'webm', 'mov', 'pdf', 'woff', 'woff2', 'ttf', 'eot',
+})
+# サンプル・プレースホルダー・計測ツールのドメイン
+NOISE_EMAIL_DOMAINS = frozenset({
+    'example.com', 'example.jp', 'example.co.jp', 'example.org', 'example.net',
+    'sample.com', 'sample.jp', 'test.com', 'domain.com', 'email.com', 'xxx.com', 'xxx.jp', 'xxx.co.jp',
+    'sentry.io', 'sentry.wixpress.com', 'sentry-next.wixpress.com', 'wixpress.com',
+})
+
+# 11桁の番号の先頭（携帯・IP電話・M2M・0800）。それ以外の0始まりは10桁
+ELEVEN_DIGIT_PREFIXES = ('020', '050', '060', '070', '080', '090', '0800')
+
+# ハイフンとして扱う文字（NFKC後も残るもの）
+_HYPHEN_TABLE = str.maketrans({c: '-' for c in '‐‑‒–—―−ーｰ﹣'})
+
+_EMAIL_PATTERN = re.compile(
+    r'(?<![A-Za-z0-9._%+\-])'
+    r'[A-Za-z0-9][A-Za-z0-9._%+\-]*@(?:[A-Za-z0-9](?:[A-Za-z0-9\-]*[A-Za-z0-9])?\.)+[A-Za-z]{2,24}'
+    r'(?![A-Za-z0-9\-]|\.[A-Za-z0-9])'
+)
+# 0始まりの数字列
+# - 区切りはハイフン・括弧（テキストノードの結合で入る改行はハイフン前後のみ許容）
+# - 空白・ドット区切り（03 1234 5678 / 03.1234.5678）は3グループの形のみ（隣の数字列と繋げないため）
+# - 直前が数字、または数字に続く英字・記号（v1.03...、2024/03...、A1B03...）なら番号の途中とみなす。
+#   TEL03- / TEL.03- / TEL/03- のような英字の見出しの直後は許容する
+_PHONE_PATTERN = re.compile(
+    r'(?<!\d)(?<!\d[A-Za-z.\-/])'
+    r'(?:'
+    r'(?:\+81[ \-]?(?:\(0\)[ \-]?)?\(?|\(?(?=0))'
+    r'\d(?:\d|[ \n]?-[ \n]?|\)[ \n]?-?[ \n]?|\(){7,16}\d'
+    r'|(?:\+81[ .]?|(?=0))\d{1,5}[ .]\d{1,4}[ .]\d{4}'
+    r')'
+    r'(?![A-Za-z0-9\-])'
+)
+_DIGIT_GROUP_PATTERN = re.compile(r'\d+')
+
+
+def normalize_text(text):
+    """全角英数字・記号を半角に、各種ハイフンを '-' に統一"""
+    return unicodedata.normalize('NFKC', text).translate(_HYPHEN_TABLE)
+
+
+def _clean_email(email):
+    """メールアドレスを小文字化し、ノイズならNoneを返す"""
+    email = email.lower().rstrip('.')
+    domain = email.rsplit('@', 1)[1]
+    if domain.rsplit('.', 1)[1] in NOISE_TLDS:
+        return None
+    if domain in NOISE_EMAIL_DOMAINS or any(domain.endswith('.' + noise) for noise in NOISE_EMAIL_DOMAINS):
+        return None
+    return email
+
+
+def _valid_phone_digits(digits):
+    """日本の電話番号として妥当な桁数・先頭か判定"""
+    if len(digits) < 10 or digits[0] != '0' or digits[1] == '0':
+        return False
+    return len(digits) == (11 if digits.startswith(ELEVEN_DIGIT_PREFIXES) else 10)
+
+
+def _phone_from_match(text):
+    """
+    電話番号らしい文字列（normalize_text済み）を 03-1234-5678 形式に整形
+
+    元の表記が3つの数字グループに分かれていれば市外局番の区切りをそのまま使い、
+    区切りがない場合は format_phone の規則で区切る。
+
+    Returns:
+        str: 整形済みの電話番号 / 不正な番号はNone
+    """
+    international = text.startswith('+81')
+    groups = _DIGIT_GROUP_PATTERN.findall(text[3:] if international else text)
+    if international:
+        # +81(0)3-... の (0) は捨て、市外局番の先頭に0を付ける
+        if groups and groups[0] == '0':
+            groups = groups[1:]
+        if groups and not groups[0].startswith('0'):
+            groups[0] = '0' + groups[0]
+    digits = ''.join(groups)
+    if not _valid_phone_digits(digits):
+        return None
+    if len(groups) == 3:
+        return '-'.join(groups)
+    return format_phone(digits)
+
+
+def normalize_phone(text):
+    """
+    文字列中の最初の有効な電話番号を標準形式（03-1234-5678）に整形
+
+    全角数字・各種ハイフン・括弧（03(1234)5678）・空白／ドット区切り（03 1234 5678）・
+    国番号（+81-3-...）に対応する。
+
+    Returns:
+        str: 整形済みの電話番号 / 見つからない場合はNone
+    """
+    if not text:
+        return None
+    text = normalize_text(text)
+    for match in _PHONE_PATTERN.finditer(text):
+        phone = _phone_from_match(match.group())
+        if phone:
+            return phone
+    return None
+
+
+def extract_from_text(text):
+    """
+    テキストからメールアドレス・電話番号を抽出
+
+    Returns:
+        tuple: (メールアドレスのリスト, 電話番号のリスト)（出現順・重複なし）
+    """
+    emails, phones = [], []
+    if not text:
+        return emails, phones
+    text = normalize_text(text)
+    if '@' in text:
+        for match in _EMAIL_PATTERN.finditer(text):
+            email = _clean_email(match.group())
+            if email and email not in emails:
+                emails.append(email)
+    for match in _PHONE_PATTERN.finditer(text):
+        phone = _phone_from_match(match.group())
+        if phone and phone not in phones:
+            phones.append(phone)
+    return emails, phones
+
+
+def _parse(html):
+    """HTMLをlxmlでパース（空・壊れたHTMLはNone）"""
+    try:
+        return lxml_html.document_fromstring(html)
+    except ValueError:
+        # XML宣言（encoding指定）付きの文字列はバイト列として渡す
+        return lxml_html.document_fromstring(html.encode('utf-8'))
+    except etree.ParserError:
+        return None
+
+
+def _link_contacts(document):
+    """mailto: / tel: リンクからメールアドレス・電話番号を抽出"""
+    emails, phones = [], []
+    for href in document.xpath('//a/@href[starts-with(normalize-space(.), "mailto:") or '
+                               'starts-with(normalize-space(.), "tel:")]'):
+        scheme, _, value = href.strip().partition(':')
+        value = unquote(value.split('?', 1)[0])
+        if scheme == 'mailto':
+            for address in value.split(','):
+                match = _EMAIL_PATTERN.fullmatch(normalize_text(address.strip()))
+                email = _clean_email(match.group()) if match else None
+                if email and email not in emails:
+                    emails.append(email)
+        else:
+            phone = normalize_phone(value)
+            if phone and phone not in phones:
+                phones.append(phone)
+    return emails, phones
+
+
+def extract_contacts(html):
+    """
+    HTMLからメールアドレス・電話番号を抽出
+
+    mailto: / tel: リンクの値を先に、本文のテキストノードの値を後に並べる。
+
+    Args:
+        html: ページのHTML（str）
+
+    Returns:
+        tuple: (メールアドレスのリスト, 電話番号のリスト)
+    """
+    if not html:
+        return [], []
+    document = _parse(html)
+    if document is None:
+        return [], []
+    emails, phones = _link_contacts(document)
+    etree.strip_elements(document, *SKIP_TAGS, with_tail=False)
+    text_emails, text_phones = extract_from_text('\n'.join(document.itertext()))
+    emails.extend(email for email in text_emails if email not in emails)
+    phones.extend(phone for phone in text_phones if phone not in phones)
+    return emails, phones
+
+
+def _extract_chunk(htmls):
+    return [extract_contacts(html) for html in htmls]
+
+
+def extract_many(htmls, workers=0, chunk_size=BATCH_CHUNK_SIZE):
+    """
+    複数ページからまとめて抽出
+
+    Args:
+        htmls: HTMLのリスト
+        workers: プロセス数（0ならこのプロセスで順に処理）
+        chunk_size: プロセス並列時に1タスクで処理するページ数
+
+    Returns:
+        list[tuple]: 各ページの (メールアドレスのリスト, 電話番号のリスト)（入力順）
+    """
+    htmls = list(htmls)
+    if workers <= 0 or len(htmls) <= chunk_size:
+        return _extract_chunk(htmls)
+    chunks = [htmls[i:i + chunk_size] for i in range(0, len(htmls), chunk_size)]
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for chunk_result in executor.map(_extract_chunk, chunks):
+            results.extend(chunk_result)
+    return results
@@ -0,0 +1,198 @@
+"""
+データ充足率（カバレッジ）レポート
+- place_id / CID / Webサイト / 問い合わせ / メール / 電話 / HPB / 評価 / 企業分析 の取得件数を
+  SUM(CASE ...) の集計クエリ1本で計算（項目ごとの count() による全件走査を繰り返さない）
+- 区別（東京23区）・カテゴリ別の内訳付き
+- 結果は CoverageSnapshot テーブルに保存し、一定時間内はスナップショットを再利用
+
+管理画面（/admin/coverage）とJSON（/admin/coverage.json）、各スクリプトの終了時の統計表示で使用する。
+"""
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, exists, func, literal, or_
+
+from models import db, Biz, Category, CompanyAnalysis, CoverageSnapshot, ReviewSummary, biz_categories
+from services.address_parser import TOKYO_23_WARDS
+
+
+# 設定
+CACHE_SECONDS = 600  # この時間内のスナップショットは再計算せずに返す
+HISTORY_LIMIT = 30  # ダッシュボードに表示する履歴の件数
+OTHER_WARD = 'その他'
+
+# (キー, 表示名)
+COVERAGE_FIELDS = [
+    ('place_id', 'Place ID'),
+    ('cid', 'CID'),
+    ('website', 'Webサイト'),
+    ('inquiry', '問い合わせページ'),
+    ('email', 'メール'),
+    ('phone', '電話番号'),
+    ('hotpepper', 'HPB URL'),
+    ('rating', '評価'),
+    ('analysis', '企業分析'),
+]
+
+
+def _field_conditions():
+    """項目キー -> 「取得済み」を表すSQL条件"""
+    return {
+        'place_id': Biz.place_id.isnot(None),
+        'cid': Biz.cid.isnot(None),
+        'website': Biz.website_url.isnot(None),
+        'inquiry': Biz.inquiry_url.isnot(None),
+        'email': Biz.email.isnot(None),
+        'phone': Biz.phone.isnot(None),
+        'hotpepper': Biz.hotpepper_url.isnot(None),
+        'rating': exists().where(ReviewSummary.biz_id == Biz.id, ReviewSummary.rating.isnot(None)),
+        # 企業分析はドメイン単位でキャッシュされているため、Webサイトのドメインで突き合わせる
+        'analysis': exists().where(CompanyAnalysis.company_domain == Biz.website_domain),
+    }
+
+
+def _aggregate_columns():
+    """総件数と項目ごとの SUM(CASE WHEN 条件 THEN 1 ELSE 0 END)"""
+    conditions = _field_conditions()
+    columns = [func.count(Biz.id).label('total')]
+    for key, _ in COVERAGE_FIELDS:
+        columns.append(func.sum(case((conditions[key], 1), else_=0)).label(key))
+    return columns
+
+
+def ward_expression():
+    """
+    住所から東京23区を判定するCASE式（23区以外は 'その他'）
+
+    Biz.address_key（正規化済み住所）の前方一致で判定する。
+    """
+    whens = []
+    for ward in TOKYO_23_WARDS:
+        whens.append((or_(
+            Biz.address_key.like(f'東京都{ward}%'),
+            Biz.address_key.like(f'{ward}%'),
+        ), literal(ward)))
+    return case(*whens, else_=literal(OTHER_WARD))
+
+
+def _row_to_counts(row):
+    counts = {'total': row.total or 0}
+    for key, _ in COVERAGE_FIELDS:
+        counts[key] = int(getattr(row, key) or 0)
+    return counts
+
+
+def _add_counts(target, counts):
+    for key, value in counts.items():
+        target[key] = target.get(key, 0) + value
+
+
+def compute_coverage():
+    """
+    充足率を集計（app_context内で呼び出すこと）
+
+    - 区別: ward_expression() でGROUP BYした1パス（全体はその合計）
+    - カテゴリ別: biz_categories を結合してGROUP BYした1パス
+
+    Returns:
+        dict: {'overall': {...}, 'by_ward': {区: {...}}, 'by_category': {カテゴリ: {...}},
+               'fields': [[キー, 表示名], ...], 'generated_at': ISO形式}
+    """
+    ward = ward_expression().label('ward')
+    ward_rows = db.session.query(ward, *_aggregate_columns()).group_by(ward).all()
+
+    overall = {}
+    by_ward = {}
+    for row in ward_rows:
+        counts = _row_to_counts(row)
+        by_ward[row.ward] = counts
+        _add_counts(overall, counts)
+    if not overall:
+        overall = dict.fromkeys(['total'] + [key for key, _ in COVERAGE_FIELDS], 0)
+
+    category_rows = db.session.query(Category.name.label('category'), *_aggregate_columns()).select_from(Biz).join(
+        biz_categories, biz_categories.c.biz_id == Biz.id
+    ).join(Category, Category.id == biz_categories.c.category_id).group_by(Category.name).all()
+    by_category = {row.category: _row_to_counts(row) for row in category_rows}
+
+    # 23区の順序で並べ、その他は最後
+    ordered_wards = {w: by_ward[w] for w in TOKYO_23_WARDS if w in by_ward}
+    if OTHER_WARD in by_ward:
+        ordered_wards[OTHER_WARD] = by_ward[OTHER_WARD]
+
+    return {
+        'generated_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'fields': [list(field) for field in COVERAGE_FIELDS],
+        'overall': overall,
+        'by_ward': ordered_wards,
+        'by_category': dict(sorted(by_category.items(), key=lambda item: -item[1]['total'])),
+    }
+
+
+def save_snapshot(report):
+    """集計結果をスナップショットとして保存"""
+    CoverageSnapshot.__table__.create(db.engine, checkfirst=True)
+    snapshot = CoverageSnapshot(total=report['overall']['total'], report=report)
+    db.session.add(snapshot)
+    db.session.commit()
+    return snapshot
+
+
+def get_coverage_report(max_age=CACHE_SECONDS, refresh=False):
+    """
+    充足率レポートを返す（max_age秒以内のスナップショットがあれば再利用）
+
+    Args:
+        max_age: スナップショットを再利用する秒数
+        refresh: Trueなら必ず再計算して保存
+
+    Returns:
+        dict: compute_coverage() の結果
+    """
+    CoverageSnapshot.__table__.create(db.engine, checkfirst=True)
+    if not refresh:
+        latest = CoverageSnapshot.query.order_by(CoverageSnapshot.created_at.desc()).first()
+        if latest and latest.created_at >= datetime.utcnow() - timedelta(seconds=max_age):
+            return latest.report
+    report = compute_coverage()
+    save_snapshot(report)
+    return report
+
+
+def coverage_history(limit=HISTORY_LIMIT):
+    """
+    スナップショットの履歴（古い順）
+
+    Returns:
+        list[dict]: {'created_at', 'total', 項目キー: 件数}
+    """
+    CoverageSnapshot.__table__.create(db.engine, checkfirst=True)
+    snapshots = CoverageSnapshot.query.order_by(CoverageSnapshot.created_at.desc()).limit(limit).all()
+    history = []
+    for snapshot in reversed(snapshots):
+        entry = {'created_at': snapshot.created_at.isoformat(timespec='seconds'), 'total': snapshot.total}
+        entry.update({key: snapshot.report['overall'].get(key, 0) for key, _ in COVERAGE_FIELDS})
+        history.append(entry)
+    return history
+
+
+def coverage_rate(counts, key):
+    """取得率（%）"""
+    return counts[key] / counts['total'] * 100 if counts.get('total') else 0.0
+
+
+def print_coverage(fields=None, title='現在の全体状況'):
+    """
+    スクリプト終了時の統計表示（集計は1クエリ、スナップショットとして保存）
+
+    Args:
+        fields: 表示する項目キーのリスト（省略時は全項目）
+        title: 見出し
+    """
+    report = get_coverage_report(refresh=True)
+    overall = report['overall']
+    labels = dict(COVERAGE_FIELDS)
+    print(f"\n{title}:")
+    print(f"  総クリニック数: {overall['total']}件")
+    for key in fields or labels:
+        print(f"  {labels[key]}有り: {overall[key]}件 ({coverage_rate(overall, key):.1f}%)")
+    return report
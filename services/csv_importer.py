@@ -0,0 +1,447 @@
+"""
+CSVストリーミングインポート機能
+- CSVを1行ずつ遅延読み込み（ファイル全体をメモリに載せない）
+- 住所・電話番号・名称の正規化をプロセスプールで並列実行
+- 既存データの重複判定キーは起動時に1回だけ読み込み、メモリ上のハッシュで判定
+- DB書き込みはチャンク単位のバルクINSERT/UPDATE
+- 進捗はJSONファイルに書き出し、管理画面からポーリングで参照
+"""
+import csv
+import io
+import json
+import os
+import re
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert, update
+
+from models import db, Biz, Category, biz_categories
+from services.normalization import format_phone, matching_keys, remove_zipcode
+
+
+# 設定
+CHUNK_SIZE = 2000  # 1回のバルク書き込み件数
+DEFAULT_WORKERS = 2  # 正規化プロセス数（4GB VPS想定）
+PROGRESS_INTERVAL = 1.0  # 進捗ファイル更新間隔（秒）
+
+# CSVフォーマット定義
+# columns: Bizのカラム名 -> 列番号（位置指定）または列名（ヘッダー指定）
+# overwrite: 既存データの値を上書きするか（Falseなら空欄のみ補完）
+CSV_FORMATS = {
+    # トリビュー形式: ID, クリニック名, 住所, 公式URL（ヘッダー行は空）
+    'toreview': {
+        'label': 'トリビュー形式',
+        'columns': {'name': 1, 'address': 2, 'website_url': 3},
+        'overwrite': False,
+    },
+    # 管理画面の標準形式: ヘッダー行の列名で指定
+    'deepbiz': {
+        'label': 'DeepBiz標準形式',
+        'columns': {
+            'place_id': 'place_id',
+            'name': 'name',
+            'address': 'address',
+            'cid': 'cid',
+            'website_url': 'official_website',
+            'inquiry_url': 'contact_page_url',
+            'email': 'email_address',
+            'phone': 'phone',
+        },
+        'overwrite': True,
+    },
+}
+
+IMPORT_FIELDS = ('place_id', 'name', 'address', 'cid', 'website_url', 'inquiry_url', 'email', 'phone')
+
+_ZENKAKU_DIGITS = str.maketrans('０１２３４５６７８９', '0123456789')
+_SPACES_PATTERN = re.compile(r'\s+')
+
+
+def detect_format(header):
+    """
+    ヘッダー行からCSVフォーマットを判定
+
+    Args:
+        header: CSVの1行目（リスト）
+
+    Returns:
+        str: CSV_FORMATSのキー
+    """
+    names = {col.strip().lower() for col in header}
+    if 'place_id' in names or 'name' in names:
+        return 'deepbiz'
+    return 'toreview'
+
+
+def iter_csv_rows(stream):
+    """
+    CSVを1行ずつ読み込むジェネレータ
+
+    Args:
+        stream: テキストストリーム（ファイルオブジェクト）
+
+    Yields:
+        tuple: (行番号, 行データのリスト)
+    """
+    reader = csv.reader(stream)
+    for line_no, row in enumerate(reader, 1):
+        yield line_no, row
+
+
+def _clean_text(value):
+    if value is None:
+        return None
+    value = _SPACES_PATTERN.sub(' ', value.replace('　', ' ')).strip()
+    return value or None
+
+
+def _clean_address(address):
+    address = _clean_text(address)
+    if not address:
+        return None
+    return remove_zipcode(address.translate(_ZENKAKU_DIGITS))
+
+
+def normalize_record(item):
+    """
+    1行分のデータを正規化（プロセスプールのワーカーで実行）
+
+    Args:
+        item: (行番号, {カラム名: 生の値})
+
+    Returns:
+        tuple: (行番号, 正規化済みdict, 重複判定キー) / 必須項目欠落時はdictがNone
+    """
+    line_no, raw = item
+    record = {
+        'place_id': _clean_text(raw.get('place_id')),
+        'name': _clean_text(raw.get('name')),
+        'address': _clean_address(raw.get('address')),
+        'cid': _clean_text(raw.get('cid')),
+        'website_url': _clean_text(raw.get('website_url')),
+        'inquiry_url': _clean_text(raw.get('inquiry_url')),
+        'email': _clean_text(raw.get('email')),
+        'phone': format_phone(raw.get('phone')),
+    }
+    if not record['place_id'] and not (record['name'] and record['address']):
+        return line_no, None, None
+
+    # バルクINSERTではモデルのイベントが発火しないため、正規化キーもここで計算
+    record.update(matching_keys(record['name'], None, record['address'], record['phone'], record['website_url']))
+    key = (record['name_key'] or '', record['address_key'] or '')
+    return line_no, record, key
+
+
+class ImportProgress:
+    """インポート進捗をJSONファイルとして保存するクラス（gunicorn複数ワーカーから参照可能）"""
+
+    def __init__(self, progress_dir, job_id=None):
+        self.job_id = job_id or uuid.uuid4().hex[:12]
+        self.path = os.path.join(progress_dir, f"{self.job_id}.json")
+        self.state = {
+            'job_id': self.job_id,
+            'status': 'queued',
+            'rows_read': 0,
+            'imported': 0,
+            'updated': 0,
+            'skipped': 0,
+            'errors': 0,
+            'started_at': None,
+            'finished_at': None,
+            'message': None,
+        }
+        self._last_write = 0.0
+        os.makedirs(progress_dir, exist_ok=True)
+
+    def update(self, force=False, **values):
+        self.state.update(values)
+        now = time.monotonic()
+        if force or now - self._last_write >= PROGRESS_INTERVAL:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self.state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self._last_write = now
+
+    @staticmethod
+    def load(progress_dir, job_id):
+        """
+        保存済みの進捗を読み込む
+
+        Returns:
+            dict or None
+        """
+        if not re.fullmatch(r'[0-9a-f]{12}', job_id or ''):
+            return None
+        path = os.path.join(progress_dir, f"{job_id}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+
+class StreamingCsvImporter:
+    """
+    CSVからBizテーブルへのストリーミングインポート
+
+    呼び出し側でapp_contextを用意すること。
+    """
+
+    def __init__(self, category_name='美容クリニック', prefecture_filter=None,
+                 csv_format=None, workers=DEFAULT_WORKERS, chunk_size=CHUNK_SIZE, progress=None):
+        """
+        Args:
+            category_name: 新規登録時に紐付けるカテゴリ名
+            prefecture_filter: 住所に含まれるべき文字列（例: '東京'）。Noneなら全件
+            csv_format: CSV_FORMATSのキー。Noneならヘッダーから自動判定
+            workers: 正規化プロセス数（0ならプロセスプールを使わない）
+            chunk_size: 1回のバルク書き込み件数
+            progress: ImportProgress（省略可）
+        """
+        self.category_name = category_name
+        self.prefecture_filter = prefecture_filter
+        self.csv_format = csv_format
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.stats = {'rows_read': 0, 'imported': 0, 'updated': 0, 'skipped': 0, 'errors': 0}
+        self._key_index = {}
+        self._place_id_index = {}
+        self._cids = set()
+
+    # --- 既存キーの読み込み ---
+    def _load_key_index(self):
+        """既存Bizの重複判定キーを1回のクエリでメモリに読み込む"""
+        rows = db.session.query(
+            Biz.id, Biz.name_key, Biz.address_key, Biz.place_id, Biz.cid, Biz.website_url
+        ).yield_per(5000)
+        for biz_id, name_key, address_key, place_id, cid, website_url in rows:
+            if name_key and address_key:
+                self._key_index[(name_key, address_key)] = (biz_id, bool(website_url))
+            if place_id:
+                self._place_id_index[place_id] = (biz_id, bool(website_url))
+            if cid:
+                self._cids.add(cid)
+        print(f"既存キー読み込み: {len(self._key_index)}件（place_id: {len(self._place_id_index)}件）", flush=True)
+
+    # --- 行の読み込み ---
+    def _iter_raw(self, stream):
+        """CSVの行をカラム名付きdictに変換して遅延生成"""
+        rows = iter_csv_rows(stream)
+        first = next(rows, None)
+        if first is None:
+            return
+        _, header = first
+        csv_format = self.csv_format or detect_format(header)
+        columns = CSV_FORMATS[csv_format]['columns']
+        self.overwrite = CSV_FORMATS[csv_format]['overwrite']
+        print(f"CSVフォーマット: {CSV_FORMATS[csv_format]['label']}", flush=True)
+
+        if all(isinstance(pos, int) for pos in columns.values()):
+            positions = columns
+        else:
+            lowered = [col.strip().lower() for col in header]
+            positions = {field: lowered.index(name) for field, name in columns.items() if name in lowered}
+
+        for line_no, row in rows:
+            self.stats['rows_read'] += 1
+            raw = {field: row[pos] for field, pos in positions.items() if pos < len(row)}
+            if self.prefecture_filter and self.prefecture_filter not in (raw.get('address') or ''):
+                self.stats['skipped'] += 1
+                continue
+            yield line_no, raw
+
+    def _normalized_chunks(self, raw_rows):
+        """正規化済みの行をチャンク単位で生成（プロセスプールで並列化）"""
+        if self.workers and self.workers > 0:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                while True:
+                    batch = list(islice(raw_rows, self.chunk_size))
+                    if not batch:
+                        break
+                    yield list(executor.map(normalize_record, batch, chunksize=200))
+        else:
+            while True:
+                batch = list(islice(raw_rows, self.chunk_size))
+                if not batch:
+                    break
+                yield [normalize_record(item) for item in batch]
+
+    # --- 書き込み ---
+    def _apply_chunk(self, normalized, category_id):
+        """1チャンク分を重複判定し、バルクINSERT/UPDATEで書き込む"""
+        new_rows = []
+        updates = {}
+
+        for line_no, record, key in normalized:
+            if record is None:
+                self.stats['skipped'] += 1
+                continue
+
+            existing = None
+            if record['place_id']:
+                existing = self._place_id_index.get(record['place_id'])
+            if existing is None and key[0] and key[1]:
+                existing = self._key_index.get(key)
+
+            if existing:
+                biz_id, has_website = existing
+                if biz_id is None:
+                    # 同一ファイル内で既に登録予定の行
+                    self.stats['skipped'] += 1
+                    continue
+                values = self._update_values(record, has_website)
+                if values:
+                    updates.setdefault(biz_id, {'id': biz_id}).update(values)
+                else:
+                    self.stats['skipped'] += 1
+                continue
+
+            if record['cid'] and record['cid'] in self._cids:
+                record['cid'] = None
+            new_rows.append((key, record))
+            # ファイル内の重複も同じインデックスで弾く（IDは挿入後に確定）
+            if key[0] and key[1]:
+                self._key_index[key] = (None, bool(record['website_url']))
+            if record['place_id']:
+                self._place_id_index[record['place_id']] = (None, bool(record['website_url']))
+            if record['cid']:
+                self._cids.add(record['cid'])
+
+        try:
+            if new_rows:
+                result = db.session.execute(
+                    insert(Biz).returning(Biz.id, sort_by_parameter_order=True),
+                    [record for _, record in new_rows]
+                )
+                new_ids = [row[0] for row in result]
+                for (key, record), biz_id in zip(new_rows, new_ids):
+                    if key[0] and key[1]:
+                        self._key_index[key] = (biz_id, bool(record['website_url']))
+                    if record['place_id']:
+                        self._place_id_index[record['place_id']] = (biz_id, bool(record['website_url']))
+                if category_id:
+                    db.session.execute(
+                        insert(biz_categories),
+                        [{'biz_id': biz_id, 'category_id': category_id} for biz_id in new_ids]
+                    )
+                self.stats['imported'] += len(new_ids)
+
+            if updates:
+                db.session.execute(update(Biz), list(updates.values()))
+                self.stats['updated'] += len(updates)
+
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.stats['errors'] += len(new_rows) + len(updates)
+            for key, record in new_rows:
+                self._key_index.pop(key, None)
+                if record['place_id']:
+                    self._place_id_index.pop(record['place_id'], None)
+            print(f"チャンク書き込みエラー: {e}", flush=True)
+
+    def _update_values(self, record, has_website):
+        """既存レコードに対する更新値を決定（正規化キーも合わせて更新）"""
+        if self.overwrite:
+            values = {field: record[field] for field in IMPORT_FIELDS
+                      if record[field] and field not in ('place_id', 'cid', 'name', 'address')}
+        elif record['website_url'] and not has_website:
+            values = {'website_url': record['website_url']}
+        else:
+            return {}
+        if 'phone' in values:
+            values['phone_digits'] = record['phone_digits']
+        if 'website_url' in values:
+            values['website_domain'] = record['website_domain']
+        return values
+
+    # --- 実行 ---
+    def run(self, stream):
+        """
+        インポートを実行
+
+        Args:
+            stream: テキストストリーム（ファイルオブジェクト）
+
+        Returns:
+            dict: 統計情報
+        """
+        started = time.monotonic()
+        if self.progress:
+            self.progress.update(force=True, status='running', started_at=datetime.now().isoformat())
+
+        category = Category.query.filter_by(name=self.category_name).first()
+        if not category:
+            print(f"警告: カテゴリ「{self.category_name}」が見つかりません。カテゴリなしで登録します", flush=True)
+        category_id = category.id if category else None
+
+        self.overwrite = False
+        self._load_key_index()
+
+        try:
+            for normalized in self._normalized_chunks(self._iter_raw(stream)):
+                self._apply_chunk(normalized, category_id)
+                elapsed = time.monotonic() - started
+                print(f"  進捗: {self.stats['rows_read']}行読込 / 登録 {self.stats['imported']}件 / "
+                      f"更新 {self.stats['updated']}件 ({elapsed:.1f}秒)", flush=True)
+                if self.progress:
+                    self.progress.update(**self.stats)
+        except Exception as e:
+            if self.progress:
+                self.progress.update(force=True, status='failed', message=str(e),
+                                     finished_at=datetime.now().isoformat(), **self.stats)
+            raise
+
+        if self.progress:
+            self.progress.update(force=True, status='completed',
+                                 finished_at=datetime.now().isoformat(), **self.stats)
+        return self.stats
+
+
+def import_csv_file(csv_path, encoding='utf-8-sig', **options):
+    """
+    CSVファイルをインポート（app_context内で呼び出すこと）
+
+    Args:
+        csv_path: CSVファイルのパス
+        encoding: 文字コード
+        **options: StreamingCsvImporterの引数
+
+    Returns:
+        dict: 統計情報
+    """
+    with open(csv_path, 'r', encoding=encoding, newline='') as f:
+        return StreamingCsvImporter(**options).run(f)
+
+
+def run_import_job(app, csv_path, progress_dir, job_id, **options):
+    """
+    バックグラウンドスレッド用のインポートジョブ
+
+    Args:
+        app: Flaskアプリケーション
+        csv_path: アップロード済みCSVのパス
+        progress_dir: 進捗ファイルの保存先
+        job_id: ジョブID
+        **options: StreamingCsvImporterの引数
+    """
+    progress = ImportProgress(progress_dir, job_id)
+    with app.app_context():
+        try:
+            with open(csv_path, 'rb') as raw:
+                stream = io.TextIOWrapper(raw, encoding='utf-8-sig', errors='replace', newline='')
+                StreamingCsvImporter(progress=progress, **options).run(stream)
+        except Exception as e:
+            print(f"CSVインポートジョブ失敗 ({job_id}): {e}", flush=True)
+            progress.update(force=True, status='failed', message=str(e), finished_at=datetime.now().isoformat())
+        finally:
+            db.session.remove()
+            try:
+                os.remove(csv_path)
+            except OSError:
+                pass
@@ -0,0 +1,95 @@
+"""
+Webサイトのドメイン単位のグループ化（チェーン・分院の重複取得を防ぐ）
+- Bizを登録可能ドメイン（Biz.website_domain）でグループ化
+- 取得・解析はグループの代表URLで1回だけ行い、結果をグループ内の全Bizに展開
+- グループごとの統計（何回分の取得を省略できたか）を表示
+
+services/contact_crawler.py（問い合わせ情報）、scripts/analyze_biz_websites.py（企業分析）、
+app.get_contact_info_from_website（Gmap拡充時のメール取得）で使用する。
+"""
+from collections import Counter
+
+from services.normalization import registrable_domain
+
+
+# 設定
+TOP_GROUPS_TO_SHOW = 10  # 統計表示で件数の多いグループを何件表示するか
+
+
+class DomainGroup:
+    """同じドメインのWebサイトを持つBizのグループ"""
+    __slots__ = ('domain', 'members')
+
+    def __init__(self, domain):
+        self.domain = domain
+        self.members = []  # (biz_id, website_url)
+
+    def __len__(self):
+        return len(self.members)
+
+    @property
+    def biz_ids(self):
+        return [biz_id for biz_id, _ in self.members]
+
+    @property
+    def representative(self):
+        """
+        取得に使う代表（biz_id, URL）
+
+        最も多くのBizが使っているURL（同数なら短い方 = トップページに近い方）を選ぶ。
+        """
+        counts = Counter(url for _, url in self.members)
+        url = min(counts, key=lambda u: (-counts[u], len(u), u))
+        return next(member for member in self.members if member[1] == url)
+
+
+def group_by_domain(rows):
+    """
+    (biz_id, website_url[, website_domain]) をドメインごとにグループ化
+
+    website_domain がない行はURLから計算する。ドメインを判定できないURLはURL自体をキーにする。
+
+    Returns:
+        list[DomainGroup]: 最初に出現した順
+    """
+    groups = {}
+    for row in rows:
+        biz_id, url = row[0], row[1]
+        domain = (row[2] if len(row) > 2 else None) or registrable_domain(url) or url
+        group = groups.get(domain)
+        if group is None:
+            group = groups[domain] = DomainGroup(domain)
+        group.members.append((biz_id, url))
+    return list(groups.values())
+
+
+def dedup_stats(groups):
+    """
+    グループ化による取得削減の統計
+
+    Returns:
+        dict: {'rows', 'domains', 'shared_domains', 'fetches_avoided', 'top_groups': [(domain, 件数), ...]}
+    """
+    rows = sum(len(group) for group in groups)
+    shared = [group for group in groups if len(group) > 1]
+    top = sorted(shared, key=lambda g: (-len(g), g.domain))[:TOP_GROUPS_TO_SHOW]
+    return {
+        'rows': rows,
+        'domains': len(groups),
+        'shared_domains': len(shared),
+        'fetches_avoided': rows - len(groups),
+        'top_groups': [(group.domain, len(group)) for group in top],
+    }
+
+
+def print_dedup_stats(groups, title='ドメイン単位の重複排除'):
+    """グループ化の統計を表示"""
+    stats = dedup_stats(groups)
+    print(f"\n{title}:")
+    print(f"  対象: {stats['rows']}件 → {stats['domains']}ドメイン")
+    print(f"  複数のBizで共有されているドメイン: {stats['shared_domains']}件")
+    print(f"  省略した取得: {stats['fetches_avoided']}件"
+          f" ({stats['fetches_avoided'] / stats['rows'] * 100 if stats['rows'] else 0:.1f}%)")
+    for domain, count in stats['top_groups']:
+        print(f"    {domain}: {count}件")
+    return stats
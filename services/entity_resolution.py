@@ -0,0 +1,262 @@
+"""
+一括エンティティ解決（名寄せ）機能
+- 正規化した名前・住所を文字n-gramのTF-IDFベクトルに変換
+- 疎行列の積で候補ペアのコサイン類似度をまとめて計算（行ごとに上位k件）
+- HPBのみ ⇔ Gmapのみ のペア、および同一ソース内の重複候補を出力
+- 結果はMatchCandidateテーブル（スコア付き候補ペア表）に保存し、
+  scripts/merge_gmap_hpb.py の merge_salon_data で取り込む
+
+SequenceMatcherによる総当たりの代わりに、同じ市区町村ブロック内で
+行列演算を行うため、10万件規模でも1台のCPUで数分で完了する。
+"""
+import csv
+import math
+import time
+from collections import defaultdict
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+from merge_helpers import extract_ward
+from services.normalization import normalize_address, normalize_name
+
+
+# 設定
+ADDRESS_WEIGHT = 0.7  # 総合スコアにおける住所の重み（merge_helpersと同じ比率）
+NAME_WEIGHT = 0.3
+DEFAULT_TOP_K = 3  # 1件あたりに残す候補数
+DEFAULT_MIN_SCORE = 0.6  # これ未満のペアは出力しない
+ROW_CHUNK_SIZE = 2000  # 1回の行列積で処理する行数
+NGRAM_RANGE = (2, 3)  # 文字n-gramの範囲
+
+
+class MatchRecord:
+    """名寄せ対象の1レコード（正規化済み）"""
+    __slots__ = ('biz_id', 'name', 'address', 'ward')
+
+    def __init__(self, biz_id, name, address, name_key=None, address_key=None):
+        self.biz_id = biz_id
+        self.name = name_key or normalize_name(name)
+        self.address = address_key or normalize_address(address)
+        self.ward = extract_ward(address, address_key=self.address)
+
+
+def load_records(query, Biz, name_attr='name'):
+    """
+    クエリ結果を名寄せ用レコードに変換（Bizの保存済み正規化キーを使用）
+
+    Args:
+        query: Bizを対象としたクエリ
+        Biz: Bizモデル
+        name_attr: 名前として使う属性（'name' or 'name_hpb'）
+
+    Returns:
+        list[MatchRecord]
+    """
+    name_column = getattr(Biz, name_attr)
+    rows = query.with_entities(
+        Biz.id, name_column, Biz.address, Biz.name_key, Biz.address_key
+    ).order_by(Biz.id).yield_per(5000)
+    records = []
+    for biz_id, name, address, name_key, address_key in rows:
+        # name_keyは name → name_hpb の順で計算されているため、nameを使う場合のみ流用
+        if name_attr != 'name' or not name:
+            name_key = None
+        records.append(MatchRecord(biz_id, name, address, name_key, address_key))
+    return records
+
+
+def _address_text(record):
+    """
+    ベクトル化用の住所文字列（丁目・番地は正規化済みキーで「2-29-5」形式）
+    - 市区町村より前を除去（全件共通のn-gramで類似度が水増しされるのを防ぐ）
+    """
+    address = record.address
+    if record.ward:
+        pos = address.find(record.ward)
+        if pos >= 0:
+            address = address[pos + len(record.ward):]
+    return address
+
+
+def _fit_transform(texts):
+    """文字n-gramのTF-IDF行列（語彙が空の場合はゼロ行列）"""
+    vectorizer = TfidfVectorizer(analyzer='char', ngram_range=NGRAM_RANGE, sublinear_tf=True, dtype=np.float32)
+    try:
+        return vectorizer.fit_transform(texts).tocsr()
+    except ValueError:
+        return sparse.csr_matrix((len(texts), 1), dtype=np.float32)
+
+
+def _vectorize(left, right):
+    """
+    名前・住所のTF-IDFベクトルを重み付きで連結
+
+    各ブロックをL2正規化した上で sqrt(重み) を掛けて連結するため、
+    連結ベクトル同士の内積 = 0.7 × 住所コサイン + 0.3 × 名前コサイン となる。
+    """
+    corpus = left + right
+    address_matrix = _fit_transform([_address_text(r) for r in corpus])
+    name_matrix = _fit_transform([r.name for r in corpus])
+
+    combined = sparse.hstack([
+        address_matrix * math.sqrt(ADDRESS_WEIGHT),
+        name_matrix * math.sqrt(NAME_WEIGHT),
+    ]).tocsr()
+    n_left = len(left)
+    return (
+        combined[:n_left], combined[n_left:],
+        address_matrix[:n_left], address_matrix[n_left:],
+        name_matrix[:n_left], name_matrix[n_left:],
+    )
+
+
+def top_k_cosine(left_matrix, right_matrix, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE,
+                 exclude_self=False, chunk_size=ROW_CHUNK_SIZE):
+    """
+    疎行列の積で行ごとに上位k件の類似ペアを求める
+
+    Args:
+        left_matrix: 左側のCSR行列（行がL2正規化済みであること）
+        right_matrix: 右側のCSR行列
+        top_k: 1行あたりに残す件数
+        min_score: 最低スコア
+        exclude_self: 同一行列同士の場合に自分自身と重複ペアを除外
+        chunk_size: 1回に計算する行数（メモリ使用量の上限）
+
+    Yields:
+        tuple: (左の行番号, 右の行番号, スコア)
+    """
+    right_t = right_matrix.T.tocsc()
+    for start in range(0, left_matrix.shape[0], chunk_size):
+        product = (left_matrix[start:start + chunk_size] @ right_t).tocsr()
+        product.data[product.data < min_score] = 0
+        product.eliminate_zeros()
+        for offset in range(product.shape[0]):
+            row_start, row_end = product.indptr[offset], product.indptr[offset + 1]
+            if row_start == row_end:
+                continue
+            columns = product.indices[row_start:row_end]
+            scores = product.data[row_start:row_end]
+            i = start + offset
+            if exclude_self:
+                mask = columns > i
+                columns, scores = columns[mask], scores[mask]
+                if not len(columns):
+                    continue
+            if len(scores) > top_k:
+                best = np.argpartition(-scores, top_k - 1)[:top_k]
+                columns, scores = columns[best], scores[best]
+            for j, score in zip(columns, scores):
+                yield i, int(j), float(score)
+
+
+def _row_dot(left, right, i, j):
+    """2行の内積（個別スコアの算出用）"""
+    return float(left[i].multiply(right[j]).sum())
+
+
+def resolve_blocks(left_records, right_records=None, top_k=DEFAULT_TOP_K, min_score=DEFAULT_MIN_SCORE):
+    """
+    市区町村ブロックごとに候補ペアを計算
+
+    Args:
+        left_records: 左側のレコード（例: HPBのみのサロン）
+        right_records: 右側のレコード（例: Gmapのみのサロン）。Noneなら左側同士で重複検出
+        top_k: 1件あたりに残す候補数
+        min_score: 最低スコア
+
+    Returns:
+        list[dict]: スコア降順の候補ペア
+            {'left_id', 'right_id', 'score', 'address_score', 'name_score'}
+    """
+    dedupe = right_records is None
+    left_blocks = defaultdict(list)
+    for record in left_records:
+        left_blocks[record.ward].append(record)
+    if dedupe:
+        right_blocks = left_blocks
+    else:
+        right_blocks = defaultdict(list)
+        for record in right_records:
+            right_blocks[record.ward].append(record)
+
+    pairs = []
+    for ward, left in left_blocks.items():
+        right = right_blocks.get(ward)
+        if not right or (dedupe and len(left) < 2):
+            continue
+        if dedupe:
+            left_matrix, _, left_address, _, left_name, _ = _vectorize(left, [])
+            right_matrix, right_address, right_name = left_matrix, left_address, left_name
+        else:
+            left_matrix, right_matrix, left_address, right_address, left_name, right_name = _vectorize(left, right)
+
+        for i, j, score in top_k_cosine(left_matrix, right_matrix, top_k, min_score, exclude_self=dedupe):
+            pairs.append({
+                'left_id': left[i].biz_id,
+                'right_id': right[j].biz_id if not dedupe else left[j].biz_id,
+                'score': round(score, 4),
+                'address_score': round(_row_dot(left_address, right_address, i, j), 4),
+                'name_score': round(_row_dot(left_name, right_name, i, j), 4),
+            })
+
+    pairs.sort(key=lambda p: (-p['score'], p['left_id'], p['right_id']))
+    return pairs
+
+
+def run_batch_matching(db, Biz, MatchCandidate, mode='hpb_gmap', top_k=DEFAULT_TOP_K,
+                       min_score=DEFAULT_MIN_SCORE, csv_path=None):
+    """
+    Biz全体の一括名寄せを実行し、MatchCandidateテーブルに保存（app_context内で呼び出すこと）
+
+    Args:
+        db: データベース
+        Biz: Bizモデル
+        MatchCandidate: 候補ペアモデル
+        mode: 'hpb_gmap'（HPBのみ⇔Gmapのみ）/ 'dedupe_gmap' / 'dedupe_hpb'（同一ソース内の重複）
+        top_k: 1件あたりに残す候補数
+        min_score: 最低スコア
+        csv_path: 指定時は候補ペアをCSVにも書き出す
+
+    Returns:
+        list[dict]: 候補ペア
+    """
+    hpb_only = Biz.query.filter(Biz.hotpepper_url.isnot(None), Biz.place_id.is_(None), Biz.address.isnot(None))
+    gmap_only = Biz.query.filter(Biz.place_id.isnot(None), Biz.hotpepper_url.is_(None), Biz.address.isnot(None))
+
+    started = time.monotonic()
+    if mode == 'hpb_gmap':
+        left = load_records(hpb_only, Biz, name_attr='name_hpb')
+        right = load_records(gmap_only, Biz)
+        print(f"名寄せ対象: HPBのみ {len(left)}件 × Gmapのみ {len(right)}件", flush=True)
+    elif mode == 'dedupe_gmap':
+        left, right = load_records(gmap_only, Biz), None
+        print(f"重複検出対象（Gmap）: {len(left)}件", flush=True)
+    elif mode == 'dedupe_hpb':
+        left, right = load_records(hpb_only, Biz, name_attr='name_hpb'), None
+        print(f"重複検出対象（HPB）: {len(left)}件", flush=True)
+    else:
+        raise ValueError(f"未対応のモードです: {mode}")
+
+    pairs = resolve_blocks(left, right, top_k=top_k, min_score=min_score)
+    print(f"候補ペア: {len(pairs)}件 ({time.monotonic() - started:.1f}秒)", flush=True)
+
+    # 同じモードの未処理候補を入れ替え
+    MatchCandidate.query.filter_by(mode=mode, status='pending').delete(synchronize_session=False)
+    if pairs:
+        db.session.execute(
+            MatchCandidate.__table__.insert(),
+            [dict(pair, mode=mode, status='pending') for pair in pairs]
+        )
+    db.session.commit()
+
+    if csv_path:
+        with open(csv_path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['left_id', 'right_id', 'score', 'address_score', 'name_score'])
+            writer.writeheader()
+            writer.writerows(pairs)
+        print(f"CSV出力: {csv_path}", flush=True)
+
+    return pairs
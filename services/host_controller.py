@@ -0,0 +1,325 @@
+"""
+ホストごとの同時実行数制御（AIMD）とサーキットブレーカー
+
+全ての取得処理（Seleniumの PageFetcher、問い合わせ情報クローラー、Google Map関連）はリクエストの前に
+HostController を通す。ホストごとに直近の結果（成功 / タイムアウト / ブロック / エラー）と応答時間を記録し、
+- 健全な間は同時実行数の上限を加算的に増やす（上限1往復分の成功で +1、応答が遅い間は増やさない）
+- 失敗したら上限を乗算的に減らす（× DECREASE_FACTOR）
+- 連続失敗・直近の失敗率が閾値を超えたらサーキットを開き、クールダウンの間はリクエストを送らない
+  （クールダウンは開くたびに倍増、再開後の最初の1件（試行）が成功したら閉じて元に戻す）
+
+ブロックの兆候: 429 / 403 / 503 応答、アクセス集中・CAPTCHA等のエラーページ（looks_blocked）、
+結果の入るはずのコンテナが空のページ（呼び出し側が Slot.blocked() / report_blocked() で通知）。
+
+使い方:
+    with get_host_controller().request(url) as slot:
+        html = fetch(url)
+        slot.check(html)  # エラーページならブロックとして記録
+
+    async with get_host_controller().async_request(url) as slot:
+        ...
+
+リプレイモードでは取得処理がリクエストを送らないため、ここを通らない。
+"""
+import asyncio
+import os
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from urllib.parse import urlparse
+
+
+# 設定
+INITIAL_CONCURRENCY = 2  # ホストごとの同時実行数の初期値
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = int(os.environ.get('HOST_MAX_CONCURRENCY', '8'))
+DECREASE_FACTOR = 0.5  # 失敗時に同時実行数の上限に掛ける係数
+WINDOW_SIZE = 20  # 失敗率・応答時間を計算する直近の結果の件数
+MIN_SAMPLES = 5  # 失敗率でサーキットを開くのに必要な件数
+FAILURE_RATE_THRESHOLD = 0.5  # 直近の失敗率がこれ以上でサーキットを開く
+CONSECUTIVE_FAILURES = 4  # 連続してこの回数失敗したらサーキットを開く
+SLOW_FACTOR = 3.0  # 応答時間が直近の中央値のこの倍以上なら同時実行数を増やさない
+BASE_COOLDOWN = float(os.environ.get('HOST_BASE_COOLDOWN', '30'))  # サーキットを開いたときの停止時間（秒）
+MAX_COOLDOWN = 30 * 60
+POLL_INTERVAL = 0.2  # 空きを待つ間隔（秒、非同期版）
+
+OK = 'ok'
+TIMEOUT = 'timeout'
+BLOCKED = 'blocked'
+ERROR = 'error'
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+BLOCK_STATUS_CODES = (403, 429, 503)
+BLOCK_MARKERS = (
+    'アクセスが集中', 'ただいまアクセスが', 'しばらく時間をおいて', 'Access Denied', 'Too Many Requests',
+    'unusual traffic', '通常と異なるトラフィック', 'google.com/sorry', 'g-recaptcha', 'cf-challenge',
+)
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いている（wait=False で取得しようとした場合）"""
+
+    def __init__(self, host, retry_after):
+        super().__init__(f"{host} はサーキット遮断中（残り{retry_after:.0f}秒）")
+        self.host = host
+        self.retry_after = retry_after
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower() or url
+
+
+def looks_blocked(html):
+    """アクセス集中・CAPTCHA等のエラーページか（先頭部分のみ確認）"""
+    if not html:
+        return False
+    head = html[:20000]
+    return any(marker in head for marker in BLOCK_MARKERS)
+
+
+def _is_timeout(exc):
+    return isinstance(exc, (TimeoutError, asyncio.TimeoutError)) or 'Timeout' in type(exc).__name__
+
+
+class HostState:
+    """1ホストの状態"""
+
+    def __init__(self):
+        self.limit = float(INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.window = deque(maxlen=WINDOW_SIZE)  # (結果, 応答時間)
+        self.consecutive_failures = 0
+        self.circuit = CLOSED
+        self.open_until = 0.0
+        self.cooldown = BASE_COOLDOWN
+        self.probing = False
+        self.counts = {OK: 0, TIMEOUT: 0, BLOCKED: 0, ERROR: 0}
+        self.opened = 0
+
+    def failure_rate(self):
+        if not self.window:
+            return 0.0
+        return sum(1 for kind, _ in self.window if kind != OK) / len(self.window)
+
+    def median_latency(self):
+        latencies = [latency for kind, latency in self.window if kind == OK]
+        return statistics.median(latencies) if latencies else None
+
+
+class Slot:
+    """取得1回分の枠（結果を記録して解放する）"""
+
+    def __init__(self, controller, host):
+        self.controller = controller
+        self.host = host
+        self.kind = None
+        self.started = time.monotonic()
+
+    def blocked(self):
+        """ブロックの兆候（空の結果・エラーページ）"""
+        self.kind = BLOCKED
+
+    def failed(self, kind=ERROR):
+        self.kind = kind
+
+    def check(self, html):
+        """HTMLがエラーページならブロックとして記録"""
+        if looks_blocked(html):
+            self.blocked()
+        return html
+
+    def check_status(self, status):
+        """HTTPステータスが 429 / 403 / 503 ならブロック、5xx ならエラーとして記録"""
+        if status in BLOCK_STATUS_CODES:
+            self.blocked()
+        elif status >= 500:
+            self.failed(ERROR)
+
+    def _finish(self, exc=None):
+        if exc is not None and self.kind is None:
+            self.kind = TIMEOUT if _is_timeout(exc) else ERROR
+        self.controller.release(self.host, self.kind or OK, time.monotonic() - self.started)
+
+
+class HostController:
+    """ホストごとのAIMD同時実行数制御とサーキットブレーカー（スレッドセーフ）"""
+
+    def __init__(self):
+        self._hosts = {}
+        self._cond = threading.Condition()
+
+    def _state(self, host):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = HostState()
+        return state
+
+    def try_acquire(self, host):
+        """
+        枠を取得（取得できなければ待つべき秒数を返す）
+
+        Returns:
+            float: 0なら取得済み、それ以外は待機秒数（サーキットが開いている間は残り時間）
+        """
+        with self._cond:
+            state = self._state(host)
+            now = time.monotonic()
+            if state.circuit == OPEN:
+                if now < state.open_until:
+                    return state.open_until - now
+                state.circuit = HALF_OPEN
+                state.probing = False
+            if state.circuit == HALF_OPEN:
+                # 再開後は1件だけ試す
+                if state.probing:
+                    return POLL_INTERVAL
+                state.probing = True
+            elif state.in_flight >= max(MIN_CONCURRENCY, int(state.limit)):
+                return POLL_INTERVAL
+            state.in_flight += 1
+            return 0
+
+    def release(self, host, kind, latency):
+        """結果を記録して枠を解放"""
+        with self._cond:
+            state = self._state(host)
+            state.in_flight = max(0, state.in_flight - 1)
+            state.counts[kind] += 1
+            median = state.median_latency()
+            state.window.append((kind, latency))
+            if kind == OK:
+                state.consecutive_failures = 0
+                if state.circuit == HALF_OPEN:
+                    self._close(host, state)
+                slow = median is not None and len(state.window) >= MIN_SAMPLES and latency > median * SLOW_FACTOR
+                if not slow:
+                    state.limit = min(MAX_CONCURRENCY, state.limit + 1.0 / state.limit)
+            else:
+                state.consecutive_failures += 1
+                state.limit = max(MIN_CONCURRENCY, state.limit * DECREASE_FACTOR)
+                if state.circuit == HALF_OPEN:
+                    self._open(host, state, f"再開後の試行が失敗（{kind}）")
+                elif state.circuit == CLOSED:
+                    if state.consecutive_failures >= CONSECUTIVE_FAILURES:
+                        self._open(host, state, f"{state.consecutive_failures}回連続で失敗（{kind}）")
+                    elif len(state.window) >= MIN_SAMPLES and state.failure_rate() >= FAILURE_RATE_THRESHOLD:
+                        self._open(host, state, f"直近の失敗率 {state.failure_rate():.0%}")
+            self._cond.notify_all()
+
+    def cancel(self, host):
+        """結果を記録せずに枠を返す（ブラウザの異常・呼び出し側の中断など、ホストの状態と無関係な場合）"""
+        with self._cond:
+            state = self._state(host)
+            state.in_flight = max(0, state.in_flight - 1)
+            if state.circuit == HALF_OPEN:
+                state.probing = False
+            self._cond.notify_all()
+
+    def _open(self, host, state, reason):
+        state.circuit = OPEN
+        state.probing = False
+        state.open_until = time.monotonic() + state.cooldown
+        state.opened += 1
+        print(f"[サーキット遮断] {host}: {reason}。{state.cooldown:.0f}秒停止します", flush=True)
+        state.cooldown = min(MAX_COOLDOWN, state.cooldown * 2)
+
+    def _close(self, host, state):
+        state.circuit = CLOSED
+        state.probing = False
+        state.cooldown = BASE_COOLDOWN
+        state.window.clear()
+        print(f"[サーキット再開] {host}: 試行が成功したため再開します", flush=True)
+
+    def report_blocked(self, url):
+        """取得後に判明したブロックの兆候（空の結果など）を記録"""
+        host = host_of(url)
+        with self._cond:
+            self._state(host).in_flight += 1
+        self.release(host, BLOCKED, 0.0)
+
+    @contextmanager
+    def request(self, url, wait=True):
+        """
+        リクエスト1回分の枠（同期版）
+
+        Args:
+            url: リクエスト先
+            wait: Falseならサーキットが開いている場合に待たず CircuitOpenError を送出
+
+        Yields:
+            Slot
+        """
+        host = host_of(url)
+        while True:
+            delay = self.try_acquire(host)
+            if not delay:
+                break
+            if not wait and self._state(host).circuit == OPEN:
+                raise CircuitOpenError(host, delay)
+            with self._cond:
+                self._cond.wait(timeout=delay)
+        slot = Slot(self, host)
+        try:
+            yield slot
+        except BaseException as e:
+            slot._finish(e)
+            raise
+        slot._finish()
+
+    @asynccontextmanager
+    async def async_request(self, url, wait=True):
+        """リクエスト1回分の枠（非同期版、引数は request と同じ）"""
+        host = host_of(url)
+        while True:
+            delay = self.try_acquire(host)
+            if not delay:
+                break
+            if not wait and self._state(host).circuit == OPEN:
+                raise CircuitOpenError(host, delay)
+            await asyncio.sleep(min(delay, 5.0))
+        slot = Slot(self, host)
+        try:
+            yield slot
+        except BaseException as e:
+            slot._finish(e)
+            raise
+        slot._finish()
+
+    def snapshot(self):
+        """ホストごとの状態（同時実行数の上限・サーキット・失敗率・応答時間の中央値・件数）"""
+        with self._cond:
+            return {host: {
+                'limit': state.limit,
+                'circuit': state.circuit,
+                'failure_rate': state.failure_rate(),
+                'median_latency': state.median_latency(),
+                'opened': state.opened,
+                **state.counts,
+            } for host, state in self._hosts.items()}
+
+    def print_report(self, min_requests=1):
+        """ホスト別の取得状況を表示（min_requests 件未満のホストは省略）"""
+        hosts = {host: stats for host, stats in self.snapshot().items()
+                 if stats[OK] + stats[TIMEOUT] + stats[BLOCKED] + stats[ERROR] >= min_requests}
+        if not hosts:
+            return
+        print("ホスト別の取得状況:", flush=True)
+        for host, stats in sorted(hosts.items()):
+            total = stats[OK] + stats[TIMEOUT] + stats[BLOCKED] + stats[ERROR]
+            latency = f"{stats['median_latency']:.1f}秒" if stats['median_latency'] is not None else '-'
+            print(f"  {host}: {total}件（成功 {stats[OK]} / タイムアウト {stats[TIMEOUT]} / ブロック {stats[BLOCKED]} / "
+                  f"エラー {stats[ERROR]}）応答 {latency} 同時実行上限 {stats['limit']:.1f} "
+                  f"遮断 {stats['opened']}回 [{stats['circuit']}]", flush=True)
+
+
+_controller = HostController()
+
+
+def get_host_controller():
+    """プロセス内で共有するHostController"""
+    return _controller
@@ -0,0 +1,268 @@
+"""
+HotPepper Beauty 詳細情報の抽出処理レジストリ（1サロンあたりトップページ・口コミページを1回ずつ取得）
+
+抽出処理は取得するページ（top / reviews）ごとに登録する。extract_details はサロンごとに
+必要なページだけを1回ずつ取得・パースし、そのページに登録された抽出処理を同じツリーに対して全て実行する。
+save_details は抽出結果（住所・評価・口コミ件数・クーポン・メニュー・スタッフ）を1トランザクションで保存する。
+一覧ページのカードから取得済みの項目（card_details）は missing_fields で除外し、残りの項目のページだけを開く。
+
+抽出処理を追加する場合:
+    @register(PAGE_TOP, 'business_hours')
+    def _business_hours(tree, salon_url):
+        return ...
+
+1回のパースで複数の項目を返す場合は項目名を並べ、{項目名: 値} を返す:
+    @register(PAGE_REVIEWS, 'rating', 'review_count')
+
+app.get_hpb_details / app.scrape_salon_list / run_hpb_details_updater.py から使用する。
+"""
+from dataclasses import asdict, is_dataclass
+
+from selectolax.lexbor import LexborHTMLParser
+
+from models import db, Coupon, Menu, ReviewSummary, Staff
+from services.hpb_parsers import (
+    parse_clinic_reviews, parse_salon_address, parse_salon_coupons, parse_salon_menu, parse_salon_reviews,
+    parse_salon_staff
+)
+
+
+# 設定
+PAGE_TOP = 'top'
+PAGE_REVIEWS = 'reviews'
+REVIEW_SOURCE_NAME = 'Hot Pepper'  # ReviewSummary.source_name
+ENRICHMENT_PARTIAL = 'partial'  # Biz.hpb_enrichment: 一覧のカードの項目のみ取得済み
+ENRICHMENT_FULL = 'full'  # Biz.hpb_enrichment: 詳細ページの全項目を取得済み
+CARD_FIELDS = ('address', 'rating', 'review_count')  # 一覧のカードからも取得できる項目
+
+# ページ → {(項目名, ...): 抽出処理(tree, salon_url)}（登録順に実行）
+_EXTRACTORS = {PAGE_TOP: {}, PAGE_REVIEWS: {}}
+
+
+def register(page, *names):
+    """
+    抽出処理を登録するデコレータ
+
+    項目名が1つなら抽出処理は値を、複数なら {項目名: 値} を返す（同じパース結果から複数の項目を取る場合）。
+    """
+    def decorator(func):
+        _EXTRACTORS[page][names] = func
+        return func
+    return decorator
+
+
+def registered_fields(page=None):
+    """登録済みの項目名（page 指定時はそのページの項目のみ）"""
+    pages = [page] if page else list(_EXTRACTORS)
+    return [name for p in pages for names in _EXTRACTORS[p] for name in names]
+
+
+def pages_for(fields=None):
+    """fields の取得に必要なページ種別"""
+    return [page for page in _EXTRACTORS if registered_fields(page) and (
+        fields is None or any(name in fields for name in registered_fields(page)))]
+
+
+def is_clinic_url(salon_url):
+    return 'clinic.beauty.hotpepper.jp' in salon_url
+
+
+def page_url(salon_url, page):
+    """
+    ページ種別のURL
+
+    口コミページはクリニックが /reviews/、美容院・エステ等が /review/。
+    """
+    if page == PAGE_TOP:
+        return salon_url
+    return salon_url.split('?')[0].rstrip('/') + ('/reviews/' if is_clinic_url(salon_url) else '/review/')
+
+
+# ---------------------------------------------------------------
+# 抽出処理
+# ---------------------------------------------------------------
+
+@register(PAGE_TOP, 'address')
+def _address(tree, salon_url):
+    return parse_salon_address(tree)
+
+
+@register(PAGE_TOP, 'coupons')
+def _coupons(tree, salon_url):
+    return parse_salon_coupons(tree)
+
+
+@register(PAGE_TOP, 'menu')
+def _menu(tree, salon_url):
+    return parse_salon_menu(tree)
+
+
+@register(PAGE_TOP, 'staff')
+def _staff(tree, salon_url):
+    return parse_salon_staff(tree)
+
+
+@register(PAGE_REVIEWS, 'rating', 'review_count')
+def _reviews(tree, salon_url):
+    reviews = parse_clinic_reviews(tree) if is_clinic_url(salon_url) else parse_salon_reviews(tree)
+    return {'rating': reviews.rating, 'review_count': reviews.count}
+
+
+# ---------------------------------------------------------------
+# 取得・保存
+# ---------------------------------------------------------------
+
+def extract_details(salon_url, fetcher, fields=None):
+    """
+    1サロン分の詳細情報を取得
+
+    fields に含まれる項目のページだけを取得する（全項目が口コミページなら、トップページは開かない）。
+    個々の抽出処理の失敗はその項目をNoneにして続行する。
+
+    Args:
+        salon_url: HPBのサロン・クリニックURL
+        fetcher: services.page_fetcher.PageFetcher（.get(url) でHTMLを返すもの）
+        fields: 取得する項目名（Noneなら登録済みの全項目）
+
+    Returns:
+        dict: 項目名 → 値
+    """
+    details = {}
+    for page, extractors in _EXTRACTORS.items():
+        targets = [
+            (names, [name for name in names if fields is None or name in fields], func)
+            for names, func in extractors.items()
+        ]
+        targets = [target for target in targets if target[1]]
+        if not targets:
+            continue
+        tree = LexborHTMLParser(fetcher.get(page_url(salon_url, page)) or '')
+        for names, wanted, func in targets:
+            try:
+                value = func(tree, salon_url)
+                values = value if len(names) > 1 else {names[0]: value}
+            except Exception as e:
+                print(f"[HPB抽出エラー] {','.join(wanted)}: {e}", flush=True)
+                values = {}
+            for name in wanted:
+                details[name] = values.get(name)
+    return details
+
+
+def card_details(card):
+    """一覧のカード（hpb_parsers.SalonCard）から取得できた項目（save_details に渡せる形）"""
+    return {name: getattr(card, name) for name in CARD_FIELDS if getattr(card, name) is not None}
+
+
+def missing_fields(biz, fields=None):
+    """
+    詳細ページから取得する必要のある項目
+
+    - address: 住所が未登録
+    - rating / review_count: HPBの評価・口コミ件数が未取得
+    - その他（クーポン・メニュー・スタッフ）: 詳細ページを未取得（hpb_enrichment が full でない）
+
+    Args:
+        biz: Biz
+        fields: 対象の項目名（Noneなら登録済みの全項目）
+
+    Returns:
+        list: 項目名
+    """
+    fields = registered_fields() if fields is None else fields
+    summary = ReviewSummary.query.filter_by(biz_id=biz.id, source_name=REVIEW_SOURCE_NAME).first()
+    present = {
+        'address': bool(biz.address),
+        'rating': summary is not None and summary.rating is not None,
+        'review_count': summary is not None and summary.count is not None,
+    }
+    return [name for name in fields if not present.get(name, biz.hpb_enrichment == ENRICHMENT_FULL)]
+
+
+def details_to_json(details):
+    """抽出結果をJSONに変換できる形にする（dataclassのリストをdictのリストに）"""
+    return {
+        name: [asdict(item) if is_dataclass(item) else item for item in value] if isinstance(value, list) else value
+        for name, value in details.items()
+    }
+
+
+_tables_checked = False
+
+
+def ensure_tables():
+    """
+    メニュー・スタッフのテーブルがなければ作成（プロセスごとに1回だけ確認）
+
+    既存のDBには scripts/migrate_add_menu_staff.py で作成する。未実行のままでも
+    save_details の置き換えでサロンごとの保存全体がロールバックされないようにする。
+    """
+    global _tables_checked
+    if _tables_checked:
+        return
+    Menu.__table__.create(bind=db.engine, checkfirst=True)
+    Staff.__table__.create(bind=db.engine, checkfirst=True)
+    _tables_checked = True
+
+
+def _replace_rows(model, biz_id, rows):
+    model.query.filter_by(biz_id=biz_id).delete()
+    db.session.add_all(rows)
+
+
+def save_details(biz, details, enrichment=None):
+    """
+    抽出結果を1トランザクションで保存
+
+    - 住所: 未登録の場合のみ
+    - 評価・口コミ件数: ReviewSummary（Hot Pepper）を作成・更新
+    - クーポン・メニュー・スタッフ: 1件以上取得できた場合にそのサロンの登録内容を置き換える
+      （セレクタの不一致で0件になった場合に既存データを消さないため）
+    - enrichment: 指定時は Biz.hpb_enrichment を更新（ENRICHMENT_PARTIAL / ENRICHMENT_FULL）
+
+    Returns:
+        list: 更新した項目名
+    """
+    updated = []
+    if details.get('menu') or details.get('staff'):
+        ensure_tables()
+    try:
+        if not biz.address and details.get('address'):
+            biz.address = details['address']
+            updated.append('address')
+
+        if details.get('rating') is not None or details.get('review_count') is not None:
+            summary = ReviewSummary.query.filter_by(biz_id=biz.id, source_name=REVIEW_SOURCE_NAME).first()
+            if not summary:
+                summary = ReviewSummary(biz_id=biz.id, source_name=REVIEW_SOURCE_NAME)
+                db.session.add(summary)
+            if details.get('rating') is not None:
+                summary.rating = details['rating']
+                updated.append('rating')
+            if details.get('review_count') is not None:
+                summary.count = details['review_count']
+                updated.append('review_count')
+
+        if details.get('coupons'):
+            _replace_rows(Coupon, biz.id, [Coupon(biz_id=biz.id, title=c.title[:255]) for c in details['coupons']])
+            updated.append('coupons')
+        if details.get('menu'):
+            _replace_rows(Menu, biz.id, [
+                Menu(biz_id=biz.id, name=m.name[:255], price=m.price, category=m.category) for m in details['menu']
+            ])
+            updated.append('menu')
+        if details.get('staff'):
+            _replace_rows(Staff, biz.id, [
+                Staff(biz_id=biz.id, name=s.name[:255], position=s.position) for s in details['staff']
+            ])
+            updated.append('staff')
+
+        if enrichment and biz.hpb_enrichment != enrichment:
+            biz.hpb_enrichment = enrichment
+            updated.append('hpb_enrichment')
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return updated
@@ -0,0 +1,360 @@
+"""
+HotPepper Beauty / リジョブのページ解析（取得処理から切り離した純粋関数）
+- parse_salon_list: 検索結果一覧（サロン・クリニックのカードと表示項目、次ページURL）
+- parse_salon_address: サロン・クリニックのトップページ（住所）
+- parse_clinic_reviews / parse_salon_reviews: 口コミページ（総合評価・口コミ件数）
+- parse_salon_coupons / parse_salon_menu / parse_salon_staff: トップページ（クーポン・メニュー・スタッフ）
+- parse_rejob_search: リジョブの検索結果（求人リンク）
+
+HTML文字列（またはパース済みの LexborHTMLParser）を受け取り、結果をdataclassで返す（ドライバー・DBに依存しない）。
+同じページに複数のパーサーを使う場合はパース済みのツリーを渡す（services/hpb_extractors.py）。
+パーサーは selectolax（lexbor）で実装している。BeautifulSoup(lxml) / SoupStrainer / lxml.html との比較は
+scripts/benchmark_hpb_parsers.py（scripts/fixtures/hpb の保存済みページで検証）。
+
+app.py の scrape_salon_list / _scrape_rejob_for_salon、services/hpb_extractors.py から使用する。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from selectolax.lexbor import LexborHTMLParser
+
+
+# 設定
+HPB_CLINIC_BASE_URL = 'https://clinic.beauty.hotpepper.jp'
+REJOB_BASE_URL = 'https://relax-job.com'
+
+_REJOB_JOB_HREF_PATTERN = re.compile(r'^/job/B\d+')
+_NUMBER_PATTERN = re.compile(r'(\d+)')
+_PRICE_PATTERN = re.compile(r'[¥￥]\s*([\d,]+)|([\d,]+)\s*円')
+
+# 検索結果一覧のカードの表示項目（「ラベル：値」の li と dt/dd の組、評価・口コミ件数）
+CARD_DATA_SELECTOR = 'ul.slnDataList li'
+CARD_RATING_SELECTOR = '.reviewRating, .clinic__rating'
+CARD_REVIEW_COUNT_SELECTOR = '.reviewCount, .clinic__review-count'
+CARD_LABELS = {'エリア': 'area', 'アクセス': 'access', '住所': 'address'}  # ラベル → SalonCard の項目
+
+# トップページのクーポン・メニュー・スタッフ（HPBのマークアップ変更時はここを更新）
+COUPON_SELECTOR = 'div.couponBox'
+COUPON_TITLE_SELECTOR = 'h3'
+MENU_SELECTOR = 'div.menuItem'
+MENU_NAME_SELECTOR = 'h4'
+MENU_CATEGORY_SELECTOR = 'p.menuCategory'
+STAFF_SELECTOR = 'div.staffItem'
+STAFF_NAME_SELECTOR = 'h4'
+STAFF_POSITION_SELECTOR = 'p.staffPosition'
+PRICE_SELECTOR = '.price'
+
+
+@dataclass
+class SalonCard:
+    """検索結果一覧のサロン・クリニック1件（カードに表示がない項目はNone）"""
+    name: str
+    url: str
+    area: Optional[str] = None
+    access: Optional[str] = None
+    address: Optional[str] = None
+    rating: Optional[float] = None
+    review_count: Optional[int] = None
+
+
+@dataclass
+class SalonListPage:
+    """検索結果一覧の1ページ"""
+    cards: List[SalonCard] = field(default_factory=list)
+    next_url: Optional[str] = None
+
+
+@dataclass
+class ReviewStats:
+    """口コミページの総合評価・口コミ件数"""
+    rating: Optional[float] = None
+    count: Optional[int] = None
+
+
+@dataclass
+class JobLink:
+    """リジョブの求人1件"""
+    title: str
+    url: str
+
+
+@dataclass
+class RejobSearchPage:
+    """リジョブの検索結果（paginated: ページネーションより前の求人に絞り込んだか）"""
+    jobs: List[JobLink] = field(default_factory=list)
+    paginated: bool = False
+
+
+@dataclass
+class CouponItem:
+    """トップページのクーポン1件"""
+    title: str
+    price: Optional[int] = None
+
+
+@dataclass
+class MenuItem:
+    """トップページのメニュー1件"""
+    name: str
+    price: Optional[int] = None
+    category: Optional[str] = None
+
+
+@dataclass
+class StaffMember:
+    """トップページのスタッフ1人"""
+    name: str
+    position: Optional[str] = None
+
+
+def _tree(source):
+    """HTML文字列ならパースし、パース済みのツリーならそのまま返す"""
+    if isinstance(source, LexborHTMLParser):
+        return source
+    return LexborHTMLParser(source or '')
+
+
+def _text(node):
+    """ノードのテキスト（BeautifulSoup の get_text(strip=True) と同じく各テキストをstripして連結）"""
+    return node.text(deep=True, strip=True)
+
+
+def _float(node):
+    if node is None:
+        return None
+    try:
+        return float(_text(node))
+    except ValueError:
+        return None
+
+
+def _count(node):
+    if node is None:
+        return None
+    match = _NUMBER_PATTERN.search(_text(node))
+    return int(match.group(1)) if match else None
+
+
+def _price(node):
+    """「¥5,500」「3,300円」形式の料金を整数（円）で返す"""
+    if node is None:
+        return None
+    match = _PRICE_PATTERN.search(_text(node))
+    if not match:
+        return None
+    return int((match.group(1) or match.group(2)).replace(',', ''))
+
+
+def _optional_text(node):
+    return (_text(node) or None) if node is not None else None
+
+
+def _next_element(node, tag):
+    """次の兄弟の tag 要素（間のテキストノードは飛ばす）"""
+    node = node.next
+    while node is not None and node.tag != tag:
+        node = node.next
+    return node
+
+
+def _ancestor(node, tag):
+    """最も近い祖先の tag 要素（BeautifulSoup の find_parent と同じ）"""
+    node = node.parent
+    while node is not None and node.tag != tag:
+        node = node.parent
+    return node
+
+
+def _card_fields(card):
+    """カードの表示項目（エリア・アクセス・住所・評価・口コミ件数）"""
+    fields = {}
+    pairs = []
+    for item in card.css(CARD_DATA_SELECTOR):
+        label, sep, value = _text(item).partition('：')
+        if sep:
+            pairs.append((label, value))
+    for dt in card.css('dt'):
+        dd = _next_element(dt, 'dd')
+        if dd is not None:
+            pairs.append((_text(dt), _text(dd)))
+    for label, value in pairs:
+        key = CARD_LABELS.get(label.strip())
+        if key and value.strip() and key not in fields:
+            fields[key] = value.strip()
+    fields['rating'] = _float(card.css_first(CARD_RATING_SELECTOR))
+    fields['review_count'] = _count(card.css_first(CARD_REVIEW_COUNT_SELECTOR))
+    return fields
+
+
+def parse_salon_list(html, base_url=HPB_CLINIC_BASE_URL):
+    """
+    検索結果一覧ページを解析
+
+    カードは li.searchListCassette → div.slnCassetteBody の親li → div.clinic の順に探す。
+    URLはクエリ文字列を除去し、相対URLは base_url で補う（同じページ内の重複は除外）。
+    カードに表示されているエリア・アクセス・住所・評価・口コミ件数も取得する（詳細ページの取得を省くため）。
+
+    Returns:
+        SalonListPage
+    """
+    tree = _tree(html)
+    cards = tree.css('li.searchListCassette')
+    if not cards:
+        cards = [li for li in (_ancestor(body, 'li') for body in tree.css('div.slnCassetteBody')) if li is not None]
+    if not cards:
+        cards = tree.css('div.clinic')
+
+    page = SalonListPage()
+    seen = set()
+    for card in cards:
+        link = card.css_first('h3.slnName a, h3.slcHead a, p.clinic__name a')
+        if link is None:
+            continue
+        href = link.attributes.get('href')
+        if not href:
+            continue
+        if href.startswith('http'):
+            url = href.split('?')[0]
+        elif href.startswith('/'):
+            url = base_url + href.split('?')[0]
+        else:
+            continue
+        if url in seen:
+            continue
+        seen.add(url)
+        page.cards.append(SalonCard(name=_text(link), url=url, **_card_fields(card)))
+
+    next_link = tree.css_first('a.iS.arrowR')
+    if next_link is not None and '次へ' in next_link.text():
+        page.next_url = next_link.attributes.get('href')
+    return page
+
+
+def parse_salon_address(html):
+    """
+    サロン・クリニックのトップページから住所を取得
+
+    Returns:
+        str: 住所 / 見つからない場合はNone
+    """
+    for th in _tree(html).css('th'):
+        if '住所' not in th.text():
+            continue
+        cell = th.next
+        while cell is not None and cell.tag != 'td':
+            cell = cell.next
+        return _text(cell) if cell is not None else None
+    return None
+
+
+def parse_clinic_reviews(html):
+    """
+    クリニックの口コミページ（/reviews/）を解析
+
+    Returns:
+        ReviewStats: span.clinic-review-rating__total-score / span.c-search-result-heading__count
+    """
+    tree = _tree(html)
+    return ReviewStats(
+        rating=_float(tree.css_first('span.clinic-review-rating__total-score')),
+        count=_count(tree.css_first('span.c-search-result-heading__count')),
+    )
+
+
+def parse_salon_reviews(html):
+    """
+    美容院・エステ等の口コミページ（/review/）を解析
+
+    Returns:
+        ReviewStats: dd.reviewRatingMeanScore / span.numberOfResult
+    """
+    tree = _tree(html)
+    return ReviewStats(
+        rating=_float(tree.css_first('dd.reviewRatingMeanScore')),
+        count=_count(tree.css_first('span.numberOfResult')),
+    )
+
+
+def parse_salon_coupons(html):
+    """
+    サロン・クリニックのトップページからクーポンを取得
+
+    Returns:
+        List[CouponItem]: タイトルのないものは除外
+    """
+    coupons = []
+    for box in _tree(html).css(COUPON_SELECTOR):
+        title = _optional_text(box.css_first(COUPON_TITLE_SELECTOR))
+        if title:
+            coupons.append(CouponItem(title=title, price=_price(box.css_first(PRICE_SELECTOR))))
+    return coupons
+
+
+def parse_salon_menu(html):
+    """
+    サロン・クリニックのトップページからメニュー・料金を取得
+
+    Returns:
+        List[MenuItem]: 名前のないものは除外
+    """
+    menu = []
+    for item in _tree(html).css(MENU_SELECTOR):
+        name = _optional_text(item.css_first(MENU_NAME_SELECTOR))
+        if name:
+            menu.append(MenuItem(
+                name=name,
+                price=_price(item.css_first(PRICE_SELECTOR)),
+                category=_optional_text(item.css_first(MENU_CATEGORY_SELECTOR)),
+            ))
+    return menu
+
+
+def parse_salon_staff(html):
+    """
+    サロン・クリニックのトップページからスタッフを取得
+
+    Returns:
+        List[StaffMember]: 名前のないものは除外
+    """
+    staff = []
+    for item in _tree(html).css(STAFF_SELECTOR):
+        name = _optional_text(item.css_first(STAFF_NAME_SELECTOR))
+        if name:
+            staff.append(StaffMember(name=name, position=_optional_text(item.css_first(STAFF_POSITION_SELECTOR))))
+    return staff
+
+
+def parse_rejob_search(html, salon_name):
+    """
+    リジョブの検索結果を解析
+
+    ページネーションがあれば、それより前にある求人リンク（/job/B...）のみを対象にする
+    （後ろは関連性の低いおすすめ求人）。ない場合は求人カードのうち会社名にサロン名を含むものを対象にする。
+
+    Returns:
+        RejobSearchPage
+    """
+    tree = _tree(html)
+    page = RejobSearchPage()
+    pagination = tree.css_first('div.c-pagenation')
+    if pagination is not None:
+        page.paginated = True
+        for node in tree.root.traverse():
+            if node.mem_id == pagination.mem_id:
+                break
+            if node.tag != 'a':
+                continue
+            href = node.attributes.get('href') or ''
+            if _REJOB_JOB_HREF_PATTERN.match(href):
+                page.jobs.append(JobLink(title=_text(node), url=REJOB_BASE_URL + href))
+        return page
+
+    for card in tree.css('div.jobCassette'):
+        company = card.css_first('p.jobCassette__company')
+        if company is None or salon_name not in _text(company):
+            continue
+        link = card.css_first('h3.jobCassette__title a')
+        if link is not None:
+            page.jobs.append(JobLink(title=_text(link), url=REJOB_BASE_URL + (link.attributes.get('href') or '')))
+    return page
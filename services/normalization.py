@@ -0,0 +1,216 @@
+"""
+マッチング用の正規化関数（正規化ロジックはこのモジュールに集約）
+- 名前・住所・電話番号・WebサイトURLを比較用のキーに変換
+- Bizの name_key / address_key / phone_digits / website_domain カラムはここで計算した値
+  （models.pyのイベントで書き込み時に自動更新）
+
+merge_helpers.py / scripts/merge_gmap_hpb.py / scripts/data_cleansing.py /
+services/csv_importer.py はこのモジュールの関数を使用する。
+"""
+import re
+import unicodedata
+from urllib.parse import urlparse
+
+
+_ZIPCODE_PATTERN = re.compile(r'^〒?\s*\d{3}-?\d{4}(?!\d)|〒\s*\d{3}-?\d{4}')
+_COUNTRY_PREFIX_PATTERN = re.compile(r'^(?:日本|Japan)[、,]?')
+_SPACES_PATTERN = re.compile(r'\s+')
+_HYPHEN_PATTERN = re.compile(r'[‐‑‒–—―−─－]')
+_DIGIT_LONG_VOWEL_PATTERN = re.compile(r'(?<=\d)[ーｰ](?=\d)')
+_KANJI_CHOME_PATTERN = re.compile(r'([一二三四五六七八九]?十?[一二三四五六七八九]?)丁目')
+_BLOCK_SEPARATOR_PATTERN = re.compile(r'(?<=\d)(?:丁目|番地の?|番の?|の(?=\d))')
+_BLOCK_SUFFIX_PATTERN = re.compile(r'(?<=\d)号')
+_NON_DIGIT_PATTERN = re.compile(r'\D')
+_KANA_VARIANTS = str.maketrans({'ヴ': 'ブ', 'ヰ': 'イ', 'ヱ': 'エ'})
+_KANJI_DIGITS = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9}
+
+# 2階層のドメイン（example.co.jp の co.jp 部分）
+_SECOND_LEVEL_SUFFIXES = {
+    'co.jp', 'or.jp', 'ne.jp', 'ac.jp', 'ad.jp', 'ed.jp', 'go.jp', 'gr.jp', 'lg.jp',
+    'co.uk', 'org.uk', 'com.au', 'com.tw', 'com.cn', 'co.kr',
+}
+# サブドメインごとに別サイトになる共有ホスティング（xxx.wixsite.com など）
+_SHARED_HOSTING_SUFFIXES = {
+    'wixsite.com', 'jimdofree.com', 'jimdo.com', 'jimdosite.com', 'fc2.com', 'blogspot.com',
+    'wordpress.com', 'webnode.jp', 'goope.jp', 'amebaownd.com', 'studio.site', 'peraichi.com',
+    'hatenablog.com', 'web.fc2.com', 'sakura.ne.jp', 'xsrv.jp', 'main.jp', 'lolipop.jp',
+}
+# 都道府県型JPドメイン（city.shibuya.tokyo.jp の tokyo.jp 部分）
+_JP_PREFECTURE_LABELS = {
+    'hokkaido', 'aomori', 'iwate', 'miyagi', 'akita', 'yamagata', 'fukushima', 'ibaraki', 'tochigi',
+    'gunma', 'saitama', 'chiba', 'tokyo', 'kanagawa', 'niigata', 'toyama', 'ishikawa', 'fukui',
+    'yamanashi', 'nagano', 'gifu', 'shizuoka', 'aichi', 'mie', 'shiga', 'kyoto', 'osaka', 'hyogo',
+    'nara', 'wakayama', 'tottori', 'shimane', 'okayama', 'hiroshima', 'yamaguchi', 'tokushima',
+    'kagawa', 'ehime', 'kochi', 'fukuoka', 'saga', 'nagasaki', 'kumamoto', 'oita', 'miyazaki',
+    'kagoshima', 'okinawa',
+}
+
+
+def kanji_to_number(text):
+    """「二十三」のような漢数字（99まで）を整数に変換"""
+    if '十' in text:
+        tens, _, ones = text.partition('十')
+        return _KANJI_DIGITS.get(tens, 1) * 10 + _KANJI_DIGITS.get(ones, 0)
+    return _KANJI_DIGITS.get(text, 0)
+
+
+def remove_zipcode(address):
+    """
+    住所から郵便番号（〒123-4567 / 1234567）と国名の接頭辞を削除
+
+    Returns:
+        str: 郵便番号なしの住所 / 空の場合はNone
+    """
+    if not address:
+        return None
+    address = _COUNTRY_PREFIX_PATTERN.sub('', address.strip())
+    address = _ZIPCODE_PATTERN.sub('', address, count=1)
+    return address.strip(' 　、,') or None
+
+
+def normalize_address(address):
+    """
+    住所を比較用キーに正規化
+    - 全角英数字・記号を半角に（NFKC）
+    - 国名・郵便番号・空白を削除
+    - ハイフンの表記揺れを統一
+    - 「2丁目29番5号」「二丁目29-5」を「2-29-5」に統一
+
+    Returns:
+        str: 正規化済み住所（空の場合は空文字）
+    """
+    if not address:
+        return ""
+    address = unicodedata.normalize('NFKC', address)
+    address = _SPACES_PATTERN.sub('', remove_zipcode(address) or '')
+    address = _HYPHEN_PATTERN.sub('-', address)
+    address = _DIGIT_LONG_VOWEL_PATTERN.sub('-', address)
+    address = _KANJI_CHOME_PATTERN.sub(
+        lambda m: f"{kanji_to_number(m.group(1))}丁目" if m.group(1) else m.group(0), address
+    )
+    address = _BLOCK_SEPARATOR_PATTERN.sub('-', address)
+    address = _BLOCK_SUFFIX_PATTERN.sub('', address)
+    return address
+
+
+def normalize_name(name):
+    """
+    名前を比較用キーに正規化
+    - 全角英数字を半角に（NFKC）、空白削除
+    - カタカナの表記揺れを統一（ヴ→ブ など）
+    - 小文字に統一
+
+    Returns:
+        str: 正規化済みの名前（空の場合は空文字）
+    """
+    if not name:
+        return ""
+    name = unicodedata.normalize('NFKC', name)
+    name = _SPACES_PATTERN.sub('', name)
+    name = name.translate(_KANA_VARIANTS)
+    return name.lower()
+
+
+def phone_digits(phone):
+    """
+    電話番号を数字のみに正規化（複数ある場合は最初の1つ、+81は0に変換）
+
+    Returns:
+        str: 10桁または11桁の数字 / 不正な番号は空文字
+    """
+    if not phone:
+        return ""
+    phone = unicodedata.normalize('NFKC', phone.split(',')[0])
+    digits = _NON_DIGIT_PATTERN.sub('', phone)
+    if digits.startswith('81') and len(digits) in (11, 12):
+        digits = '0' + digits[2:]
+    return digits if len(digits) in (10, 11) else ""
+
+
+def format_phone(phone):
+    """
+    電話番号を標準形式（03-1234-5678）に整形
+
+    Returns:
+        str: 整形済みの電話番号 / 不正な番号はNone
+    """
+    digits = phone_digits(phone)
+    if not digits:
+        return None
+    if len(digits) == 10:
+        # 03-1234-5678 or 06-1234-5678
+        if digits[:2] in ('03', '04', '06'):
+            return f"{digits[:2]}-{digits[2:6]}-{digits[6:]}"
+        # 0120-123-456 / 0570-012-345 / 0990-123-456
+        if digits[:4] in ('0120', '0570', '0990'):
+            return f"{digits[:4]}-{digits[4:7]}-{digits[7:]}"
+        return f"{digits[:3]}-{digits[3:6]}-{digits[6:]}"
+    # 0800-123-4567
+    if digits[:4] == '0800':
+        return f"{digits[:4]}-{digits[4:7]}-{digits[7:]}"
+    # 090-1234-5678
+    return f"{digits[:3]}-{digits[3:7]}-{digits[7:]}"
+
+
+def registrable_domain(url):
+    """
+    URLから登録可能ドメイン（例: https://www.abc-clinic.co.jp/shibuya/ → abc-clinic.co.jp）を取り出す
+
+    共有ホスティング（xxx.wixsite.com など）はサブドメインまで含める。
+
+    Returns:
+        str: ドメイン / 取得できない場合は空文字
+    """
+    if not url:
+        return ""
+    url = url.strip()
+    if '://' not in url:
+        url = 'http://' + url
+    try:
+        host = (urlparse(url).hostname or '').lower().rstrip('.')
+    except ValueError:
+        return ""
+    if not host or re.fullmatch(r'[\d.]+', host):
+        return host
+    labels = host.split('.')
+    if len(labels) <= 2:
+        return host
+
+    last_two = '.'.join(labels[-2:])
+    last_three = '.'.join(labels[-3:])
+    if last_three in _SHARED_HOSTING_SUFFIXES:
+        return '.'.join(labels[-4:])
+    if last_two in _SHARED_HOSTING_SUFFIXES:
+        return last_three
+    if last_two in _SECOND_LEVEL_SUFFIXES:
+        # co.jp などの属性型ドメイン
+        return last_three
+    if labels[-1] == 'jp' and labels[-2] in _JP_PREFECTURE_LABELS:
+        # 都道府県型ドメイン（city.shibuya.tokyo.jp）
+        return '.'.join(labels[-4:])
+    return last_two
+
+
+def matching_keys(name=None, name_hpb=None, address=None, phone=None, website_url=None):
+    """
+    Bizに保存するマッチング用キーをまとめて計算
+
+    Returns:
+        dict: name_key / address_key / phone_digits / website_domain（空はNone）
+    """
+    return {
+        'name_key': normalize_name(name or name_hpb)[:255] or None,
+        'address_key': normalize_address(address)[:255] or None,
+        'phone_digits': phone_digits(phone) or None,
+        'website_domain': registrable_domain(website_url) or None,
+    }
+
+
+def prefix_filter(column, prefix):
+    """
+    前方一致の条件をインデックスの範囲検索として組み立てる
+
+    SQLiteのLIKEは大文字小文字の扱いによってインデックスを使わないため、
+    column >= prefix AND column < prefix + U+FFFF の形にする。
+    """
+    return (column >= prefix) & (column < prefix + '\uffff')
@@ -0,0 +1,133 @@
+"""
+ブラウザでのページ取得（Selenium / Playwright の選択）
+
+- PageFetcher: Seleniumでのページ取得とスナップショット保存（ドライバーの起動・再起動は
+  services.browser_watchdog、ホストごとの同時実行数・サーキットブレーカーは services.host_controller）
+- create_fetcher: 取得元ごとに Selenium（PageFetcher）/ Playwright（services.playwright_fetcher.PlaywrightFetcher）を
+  選択する（環境変数 BROWSER_BACKEND / BROWSER_BACKEND_<取得元>）
+
+取得したHTMLの保存・リプレイは services.snapshot_store が担う。
+"""
+import os
+import time
+
+from services.browser_watchdog import get_browser_watchdog
+from services.host_controller import get_host_controller
+from services.snapshot_store import is_replay, load_snapshot, record_snapshot
+
+
+# 設定
+BACKEND_SELENIUM = 'selenium'
+BACKEND_PLAYWRIGHT = 'playwright'
+BROWSER_BACKEND = os.environ.get('BROWSER_BACKEND', BACKEND_SELENIUM)  # ページ取得に使うブラウザの既定値
+
+
+class PageFetcher:
+    """
+    Seleniumでのページ取得とスナップショット保存をまとめたもの
+
+    ドライバーは最初に必要になったときに起動する。ページごとにメモリ・描画時間を監視し
+    （services.browser_watchdog）、再起動が必要になったら閉じて次のページで起動し直す。
+    リプレイモードではドライバーを起動せず、待機もせずに保存済みのHTMLを返す。
+    1つのドライバーを使うため、同時に取得できるのは1ページ（concurrency = 1）。
+    Playwright版（services.playwright_fetcher.PlaywrightFetcher）と同じインターフェース。
+
+    Args:
+        driver_factory: Seleniumドライバーを生成する関数（app.get_stealth_driver）
+        source: スナップショットの取得元の識別名
+        wait: ページ読み込み後の待機秒数
+    """
+    concurrency = 1
+
+    def __init__(self, driver_factory, source, wait=3):
+        self.driver_factory = driver_factory
+        self.source = source
+        self.wait = wait
+        self._driver = None
+
+    @property
+    def driver(self):
+        if self._driver is None:
+            self._driver = get_browser_watchdog().track(self.driver_factory())
+        return self._driver
+
+    def get(self, url, wait=None):
+        """
+        ページのHTMLを取得
+
+        Raises:
+            SnapshotNotFound: リプレイモードで保存されていない場合
+        """
+        return self.fetch(url, wait)[1]
+
+    def fetch(self, url, wait=None):
+        """
+        ページを取得し、(リダイレクト・JavaScriptによる書き換え後のURL, HTML) を返す
+
+        リプレイモードではURLは書き換わらない（保存済みのHTMLのみ）。
+
+        Raises:
+            SnapshotNotFound: リプレイモードで保存されていない場合
+        """
+        if is_replay():
+            return url, load_snapshot(url)
+        # ホストごとの同時実行数・サーキットブレーカー（遮断中はクールダウンが終わるまで待つ）
+        watchdog = get_browser_watchdog()
+        with get_host_controller().request(url) as slot:
+            started = time.monotonic()
+            self.driver.get(url)
+            watchdog.record_latency(self._driver, time.monotonic() - started)
+            time.sleep(self.wait if wait is None else wait)
+            html = slot.check(self.driver.page_source)
+            final_url = self.driver.current_url
+        record_snapshot(url, html, self.source)
+        reason = watchdog.check(self._driver)
+        if reason:
+            print(f"  🔄 ブラウザを再起動します: {reason}", flush=True)
+            try:
+                self.close()
+            except Exception:
+                pass
+        return final_url, html
+
+    def get_many(self, urls, wait=None):
+        """
+        複数のページを取得し、入力順に (URL, HTML) を返す（取得に失敗したページのHTMLはNone）
+        """
+        for url in urls:
+            try:
+                yield url, self.get(url, wait)
+            except Exception as e:
+                print(f"[取得エラー] {url}: {type(e).__name__}: {str(e)[:100]}", flush=True)
+                yield url, None
+
+    def close(self):
+        if self._driver is not None:
+            driver, self._driver = self._driver, None
+            get_browser_watchdog().forget(driver)
+            driver.quit()
+
+
+def browser_backend(source):
+    """取得元ごとのブラウザの種類（環境変数 BROWSER_BACKEND_<取得元> > BROWSER_BACKEND）"""
+    return os.environ.get(f"BROWSER_BACKEND_{source.upper()}", BROWSER_BACKEND)
+
+
+def create_fetcher(driver_factory, source, wait=3, backend=None):
+    """
+    取得元に応じたページ取得（PageFetcher / PlaywrightFetcher）を作成
+
+    Args:
+        driver_factory: Seleniumドライバーを生成する関数（Seleniumの場合のみ使用）
+        source: スナップショットの取得元の識別名（hpb_list / hpb_details / gmap / rejob など）
+        wait: ページ読み込み後の待機秒数（Playwrightでは通信が落ち着くまでの最大待機秒数）
+        backend: BACKEND_SELENIUM / BACKEND_PLAYWRIGHT（省略時は browser_backend(source)）
+    """
+    backend = backend or browser_backend(source)
+    if backend == BACKEND_PLAYWRIGHT:
+        # Playwrightは選択された場合のみ読み込む
+        from services.playwright_fetcher import PlaywrightFetcher
+        return PlaywrightFetcher(source, wait=wait)
+    if backend != BACKEND_SELENIUM:
+        raise ValueError(f"不明なブラウザの種類: {backend}")
+    return PageFetcher(driver_factory, source, wait=wait)
@@ -0,0 +1,90 @@
+"""
+一覧ページのパイプライン取得（次ページの先読み）
+
+ページNを解析して次ページのURLが分かった時点で、ページN+1の取得を取得用スレッドで開始し、
+その間に呼び出し側がページNのDB書き込みを行う。取得は取得用スレッド1本に限定し
+（ドライバーは取得用スレッドだけが使う）、同じホストへのリクエスト開始間隔は HostRateLimiter で
+MIN_REQUEST_INTERVAL 秒以上に保つ（直列実行時よりリクエスト頻度が上がらないようにする）。
+
+app.scrape_salon_list から使用する。
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+from services.snapshot_store import is_replay
+
+
+# 設定
+MIN_REQUEST_INTERVAL = float(os.environ.get('HPB_MIN_REQUEST_INTERVAL', '5'))  # 同じホストへのリクエスト開始間隔（秒）
+
+
+class HostRateLimiter:
+    """
+    ホストごとのリクエスト開始間隔を保つ（スレッドセーフ）
+
+    Args:
+        min_interval: 同じホストへのリクエスト開始間隔（秒）
+    """
+
+    def __init__(self, min_interval=MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self._next_start = {}  # ホスト → 次にリクエストを開始できる時刻
+        self._lock = threading.Lock()
+
+    def wait(self, url):
+        """url のホストへのリクエストを開始できるまで待機（リプレイ時は待機しない）"""
+        if is_replay() or self.min_interval <= 0:
+            return
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start.get(host, now))
+            self._next_start[host] = start + self.min_interval
+        if start > now:
+            time.sleep(start - now)
+
+
+# プロセス内で共有（同じホストへの複数タスクの合計でも間隔を保つ）
+_host_limiter = HostRateLimiter()
+
+
+def iter_pages(start_url, fetcher, parse, limiter=None):
+    """
+    一覧ページを順に取得・解析し、次ページを先読みしながら (URL, HTML, 解析結果) を返す
+
+    parse の結果の next_url を次ページとして、返す前に取得を開始する。
+    呼び出し側が途中で抜けた場合は、先読み中の取得の完了を待ってから終了する。
+
+    Args:
+        start_url: 最初のページのURL
+        fetcher: services.page_fetcher.PageFetcher（.get(url) でHTMLを返すもの）
+        parse: HTML → next_url 属性を持つ解析結果（hpb_parsers.parse_salon_list など）
+        limiter: HostRateLimiter（省略時はプロセス内で共有のもの）
+
+    Yields:
+        (str, str, 解析結果)（HTMLは変更検出 services.change_detection 用）
+    """
+    limiter = limiter or _host_limiter
+
+    def fetch(url):
+        limiter.wait(url)
+        return fetcher.get(url)
+
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='page-prefetch')
+    try:
+        url = start_url
+        future = executor.submit(fetch, url)
+        while url:
+            html = future.result()
+            page = parse(html)
+            next_url = page.next_url
+            if next_url:
+                # ページNのDB書き込みと並行して、ページN+1を取得
+                future = executor.submit(fetch, next_url)
+            yield url, html, page
+            url = next_url
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,238 @@
+"""
+Google Places API（Web Service）のクライアント
+
+- プロセス内で共有する requests.Session（keep-alive・コネクションプールで接続を使い回す）
+- 接続・読み込みのタイムアウト
+- OVER_QUERY_LIMIT / UNKNOWN_ERROR / 5xx / 接続エラーはジッター付きの指数バックオフで再試行
+- 呼び出しごとに取得するフィールドを指定（Place Details / Find Place は指定したフィールドのSKUのみ課金され、
+  応答も小さくなる。テキスト検索はAPIの仕様でフィールドを指定できない）
+- テキスト検索は next_page_token を辿って結果を順に返す（最大 MAX_PAGES ページ = 60件）
+- 全ての呼び出しは services.host_controller を通す（OVER_QUERY_LIMIT はブロックとして記録）
+- ページ表示時（interactive）の呼び出しはサーキット遮断中に待たず、再試行も INTERACTIVE_RETRIES 回までにして
+  すぐに PlacesError を送出する（呼び出し側は保存済みの口コミを表示する）
+- 全ての呼び出しは services.places_governor で予算・優先度を確認し、SKUごとの回数・料金と応答時間を記録する
+  （予算に近づいたら優先度の低い呼び出しは料金を使わずに BudgetDeferred を送出）
+
+app.py の get_gmap_place_details / get_gmap_details、scripts/update_missing_ratings.py から使用する。
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from services.host_controller import CircuitOpenError, get_host_controller
+from services.places_governor import BATCH, INTERACTIVE, get_places_governor, skus_for
+
+
+# 設定
+PLACES_API_URL = 'https://maps.googleapis.com/maps/api/place/'
+CONNECT_TIMEOUT = 3.05  # 接続のタイムアウト（秒）
+READ_TIMEOUT = 10  # 応答の読み込みのタイムアウト（秒）
+MAX_RETRIES = 3  # 再試行の回数
+INTERACTIVE_RETRIES = 1  # ページ表示時（interactive）の呼び出しの再試行の回数
+BACKOFF_BASE = 1.0  # 再試行の待機秒数の基準（1, 2, 4... 秒にジッターを加える）
+BACKOFF_MAX = 16.0
+NEXT_PAGE_DELAY = 2.0  # next_page_token が有効になるまでの待機（秒）
+MAX_PAGES = 3  # テキスト検索で辿るページ数の上限（APIの上限は3ページ）
+PAGE_SIZE = 20  # テキスト検索の1ページの件数
+POOL_SIZE = 10  # コネクションプールの大きさ
+LANGUAGE = 'ja'
+REGION = 'jp'
+
+# 呼び出しごとのフィールド（Place Details / Find Place）
+SEARCH_FIELDS = ('place_id', 'name', 'formatted_address', 'rating', 'user_ratings_total')
+RATING_FIELDS = ('rating', 'user_ratings_total')
+REVIEW_FIELDS = ('name', 'rating', 'user_ratings_total', 'reviews')
+
+RETRY_STATUSES = ('OVER_QUERY_LIMIT', 'UNKNOWN_ERROR')
+EMPTY_STATUSES = ('ZERO_RESULTS', 'NOT_FOUND')
+
+
+class PlacesError(Exception):
+    """Places APIのエラー（再試行しても解消しなかったもの・REQUEST_DENIED など）"""
+
+    def __init__(self, status, message=None):
+        super().__init__(f"{status}: {message}" if message else status)
+        self.status = status
+
+
+class BudgetDeferred(PlacesError):
+    """予算の上限に近いため、優先度の低い呼び出しを見送った（料金は発生していない）"""
+
+    def __init__(self, reason):
+        super().__init__('BUDGET_DEFERRED', reason)
+
+
+def backoff_delay(attempt):
+    """attempt 回目（1始まり）の再試行までの待機秒数（フルジッター）"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+class PlacesClient:
+    """
+    Places APIのクライアント（スレッドセーフ）
+
+    Args:
+        api_key: APIキー（省略時は環境変数 GOOGLE_MAPS_API_KEY）
+    """
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get('GOOGLE_MAPS_API_KEY')
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        self.session.mount('https://', adapter)
+
+    def _request(self, endpoint, params, priority=BATCH, fields=None):
+        """
+        1回のAPI呼び出し（再試行を含む）
+
+        Args:
+            endpoint: textsearch / findplacefromtext / details
+            params: クエリパラメータ（キー・言語は自動で付ける）
+            priority: 優先度（services.places_governor の interactive / batch / admin）
+            fields: 取得するフィールド（課金されるSKUの判定用）
+
+        Returns:
+            dict: 応答のJSON（status が OK / ZERO_RESULTS / NOT_FOUND）
+
+        Raises:
+            BudgetDeferred: 予算の上限に近いため見送った場合
+            PlacesError: 再試行しても成功しなかった場合、再試行しても意味のないエラー、
+                         または interactive の呼び出しでサーキットが遮断されている場合
+        """
+        if not self.api_key:
+            raise PlacesError('REQUEST_DENIED', 'GOOGLE_MAPS_API_KEYが設定されていません')
+        governor = get_places_governor()
+        skus = skus_for(endpoint, fields)
+        reason = governor.authorize(endpoint, skus, priority)
+        if reason:
+            raise BudgetDeferred(reason)
+        params = dict(params, key=self.api_key, language=LANGUAGE)
+        # ページ表示中の呼び出しはサーキットの回復や長い再試行を待たない
+        interactive = priority == INTERACTIVE
+        retries = INTERACTIVE_RETRIES if interactive else MAX_RETRIES
+        last_error = None
+        for attempt in range(1, retries + 2):
+            if attempt > 1:
+                time.sleep(backoff_delay(attempt - 1))
+            try:
+                with get_host_controller().request(PLACES_API_URL, wait=not interactive) as slot:
+                    started = time.monotonic()
+                    try:
+                        response = self.session.get(
+                            PLACES_API_URL + endpoint + '/json', params=params, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+                        )
+                    finally:
+                        governor.record_latency(endpoint, time.monotonic() - started)
+                    slot.check_status(response.status_code)
+                    if response.status_code >= 500:
+                        last_error = PlacesError(f"HTTP {response.status_code}")
+                        continue
+                    response.raise_for_status()
+                    data = response.json()
+                    status = data.get('status')
+                    if status == 'OVER_QUERY_LIMIT':
+                        slot.blocked()
+            except CircuitOpenError as e:
+                raise PlacesError('CIRCUIT_OPEN', str(e)) from e
+            except (requests.ConnectionError, requests.Timeout) as e:
+                last_error = PlacesError(type(e).__name__, str(e)[:100])
+                continue
+            except requests.RequestException as e:
+                raise PlacesError(type(e).__name__, str(e)[:100]) from e
+            if status == 'OK' or status in EMPTY_STATUSES:
+                governor.record(skus, priority)
+                return data
+            if status in RETRY_STATUSES:
+                last_error = PlacesError(status, data.get('error_message'))
+                continue
+            # next_page_token は発行直後しばらく INVALID_REQUEST になる
+            if status == 'INVALID_REQUEST' and 'pagetoken' in params:
+                last_error = PlacesError(status, 'next_page_token が有効になっていません')
+                time.sleep(NEXT_PAGE_DELAY)
+                continue
+            raise PlacesError(status, data.get('error_message'))
+        raise last_error
+
+    def details(self, place_id, fields, priority=BATCH):
+        """
+        Place Details（指定したフィールドのみ）
+
+        Returns:
+            dict: result（見つからなければNone）
+        """
+        data = self._request('details', {'place_id': place_id, 'fields': ','.join(fields)}, priority, fields)
+        return data.get('result')
+
+    def find_place(self, query, fields=SEARCH_FIELDS, priority=BATCH):
+        """
+        Find Place（テキストから1件を特定、指定したフィールドのみ）
+
+        Returns:
+            dict: 最も一致する候補（見つからなければNone）
+        """
+        data = self._request('findplacefromtext', {
+            'input': query, 'inputtype': 'textquery', 'fields': ','.join(fields)
+        }, priority, fields)
+        candidates = data.get('candidates') or []
+        return candidates[0] if candidates else None
+
+    def text_search_pages(self, query, max_pages=MAX_PAGES, priority=BATCH):
+        """
+        テキスト検索の結果をページ単位で返す（next_page_token を辿る）
+
+        Yields:
+            list: 1ページ分の結果（最大20件）
+        """
+        params = {'query': query, 'region': REGION}
+        for page in range(max_pages):
+            data = self._request('textsearch', params, priority)
+            yield data.get('results') or []
+            token = data.get('next_page_token')
+            if not token or page + 1 >= max_pages:
+                return
+            # トークンは発行から数秒後に有効になる
+            time.sleep(NEXT_PAGE_DELAY)
+            params = {'pagetoken': token}
+
+    def iter_text_search(self, query, max_pages=MAX_PAGES, priority=BATCH):
+        """テキスト検索の結果を1件ずつ返す（次のページは必要になったときに取得）"""
+        for results in self.text_search_pages(query, max_pages, priority):
+            yield from results
+
+    def text_search(self, query, max_pages=1, priority=BATCH):
+        """テキスト検索の結果（max_pages ページ分）"""
+        return list(self.iter_text_search(query, max_pages, priority))
+
+    def text_search_all(self, query, priority=BATCH):
+        """
+        テキスト検索の結果を上限（MAX_PAGES ページ）まで全て取得
+
+        Returns:
+            tuple: (結果のリスト, 上限まで返ったか)。上限まで返った場合は取りこぼしがありうる
+                   （APIは3ページ目以降を返さないため、最後のページが満杯なら飽和とみなす）
+        """
+        results = []
+        pages = 0
+        last_page = []
+        for last_page in self.text_search_pages(query, MAX_PAGES, priority):
+            pages += 1
+            results.extend(last_page)
+        return results, pages >= MAX_PAGES and len(last_page) >= PAGE_SIZE
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_places_client(api_key=None):
+    """プロセス内で共有するPlacesClient（APIキーごと）"""
+    api_key = api_key or os.environ.get('GOOGLE_MAPS_API_KEY')
+    with _clients_lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _clients[api_key] = PlacesClient(api_key)
+        return client
@@ -0,0 +1,250 @@
+"""
+Places APIの利用料金・応答時間の管理（予算と優先度による呼び出しの制御）
+
+services.places_client の全ての呼び出しはここを通す。
+- SKU（Text Search / Find Place / Place Details と、取得するフィールドの区分の Contact Data /
+  Atmosphere Data）ごとの呼び出し回数と概算料金を日別・優先度別に記録する
+- 1日・1か月の予算（環境変数 PLACES_DAILY_BUDGET_USD / PLACES_MONTHLY_BUDGET_USD）に対して、
+  優先度ごとに使ってよい割合を決め、超える呼び出しは料金を使わずに見送る（BudgetDeferred）
+    interactive（ページ表示時の口コミ更新）: ソフト上限（予算の SOFT_LIMIT_RATIO）まで
+    batch（タスク・スクリプトでの一括取得）: BATCH_LIMIT_RATIO まで
+    admin（管理画面から手動で実行したタスク）: ハード上限（予算の全額）まで
+- エンドポイントごとの応答時間のヒストグラムを日別に記録する（再試行を含むHTTPリクエスト1回ごと）
+
+複数のプロセス（Webアプリ・バッチ）で同じ予算を共有するため、記録はSQLiteに保存する。
+料金は公開単価からの概算（無料枠・割引は考慮しない）。scripts/report_places_usage.py で確認する。
+
+保存先: instance/places_usage.sqlite3（環境変数 PLACES_USAGE_DB で変更可）
+"""
+import bisect
+import os
+import sqlite3
+import threading
+import time
+
+
+# 設定
+PLACES_USAGE_DB = os.environ.get(
+    'PLACES_USAGE_DB',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'places_usage.sqlite3')
+)
+DAILY_BUDGET_USD = float(os.environ.get('PLACES_DAILY_BUDGET_USD', '10'))
+MONTHLY_BUDGET_USD = float(os.environ.get('PLACES_MONTHLY_BUDGET_USD', '150'))
+SOFT_LIMIT_RATIO = 0.8  # ソフト上限（これを超えたら interactive を見送る）
+BATCH_LIMIT_RATIO = 0.95  # これを超えたら batch も見送る（残りは admin 用）
+LATENCY_BUCKETS_MS = (100, 250, 500, 1000, 2000, 5000, 10000)  # ヒストグラムの区切り（これを超えたものは最後の区間）
+
+INTERACTIVE = 'interactive'
+BATCH = 'batch'
+ADMIN = 'admin'
+PRIORITIES = (INTERACTIVE, BATCH, ADMIN)  # 優先度の低い順
+PRIORITY_LIMITS = {INTERACTIVE: SOFT_LIMIT_RATIO, BATCH: BATCH_LIMIT_RATIO, ADMIN: 1.0}
+
+# SKUと1000回あたりの単価（USD、Places API（従来版）の公開単価）
+SKU_PRICES = {
+    'text_search': 32.0,
+    'find_place': 17.0,
+    'place_details': 17.0,
+    'contact_data': 3.0,
+    'atmosphere_data': 5.0,
+}
+ENDPOINT_SKUS = {'textsearch': 'text_search', 'findplacefromtext': 'find_place', 'details': 'place_details'}
+CONTACT_FIELDS = {
+    'formatted_phone_number', 'international_phone_number', 'opening_hours', 'current_opening_hours',
+    'secondary_opening_hours', 'website',
+}
+ATMOSPHERE_FIELDS = {
+    'rating', 'user_ratings_total', 'reviews', 'price_level', 'editorial_summary', 'reservable', 'delivery',
+    'dine_in', 'takeout', 'wheelchair_accessible_entrance',
+}
+
+
+def skus_for(endpoint, fields=None):
+    """
+    1回の呼び出しで課金されるSKU
+
+    Args:
+        endpoint: textsearch / findplacefromtext / details
+        fields: 取得するフィールド（テキスト検索は指定できず、Contact / Atmosphere Data も課金される）
+    """
+    skus = [ENDPOINT_SKUS[endpoint]]
+    if fields is None:
+        return skus + ['contact_data', 'atmosphere_data'] if endpoint == 'textsearch' else skus
+    fields = set(fields)
+    if fields & CONTACT_FIELDS:
+        skus.append('contact_data')
+    if fields & ATMOSPHERE_FIELDS:
+        skus.append('atmosphere_data')
+    return skus
+
+
+def skus_cost(skus):
+    """SKUの組み合わせ1回分の概算料金（USD）"""
+    return sum(SKU_PRICES[sku] for sku in skus) / 1000
+
+
+def latency_bucket(seconds):
+    """応答時間のヒストグラムの区間（区間の上限のミリ秒、最後の区間は0）"""
+    index = bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)
+    return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else 0
+
+
+class PlacesUsageStore:
+    """SKUごとの呼び出し回数・料金、見送った回数、応答時間のヒストグラムの保存先"""
+
+    def __init__(self, path=PLACES_USAGE_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS places_sku_usage (
+                day TEXT NOT NULL,
+                sku TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                cost_usd REAL NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, sku, priority)
+            );
+            CREATE TABLE IF NOT EXISTS places_deferred (
+                day TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                priority TEXT NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, endpoint, priority)
+            );
+            CREATE TABLE IF NOT EXISTS places_latency (
+                day TEXT NOT NULL,
+                endpoint TEXT NOT NULL,
+                bucket_ms INTEGER NOT NULL,
+                calls INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (day, endpoint, bucket_ms)
+            );
+        ''')
+
+    def add_usage(self, day, skus, priority):
+        with self._lock:
+            self._conn.executemany('''
+                INSERT INTO places_sku_usage (day, sku, priority, calls, cost_usd) VALUES (?, ?, ?, 1, ?)
+                ON CONFLICT(day, sku, priority) DO UPDATE SET calls = calls + 1, cost_usd = cost_usd + excluded.cost_usd
+            ''', [(day, sku, priority, SKU_PRICES[sku] / 1000) for sku in skus])
+            self._conn.commit()
+
+    def add_deferred(self, day, endpoint, priority):
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO places_deferred (day, endpoint, priority, calls) VALUES (?, ?, ?, 1)
+                ON CONFLICT(day, endpoint, priority) DO UPDATE SET calls = calls + 1
+            ''', (day, endpoint, priority))
+            self._conn.commit()
+
+    def add_latency(self, day, endpoint, bucket_ms):
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO places_latency (day, endpoint, bucket_ms, calls) VALUES (?, ?, ?, 1)
+                ON CONFLICT(day, endpoint, bucket_ms) DO UPDATE SET calls = calls + 1
+            ''', (day, endpoint, bucket_ms))
+            self._conn.commit()
+
+    def spend(self, day_prefix):
+        """日（YYYY-MM-DD）または月（YYYY-MM）の料金の合計（USD）"""
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT COALESCE(SUM(cost_usd), 0) FROM places_sku_usage WHERE day LIKE ?', (day_prefix + '%',)
+            ).fetchone()
+        return row[0]
+
+    def usage(self, day_prefix):
+        """SKU・優先度ごとの呼び出し回数と料金 [(sku, priority, calls, cost_usd), ...]"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT sku, priority, SUM(calls), SUM(cost_usd) FROM places_sku_usage WHERE day LIKE ? '
+                'GROUP BY sku, priority ORDER BY sku, priority', (day_prefix + '%',)
+            ).fetchall()
+
+    def deferred(self, day_prefix):
+        """エンドポイント・優先度ごとの見送った回数 [(endpoint, priority, calls), ...]"""
+        with self._lock:
+            return self._conn.execute(
+                'SELECT endpoint, priority, SUM(calls) FROM places_deferred WHERE day LIKE ? '
+                'GROUP BY endpoint, priority ORDER BY endpoint, priority', (day_prefix + '%',)
+            ).fetchall()
+
+    def latency(self, day_prefix):
+        """エンドポイントごとの応答時間のヒストグラム（エンドポイント → {区間の上限のミリ秒: 回数}）"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT endpoint, bucket_ms, SUM(calls) FROM places_latency WHERE day LIKE ? '
+                'GROUP BY endpoint, bucket_ms', (day_prefix + '%',)
+            ).fetchall()
+        histograms = {}
+        for endpoint, bucket_ms, calls in rows:
+            histograms.setdefault(endpoint, {})[bucket_ms] = calls
+        return histograms
+
+
+class PlacesGovernor:
+    """
+    Places APIの予算・優先度による呼び出しの可否の判定と、利用状況の記録
+
+    Args:
+        store: PlacesUsageStore（省略時は最初に必要になったときに作成）
+        daily_budget: 1日の予算（USD、0以下なら制限なし）
+        monthly_budget: 1か月の予算（USD、0以下なら制限なし）
+    """
+
+    def __init__(self, store=None, daily_budget=DAILY_BUDGET_USD, monthly_budget=MONTHLY_BUDGET_USD):
+        self._store = store
+        self._store_lock = threading.Lock()
+        self.daily_budget = daily_budget
+        self.monthly_budget = monthly_budget
+        self._warned = set()
+
+    @property
+    def store(self):
+        with self._store_lock:
+            if self._store is None:
+                self._store = PlacesUsageStore()
+            return self._store
+
+    def authorize(self, endpoint, skus, priority=BATCH):
+        """
+        呼び出してよいか（予算のうち優先度ごとに使ってよい範囲に収まるか）
+
+        Returns:
+            str: 見送るべきなら理由、呼び出してよければNone
+        """
+        if priority not in PRIORITY_LIMITS:
+            raise ValueError(f"未対応の優先度です: {priority}")
+        cost = skus_cost(skus)
+        day = time.strftime('%Y-%m-%d')
+        for label, period, budget in (('1日', day, self.daily_budget), ('1か月', day[:7], self.monthly_budget)):
+            if budget <= 0:
+                continue
+            spent = self.store.spend(period)
+            if spent + cost > budget * PRIORITY_LIMITS[priority]:
+                self.store.add_deferred(day, endpoint, priority)
+                return (f"{label}の予算 ${budget:.2f} のうち ${spent:.2f} を使用済み"
+                        f"（{priority} は {PRIORITY_LIMITS[priority]:.0%} まで）")
+            if spent >= budget * SOFT_LIMIT_RATIO and (label, period) not in self._warned:
+                self._warned.add((label, period))
+                print(f"[Places API] {label}の予算のソフト上限を超えました（${spent:.2f} / ${budget:.2f}）。"
+                      f"優先度の低い呼び出しは見送ります", flush=True)
+        return None
+
+    def record(self, skus, priority=BATCH):
+        """課金される呼び出し（応答を受け取ったもの）を記録"""
+        self.store.add_usage(time.strftime('%Y-%m-%d'), skus, priority)
+
+    def record_latency(self, endpoint, seconds):
+        """HTTPリクエスト1回の応答時間を記録"""
+        self.store.add_latency(time.strftime('%Y-%m-%d'), endpoint, latency_bucket(seconds))
+
+
+_governor = PlacesGovernor()
+
+
+def get_places_governor():
+    """プロセス内で共有するPlacesGovernor"""
+    return _governor
@@ -0,0 +1,243 @@
+"""
+Playwright（非同期API）でのページ取得
+
+Seleniumでは取得処理ごとに Chrome を1つずつ起動するが、こちらは1つのブラウザプロセスを共有し、
+取得処理（PlaywrightFetcher）ごとに軽量なコンテキスト（Cookie・ストレージを分離）を作る。
+ページはリクエストごとに開いて閉じるため、同じブラウザで数十ページを同時に取得できる
+（同時に開くページ数の上限は MAX_PAGES、ホストごとの同時実行数は services.host_controller が制御）。
+
+- ブラウザとイベントループは専用のスレッドで動かし、同期版の get / fetch / get_many は
+  そのループでコルーチンを実行して結果を待つ（複数のスレッドから同時に呼び出してよい）
+- 固定の待機の代わりに、読み込み後は通信が落ち着くまで（最大 wait 秒）待つ
+- 画像・動画・フォントは読み込まない（HTMLの解析に不要）
+- 取得したHTMLはスナップショットとして保存し、リプレイモードでは保存済みのHTMLを返す
+
+PageFetcher（Selenium）と同じインターフェースで、services.page_fetcher.create_fetcher から
+取得元ごとに選択する（環境変数 BROWSER_BACKEND / BROWSER_BACKEND_<取得元> = playwright）。
+
+事前に `pip install playwright && playwright install chromium` が必要。
+"""
+import asyncio
+import atexit
+import os
+import threading
+
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError, async_playwright
+
+from services.host_controller import get_host_controller
+from services.snapshot_store import is_replay, load_snapshot, record_snapshot
+
+
+# 設定
+MAX_PAGES = int(os.environ.get('PLAYWRIGHT_MAX_PAGES', '24'))  # 1ブラウザで同時に開くページ数の上限
+NAVIGATION_TIMEOUT = 30  # ページ読み込みのタイムアウト（秒）
+BLOCKED_RESOURCE_TYPES = ('image', 'media', 'font')
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/140.0.7339.127 Safari/537.36'
+LAUNCH_ARGS = ['--no-sandbox', '--disable-dev-shm-usage', '--disable-blink-features=AutomationControlled', '--lang=ja']
+HIDE_WEBDRIVER_SCRIPT = "Object.defineProperty(navigator, 'webdriver', {get: () => undefined});"
+
+
+async def _block_resources(route):
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+class PlaywrightEngine:
+    """
+    共有のブラウザプロセスとイベントループ（最初に必要になったときに起動）
+
+    Args:
+        max_pages: 同時に開くページ数の上限
+        headless: ヘッドレスで起動するか
+    """
+
+    def __init__(self, max_pages=MAX_PAGES, headless=True):
+        self.max_pages = max_pages
+        self.headless = headless
+        self._loop = None
+        self._lock = threading.Lock()
+        self._playwright = None
+        self._browser = None
+        self._launch_lock = None
+        self._pages = None
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='playwright-engine', daemon=True).start()
+                self._loop = loop
+            return self._loop
+
+    def run(self, coro):
+        """コルーチンをエンジンのイベントループで実行して結果を待つ（同期版の呼び出し用）"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop()).result()
+
+    def submit(self, coro):
+        """コルーチンをエンジンのイベントループで開始（concurrent.futures.Future を返す）"""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    async def browser(self):
+        """起動済みのブラウザ（切断されていれば起動し直す）"""
+        if self._launch_lock is None:
+            self._launch_lock = asyncio.Lock()
+        async with self._launch_lock:
+            if self._browser is None or not self._browser.is_connected():
+                if self._playwright is None:
+                    self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless, args=LAUNCH_ARGS)
+        return self._browser
+
+    def page_slots(self):
+        """同時に開くページ数の上限（async with で1ページ分の枠を取る）"""
+        if self._pages is None:
+            self._pages = asyncio.Semaphore(self.max_pages)
+        return self._pages
+
+    async def new_context(self):
+        """Cookie・ストレージを分離した新しいコンテキスト"""
+        browser = await self.browser()
+        context = await browser.new_context(
+            user_agent=USER_AGENT, locale='ja-JP', timezone_id='Asia/Tokyo', viewport={'width': 1920, 'height': 1080}
+        )
+        context.set_default_navigation_timeout(NAVIGATION_TIMEOUT * 1000)
+        await context.add_init_script(HIDE_WEBDRIVER_SCRIPT)
+        await context.route('**/*', _block_resources)
+        return context
+
+    async def _shutdown(self):
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    def close(self):
+        """ブラウザを終了してイベントループを止める"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), loop).result(timeout=30)
+        except Exception as e:
+            print(f"[Playwright] 終了時にエラー: {type(e).__name__}: {e}", flush=True)
+        loop.call_soon_threadsafe(loop.stop)
+
+
+class PlaywrightFetcher:
+    """
+    Playwrightでのページ取得とスナップショット保存をまとめたもの（PageFetcher と同じインターフェース）
+
+    コンテキストは最初に必要になったときに作成し、close() で閉じる（ブラウザは共有のため終了しない）。
+    get / fetch / get_many は複数のスレッドから同時に呼び出してよい（同時に取得できるページ数は concurrency）。
+
+    Args:
+        source: スナップショットの取得元の識別名
+        wait: ページ読み込み後に通信が落ち着くまで待つ最大秒数
+        engine: PlaywrightEngine（省略時はプロセス内で共有のもの）
+    """
+
+    def __init__(self, source, wait=3, engine=None):
+        self.source = source
+        self.wait = wait
+        self.engine = engine or get_playwright_engine()
+        self.concurrency = self.engine.max_pages
+        self._context = None
+        self._context_lock = None
+
+    async def _get_context(self):
+        if self._context_lock is None:
+            self._context_lock = asyncio.Lock()
+        async with self._context_lock:
+            if self._context is None:
+                self._context = await self.engine.new_context()
+        return self._context
+
+    async def afetch(self, url, wait=None):
+        """
+        ページを取得し、(リダイレクト・JavaScriptによる書き換え後のURL, HTML) を返す（非同期版）
+
+        Raises:
+            SnapshotNotFound: リプレイモードで保存されていない場合
+        """
+        if is_replay():
+            return url, load_snapshot(url)
+        wait = self.wait if wait is None else wait
+        context = await self._get_context()
+        # ホストごとの同時実行数・サーキットブレーカー（遮断中はクールダウンが終わるまで待つ）を先に通し、
+        # 待っている間はブラウザのページ枠を占有しない
+        async with get_host_controller().async_request(url) as slot:
+            async with self.engine.page_slots():
+                page = await context.new_page()
+                try:
+                    await page.goto(url, wait_until='load')
+                    try:
+                        await page.wait_for_load_state('networkidle', timeout=wait * 1000)
+                    except PlaywrightTimeoutError:
+                        pass
+                    html = slot.check(await page.content())
+                    final_url = page.url
+                finally:
+                    await page.close()
+        await asyncio.to_thread(record_snapshot, url, html, self.source)
+        return final_url, html
+
+    async def aget(self, url, wait=None):
+        """ページのHTMLを取得（非同期版）"""
+        return (await self.afetch(url, wait))[1]
+
+    def fetch(self, url, wait=None):
+        """ページを取得し、(書き換え後のURL, HTML) を返す"""
+        return self.engine.run(self.afetch(url, wait))
+
+    def get(self, url, wait=None):
+        """
+        ページのHTMLを取得
+
+        Raises:
+            SnapshotNotFound: リプレイモードで保存されていない場合
+        """
+        return self.fetch(url, wait)[1]
+
+    def get_many(self, urls, wait=None):
+        """
+        複数のページを同時に取得し、入力順に (URL, HTML) を返す（取得に失敗したページのHTMLはNone）
+        """
+        urls = list(urls)
+        futures = [self.engine.submit(self.aget(url, wait)) for url in urls]
+        try:
+            for url, future in zip(urls, futures):
+                try:
+                    yield url, future.result()
+                except Exception as e:
+                    print(f"[取得エラー] {url}: {type(e).__name__}: {str(e)[:100]}", flush=True)
+                    yield url, None
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self):
+        if self._context is not None:
+            context, self._context = self._context, None
+            try:
+                self.engine.run(context.close())
+            except Exception:
+                pass
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_playwright_engine():
+    """プロセス内で共有するPlaywrightEngine（終了時にブラウザを閉じる）"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = PlaywrightEngine()
+            atexit.register(_engine.close)
+        return _engine
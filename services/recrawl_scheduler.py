@@ -0,0 +1,267 @@
+"""
+再クロールの優先度付きスケジューラー
+
+ScrapingTask（HPB一覧 / Google Map検索）と、Bizごとの情報拡充（HPB詳細 / 公式サイトの問い合わせ情報）を
+同じ基準でスコア付けし、1時間あたりのリクエスト数の予算に収まる実行計画を作る。
+
+スコア = 価値 × 変更されている見込み × 失敗による補正
+- 変更されている見込み: 前回の取得からの経過日数と、変更検出（services.change_detection）で観測した
+  変更間隔から 1 - exp(-経過日数 / 変更間隔) で推定（変更の多いページほど早く再取得され、
+  変更のないページは間隔が延びる）。未取得は 1
+- 価値: 口コミ件数（log）と区の重み（WARD_WEIGHTS、23区外は OTHER_WARD_WEIGHT）
+- 失敗: 直近 FAILURE_BACKOFF_HOURS 時間以内に失敗したタスクは対象外、それ以降は再試行として上げる
+
+計画はスコア / 推定リクエスト数 の高い順に、予算に収まるだけ選ぶ。
+変更されている見込みが MIN_GAIN 未満の項目は計画に入れない。
+
+run_hpb_scraper.py / run_gmap_scraper.py（タスクID省略時の選択）と scripts/plan_recrawl.py から使用する。
+"""
+import math
+import os
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from sqlalchemy import func, or_
+
+from models import db, Biz, ReviewSummary, ScrapingTask
+from services.address_parser import TOKYO_23_WARDS
+from services.area_subdivision import SPLIT_STATUS
+from services.change_detection import get_page_state_store
+from services.contact_crawler import MAX_CONTACT_PAGES
+from services.coverage_report import OTHER_WARD, ward_expression
+from services.hpb_extractors import ENRICHMENT_FULL, pages_for
+
+
+# 設定
+HOURLY_REQUEST_BUDGET = int(os.environ.get('RECRAWL_HOURLY_BUDGET', '600'))  # 1時間あたりのリクエスト数の予算
+DEFAULT_CHANGE_INTERVAL_DAYS = 7.0  # 変更の観測がないページの変更間隔の想定（日）
+MIN_CHANGE_INTERVAL_DAYS = 1.0
+MAX_CHANGE_INTERVAL_DAYS = 90.0
+MIN_GAIN = 0.05  # 変更されている見込みがこれ未満なら計画に入れない
+FAILURE_BACKOFF_HOURS = 6  # 失敗したタスクをこの時間は再試行しない（計画・next_task の対象外）
+FAILURE_RETRY_FACTOR = 1.5  # バックオフ後の失敗タスクの優先度
+REVIEW_WEIGHT = 0.5  # 口コミ件数（log10）の重み
+WARD_WEIGHTS = {}  # 区 → 重み（未指定の23区は 1.0）
+OTHER_WARD_WEIGHT = 0.5
+
+KIND_HPB_TASK = 'hpb_task'
+KIND_GMAP_TASK = 'gmap_task'
+KIND_HPB_DETAILS = 'hpb_details'
+KIND_CONTACT = 'contact'
+KINDS = (KIND_HPB_TASK, KIND_GMAP_TASK, KIND_HPB_DETAILS, KIND_CONTACT)
+
+# 1件あたりの推定リクエスト数
+REQUEST_COSTS = {
+    KIND_HPB_TASK: 10,  # 一覧ページ数（前回の実行から分からないため想定値）
+    KIND_GMAP_TASK: 17,  # 検索API 最大3回（next_page_token） + 新規サロンのGoogle Map拡充
+    KIND_HPB_DETAILS: len(pages_for()),  # トップページ + 口コミページ
+    KIND_CONTACT: 1 + MAX_CONTACT_PAGES,  # トップページ + 問い合わせページ
+}
+
+# 変更検出の状態の取得元（services.change_detection.ChangeTracker の source）
+STATE_SOURCES = {
+    KIND_HPB_TASK: 'hpb_list',
+    KIND_GMAP_TASK: 'gmap_search',
+    KIND_HPB_DETAILS: 'hpb_details',
+    KIND_CONTACT: 'contact',
+}
+
+
+@dataclass
+class PlanItem:
+    """計画の1件"""
+    kind: str  # KINDS のいずれか
+    target_id: int  # ScrapingTask.id / Biz.id
+    label: str
+    score: float
+    cost: int  # 推定リクエスト数
+    reasons: list = field(default_factory=list)
+
+
+def gmap_search_key(keyword):
+    """Google Map検索タスクの変更検出のキー"""
+    return f"search:{keyword}"
+
+
+def change_interval_days(state):
+    """
+    観測した変更間隔の推定（日）
+
+    直前の取得で変更があったページは短く、連続して未変更のページほど長くする。
+    """
+    if state is None:
+        return DEFAULT_CHANGE_INTERVAL_DAYS
+    stable_days = max(0.0, (state.checked_at - state.changed_at) / 86400)
+    interval = (stable_days + DEFAULT_CHANGE_INTERVAL_DAYS) * (1 + state.unchanged_runs) / 2
+    return min(MAX_CHANGE_INTERVAL_DAYS, max(MIN_CHANGE_INTERVAL_DAYS, interval))
+
+
+def change_probability(age_days, interval_days):
+    """前回の取得から age_days 日後に変更されている見込み（未取得なら1）"""
+    if age_days is None:
+        return 1.0
+    return 1.0 - math.exp(-age_days / interval_days)
+
+
+def value_weight(reviews=None, ward=None):
+    """価値（口コミ件数と区の重み）"""
+    weight = 1.0 + REVIEW_WEIGHT * math.log10(1 + (reviews or 0))
+    if ward is None:
+        return weight
+    if ward == OTHER_WARD:
+        return weight * OTHER_WARD_WEIGHT
+    return weight * WARD_WEIGHTS.get(ward, 1.0)
+
+
+def _keyword_ward(keyword):
+    """検索キーワードに含まれる区（なければNone）"""
+    for ward in TOKYO_23_WARDS:
+        if keyword and ward in keyword:
+            return ward
+    return None
+
+
+def _age_days(timestamp, now):
+    return None if timestamp is None else max(0.0, (now - timestamp) / 86400)
+
+
+def _task_items(task_type, kind, states, now):
+    items = []
+    # 分割済みのGoogle Map検索タスクは子タスク（細かい地域）が同じ範囲を検索するため対象外
+    for task in ScrapingTask.query.filter(
+        ScrapingTask.task_type == task_type, ScrapingTask.status.notin_(('実行中', SPLIT_STATUS))
+    ):
+        key = task.target_url if kind == KIND_HPB_TASK else gmap_search_key(task.search_keyword)
+        state = states.get(key)
+        last_run = task.last_run_at.timestamp() if task.last_run_at else None
+        age = None if task.status == '未実行' else _age_days(last_run or (state and state.checked_at), now)
+        interval = change_interval_days(state)
+        gain = change_probability(age, interval)
+        ward = _keyword_ward(task.search_keyword)
+        score = value_weight(ward=ward) * gain
+        reasons = ['未実行' if age is None else f"経過{age:.1f}日/変更間隔{interval:.0f}日"]
+        if task.status == '失敗':
+            if age is not None and age * 24 < FAILURE_BACKOFF_HOURS:
+                continue
+            score *= FAILURE_RETRY_FACTOR
+            reasons.append('失敗の再試行')
+        if gain < MIN_GAIN:
+            continue
+        label = task.search_keyword or task.target_url
+        items.append(PlanItem(kind, task.id, label, score, REQUEST_COSTS[kind], reasons))
+    return items
+
+
+def _biz_items(kinds, store, now):
+    reviews = db.session.query(
+        ReviewSummary.biz_id, func.max(ReviewSummary.count).label('reviews')
+    ).group_by(ReviewSummary.biz_id).subquery()
+    ward = ward_expression().label('ward')
+    rows = db.session.query(
+        Biz.id, Biz.name, Biz.name_hpb, Biz.hotpepper_url, Biz.hpb_enrichment, Biz.website_url, Biz.inquiry_url,
+        ward, reviews.c.reviews
+    ).outerjoin(reviews, reviews.c.biz_id == Biz.id).filter(
+        or_(Biz.hotpepper_url.isnot(None), Biz.website_url.isnot(None))
+    )
+
+    detail_states = store.states(STATE_SOURCES[KIND_HPB_DETAILS]) if KIND_HPB_DETAILS in kinds else {}
+    contact_states = store.states(STATE_SOURCES[KIND_CONTACT]) if KIND_CONTACT in kinds else {}
+    items = []
+    for row in rows:
+        value = value_weight(row.reviews, row.ward)
+        label = row.name_hpb or row.name or f"Biz {row.id}"
+        targets = []
+        if KIND_HPB_DETAILS in kinds and row.hotpepper_url:
+            state = detail_states.get(row.hotpepper_url)
+            # 詳細ページ未取得（full でない）なら未取得扱い、取得済みで観測がなければ想定の変更間隔だけ経過扱い
+            if row.hpb_enrichment != ENRICHMENT_FULL:
+                age = None
+            else:
+                age = _age_days(state.checked_at, now) if state else DEFAULT_CHANGE_INTERVAL_DAYS
+            targets.append((KIND_HPB_DETAILS, state, age))
+        if KIND_CONTACT in kinds and row.website_url:
+            state = contact_states.get(row.website_url)
+            if state:
+                age = _age_days(state.checked_at, now)
+            else:
+                age = None if row.inquiry_url is None else DEFAULT_CHANGE_INTERVAL_DAYS
+            targets.append((KIND_CONTACT, state, age))
+        for kind, state, age in targets:
+            interval = change_interval_days(state)
+            gain = change_probability(age, interval)
+            if gain < MIN_GAIN:
+                continue
+            reasons = ['未取得' if age is None else f"経過{age:.1f}日/変更間隔{interval:.0f}日"]
+            if row.reviews:
+                reasons.append(f"口コミ{row.reviews}件")
+            items.append(PlanItem(kind, row.id, label, value * gain, REQUEST_COSTS[kind], reasons))
+    return items
+
+
+def score_items(kinds=KINDS):
+    """
+    全ての対象をスコア付け（app_context内で呼び出すこと）
+
+    Args:
+        kinds: 対象の種別（KINDS のいずれか）
+
+    Returns:
+        list: PlanItem（スコアの高い順）
+    """
+    store = get_page_state_store()
+    now = time.time()
+    items = []
+    if KIND_HPB_TASK in kinds:
+        items += _task_items('HPB', KIND_HPB_TASK, store.states(STATE_SOURCES[KIND_HPB_TASK]), now)
+    if KIND_GMAP_TASK in kinds:
+        items += _task_items('GMAP', KIND_GMAP_TASK, store.states(STATE_SOURCES[KIND_GMAP_TASK]), now)
+    if KIND_HPB_DETAILS in kinds or KIND_CONTACT in kinds:
+        items += _biz_items(kinds, store, now)
+    items.sort(key=lambda item: -item.score)
+    return items
+
+
+def build_plan(hours=1.0, budget_per_hour=HOURLY_REQUEST_BUDGET, kinds=KINDS):
+    """
+    予算に収まる実行計画（app_context内で呼び出すこと）
+
+    スコア / 推定リクエスト数 の高い順に、合計が予算（budget_per_hour × hours）に収まるだけ選ぶ。
+
+    Returns:
+        tuple: (PlanItemのリスト（選んだ順）, 予算, 対象の総数)
+    """
+    budget = int(budget_per_hour * hours)
+    items = score_items(kinds)
+    plan, used = [], 0
+    for item in sorted(items, key=lambda item: -item.score / item.cost):
+        if used + item.cost > budget:
+            continue
+        plan.append(item)
+        used += item.cost
+    return plan, budget, len(items)
+
+
+def next_task(task_type):
+    """
+    cron用: 次に実行するタスク（スコアが最も高いもの、対象がなければNone）
+
+    Args:
+        task_type: 'HPB' / 'GMAP'
+    """
+    kind = KIND_HPB_TASK if task_type == 'HPB' else KIND_GMAP_TASK
+    items = score_items([kind])
+    return db.session.get(ScrapingTask, items[0].target_id) if items else None
+
+
+def print_plan(plan, budget, candidates, limit=None):
+    """計画の集計と内訳（limit 件まで）を表示"""
+    used = sum(item.cost for item in plan)
+    print(f"=== 再クロール計画（{datetime.now():%Y-%m-%d %H:%M}） ===")
+    print(f"予算: {budget}リクエスト / 使用: {used}リクエスト / 選択: {len(plan)}件（候補 {candidates}件）")
+    for kind in KINDS:
+        selected = [item for item in plan if item.kind == kind]
+        if selected:
+            print(f"  {kind}: {len(selected)}件（{sum(item.cost for item in selected)}リクエスト）")
+    for item in plan[:limit] if limit else plan:
+        print(f"  [{item.score:6.3f}] {item.kind:<12} #{item.target_id:<7} {item.label[:40]}  ({', '.join(item.reasons)})")
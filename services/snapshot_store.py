@@ -0,0 +1,329 @@
+"""
+取得したHTMLのスナップショット保存（コンテンツアドレス方式）
+- 各スクレイパーが取得した生のHTMLを zstd 圧縮してディスクに保存
+- 本体は内容のSHA-256で重複排除（同じ内容は何回取得しても1ファイル）、
+  URL・取得日時・取得元はSQLiteのインデックスに記録
+- URLごとの保持世代数と全体の容量上限で古いものから削除
+- リプレイモード（--from-cache）ではネットワークを使わず、保存済みのHTMLを返す
+  → セレクタを修正したときに再クロールせず、保存済みページでパーサーを再実行できる
+
+保存先: instance/snapshots/（環境変数 SNAPSHOT_DIR で変更可）
+  index.sqlite3          スナップショットの一覧
+  blobs/ab/abcdef...zst  HTML本体
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import zstandard
+
+
+# 設定
+SNAPSHOT_DIR = os.environ.get(
+    'SNAPSHOT_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'instance', 'snapshots')
+)
+SNAPSHOT_ENABLED = os.environ.get('SNAPSHOT_ENABLED', '1') != '0'  # 0なら保存しない
+MAX_STORE_BYTES = int(os.environ.get('SNAPSHOT_MAX_MB', '2048')) * 1024 * 1024  # 圧縮後の合計容量の上限
+KEEP_PER_URL = 3  # URLごとに保持する世代数
+COMPRESSION_LEVEL = 10
+PRUNE_EVERY = 500  # この件数を保存するごとに保持ポリシーを適用
+PRUNE_BATCH = 1000  # 容量超過時に1回で削除する件数
+
+_replay = os.environ.get('SNAPSHOT_REPLAY') == '1'
+
+
+def set_replay(enabled=True):
+    """リプレイモード（保存済みHTMLのみを使い、ネットワークにアクセスしない）を切り替える"""
+    global _replay
+    _replay = bool(enabled)
+
+
+def is_replay():
+    return _replay
+
+
+class SnapshotNotFound(KeyError):
+    """リプレイモードで、URLのスナップショットが保存されていない"""
+
+
+class Snapshot:
+    """スナップショット1件（HTML本体は html プロパティで読み込む）"""
+    __slots__ = ('store', 'id', 'url', 'source', 'fetched_at', 'content_hash')
+
+    def __init__(self, store, id, url, source, fetched_at, content_hash):
+        self.store = store
+        self.id = id
+        self.url = url
+        self.source = source
+        self.fetched_at = datetime.fromtimestamp(fetched_at)
+        self.content_hash = content_hash
+
+    @property
+    def html(self):
+        return self.store.read_blob(self.content_hash)
+
+    def __repr__(self):
+        return f"Snapshot({self.url!r}, {self.source!r}, {self.fetched_at:%Y-%m-%d %H:%M:%S})"
+
+
+class SnapshotStore:
+    """
+    zstd圧縮・内容ハッシュで重複排除するHTMLスナップショットの保存先
+
+    Args:
+        root: 保存先ディレクトリ
+        max_bytes: 圧縮後の合計容量の上限
+        keep_per_url: URLごとに保持する世代数
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR, max_bytes=MAX_STORE_BYTES, keep_per_url=KEEP_PER_URL):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.keep_per_url = keep_per_url
+        self._lock = threading.Lock()
+        self._writes = 0
+        os.makedirs(os.path.join(root, 'blobs'), exist_ok=True)
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                source TEXT,
+                fetched_at REAL NOT NULL,
+                content_hash TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_snapshots_url ON snapshots (url, fetched_at);
+            CREATE INDEX IF NOT EXISTS ix_snapshots_hash ON snapshots (content_hash);
+            CREATE INDEX IF NOT EXISTS ix_snapshots_fetched_at ON snapshots (fetched_at);
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                raw_size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL
+            );
+        ''')
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.root, 'blobs', content_hash[:2], content_hash + '.zst')
+
+    def put(self, url, html, source=None, fetched_at=None):
+        """
+        HTMLを保存
+
+        Args:
+            url: 取得したURL（リプレイ時の検索キー）
+            html: HTML（str）
+            source: 取得元の識別名（hpb_list / hpb_details / rejob / contact など）
+            fetched_at: 取得日時（UNIX時刻、省略時は現在）
+
+        Returns:
+            str: 内容のハッシュ / HTMLが空の場合はNone
+        """
+        if not html:
+            return None
+        raw = html.encode('utf-8')
+        content_hash = hashlib.sha256(raw).hexdigest()
+        with self._lock:
+            known = self._conn.execute('SELECT 1 FROM blobs WHERE content_hash = ?', (content_hash,)).fetchone()
+            if not known:
+                data = zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(raw)
+                path = self._blob_path(content_hash)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{os.getpid()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self._conn.execute('INSERT OR IGNORE INTO blobs (content_hash, raw_size, stored_size) VALUES (?, ?, ?)',
+                                   (content_hash, len(raw), len(data)))
+            self._conn.execute('INSERT INTO snapshots (url, source, fetched_at, content_hash) VALUES (?, ?, ?, ?)',
+                               (url, source, fetched_at or time.time(), content_hash))
+            self._conn.commit()
+            self._writes += 1
+            prune_due = self._writes % PRUNE_EVERY == 0
+        if prune_due:
+            self.prune()
+        return content_hash
+
+    def read_blob(self, content_hash):
+        """ハッシュからHTMLを読み込む（ファイルがなければNone）"""
+        try:
+            with open(self._blob_path(content_hash), 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        return zstandard.ZstdDecompressor().decompress(data).decode('utf-8')
+
+    def latest(self, url, max_age=None):
+        """
+        URLの最新のスナップショット
+
+        Args:
+            max_age: これより古い（秒）ものは対象外
+
+        Returns:
+            Snapshot / なければNone
+        """
+        query = 'SELECT id, url, source, fetched_at, content_hash FROM snapshots WHERE url = ?'
+        params = [url]
+        if max_age is not None:
+            query += ' AND fetched_at >= ?'
+            params.append(time.time() - max_age)
+        with self._lock:
+            row = self._conn.execute(query + ' ORDER BY fetched_at DESC, id DESC LIMIT 1', params).fetchone()
+        return Snapshot(self, *row) if row else None
+
+    def get(self, url, max_age=None):
+        """URLの最新のHTML（なければNone）"""
+        snapshot = self.latest(url, max_age)
+        return snapshot.html if snapshot else None
+
+    def iter_snapshots(self, source=None, latest_only=True, limit=None):
+        """
+        保存済みのスナップショットを順に返す（オフラインでのパーサー再実行用）
+
+        Args:
+            source: 取得元で絞り込む
+            latest_only: TrueならURLごとに最新の1件のみ
+            limit: 最大件数
+        """
+        query = 'SELECT id, url, source, fetched_at, content_hash FROM snapshots'
+        conditions, params = [], []
+        if source:
+            conditions.append('source = ?')
+            params.append(source)
+        if latest_only:
+            conditions.append('id IN (SELECT MAX(id) FROM snapshots GROUP BY url)')
+        if conditions:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        for row in rows:
+            yield Snapshot(self, *row)
+
+    def _delete_orphan_blobs(self):
+        """どのスナップショットからも参照されない本体を削除（ロック取得済みで呼ぶ）"""
+        orphans = [row[0] for row in self._conn.execute(
+            'SELECT content_hash FROM blobs WHERE content_hash NOT IN (SELECT content_hash FROM snapshots)'
+        )]
+        for content_hash in orphans:
+            try:
+                os.remove(self._blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+        self._conn.executemany('DELETE FROM blobs WHERE content_hash = ?', [(h,) for h in orphans])
+        return len(orphans)
+
+    def prune(self, max_bytes=None, keep_per_url=None):
+        """
+        保持ポリシーを適用
+
+        1. URLごとに新しい keep_per_url 件を残して削除
+        2. 圧縮後の合計容量が max_bytes 以下になるまで、取得日時の古いものから削除
+
+        Returns:
+            dict: {'snapshots': 削除した件数, 'blobs': 削除したファイル数}
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        keep_per_url = keep_per_url or self.keep_per_url
+        removed = {'snapshots': 0, 'blobs': 0}
+        with self._lock:
+            cursor = self._conn.execute('''
+                DELETE FROM snapshots WHERE id IN (
+                    SELECT id FROM (
+                        SELECT id, ROW_NUMBER() OVER (PARTITION BY url ORDER BY fetched_at DESC, id DESC) AS rank
+                        FROM snapshots
+                    ) WHERE rank > ?
+                )
+            ''', (keep_per_url,))
+            removed['snapshots'] += cursor.rowcount
+            removed['blobs'] += self._delete_orphan_blobs()
+
+            while (self._conn.execute('SELECT COALESCE(SUM(stored_size), 0) FROM blobs').fetchone()[0] > max_bytes):
+                cursor = self._conn.execute(
+                    'DELETE FROM snapshots WHERE id IN (SELECT id FROM snapshots ORDER BY fetched_at LIMIT ?)',
+                    (PRUNE_BATCH,)
+                )
+                if not cursor.rowcount:
+                    break
+                removed['snapshots'] += cursor.rowcount
+                removed['blobs'] += self._delete_orphan_blobs()
+            self._conn.commit()
+        return removed
+
+    def stats(self):
+        """
+        保存状況
+
+        Returns:
+            dict: {'snapshots', 'urls', 'blobs', 'raw_bytes', 'stored_bytes', 'by_source': {取得元: 件数}}
+        """
+        with self._lock:
+            snapshots, urls = self._conn.execute('SELECT COUNT(*), COUNT(DISTINCT url) FROM snapshots').fetchone()
+            blobs, raw_bytes, stored_bytes = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM blobs'
+            ).fetchone()
+            by_source = dict(self._conn.execute(
+                'SELECT COALESCE(source, \'\'), COUNT(*) FROM snapshots GROUP BY source ORDER BY COUNT(*) DESC'
+            ).fetchall())
+        return {
+            'snapshots': snapshots,
+            'urls': urls,
+            'blobs': blobs,
+            'raw_bytes': raw_bytes,
+            'stored_bytes': stored_bytes,
+            'by_source': by_source,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_snapshot_store():
+    """プロセス内で共有するSnapshotStore"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore()
+        return _store
+
+
+def record_snapshot(url, html, source=None):
+    """
+    取得したHTMLを保存（保存の失敗で取得処理を止めない）
+
+    Returns:
+        str: 内容のハッシュ / 保存しなかった場合はNone
+    """
+    if not SNAPSHOT_ENABLED or _replay:
+        return None
+    try:
+        return get_snapshot_store().put(url, html, source=source)
+    except (OSError, sqlite3.Error, zstandard.ZstdError) as e:
+        print(f"[スナップショット保存エラー] {url}: {e}", flush=True)
+        return None
+
+
+def load_snapshot(url):
+    """
+    リプレイモード用: URLの保存済みHTMLを返す
+
+    Raises:
+        SnapshotNotFound: 保存されていない場合
+    """
+    html = get_snapshot_store().get(url)
+    if html is None:
+        raise SnapshotNotFound(url)
+    return html
@@ -0,0 +1,184 @@
+"""
+1つのChromeの複数のタブでページの読み込みを並行して待つ
+
+Google Mapは読み込み後にJavaScriptでURLを書き換える（CIDを含むURLになる）まで数秒かかり、
+1件ずつ処理すると大半の時間が待機になる。TabbedWorker は1つのドライバーでK個のタブを開き、
+- 空いているタブに順番に（ラウンドロビンで）URLを割り当て、読み込みの完了を待たずに次のタブへ進む
+- 全てのタブを順に確認し、完了した（check が結果を返した）タブから結果を取り出して次のURLを割り当てる
+ことで、ブラウザ1つ・同じメモリでおよそK倍の件数を処理する。
+
+- ホストごとの同時実行数（services.host_controller）の枠が取れた分だけ割り当てる
+  （同時に読み込むタブ数もAIMDで調整され、遮断中は割り当てない）
+- 期限（timeout）までに完了しなかったタブは fallback（ページソースからの抽出など）を試し、
+  それでも取れなければ attempts 回まで割り当て直す
+- メモリ・描画時間の監視（services.browser_watchdog）で再起動が必要になったら、読み込み中のタブの完了を待って再起動
+- ブラウザ異常（WebDriverException）の場合は再起動し、読み込み中だったURLを割り当て直す
+
+scripts/retry_cid_failed.py / scripts/enrich_website_from_cid.py から使用する。
+"""
+import time
+from collections import deque
+
+from selenium.common.exceptions import WebDriverException
+
+from services.browser_watchdog import get_browser_watchdog
+from services.host_controller import BLOCKED, OK, TIMEOUT, get_host_controller, host_of, looks_blocked
+
+
+# 設定
+TAB_COUNT = 4  # 1つのブラウザで開くタブ数
+JOB_TIMEOUT = 25  # 1件の完了を待つ上限（秒）
+POLL_INTERVAL = 0.5  # タブを確認する間隔（秒）
+MAX_ATTEMPTS = 2  # 期限切れ・ブラウザ異常の場合に割り当てる回数の上限
+MAX_HOST_WAIT = 5.0  # ホストの枠が空くのを待つ間隔の上限（秒）
+
+NOT_FOUND = object()  # check / fallback の戻り値: 読み込みは完了したが値がない（再試行しない）
+
+
+class TabJob:
+    """タブに割り当てた1件"""
+    __slots__ = ('key', 'url', 'attempt', 'started')
+
+    def __init__(self, key, url, attempt):
+        self.key = key
+        self.url = url
+        self.attempt = attempt
+        self.started = time.monotonic()
+
+
+class TabbedWorker:
+    """
+    1つのドライバーの複数のタブで、ページの読み込みを並行して待つ
+
+    Args:
+        driver_factory: Seleniumドライバーを生成する関数（app.get_stealth_driver）
+        tabs: 開くタブ数
+        timeout: 1件の完了を待つ上限（秒）
+        attempts: 期限切れ・ブラウザ異常の場合に割り当てる回数の上限
+    """
+
+    def __init__(self, driver_factory, tabs=TAB_COUNT, timeout=JOB_TIMEOUT, attempts=MAX_ATTEMPTS):
+        self.driver_factory = driver_factory
+        self.tabs = max(1, tabs)
+        self.timeout = timeout
+        self.attempts = attempts
+        self.driver = None
+        self.handles = []
+        self.restarts = 0
+
+    def _start(self):
+        driver = get_browser_watchdog().track(self.driver_factory())
+        self.driver = driver
+        self.handles = [driver.current_window_handle]
+        for _ in range(self.tabs - 1):
+            driver.switch_to.new_window('tab')
+            self.handles.append(driver.current_window_handle)
+
+    def close(self):
+        if self.driver is not None:
+            driver, self.driver = self.driver, None
+            get_browser_watchdog().forget(driver)
+            try:
+                driver.quit()
+            except Exception:
+                pass
+        self.handles = []
+
+    def restart(self):
+        """ブラウザを再起動（タブも開き直す）"""
+        self.close()
+        time.sleep(2)
+        self._start()
+        self.restarts += 1
+
+    def _dispatch(self, handle, job):
+        self.driver.switch_to.window(handle)
+        # 前のページのURL（前の件のCID）を拾わないよう空白ページにしてから、完了を待たずに読み込みを開始
+        self.driver.get('about:blank')
+        self.driver.execute_script('window.location.href = arguments[0];', job.url)
+
+    def run(self, jobs, check, fallback=None):
+        """
+        URLを空いているタブに割り当て、完了した順に結果を返す
+
+        Args:
+            jobs: (キー, URL) のリスト
+            check: ドライバー（対象のタブに切り替え済み）→ 結果（未完了ならNone、完了して値がなければ NOT_FOUND）
+            fallback: 期限切れのタブで呼ぶ（ドライバー → 結果 / None / NOT_FOUND）
+
+        Yields:
+            (キー, 結果)（完了順。取得できなかった場合の結果はNone）
+        """
+        controller = get_host_controller()
+        watchdog = get_browser_watchdog()
+        queue = deque((key, url, 1) for key, url in jobs)
+        busy = {}  # タブのハンドル → TabJob
+        recycle = None
+        if self.driver is None:
+            self._start()
+        try:
+            while queue or busy:
+                host_wait = 0
+                try:
+                    # 空いているタブに割り当て（再起動待ちの間は割り当てない）
+                    for handle in self.handles:
+                        if not queue or recycle:
+                            break
+                        if handle in busy:
+                            continue
+                        key, url, attempt = queue[0]
+                        host_wait = controller.try_acquire(host_of(url))
+                        if host_wait:
+                            break
+                        queue.popleft()
+                        job = busy[handle] = TabJob(key, url, attempt)
+                        self._dispatch(handle, job)
+
+                    # 全てのタブを確認し、完了したものから結果を返す
+                    for handle, job in list(busy.items()):
+                        self.driver.switch_to.window(handle)
+                        result = check(self.driver)
+                        elapsed = time.monotonic() - job.started
+                        kind = OK
+                        if result is None:
+                            if elapsed < self.timeout:
+                                continue
+                            if looks_blocked(self.driver.page_source):
+                                kind = BLOCKED
+                            else:
+                                result = fallback(self.driver) if fallback else None
+                                if result is None:
+                                    kind = TIMEOUT
+                        del busy[handle]
+                        controller.release(host_of(job.url), kind, elapsed)
+                        watchdog.record_latency(self.driver, elapsed)
+                        if result is None and kind == TIMEOUT and job.attempt < self.attempts:
+                            queue.append((job.key, job.url, job.attempt + 1))
+                            continue
+                        yield job.key, None if result is NOT_FOUND else result
+                        recycle = recycle or watchdog.check(self.driver)
+
+                    if recycle and not busy:
+                        print(f"  🔄 ブラウザを再起動します: {recycle}", flush=True)
+                        self.restart()
+                        recycle = None
+                        continue
+                except WebDriverException as e:
+                    print(f"  ⚠️  ブラウザ異常を検知、再起動します: {type(e).__name__}", flush=True)
+                    failed = list(busy.values())
+                    busy.clear()
+                    for job in failed:
+                        # ブラウザ側の異常のため、ホストの失敗としては記録しない
+                        controller.cancel(host_of(job.url))
+                        if job.attempt < self.attempts:
+                            queue.appendleft((job.key, job.url, job.attempt + 1))
+                        else:
+                            yield job.key, None
+                    self.restart()
+                    recycle = None
+                    continue
+                time.sleep(POLL_INTERVAL if busy else min(max(host_wait, POLL_INTERVAL), MAX_HOST_WAIT))
+        finally:
+            # 途中で中断された場合は、読み込み中の件の枠を返す
+            for job in busy.values():
+                controller.cancel(host_of(job.url))
@@ -2,18 +2,24 @@
 企業Webサイトのスクレイピング機能
 - URLからHTMLコンテンツを取得
 - JavaScript実行が必要な場合はSelenium使用
-- テキスト抽出・クリーニング機能
+- テキスト抽出・クリーニング機能（lxmlでパース）
 """
 import requests
 import time
 import re
-from bs4 import BeautifulSoup
+from lxml import etree, html as lxml_html
 from urllib.parse import urlparse
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from services.host_controller import get_host_controller
+
+
+# テキスト抽出時に中身ごと除外する要素
+EXCLUDED_TAGS = ('script', 'style', 'header', 'footer', 'nav', 'aside', etree.Comment)
+
 
 class WebScraper:
     """企業Webサイトのスクレイピングを行うクラス"""
@@ -81,7 +87,10 @@ class WebScraper:
     
     def _scrape_with_requests(self, url: str, max_chars: int) -> dict:
         """requestsライブラリを使用したスクレイピング"""
-        response = requests.get(url, headers=self.headers, timeout=10)
+        # ホストごとの同時実行数・サーキットブレーカー（services.host_controller）
+        with get_host_controller().request(url) as slot:
+            response = requests.get(url, headers=self.headers, timeout=10)
+            slot.check_status(response.status_code)
         response.raise_for_status()
         response.encoding = response.apparent_encoding or 'utf-8'
         
@@ -105,15 +114,16 @@ class WebScraper:
         driver = None
         try:
             driver = get_stealth_driver()
-            driver.get(url)
-            
-            # ページ読み込み待機（最大10秒）
-            WebDriverWait(driver, 10).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            time.sleep(3)  # JavaScript実行完了を待つ
-            
-            html = driver.page_source[:max_chars * 3]
+            with get_host_controller().request(url) as slot:
+                driver.get(url)
+                
+                # ページ読み込み待機（最大10秒）
+                WebDriverWait(driver, 10).until(
+                    EC.presence_of_element_located((By.TAG_NAME, "body"))
+                )
+                time.sleep(3)  # JavaScript実行完了を待つ
+                
+                html = slot.check(driver.page_source)[:max_chars * 3]
             text = self._extract_text(html)
             text = text[:max_chars]
             
@@ -139,14 +149,21 @@ class WebScraper:
         Returns:
             クリーニングされたテキスト
         """
-        soup = BeautifulSoup(html, 'html.parser')
+        if not html or not html.strip():
+            return ''
+        try:
+            document = lxml_html.document_fromstring(html)
+        except ValueError:
+            # XML宣言（encoding指定）付きの文字列はバイト列として渡す
+            document = lxml_html.document_fromstring(html.encode('utf-8'))
+        except etree.ParserError:
+            return ''
         
-        # 不要なタグを削除（スクリプト、スタイル、ヘッダー、フッター、ナビ）
-        for tag in soup(['script', 'style', 'header', 'footer', 'nav', 'aside']):
-            tag.decompose()
+        # 不要なタグを削除（スクリプト、スタイル、ヘッダー、フッター、ナビ、コメント）
+        etree.strip_elements(document, *EXCLUDED_TAGS, with_tail=False)
         
-        # テキスト抽出
-        text = soup.get_text(separator='\n', strip=True)
+        # テキスト抽出（テキストノードごとに改行で区切る）
+        text = '\n'.join(part.strip() for part in document.itertext() if part.strip())
         
         # クリーニング
         lines = []